@@ -177,3 +177,20 @@ def send_flight_details(to_email: str, flight_ctx: dict) -> bool:
         context={"flight": flight_ctx},
         text_template_name="main/emails/flight_summary.txt",
     )
+
+
+def send_price_drop_alert(to_email: str, alert_ctx: dict) -> bool:
+    """
+    Send a price-drop alert for a watched route (main.price_watch).
+    alert_ctx: route_display, price_display, previous_display, target_display, depart_date, etc.
+    """
+    if not _is_email_configured():
+        logger.warning("Email not configured. Price alert would not be sent.")
+    subject = f"Price drop: {alert_ctx.get('route_display', 'your route')} now {alert_ctx.get('price_display', '')}"
+    return _send_templated(
+        to_emails=to_email,
+        subject=subject.strip(),
+        html_template_name="main/emails/price_drop.html",
+        context={"alert": alert_ctx},
+        text_template_name="main/emails/price_drop.txt",
+    )
@@ -1,4 +1,5 @@
 """Admin dashboard access middleware. Protects /admin-dashboard/*"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.shortcuts import redirect
 from django.conf import settings
 
@@ -12,18 +13,33 @@ def _is_admin(user):
     return user.email and user.email.lower() == ADMIN_EMAIL.lower()
 
 
+def _guarded(request):
+    path = request.path
+    # Allow tracking API for all visitors (used by main site)
+    if path == "/admin-dashboard/api/click/" and request.method == "POST":
+        return False
+    return path.startswith("/admin-dashboard/")
+
+
 class AdminDashboardMiddleware:
-    """Block /admin-dashboard/ for non-admin users."""
+    """Block /admin-dashboard/ for non-admin users. Async-capable, so async views stay on the event loop."""
+
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        path = request.path
-        # Allow tracking API for all visitors (used by main site)
-        if path == "/admin-dashboard/api/click/" and request.method == "POST":
-            return self.get_response(request)
-        if path.startswith("/admin-dashboard/"):
-            if not _is_admin(request.user):
-                return redirect(settings.LOGIN_URL + f"?next={path}")
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if _guarded(request) and not _is_admin(request.user):
+            return redirect(settings.LOGIN_URL + f"?next={request.path}")
         return self.get_response(request)
+
+    async def __acall__(self, request):
+        if _guarded(request) and not _is_admin(await request.auser()):
+            return redirect(settings.LOGIN_URL + f"?next={request.path}")
+        return await self.get_response(request)
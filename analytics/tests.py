@@ -1,3 +1,29 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from analytics.middleware import ADMIN_EMAIL
+
+
+class UpstreamsDashboardTestCase(TestCase):
+    def setUp(self):
+        get_user_model().objects.create_user(username="admin", email=ADMIN_EMAIL, password="pass123")
+
+    def test_admin_only(self):
+        resp = self.client.get("/admin-dashboard/upstreams/")
+        self.assertEqual(resp.status_code, 302)
+
+    async def test_admin_only_under_asgi(self):
+        resp = await self.async_client.get("/admin-dashboard/upstreams/")
+        self.assertEqual(resp.status_code, 302)
+
+    def test_breakers_and_limiter_are_shown(self):
+        self.client.login(username="admin", password="pass123")
+        resp = self.client.get("/admin-dashboard/upstreams/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, "google_places")
+        self.assertContains(resp, "Amadeus rate limiter")
+        self.assertContains(resp, "HTTP calls")
+        data = self.client.get("/admin-dashboard/api/upstreams/").json()
+        self.assertLessEqual({"amadeus", "google_places", "openai", "openweather"}, {b["name"] for b in data["breakers"]})
+        self.assertIn("hits", data["search_cache"])
+        self.assertIsInstance(data["http"], list)
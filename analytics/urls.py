@@ -14,9 +14,11 @@ urlpatterns = [
     path("countries/", views.dashboard_countries, name="countries"),
     path("ai-analysis/", views.dashboard_ai_analysis, name="ai_analysis"),
     path("reports/", views.dashboard_reports, name="reports"),
+    path("upstreams/", views.dashboard_upstreams, name="upstreams"),
     path("user-management/", views.dashboard_user_management, name="user_management"),
     path("api/live/", views.api_live, name="api_live"),
     path("api/traffic/", views.api_traffic, name="api_traffic"),
+    path("api/upstreams/", views.api_upstreams, name="api_upstreams"),
     path("api/click/", views.api_click, name="api_click"),
     path("api/footprint/", views.api_footprint, name="api_footprint"),
     path("api/past-analyses/", views.api_past_analyses, name="api_past_analyses"),
@@ -72,8 +72,8 @@ def get_geo_from_ip(ip: str) -> tuple:
     if not ip or ip in ("127.0.0.1", "::1", "localhost"):
         return "", ""
     try:
-        import requests
-        r = requests.get(f"http://ip-api.com/json/{ip}?fields=country,city", timeout=1)
+        from main.http_client import http_client
+        r = http_client.get(f"http://ip-api.com/json/{ip}?fields=country,city", timeout=1, retries=0)
         if r.status_code == 200:
             d = r.json()
             return (d.get("country") or "", (d.get("city") or ""))
@@ -11,7 +11,7 @@ from django.utils import timezone
 from django.db.models import Count
 from django.db.models.functions import TruncDate
 from django.contrib.auth.models import User
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 
 from .models import (
     VisitorProfile,
@@ -41,6 +41,7 @@ def _nav_pages():
         {"url": "analytics:countries", "label": "Countries"},
         {"url": "analytics:ai_analysis", "label": "AI Analysis"},
         {"url": "analytics:reports", "label": "Reports"},
+        {"url": "analytics:upstreams", "label": "Upstreams"},
         {"url": "analytics:user_management", "label": "User Management"},
     ]
 
@@ -148,6 +149,36 @@ def dashboard_reports(request):
     return render(request, "analytics/pages/reports.html", ctx)
 
 
+def _upstream_metrics():
+    """HTTP calls, circuit breakers, the Amadeus rate limiter and the flight caches of this worker process."""
+    from main.cheap_flight_finder import _TOKEN_MANAGER
+    from main.circuit_breaker import all_stats
+    from main.flight_cache import search_cache
+    from main.http_client import http_client
+    from main.location_cache import location_cache
+    from main.rate_limit import amadeus_limiter
+
+    return {
+        "http": http_client.stats(),
+        "breakers": all_stats(),
+        "amadeus_limiter": amadeus_limiter.stats(),
+        "amadeus_token": _TOKEN_MANAGER.stats(),
+        "search_cache": search_cache.stats(),
+        "location_cache": location_cache.stats(),
+    }
+
+
+def dashboard_upstreams(request):
+    ctx = _base_ctx("Upstreams")
+    metrics = _upstream_metrics()
+    for b in metrics["breakers"]:
+        b["last_failure"] = (
+            datetime.fromtimestamp(b["last_failure_at"], tz=dt_timezone.utc) if b["last_failure_at"] else None
+        )
+    ctx.update(metrics)
+    return render(request, "analytics/pages/upstreams.html", ctx)
+
+
 def dashboard_user_management(request):
     ctx = _base_ctx("User Management")
     ctx["users"] = User.objects.all().order_by("-date_joined")
@@ -163,6 +194,11 @@ def api_live(request):
     return JsonResponse({"ok": True, "visitors": data})
 
 
+@require_GET
+def api_upstreams(request):
+    return JsonResponse({"ok": True, **_upstream_metrics()})
+
+
 @require_GET
 def api_traffic(request):
     from django.db.models.functions import TruncDate
@@ -2,6 +2,9 @@
 ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with ``SERVER=asgi ./start.sh`` (gunicorn + uvicorn workers); that also sets
+CFF_ASYNC_VIEWS, so the flight search, locations and places APIs run as async views
+(main/cheap_flight_async.py).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -14,3 +17,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+# Location search indexes are built as the worker boots, not on its first request
+from main import airport_data  # noqa: E402
+
+airport_data.prepare_indexes()
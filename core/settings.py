@@ -143,11 +143,78 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # ==================== APP CONFIG ====================
 OPENWEATHER_API_KEY = config("OPENWEATHER_API_KEY", default="")
 CHAT_API_URL = config("CHAT_API_URL", default="http://127.0.0.1:8001/chat")
+# Upstream base URLs; point both at `manage.py run_upstream_standin` for offline load tests
+AMADEUS_BASE_URL = config("AMADEUS_BASE_URL", default="https://test.api.amadeus.com")
+GOOGLE_PLACES_BASE_URL = config("GOOGLE_PLACES_BASE_URL", default="https://places.googleapis.com")
 
+# Cheap Flight Finder: search result cache (seconds)
+CFF_SEARCH_CACHE_TTL = config("CFF_SEARCH_CACHE_TTL", default=600, cast=int)
+CFF_SEARCH_CACHE_STALE_TTL = config("CFF_SEARCH_CACHE_STALE_TTL", default=1800, cast=int)
+# CACHES alias holding flight search results
+CFF_SEARCH_CACHE_ALIAS = config("CFF_SEARCH_CACHE_ALIAS", default="default")
+# Max seconds an identical concurrent search waits for the in-flight one
+CFF_SINGLEFLIGHT_WAIT = config("CFF_SINGLEFLIGHT_WAIT", default=30, cast=int)
+# Whole-request budget for a flight search: location lookups + offers share it
+CFF_SEARCH_DEADLINE = config("CFF_SEARCH_DEADLINE", default=25, cast=int)
+# Worker pool size for calendar/matrix fan-out (concurrent Amadeus calls per process)
+CFF_FANOUT_WORKERS = config("CFF_FANOUT_WORKERS", default=14, cast=int)
+# Of those, cells one calendar/matrix request may run at once (the rest of the pool stays free for others).
+# 7 runs the default ±3-day calendar in one round; the Amadeus rate limiter still paces the calls
+CFF_FANOUT_PER_REQUEST = config("CFF_FANOUT_PER_REQUEST", default=7, cast=int)
+# Amadeus location search cache: in-process LRU entries, TTL for results / for "no matches"
+CFF_LOCATION_CACHE_SIZE = config("CFF_LOCATION_CACHE_SIZE", default=2048, cast=int)
+CFF_LOCATION_CACHE_TTL = config("CFF_LOCATION_CACHE_TTL", default=3600, cast=int)
+CFF_LOCATION_CACHE_NEGATIVE_TTL = config("CFF_LOCATION_CACHE_NEGATIVE_TTL", default=60, cast=int)
+# Price history: cheapest price per upstream search, written in batches (rows / max seconds buffered)
+CFF_PRICE_HISTORY = config("CFF_PRICE_HISTORY", default=True, cast=bool)
+CFF_PRICE_HISTORY_BATCH = config("CFF_PRICE_HISTORY_BATCH", default=50, cast=int)
+CFF_PRICE_HISTORY_FLUSH_S = config("CFF_PRICE_HISTORY_FLUSH_S", default=30, cast=int)
+# check_price_watches: watches per batch, upstream calls per run and their pace
+CFF_WATCH_BATCH = config("CFF_WATCH_BATCH", default=20, cast=int)
+CFF_WATCH_BUDGET = config("CFF_WATCH_BUDGET", default=30, cast=int)
+CFF_WATCH_CALLS_PER_MINUTE = config("CFF_WATCH_CALLS_PER_MINUTE", default=20, cast=float)
+# Search cache warmer (manage.py warm_flight_cache): routes from search history, dates ahead, refresh margin, pacing
+CFF_WARM_TOP_ROUTES = config("CFF_WARM_TOP_ROUTES", default=20, cast=int)
+CFF_WARM_LOOKBACK_DAYS = config("CFF_WARM_LOOKBACK_DAYS", default=7, cast=int)
+CFF_WARM_DAYS = config("CFF_WARM_DAYS", default=7, cast=int)
+CFF_WARM_AHEAD_S = config("CFF_WARM_AHEAD_S", default=300, cast=int)
+CFF_WARM_CONCURRENCY = config("CFF_WARM_CONCURRENCY", default=4, cast=int)
+CFF_WARM_BUDGET = config("CFF_WARM_BUDGET", default=100, cast=int)
+CFF_WARM_CALLS_PER_MINUTE = config("CFF_WARM_CALLS_PER_MINUTE", default=30, cast=float)
+# Price trend (main/price_trend.py): routes kept in memory, prices per band before a verdict
+CFF_TREND_MAX_ROUTES = config("CFF_TREND_MAX_ROUTES", default=2048, cast=int)
+CFF_TREND_MIN_SAMPLES = config("CFF_TREND_MIN_SAMPLES", default=8, cast=int)
+# Amadeus rate limiter (main/rate_limit.py): calls per second, burst, tokens kept for user traffic,
+# cache-backed (cross-process) counting, max seconds to queue without a deadline
+CFF_AMADEUS_RATE = config("CFF_AMADEUS_RATE", default=10, cast=float)
+CFF_AMADEUS_BURST = config("CFF_AMADEUS_BURST", default=10, cast=float)
+CFF_AMADEUS_RESERVE = config("CFF_AMADEUS_RESERVE", default=2, cast=float)
+CFF_AMADEUS_RATE_SHARED = config("CFF_AMADEUS_RATE_SHARED", default=False, cast=bool)
+CFF_AMADEUS_MAX_WAIT = config("CFF_AMADEUS_MAX_WAIT", default=10, cast=float)
+# Retries of idempotent Amadeus GETs (429 / 5xx / connection errors) and their base backoff
+CFF_AMADEUS_RETRIES = config("CFF_AMADEUS_RETRIES", default=2, cast=int)
+CFF_AMADEUS_BACKOFF_S = config("CFF_AMADEUS_BACKOFF_S", default=0.25, cast=float)
+# Circuit breakers per upstream (main/circuit_breaker.py): failures in a row to open, seconds to the next probe
+CFF_BREAKER_FAILURES = config("CFF_BREAKER_FAILURES", default=5, cast=int)
+CFF_BREAKER_RESET_S = config("CFF_BREAKER_RESET_S", default=30, cast=float)
+# Shared outbound HTTP client (main/http_client.py): keep-alive pools, default timeouts, GET retries on 502/503/504
+CFF_HTTP_POOL_HOSTS = config("CFF_HTTP_POOL_HOSTS", default=16, cast=int)
+CFF_HTTP_POOL_SIZE = config("CFF_HTTP_POOL_SIZE", default=20, cast=int)
+CFF_HTTP_CONNECT_TIMEOUT = config("CFF_HTTP_CONNECT_TIMEOUT", default=5, cast=float)
+CFF_HTTP_READ_TIMEOUT = config("CFF_HTTP_READ_TIMEOUT", default=25, cast=float)
+CFF_HTTP_RETRIES = config("CFF_HTTP_RETRIES", default=1, cast=int)
+CFF_HTTP_BACKOFF_S = config("CFF_HTTP_BACKOFF_S", default=0.2, cast=float)
+# Serve search, locations and places APIs from main/cheap_flight_async.py (set when running under ASGI)
+CFF_ASYNC_VIEWS = config("CFF_ASYNC_VIEWS", default=False, cast=bool)
+
+# Process-local by default. Set CACHE_BACKEND / CACHE_LOCATION to a shared backend (e.g.
+# django.core.cache.backends.db.DatabaseCache + a table name, then `manage.py createcachetable`,
+# or django.core.cache.backends.redis.RedisCache + redis://...) so several workers, and
+# commands such as warm_flight_cache, share one search cache.
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "home-feed-cache",
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default="home-feed-cache"),
     }
 }
 
@@ -208,4 +275,6 @@ LOGGING = {
         },
     },
     "root": {"handlers": ["console"], "level": "INFO"},
+    # httpx logs every request at INFO; main/http_client.py keeps per-upstream stats instead
+    "loggers": {"httpx": {"level": "WARNING"}},
 }
@@ -14,6 +14,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
@@ -35,6 +36,17 @@ from main.cheap_flight_finder import (
     place_photo_api,
     place_details_api,
 )
+# Under ASGI the search / locations / places APIs wait on upstreams without holding a thread
+if settings.CFF_ASYNC_VIEWS:
+    from main.cheap_flight_async import (
+        cheap_flight_search_api,
+        cheap_flight_locations_api,
+        place_photo_api,
+        place_details_api,
+    )
+from main.flight_calendar import cheap_flight_calendar_api, cheap_flight_matrix_api
+from main.flight_results import cheap_flight_offer_api, cheap_flight_results_api
+from main.flight_stream import cheap_flight_search_stream_api
 from main.todo import todo_page, todo_task_detail_api, todo_toggle_api
 
 from django.contrib.sitemaps.views import sitemap
@@ -72,6 +84,11 @@ urlpatterns = [
     path("stock-predictor/", stock_predictor_view, name="stock-predictor"),
     path("cheap-flight-finder/", cheap_flight_finder_view, name="cheap_flight_finder"),
     path("cheap-flight-finder/api/search/", cheap_flight_search_api, name="cheap_flight_search_api"),
+    path("cheap-flight-finder/api/search/stream/", cheap_flight_search_stream_api, name="cheap_flight_search_stream_api"),
+    path("cheap-flight-finder/api/search/results/", cheap_flight_results_api, name="cheap_flight_results_api"),
+    path("cheap-flight-finder/api/search/offer/", cheap_flight_offer_api, name="cheap_flight_offer_api"),
+    path("cheap-flight-finder/api/calendar/", cheap_flight_calendar_api, name="cheap_flight_calendar_api"),
+    path("cheap-flight-finder/api/matrix/", cheap_flight_matrix_api, name="cheap_flight_matrix_api"),
     path("cheap-flight-finder/api/locations/", cheap_flight_locations_api, name="cheap_flight_locations_api"),
     path("cheap-flight-finder/api/store-context/", store_flight_context_api, name="cff_store_context"),
     path("cheap-flight-finder/api/restore-context/", restore_flight_context_api, name="cff_restore_context"),
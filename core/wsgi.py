@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# Location search indexes are built as the worker boots, not on its first request
+from main import airport_data  # noqa: E402
+
+airport_data.prepare_indexes()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Task, TodoList, Tag, Subtask
+from .models import PriceWatch, RoutePriceSnapshot, Task, TodoList, Tag, Subtask
 
 
 @admin.register(TodoList)
@@ -24,3 +24,20 @@ class TaskAdmin(admin.ModelAdmin):
     search_fields = ("title", "description")
     inlines = [SubtaskInline]
     filter_horizontal = ("tags",)
+
+
+@admin.register(RoutePriceSnapshot)
+class RoutePriceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ("origin", "destination", "depart_date", "return_date", "min_price", "currency", "source", "recorded_at")
+    list_filter = ("source", "currency")
+    search_fields = ("origin", "destination")
+    date_hierarchy = "recorded_at"
+
+
+@admin.register(PriceWatch)
+class PriceWatchAdmin(admin.ModelAdmin):
+    list_display = ("user", "origin", "destination", "depart_date", "return_date", "target_price", "last_price",
+                    "last_checked_at", "active")
+    list_filter = ("active", "currency")
+    search_fields = ("origin", "destination", "user__email")
+    raw_id_fields = ("user",)
@@ -2,13 +2,22 @@
 Location resolver: city/airport/IATA mapping.
 Static data + local lookup. No external API calls.
 Used by location_resolver for the first fallback layer.
+Lookups run on the memory-mapped airport table (main/data/airports.bin) when present,
+otherwise on an in-memory index over POPULAR_LOCATIONS. Queries with no substring match
+fall back to a trigram index (typos, native spellings) before anyone calls the API.
 """
 from __future__ import annotations
 
 import re
+import threading
 import unicodedata
+from bisect import bisect_left
+from types import MappingProxyType
 from typing import TypedDict
 
+from main import airport_table
+from main.location_trigram import TrigramIndex
+
 # ---------------------------------------------------------------------------
 # Normalized location output format
 # ---------------------------------------------------------------------------
@@ -102,6 +111,39 @@ for loc in POPULAR_LOCATIONS:
 POPULAR_LOCATIONS = list(_pop_dedup.values())
 
 
+# Alternate / native spellings by IATA: an exact alias wins over substring matches
+# (with the full table "Wien" is also inside "Ralph Wien Memorial"), others go to fuzzy search
+LOCATION_ALIASES: dict[str, tuple[str, ...]] = {
+    "WAW": ("Warszawa",),
+    "KRK": ("Kraków", "Cracow"),
+    "GYD": ("Bakı", "Baki"),
+    "IST": ("İstanbul", "Constantinople"),
+    "SAW": ("İstanbul",),
+    "MUC": ("München", "Muenchen"),
+    "VIE": ("Wien",),
+    "ZRH": ("Zürich", "Zuerich"),
+    "CPH": ("København",),
+    "LIS": ("Lisboa",),
+    "FCO": ("Roma",),
+    "MXP": ("Milano",),
+    "PRG": ("Praha",),
+    "ATH": ("Athina", "Athína"),
+    "ARN": ("Stokholm",),
+    "BCN": ("Barna",),
+    "BOM": ("Bombay",),
+    "BLR": ("Bengaluru",),
+    "CCU": ("Calcutta",),
+    "MAA": ("Madras",),
+    "PEK": ("Peking",),
+    "JFK": ("NYC",),
+    "DXB": ("Dubayy",),
+}
+_ALIAS_IATA: dict[str, tuple[str, ...]] = {}
+for _iata, _aliases in LOCATION_ALIASES.items():
+    for _alias in _aliases:
+        _ALIAS_IATA[_alias.casefold()] = _ALIAS_IATA.get(_alias.casefold(), ()) + (_iata,)
+
+
 def normalize_input(query: str) -> str:
     """
     Trim, collapse whitespace, normalize unicode.
@@ -150,61 +192,199 @@ def _to_location_result(
     )
 
 
-def search_local(query: str, limit: int = 10) -> list[LocationResult]:
+class _LocationIndex:
     """
-    Search POPULAR_LOCATIONS by IATA, city, or airport name.
-    Case-insensitive partial match.
-    Returns list of LocationResult, sorted: exact IATA first, then city start, then airport.
+    Immutable lookup index over a location list, built once at import.
+    - IATA hash map for exact codes
+    - sorted suffix lists per field: a prefix search over suffixes finds every
+      location whose city / airport / country name contains the query (substring match)
+    Result order matches the old linear scan: exact IATA, city, airport, partial; list order within each.
     """
-    q = normalize_input(query)
-    if not q:
-        return []
 
-    q_lower = q.lower()
-    q_upper = q.upper()
-
-    exact_iata: list[LocationResult] = []
-    city_matches: list[LocationResult] = []
-    airport_matches: list[LocationResult] = []
-    partial: list[LocationResult] = []
-
-    for loc in POPULAR_LOCATIONS:
-        iata = (loc.get("iata") or "").upper()
-        city = (loc.get("city") or "").lower()
-        airport = (loc.get("airport") or "").lower()
-        country = (loc.get("country") or "").upper()
-        country_name = (loc.get("country_name") or "").lower()
-
-        res = _to_location_result(
-            iata,
-            loc.get("city", ""),
-            loc.get("airport", ""),
-            loc.get("country", ""),
-            loc.get("country_name", ""),
-            "local",
-        )
-
-        if q_upper == iata:
-            exact_iata.append(res)
-        elif city.startswith(q_lower) or q_lower in city:
-            city_matches.append(res)
-        elif airport.startswith(q_lower) or q_lower in airport:
-            airport_matches.append(res)
-        elif q_upper in iata or q_lower in city or q_lower in airport or q_lower in country_name:
-            partial.append(res)
-
-    # Deduplicate by iata_code, preserve order
-    seen = set()
-    out: list[LocationResult] = []
-    for lst in (exact_iata, city_matches, airport_matches, partial):
-        for r in lst:
+    __slots__ = ("_results", "_by_iata", "_city_sfx", "_airport_sfx", "_partial_sfx", "_iata_sfx")
+
+    def __init__(self, locations: list[dict]):
+        results: list[LocationResult] = []
+        by_iata: dict[str, int] = {}
+        city_sfx: list[tuple[str, int]] = []
+        airport_sfx: list[tuple[str, int]] = []
+        partial_sfx: list[tuple[str, int]] = []
+        iata_sfx: list[tuple[str, int]] = []
+
+        for pos, loc in enumerate(locations):
+            iata = (loc.get("iata") or "").upper()
+            city = (loc.get("city") or "").lower()
+            airport = (loc.get("airport") or "").lower()
+            country_name = (loc.get("country_name") or "").lower()
+            results.append(_to_location_result(
+                iata,
+                loc.get("city", ""),
+                loc.get("airport", ""),
+                loc.get("country", ""),
+                loc.get("country_name", ""),
+                "local",
+            ))
+            by_iata.setdefault(iata, pos)
+            city_sfx.extend((city[i:], pos) for i in range(len(city)))
+            airport_sfx.extend((airport[i:], pos) for i in range(len(airport)))
+            partial_sfx.extend((country_name[i:], pos) for i in range(len(country_name)))
+            iata_sfx.extend((iata[i:], pos) for i in range(len(iata)))
+
+        self._results = tuple(MappingProxyType(r) for r in results)
+        self._by_iata = MappingProxyType(by_iata)
+        self._city_sfx = tuple(sorted(city_sfx))
+        self._airport_sfx = tuple(sorted(airport_sfx))
+        self._partial_sfx = tuple(sorted(partial_sfx))
+        self._iata_sfx = tuple(sorted(iata_sfx))
+
+    @staticmethod
+    def _containing(sfx: tuple[tuple[str, int], ...], q: str) -> list[int]:
+        """Positions whose field contains q: all suffixes starting with q are contiguous."""
+        out = []
+        i = bisect_left(sfx, (q,))
+        n = len(sfx)
+        while i < n and sfx[i][0].startswith(q):
+            out.append(sfx[i][1])
+            i += 1
+        return out
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def position(self, iata: str) -> int | None:
+        return self._by_iata.get(iata)
+
+    def rank(self, pos: int) -> int:
+        """Popularity: list order."""
+        return pos
+
+    def record(self, pos: int):
+        """Read-only view of the stored result (no copy)."""
+        return self._results[pos]
+
+    def search(self, q: str, limit: int) -> list[LocationResult]:
+        q_lower = q.lower()
+        q_upper = q.upper()
+
+        # position -> bucket (0 exact IATA, 1 city, 2 airport, 3 partial); first bucket wins
+        bucket: dict[int, int] = {}
+        exact = self._by_iata.get(q_upper)
+        if exact is not None:
+            bucket[exact] = 0
+        for pos in self._containing(self._city_sfx, q_lower):
+            bucket.setdefault(pos, 1)
+        for pos in self._containing(self._airport_sfx, q_lower):
+            bucket.setdefault(pos, 2)
+        for pos in self._containing(self._iata_sfx, q_upper):
+            bucket.setdefault(pos, 3)
+        for pos in self._containing(self._partial_sfx, q_lower):
+            bucket.setdefault(pos, 3)
+
+        seen = set()
+        out: list[LocationResult] = []
+        for pos in sorted(bucket, key=lambda p: (bucket[p], p)):
+            r = self._results[pos]
             code = r.get("iata_code") or ""
             if code and code not in seen:
                 seen.add(code)
-                out.append(r)
+                out.append(LocationResult(**r))
                 if len(out) >= limit:
-                    return out
-    return out[:limit]
+                    break
+        return out
+
+
+# Bundled table is shared between workers via mmap; the in-memory index is the fallback
+_INDEX = airport_table.load_default() or _LocationIndex(POPULAR_LOCATIONS)
+
+
+# Fuzzy matching only for queries this long (shorter ones are IATA codes or prefixes)
+FUZZY_MIN_LEN = 4
+FUZZY_THRESHOLD = 0.5
+
+# (index it was built from, trigram index); positions are only valid for that index
+_fuzzy_index: tuple[object, TrigramIndex] | None = None
+_fuzzy_lock = threading.Lock()
+
+
+def _build_fuzzy_index(index) -> TrigramIndex:
+    def entries():
+        for pos in range(len(index)):
+            rec = index.record(pos)
+            rank = index.rank(pos)
+            yield pos, rec.get("city_name") or "", rank
+            yield pos, rec.get("airport_name") or "", rank
+            for alias in LOCATION_ALIASES.get(rec.get("iata_code") or "", ()):
+                yield pos, alias, rank
+
+    return TrigramIndex(entries())
+
+
+def _get_fuzzy_index() -> TrigramIndex:
+    """Built by prepare_indexes() at worker start (on first use otherwise)."""
+    global _fuzzy_index
+    index = _INDEX
+    cached = _fuzzy_index
+    if cached is None or cached[0] is not index:
+        with _fuzzy_lock:
+            cached = _fuzzy_index
+            if cached is None or cached[0] is not index:
+                cached = _fuzzy_index = (index, _build_fuzzy_index(index))
+    return cached[1]
+
+
+def prepare_indexes() -> None:
+    """Build the search indexes now (about a second on the bundled table) so no request pays for it."""
+    if isinstance(_INDEX, airport_table.AirportTable):
+        _INDEX.build_index()
+    _get_fuzzy_index()
+
+
+def search_fuzzy(query: str, limit: int = 10) -> list[LocationResult]:
+    """
+    Typo-tolerant search over city / airport names and LOCATION_ALIASES.
+    Ranked by trigram similarity, then popularity. Empty for short or unmatched queries.
+    """
+    q = normalize_input(query)
+    if len(q) < FUZZY_MIN_LEN:
+        return []
+    seen = set()
+    out: list[LocationResult] = []
+    for pos, _score in _get_fuzzy_index().search(q, limit, FUZZY_THRESHOLD):
+        r = _INDEX.record(pos)
+        code = r.get("iata_code") or ""
+        if code and code not in seen:
+            seen.add(code)
+            out.append(LocationResult(**r))
+    return out
+
+
+def alias_iatas(query: str) -> tuple[str, ...]:
+    """IATA codes the query is an exact LOCATION_ALIASES spelling of ("Wien" -> ("VIE",))."""
+    return _ALIAS_IATA.get(normalize_input(query).casefold(), ())
+
+
+def search_local(query: str, limit: int = 10, fuzzy: bool = True) -> list[LocationResult]:
+    """
+    Search the airport table by IATA, city, or airport name.
+    Case-insensitive partial match.
+    Returns list of LocationResult, sorted: exact IATA first, then an exact LOCATION_ALIASES
+    spelling, then city start, then airport.
+    If nothing matches and fuzzy is set, falls back to search_fuzzy.
+    """
+    q = normalize_input(query)
+    if not q:
+        return []
+    results = _INDEX.search(q, limit)
+    aliased = alias_iatas(q)
+    if aliased and not (results and results[0].get("iata_code") == q.upper()):
+        positions = [p for p in map(_INDEX.position, aliased) if p is not None]
+        results = [LocationResult(**_INDEX.record(p)) for p in positions] + [
+            r for r in results if r.get("iata_code") not in aliased
+        ]
+        results = results[:limit]
+    if not results and fuzzy:
+        results = search_fuzzy(q, limit)
+    return results
 
 
 def iata_to_city(iata: str) -> str:
@@ -214,10 +394,10 @@ def iata_to_city(iata: str) -> str:
     q = iata.strip().upper()
     if len(q) != 3:
         return ""
-    for loc in POPULAR_LOCATIONS:
-        if (loc.get("iata") or "").upper() == q:
-            return loc.get("city", "") or ""
-    return ""
+    pos = _INDEX.position(q)
+    if pos is None:
+        return ""
+    return _INDEX.record(pos).get("city_name", "") or ""
 
 
 def iata_to_country(iata: str) -> str:
@@ -227,28 +407,27 @@ def iata_to_country(iata: str) -> str:
     q = iata.strip().upper()
     if len(q) != 3:
         return ""
-    for loc in POPULAR_LOCATIONS:
-        if (loc.get("iata") or "").upper() == q:
-            return (loc.get("country") or "").upper() or ""
-    return ""
+    pos = _INDEX.position(q)
+    if pos is None:
+        return ""
+    return (_INDEX.record(pos).get("country_code") or "").upper() or ""
 
 
 def resolve_to_iata_local(query: str) -> str | None:
     """
     Resolve query to a single IATA code using only local data.
-    Returns IATA or None.
+    Returns IATA or None. Exact matches only: a typo must not turn into some other airport
+    (search_fuzzy offers the "did you mean" candidates instead).
     """
     q = normalize_input(query)
     if not q:
         return None
 
     # Exact 3-letter IATA in our list
-    if looks_like_iata(q):
-        for loc in POPULAR_LOCATIONS:
-            if (loc.get("iata") or "").upper() == q.upper():
-                return q.upper()
+    if looks_like_iata(q) and _INDEX.position(q.upper()) is not None:
+        return q.upper()
 
-    results = search_local(q, limit=1)
+    results = search_local(q, limit=1, fuzzy=False)
     if results:
         return (results[0].get("iata_code") or "").upper() or None
     return None
@@ -0,0 +1,348 @@
+"""
+Compact, memory-mapped airport table.
+A single read-only file (main/data/airports.bin) holds fixed-width records sorted by IATA,
+a UTF-8 string blob and lowercased search haystacks. Workers mmap it, so the OS page cache
+is shared between gunicorn processes and nothing is parsed at import. Name search runs on a
+small in-memory gram index built from the haystacks once per process (see _NameIndex).
+
+File layout (little-endian, sections 8-byte aligned):
+    header    magic, count, record_size, records/strings offsets, 4 x haystack (starts, blob, size)
+    records   count x _RECORD, sorted by IATA
+    strings   UTF-8 city / airport / country names
+    haystacks city, airport, iata, country_name: u32 start offset per record + "\\x00"-joined text
+Built by `python manage.py build_airport_table`.
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from typing import Any, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CFFAPT01"
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "airports.bin")
+
+# iata, country, kind, lat, lon, rank, city_off, airport_off, cname_off, city_len, airport_len, cname_len
+_RECORD = struct.Struct("<3s2sBffIIIIHHH")
+_HAYSTACKS = ("city", "airport", "iata", "country_name")
+_HEADER = struct.Struct("<8sIIIII" + "III" * len(_HAYSTACKS))
+
+KIND_AIRPORT = 0
+KIND_CITY = 1
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def write_table(locations: Iterable[dict[str, Any]], path: str) -> int:
+    """
+    Write locations to path atomically. Each location: iata, city, airport, country,
+    country_name, optional lat/lon (NaN if unknown), rank (lower = more popular), kind.
+    Duplicate IATA codes keep the best-ranked entry. Returns the record count.
+    """
+    by_iata: dict[str, dict[str, Any]] = {}
+    for loc in locations:
+        iata = (loc.get("iata") or "").strip().upper()
+        if len(iata) != 3 or not iata.isascii() or not iata.isalpha():
+            continue
+        prev = by_iata.get(iata)
+        if prev is None or int(loc.get("rank", 0)) < int(prev.get("rank", 0)):
+            by_iata[iata] = loc
+    rows = [by_iata[k] for k in sorted(by_iata)]
+
+    strings = bytearray()
+    interned: dict[str, tuple[int, int]] = {}
+
+    def _str(s: str) -> tuple[int, int]:
+        s = (s or "").strip()
+        if s not in interned:
+            b = s.encode("utf-8")[:0xFFFF]
+            interned[s] = (len(strings), len(b))
+            strings.extend(b)
+        return interned[s]
+
+    records = bytearray()
+    haystacks: dict[str, tuple[array, bytearray]] = {h: (array("I"), bytearray()) for h in _HAYSTACKS}
+    for loc in rows:
+        iata = loc["iata"].strip().upper()
+        city = loc.get("city") or ""
+        airport = loc.get("airport") or ""
+        country_name = loc.get("country_name") or ""
+        city_off, city_len = _str(city)
+        airport_off, airport_len = _str(airport)
+        cname_off, cname_len = _str(country_name)
+        lat = loc.get("lat")
+        lon = loc.get("lon")
+        records += _RECORD.pack(
+            iata.encode("ascii"),
+            (loc.get("country") or "").strip().upper().encode("ascii", "replace")[:2].ljust(2),
+            int(loc.get("kind") or KIND_AIRPORT),
+            float(lat) if lat not in (None, "") else math.nan,
+            float(lon) if lon not in (None, "") else math.nan,
+            int(loc.get("rank") or 0),
+            city_off, airport_off, cname_off,
+            city_len, airport_len, cname_len,
+        )
+        for name, text in (
+            ("city", city.strip().lower()),
+            ("airport", airport.strip().lower()),
+            ("iata", iata),
+            ("country_name", country_name.strip().lower()),
+        ):
+            starts, blob = haystacks[name]
+            starts.append(len(blob))
+            blob += text.encode("utf-8") + b"\x00"
+
+    if sys.byteorder != "little":
+        for starts, _ in haystacks.values():
+            starts.byteswap()
+
+    out = bytearray(_HEADER.size)
+    out += b"\x00" * (_align(len(out)) - len(out))
+    records_off = len(out)
+    out += records
+    out += b"\x00" * (_align(len(out)) - len(out))
+    strings_off = len(out)
+    out += strings
+    hay_fields: list[int] = []
+    for name in _HAYSTACKS:
+        starts, blob = haystacks[name]
+        out += b"\x00" * (_align(len(out)) - len(out))
+        starts_off = len(out)
+        out += starts.tobytes()
+        out += b"\x00" * (_align(len(out)) - len(out))
+        blob_off = len(out)
+        out += blob
+        hay_fields += [starts_off, blob_off, len(blob)]
+    out[: _HEADER.size] = _HEADER.pack(
+        MAGIC, len(rows), _RECORD.size, records_off, strings_off, len(strings), *hay_fields
+    )
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(out)
+    os.replace(tmp, path)
+    return len(rows)
+
+
+class _Haystack:
+    __slots__ = ("starts", "blob_off", "blob_end")
+
+    def __init__(self, starts, blob_off: int, blob_size: int):
+        self.starts = starts
+        self.blob_off = blob_off
+        self.blob_end = blob_off + blob_size
+
+
+class _NameIndex:
+    """
+    In-memory substring index over a table's name fields, built once per process.
+    Records are numbered by (rank, position) ("ordinals"); for every 1-3 character gram of a
+    field, a sorted array of the ordinals containing it. Queries up to 3 characters are a
+    single posting list; longer ones walk the rarest trigram's list and check the field,
+    so matches come out most popular first and search() stops at the limit.
+    records caches the decoded result of every record search() has returned.
+    """
+
+    __slots__ = ("order", "records", "_texts", "_postings")
+
+    def __init__(self, table: "AirportTable"):
+        order = sorted(range(table.count), key=lambda p: (table.rank(p), p))
+        self.order = array("I", order)
+        self.records: dict[int, dict[str, Any]] = {}
+        self._texts: dict[str, list[str]] = {}
+        self._postings: dict[str, dict[str, array]] = {}
+        for name in _HAYSTACKS:
+            texts = table.texts(name)
+            postings: dict[str, array] = {}
+            for ordinal, pos in enumerate(order):
+                text = texts[pos]
+                grams = {text[i:i + n] for n in (1, 2, 3) for i in range(len(text) - n + 1)}
+                for gram in grams:
+                    ids = postings.get(gram)
+                    if ids is None:
+                        ids = postings[gram] = array("I")
+                    ids.append(ordinal)
+            self._texts[name] = texts
+            self._postings[name] = postings
+
+    def containing(self, name: str, q: str) -> Iterator[int]:
+        """Ordinals whose field contains q, ascending."""
+        postings = self._postings[name]
+        if len(q) <= 3:
+            yield from postings.get(q, ())
+            return
+        grams = [postings.get(q[i:i + 3], ()) for i in range(len(q) - 2)]
+        texts = self._texts[name]
+        order = self.order
+        for ordinal in min(grams, key=len):
+            if q in texts[order[ordinal]]:
+                yield ordinal
+
+
+class AirportTable:
+    """
+    Read-only view over a memory-mapped airport table.
+    Implements the same lookup interface as airport_data's in-memory index:
+    position(iata), record(pos), search(q, limit). Records stay in the shared mapping;
+    search() goes through a per-process _NameIndex built on first use (or by build_index()).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        head = _HEADER.unpack_from(self._mm, 0)
+        if head[0] != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path}: not an airport table")
+        self.count, record_size, self._records_off, self._strings_off, _ = head[1:6]
+        if record_size != _RECORD.size:
+            self._mm.close()
+            raise ValueError(f"{path}: unsupported record size {record_size}")
+        self._view = view = memoryview(self._mm)
+        self._hay: dict[str, _Haystack] = {}
+        fields = head[6:]
+        for i, name in enumerate(_HAYSTACKS):
+            starts_off, blob_off, blob_size = fields[i * 3: i * 3 + 3]
+            raw = view[starts_off: starts_off + 4 * self.count]
+            if sys.byteorder == "little":
+                starts = raw.cast("I")
+            else:
+                starts = array("I", raw.tobytes())
+                starts.byteswap()
+            self._hay[name] = _Haystack(starts, blob_off, blob_size)
+        self._index: _NameIndex | None = None
+        self._index_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.count
+
+    # -- records ------------------------------------------------------------
+
+    def _unpack(self, pos: int) -> tuple:
+        return _RECORD.unpack_from(self._mm, self._records_off + pos * _RECORD.size)
+
+    def _text(self, off: int, length: int) -> str:
+        start = self._strings_off + off
+        return self._mm[start: start + length].decode("utf-8")
+
+    def _iata_at(self, pos: int) -> bytes:
+        start = self._records_off + pos * _RECORD.size
+        return self._mm[start: start + 3]
+
+    def position(self, iata: str) -> int | None:
+        """Binary search by IATA code (records are sorted)."""
+        try:
+            key = iata.upper().encode("ascii")
+        except UnicodeEncodeError:
+            return None
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._iata_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._iata_at(lo) == key:
+            return lo
+        return None
+
+    def rank(self, pos: int) -> int:
+        return self._unpack(pos)[5]
+
+    def record(self, pos: int) -> dict[str, Any]:
+        from main.airport_data import _to_location_result
+
+        (iata, country, _kind, _lat, _lon, _rank,
+         city_off, airport_off, cname_off, city_len, airport_len, cname_len) = self._unpack(pos)
+        return _to_location_result(
+            iata.decode("ascii"),
+            self._text(city_off, city_len),
+            self._text(airport_off, airport_len),
+            country.decode("ascii").strip(),
+            self._text(cname_off, cname_len),
+            "local",
+        )
+
+    def coordinates(self, pos: int) -> tuple[float, float] | None:
+        lat, lon = self._unpack(pos)[3:5]
+        if math.isnan(lat) or math.isnan(lon):
+            return None
+        return lat, lon
+
+    # -- search -------------------------------------------------------------
+
+    def texts(self, name: str) -> list[str]:
+        """One haystack ("city", "airport", "iata", "country_name") decoded: the field of every record."""
+        hay = self._hay[name]
+        return self._mm[hay.blob_off: hay.blob_end].decode("utf-8").split("\x00")[: self.count]
+
+    def build_index(self) -> None:
+        """Build the in-memory name index now (a few hundred ms on the bundled table) instead of on first search."""
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = _NameIndex(self)
+
+    def search(self, q: str, limit: int) -> list[dict[str, Any]]:
+        """Exact IATA, then city, airport, partial (IATA / country) matches; by rank within each."""
+        self.build_index()
+        index = self._index
+        out: list[Any] = []
+        seen: set[int] = set()
+        exact = self.position(q) if len(q) == 3 else None
+        if exact is not None:
+            out.append(exact)
+            seen.add(exact)
+        q_lower = q.lower()
+        for matches in (
+            index.containing("city", q_lower),
+            index.containing("airport", q_lower),
+            heapq.merge(index.containing("iata", q.upper()), index.containing("country_name", q_lower)),
+        ):
+            if len(out) >= limit:
+                break
+            for ordinal in matches:
+                pos = index.order[ordinal]
+                if pos not in seen:
+                    seen.add(pos)
+                    out.append(pos)
+                    if len(out) >= limit:
+                        break
+        records = index.records
+        for i, pos in enumerate(out):
+            rec = records.get(pos)
+            if rec is None:
+                rec = records[pos] = self.record(pos)
+            out[i] = dict(rec)
+        return out
+
+    def close(self) -> None:
+        for hay in self._hay.values():
+            if isinstance(hay.starts, memoryview):
+                hay.starts.release()
+        self._view.release()
+        self._mm.close()
+
+
+def load_default(path: str | None = None) -> AirportTable | None:
+    """Open the bundled (or CFF_AIRPORT_TABLE) table. Returns None if missing or invalid."""
+    path = path or os.getenv("CFF_AIRPORT_TABLE") or DEFAULT_PATH
+    if not os.path.exists(path):
+        return None
+    try:
+        return AirportTable(path)
+    except (OSError, ValueError, struct.error) as e:
+        logger.warning("Airport table %s unusable, falling back to POPULAR_LOCATIONS: %s", path, e)
+        return None
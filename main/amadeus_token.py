@@ -0,0 +1,97 @@
+"""
+Amadeus OAuth token manager.
+One cached client_credentials token per process, refreshed shortly before
+expires_in. Concurrent misses (gunicorn threads) trigger a single refresh.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# Refresh this many seconds before Amadeus says the token expires
+TOKEN_EXPIRY_MARGIN = 60
+# Used when the token response has no (or an invalid) expires_in
+DEFAULT_EXPIRES_IN = 1799
+
+
+class AmadeusTokenManager:
+    """
+    Thread-safe token cache.
+    fetch() must return (access_token, expires_in_seconds) or raise.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], tuple[str, int | None]],
+        margin: int = TOKEN_EXPIRY_MARGIN,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._fetch = fetch
+        self._margin = margin
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._token: str | None = None
+        self._expires_at = 0.0
+        self.hits = 0
+        self.refreshes = 0
+        self.failures = 0
+
+    def _valid(self) -> bool:
+        return bool(self._token) and self._clock() < self._expires_at
+
+    def get_token(self) -> str:
+        """Return a cached token, refreshing it once if missing or near expiry."""
+        if self._valid():
+            self.hits += 1
+            return self._token  # type: ignore[return-value]
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._valid():
+                self.hits += 1
+                return self._token  # type: ignore[return-value]
+            try:
+                token, expires_in = self._fetch()
+            except Exception:
+                self.failures += 1
+                raise
+            try:
+                ttl = int(expires_in) if expires_in is not None else DEFAULT_EXPIRES_IN
+            except (ValueError, TypeError):
+                ttl = DEFAULT_EXPIRES_IN
+            self._token = token
+            self._expires_at = self._clock() + max(0, ttl - self._margin)
+            self.refreshes += 1
+            logger.info("Amadeus token refreshed (expires_in=%s)", ttl)
+            return token
+
+    def peek(self) -> str | None:
+        """The cached token if still valid, else None (never fetches; safe on an event loop)."""
+        if self._valid():
+            self.hits += 1
+            return self._token
+        return None
+
+    def invalidate(self, token: str | None = None) -> None:
+        """
+        Drop the cached token (e.g. after a 401).
+        If token is given, only drop it if it is still the cached one.
+        """
+        with self._lock:
+            if token is None or token == self._token:
+                self._token = None
+                self._expires_at = 0.0
+
+    def stats(self) -> dict:
+        remaining = max(0.0, self._expires_at - self._clock()) if self._token else 0.0
+        return {
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "cached": self._valid(),
+            "expires_in_s": round(remaining, 0),
+        }
@@ -0,0 +1,29 @@
+"""
+Offline micro-benchmarks for the Cheap Flight Finder hot paths.
+`python -m main.benchmarks` runs the search pipeline suite (`--all` for every module);
+run a module directly for one area, e.g. `python -m main.benchmarks.airport_lookup`.
+No network, no database.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Iterable
+
+
+def time_calls(fn: Callable[..., Any], args: Iterable[tuple], repeat: int = 5) -> float:
+    """Best-of-repeat mean microseconds per call over the given argument tuples."""
+    args = list(args)
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for a in args:
+            fn(*a)
+        best = min(best, time.perf_counter() - t0)
+    return best / max(1, len(args)) * 1e6
+
+
+def print_table(rows: list[dict[str, Any]], columns: list[str]) -> None:
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for r in rows:
+        print("  ".join(str(r.get(c, "")).ljust(widths[c]) for c in columns))
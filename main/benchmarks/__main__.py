@@ -0,0 +1,20 @@
+"""
+python -m main.benchmarks [pipeline options]  -> search pipeline suite
+python -m main.benchmarks --all               -> every benchmark module
+"""
+import sys
+
+from main.benchmarks import airport_lookup, normalizer, offer_model, pipeline
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    if "--all" in argv:
+        argv.remove("--all")
+        status = 0
+        for module in (airport_lookup, normalizer, offer_model):
+            print(f"== {module.__name__}")
+            status |= module.run()
+            print()
+        print(f"== {pipeline.__name__}")
+        sys.exit(status | pipeline.main(argv))
+    sys.exit(pipeline.main(argv))
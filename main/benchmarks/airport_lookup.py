@@ -0,0 +1,299 @@
+"""
+Airport lookup benchmark: airport_data functions on the in-memory index and on the
+memory-mapped table vs the original linear scans. Also checks all of them return
+identical results over the query corpus (the table is built from POPULAR_LOCATIONS
+into a temp dir for that, so the bundled table may be larger).
+
+    python -m main.benchmarks.airport_lookup
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from main import airport_data, airport_table
+from main.benchmarks import print_table, time_calls
+
+# ---------------------------------------------------------------------------
+# Reference (pre-index) implementations, kept verbatim for comparison
+# ---------------------------------------------------------------------------
+
+
+def legacy_search_local(query: str, limit: int = 10) -> list[airport_data.LocationResult]:
+    q = airport_data.normalize_input(query)
+    if not q:
+        return []
+
+    q_lower = q.lower()
+    q_upper = q.upper()
+
+    exact_iata = []
+    city_matches = []
+    airport_matches = []
+    partial = []
+
+    for loc in airport_data.POPULAR_LOCATIONS:
+        iata = (loc.get("iata") or "").upper()
+        city = (loc.get("city") or "").lower()
+        airport = (loc.get("airport") or "").lower()
+        country_name = (loc.get("country_name") or "").lower()
+
+        res = airport_data._to_location_result(
+            iata,
+            loc.get("city", ""),
+            loc.get("airport", ""),
+            loc.get("country", ""),
+            loc.get("country_name", ""),
+            "local",
+        )
+
+        if q_upper == iata:
+            exact_iata.append(res)
+        elif city.startswith(q_lower) or q_lower in city:
+            city_matches.append(res)
+        elif airport.startswith(q_lower) or q_lower in airport:
+            airport_matches.append(res)
+        elif q_upper in iata or q_lower in city or q_lower in airport or q_lower in country_name:
+            partial.append(res)
+
+    seen = set()
+    out = []
+    for lst in (exact_iata, city_matches, airport_matches, partial):
+        for r in lst:
+            code = r.get("iata_code") or ""
+            if code and code not in seen:
+                seen.add(code)
+                out.append(r)
+                if len(out) >= limit:
+                    return out
+    return out[:limit]
+
+
+def legacy_iata_to_city(iata: str) -> str:
+    if not iata or not isinstance(iata, str):
+        return ""
+    q = iata.strip().upper()
+    if len(q) != 3:
+        return ""
+    for loc in airport_data.POPULAR_LOCATIONS:
+        if (loc.get("iata") or "").upper() == q:
+            return loc.get("city", "") or ""
+    return ""
+
+
+def legacy_iata_to_country(iata: str) -> str:
+    if not iata or not isinstance(iata, str):
+        return ""
+    q = iata.strip().upper()
+    if len(q) != 3:
+        return ""
+    for loc in airport_data.POPULAR_LOCATIONS:
+        if (loc.get("iata") or "").upper() == q:
+            return (loc.get("country") or "").upper() or ""
+    return ""
+
+
+def legacy_resolve_to_iata_local(query: str) -> str | None:
+    q = airport_data.normalize_input(query)
+    if not q:
+        return None
+    if airport_data.looks_like_iata(q):
+        for loc in airport_data.POPULAR_LOCATIONS:
+            if (loc.get("iata") or "").upper() == q.upper():
+                return q.upper()
+    results = legacy_search_local(q, limit=1)
+    if results:
+        return (results[0].get("iata_code") or "").upper() or None
+    return None
+
+
+def scan_table_search(table: airport_table.AirportTable, q: str, fields: dict[str, list[str]] | None = None) -> list[int]:
+    """Positions AirportTable.search orders q's matches by, from a scan over every record (before the name index)."""
+    fields = fields or {name: table.texts(name) for name in ("city", "airport", "iata", "country_name")}
+    q_lower, q_upper = q.lower(), q.upper()
+    bucket: dict[int, int] = {}
+    exact = table.position(q) if len(q) == 3 else None
+    if exact is not None:
+        bucket[exact] = 0
+    for pos in range(len(table)):
+        if q_lower in fields["city"][pos]:
+            bucket.setdefault(pos, 1)
+        elif q_lower in fields["airport"][pos]:
+            bucket.setdefault(pos, 2)
+        elif q_upper in fields["iata"][pos] or q_lower in fields["country_name"][pos]:
+            bucket.setdefault(pos, 3)
+    return sorted(bucket, key=lambda p: (bucket[p], table.rank(p), p))
+
+
+def check_table_search(table: airport_table.AirportTable) -> list[str]:
+    """Mismatches between table.search and scan_table_search over the corpus."""
+    fields = {name: table.texts(name) for name in ("city", "airport", "iata", "country_name")}
+    queries = query_corpus() + [q for q, _ in FUZZY_QUERIES] + ["international", "air", "ÿ", "são", "a\x00b"]
+    mismatches = []
+    for q in set(filter(None, map(airport_data.normalize_input, queries))):
+        expected = scan_table_search(table, q, fields)
+        for limit in (1, 10, 50):
+            if table.search(q, limit) != [table.record(p) for p in expected[:limit]]:
+                mismatches.append(f"table.search({q!r}, limit={limit})")
+    return mismatches
+
+
+# ---------------------------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------------------------
+
+
+def query_corpus() -> list[str]:
+    """IATA codes, name prefixes/substrings, country names, case variants and misses."""
+    queries: list[str] = []
+    for loc in airport_data.POPULAR_LOCATIONS:
+        iata, city, airport = loc["iata"], loc["city"], loc["airport"]
+        queries += [iata, iata.lower(), iata[:2], city, city.upper(), city[:2], city[:4], city[1:4], airport[:3]]
+        queries.append(loc["country_name"][:5])
+    queries += ["", " ", "zz", "xyz", "Nowhere", "  new   york ", "o'h", "-", "ZZZ", "kin"]
+    return queries
+
+
+# Misspellings and native names: (query, expected first autocomplete IATA), answered by search_fuzzy
+FUZZY_QUERIES = [
+    ("Barcelna", "BCN"), ("Warszawa", "WAW"), ("Warsz", "WAW"), ("München", "MUC"),
+    ("Munchen", "MUC"), ("Kraków", "KRK"), ("Wien", "VIE"), ("Praha", "PRG"),
+    ("København", "CPH"), ("Lisboa", "LIS"), ("Roma", "FCO"), ("Milano", "MXP"),
+    ("İstanbul", "IST"), ("Istambul", "IST"), ("Bakı", "GYD"), ("Zürich", "ZRH"),
+    ("Londn", "LHR"), ("Frankfrut", "FRA"), ("Amsterdm", "AMS"), ("Singapor", "SIN"),
+]
+
+
+def check_fuzzy() -> list[str]:
+    """Mismatch descriptions for FUZZY_QUERIES (empty when all autocomplete as expected)."""
+    mismatches = []
+    for q, expected in FUZZY_QUERIES:
+        results = airport_data.search_local(q, limit=1)
+        got = results[0].get("iata_code") if results else None
+        if got != expected:
+            mismatches.append(f"search_local({q!r})[0] = {got!r}, expected {expected!r}")
+    return mismatches
+
+
+@contextmanager
+def using_index(index):
+    """Temporarily point airport_data at another index/table."""
+    prev = airport_data._INDEX
+    airport_data._INDEX = index
+    try:
+        yield
+    finally:
+        airport_data._INDEX = prev
+
+
+@contextmanager
+def seed_table():
+    """AirportTable built from POPULAR_LOCATIONS in a temp dir (same ranking as the list)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "airports.bin")
+        airport_table.write_table(
+            ({**loc, "rank": i} for i, loc in enumerate(airport_data.POPULAR_LOCATIONS)), path
+        )
+        table = airport_table.AirportTable(path)
+        try:
+            yield table
+        finally:
+            table.close()
+
+
+def check_equivalence(index=None) -> list[str]:
+    """Return a list of mismatch descriptions (empty when indexed == legacy)."""
+    if index is not None:
+        with using_index(index):
+            return check_equivalence()
+    mismatches = []
+    for q in query_corpus():
+        for limit in (1, 5, 10):
+            if airport_data.search_local(q, limit=limit) != legacy_search_local(q, limit=limit):
+                mismatches.append(f"search_local({q!r}, limit={limit})")
+        if airport_data.resolve_to_iata_local(q) != legacy_resolve_to_iata_local(q):
+            mismatches.append(f"resolve_to_iata_local({q!r})")
+        if airport_data.iata_to_city(q) != legacy_iata_to_city(q):
+            mismatches.append(f"iata_to_city({q!r})")
+        if airport_data.iata_to_country(q) != legacy_iata_to_country(q):
+            mismatches.append(f"iata_to_country({q!r})")
+    return mismatches
+
+
+def _load_cost(factory) -> tuple[float, float]:
+    """(milliseconds, KiB allocated) to build an index."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    obj = factory()
+    ms = (time.perf_counter() - t0) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if hasattr(obj, "close"):
+        obj.close()
+    return ms, peak / 1024
+
+
+def run() -> int:
+    corpus = [(q,) for q in query_corpus()]
+    iatas = [(loc["iata"],) for loc in airport_data.POPULAR_LOCATIONS] + [("ZZZ",)]
+    funcs = [
+        ("search_local", "search_local", legacy_search_local, corpus),
+        ("resolve_to_iata_local", "resolve_to_iata_local", legacy_resolve_to_iata_local, corpus),
+        ("iata_to_city", "iata_to_city", legacy_iata_to_city, iatas),
+        ("iata_to_country", "iata_to_country", legacy_iata_to_country, iatas),
+    ]
+
+    memory_index = airport_data._LocationIndex(airport_data.POPULAR_LOCATIONS)
+    mismatches: list[str] = []
+    rows = []
+    with seed_table() as table:
+        backends = [("memory", memory_index), ("mmap", table)]
+        fuzzy = [(q,) for q, _ in FUZZY_QUERIES]
+        funcs.append(("search_fuzzy", "search_fuzzy", None, fuzzy))  # no legacy equivalent
+        for label, index in backends:
+            mismatches += [f"[{label}] {m}" for m in check_equivalence(index)]
+            with using_index(index):
+                mismatches += [f"[{label}] {m}" for m in check_fuzzy()]
+        for name, attr, old, args in funcs:
+            row = {"function": name, "legacy_us": f"{time_calls(old, args):.2f}" if old else "-"}
+            for label, index in backends:
+                with using_index(index):
+                    row[f"{label}_us"] = f"{time_calls(getattr(airport_data, attr), args):.2f}"
+            rows.append(row)
+        mem_ms, mem_kib = _load_cost(lambda: airport_data._LocationIndex(airport_data.POPULAR_LOCATIONS))
+        tab_ms, tab_kib = _load_cost(lambda: airport_table.AirportTable(table.path))
+        idx_ms, idx_kib = _load_cost(lambda: airport_table._NameIndex(table))
+
+    print(f"locations={len(airport_data.POPULAR_LOCATIONS)} queries={len(corpus)}")
+    print_table(rows, ["function", "legacy_us", "memory_us", "mmap_us"])
+    print(f"load: memory index {mem_ms:.2f} ms / {mem_kib:.0f} KiB, mmap table {tab_ms:.2f} ms / {tab_kib:.0f} KiB "
+          f"+ name index {idx_ms:.2f} ms / {idx_kib:.0f} KiB")
+
+    bundled = airport_table.load_default()
+    if bundled is not None:
+        with using_index(bundled):
+            t0 = time.perf_counter()
+            airport_data.prepare_indexes()
+            build_ms = (time.perf_counter() - t0) * 1000
+            us = time_calls(airport_data.search_local, corpus)
+            fuzzy_us = time_calls(airport_data.search_fuzzy, fuzzy)
+        mismatches += [f"[bundled] {m}" for m in check_table_search(bundled)]
+        print(f"bundled table: {len(bundled)} locations, search_local {us:.2f} us/query, "
+              f"search_fuzzy {fuzzy_us:.2f} us/query (indexes built in {build_ms:.0f} ms)")
+        bundled.close()
+
+    if mismatches:
+        print(f"MISMATCHES ({len(mismatches)}):")
+        for m in mismatches[:20]:
+            print("  ", m)
+        return 1
+    print("results identical: yes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
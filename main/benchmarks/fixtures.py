@@ -0,0 +1,135 @@
+"""
+Amadeus flight-offers payloads for benchmarks.
+Synthetic ones are deterministic; recorded ones are live responses saved under
+main/benchmarks/data/ (python -m main.benchmarks.fixtures WAW BCN 2030-06-15 2030-06-22).
+The bundled WAW-BCN round trip keeps the full v2 response shape (fare families, operating
+carriers, every dictionary) with nothing account-specific in it, so the recorded benchmark
+scenario and the upstream stand-in's replay run offline.
+"""
+from __future__ import annotations
+
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from typing import Any
+
+_CARRIERS = {"LO": "LOT POLISH AIRLINES", "LH": "LUFTHANSA", "KL": "KLM", "AF": "AIR FRANCE",
+             "TK": "TURKISH AIRLINES", "VY": "VUELING", "FR": "RYANAIR", "BA": "BRITISH AIRWAYS"}
+_HUBS = ["FRA", "MUC", "AMS", "CDG", "IST", "ZRH", "VIE", "LHR"]
+
+
+def _iso_duration(minutes: int) -> str:
+    h, m = divmod(minutes, 60)
+    return f"PT{h}H{m}M" if m else f"PT{h}H"
+
+
+def _itinerary(rng: random.Random, origin: str, destination: str, day: str, stops: int) -> dict[str, Any]:
+    t = datetime.fromisoformat(f"{day}T05:00:00") + timedelta(minutes=rng.randrange(0, 16 * 60, 5))
+    start = t
+    points = [origin] + rng.sample(_HUBS, stops) + [destination]
+    segments = []
+    for i in range(len(points) - 1):
+        minutes = rng.randrange(55, 240, 5)
+        arr = t + timedelta(minutes=minutes)
+        carrier = rng.choice(list(_CARRIERS))
+        segments.append({
+            "departure": {"iataCode": points[i], "terminal": str(rng.randint(1, 3)), "at": t.isoformat()},
+            "arrival": {"iataCode": points[i + 1], "at": arr.isoformat()},
+            "carrierCode": carrier,
+            "number": str(rng.randint(100, 9999)),
+            "aircraft": {"code": rng.choice(["320", "321", "73H", "789", "E95"])},
+            "duration": _iso_duration(minutes),
+            "numberOfStops": 0,
+        })
+        t = arr + timedelta(minutes=rng.randrange(45, 180, 5))
+    total = int((arr - start).total_seconds() // 60)
+    return {"duration": _iso_duration(total), "segments": segments}
+
+
+def make_offers_payload(
+    n: int,
+    round_trip: bool = True,
+    max_stops: int = 1,
+    origin: str = "WAW",
+    destination: str = "BCN",
+    depart_date: str = "2030-06-15",
+    return_date: str = "2030-06-22",
+    seed: int = 7,
+) -> dict[str, Any]:
+    """n offers shaped like /v2/shopping/flight-offers, 0..max_stops stops per leg."""
+    rng = random.Random(seed)
+    data = []
+    for i in range(n):
+        itins = [_itinerary(rng, origin, destination, depart_date, rng.randint(0, max_stops))]
+        if round_trip:
+            itins.append(_itinerary(rng, destination, origin, return_date, rng.randint(0, max_stops)))
+        carrier = itins[0]["segments"][0]["carrierCode"]
+        n_segments = sum(len(it["segments"]) for it in itins)
+        data.append({
+            "type": "flight-offer",
+            "id": str(i + 1),
+            "source": "GDS",
+            "itineraries": itins,
+            "price": {"currency": "EUR", "total": f"{rng.uniform(60, 900):.2f}", "base": "50.00"},
+            "validatingAirlineCodes": [carrier],
+            "travelerPricings": [{
+                "travelerId": "1",
+                "fareOption": "STANDARD",
+                "travelerType": "ADULT",
+                "fareDetailsBySegment": [
+                    {"segmentId": str(k + 1), "cabin": "ECONOMY", "class": "V",
+                     "includedCheckedBags": {"quantity": rng.randint(0, 1)}}
+                    for k in range(n_segments)
+                ],
+            }],
+        })
+    return {
+        "meta": {"count": n},
+        "data": data,
+        "dictionaries": {
+            "carriers": dict(_CARRIERS),
+            "locations": {code: {"cityCode": code, "countryCode": "XX"} for code in _HUBS + [origin, destination]},
+        },
+    }
+
+
+# ---------------------------------------------------------------------------
+# Recorded payloads
+# ---------------------------------------------------------------------------
+
+RECORDED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def load_recorded(directory: str = RECORDED_DIR) -> dict[str, dict[str, Any]]:
+    """Recorded flight-offers responses (*.json in directory) by file stem."""
+    out: dict[str, dict[str, Any]] = {}
+    if not os.path.isdir(directory):
+        return out
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                out[name[:-5]] = json.load(f)
+    return out
+
+
+def record(origin: str, destination: str, depart_date: str, return_date: str | None = None,
+           max_items: int = 250, directory: str = RECORDED_DIR) -> str:
+    """Fetch one live response (needs Amadeus credentials) and save it for offline runs."""
+    from main.cheap_flight_finder import get_offers
+
+    payload = get_offers(origin, destination, depart_date, "EUR", max_items=max_items, return_date=return_date)
+    os.makedirs(directory, exist_ok=True)
+    stem = "_".join(p for p in (origin, destination, depart_date, return_date) if p).lower()
+    path = os.path.join(directory, f"{stem}_{len(payload.get('data') or [])}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    return path
+
+
+if __name__ == "__main__":
+    # python -m main.benchmarks.fixtures WAW BCN 2030-06-15 [2030-06-22]
+    if len(sys.argv) < 4:
+        sys.exit("usage: python -m main.benchmarks.fixtures ORIGIN DEST DEPART_DATE [RETURN_DATE]")
+    print(record(*sys.argv[1:5]))
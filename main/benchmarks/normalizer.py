@@ -0,0 +1,230 @@
+"""
+Normalization benchmark: memoized duration / datetime parsers vs the original
+uncached ones, and parse_all_offers on a 250-offer payload with cold and warm
+parser caches. Also checks the memoized parsers agree with the originals.
+Ranking: flight_ranking.rank_offers vs the original badge_lists and an O(n^2)
+Pareto front at 250 to 5000 offers, with cheapest / shortest badges, price order
+and the front checked against those references.
+
+    python -m main.benchmarks.normalizer
+"""
+from __future__ import annotations
+
+import re
+import sys
+import time
+from typing import Any
+
+from main import flight_normalizer, flight_ranking
+from main.benchmarks import print_table, time_calls
+from main.benchmarks.fixtures import make_offers_payload
+
+# ---------------------------------------------------------------------------
+# Reference (uncached) implementations, kept verbatim for comparison
+# ---------------------------------------------------------------------------
+
+
+def legacy_parse_iso8601_duration_to_minutes(dur: str | None) -> int | None:
+    if not dur or not isinstance(dur, str):
+        return None
+    s = dur.strip().upper()
+    if not s.startswith("P"):
+        return None
+    total = 0
+    m = re.match(r"^P(?:(\d+)Y)?(?:(\d+)M)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)(?:[.,]\d+)?S)?)?$", s)
+    if m:
+        y, mo, d, h, mi, sec = m.groups()
+        total = (int(y or 0) * 365 * 24 * 60 +
+                 int(mo or 0) * 30 * 24 * 60 +
+                 int(d or 0) * 24 * 60 +
+                 int(h or 0) * 60 +
+                 int(mi or 0) +
+                 int(float(sec or 0)))
+        return total
+    return None
+
+
+def legacy_parse_datetime_iso(iso_str: str | None) -> tuple[str, str, str] | None:
+    if not iso_str or "T" not in str(iso_str):
+        return None
+    try:
+        parts = str(iso_str).split("T", 1)
+        date_part = parts[0][:10]
+        time_part = (parts[1][:8] if len(parts) > 1 else "")[:5]  # HH:MM
+        return (date_part, time_part, str(iso_str)[:19])
+    except Exception:
+        return None
+
+
+def legacy_badge_lists(prices: list[Any], minutes: list[int | None]) -> list[list[str]]:
+    out: list[list[str]] = [[] for _ in prices]
+    if not prices:
+        return out
+
+    min_price = min((p or float("inf")) for p in prices)
+    for i, p in enumerate(prices):
+        if (p or 0) == min_price:
+            out[i].append("cheapest")
+
+    valid_mins = [m for m in minutes if m is not None]
+    if valid_mins:
+        min_mins = min(valid_mins)
+        shortest = [i for i, m in enumerate(minutes) if m == min_mins]
+        for i in shortest:
+            out[i].append("shortest")
+        best_val_price = min((prices[i] or float("inf")) for i in shortest)
+        for i in shortest:
+            if (prices[i] or 0) == best_val_price:
+                out[i].append("best_value")
+    return out
+
+
+def legacy_order(offers) -> list[int]:
+    return sorted(range(len(offers)), key=lambda i: (float(offers[i].price or 0), offers[i].total_minutes or 0))
+
+
+def brute_force_front(offers) -> list[bool]:
+    """O(n^2) reference: not dominated by any other offer on the ranking criteria."""
+    crit = [
+        (float(o.price or 0) or float("inf"),
+         o.total_minutes if o.total_minutes is not None else float("inf"),
+         min(flight_ranking.MAX_STOPS, o.stops),
+         flight_ranking.departure_bucket(o.departure_datetime))
+        for o in offers
+    ]
+    return [
+        not any(all(x <= y for x, y in zip(c2, c)) and c2 != c for c2 in crit)
+        for c in crit
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------------------------
+
+
+def payload_strings(payload: dict[str, Any]) -> tuple[list[str], list[str]]:
+    """Every duration and timestamp string the normalizer parses, in payload order."""
+    durations: list[str] = []
+    stamps: list[str] = []
+    for offer in payload.get("data") or []:
+        for itin in offer.get("itineraries") or []:
+            durations.append(itin.get("duration"))
+            for seg in itin.get("segments") or []:
+                durations.append(seg.get("duration"))
+                stamps += [seg["departure"]["at"], seg["arrival"]["at"]]
+    return durations, stamps
+
+
+EDGE_DURATIONS = ["", None, "PT", "P1D", "PT45M", "pt2h5m", "PT1H30M15.5S", "P1DT2H", "2H", "PXT"]
+EDGE_STAMPS = ["", None, "2030-06-15", "2030-06-15T08:05", "2030-06-15T08:05:00.000+02:00", "T"]
+
+
+def check_equivalence(payload: dict[str, Any]) -> list[str]:
+    """Inputs where the memoized parsers disagree with the originals (empty when identical)."""
+    durations, stamps = payload_strings(payload)
+    mismatches = []
+    for d in durations + EDGE_DURATIONS:
+        if flight_normalizer._parse_iso8601_duration_to_minutes(d) != legacy_parse_iso8601_duration_to_minutes(d):
+            mismatches.append(f"duration {d!r}")
+    for t in stamps + EDGE_STAMPS:
+        if flight_normalizer._parse_datetime_iso(t) != legacy_parse_datetime_iso(t):
+            mismatches.append(f"datetime {t!r}")
+    return mismatches
+
+
+def check_ranking(payload: dict[str, Any]) -> list[str]:
+    """Offer ids where rank_offers disagrees with the references (empty when consistent)."""
+    offers = flight_normalizer.parse_all_offers(payload, "2030-06-15")
+    ranking = flight_ranking.rank_offers(offers)
+    legacy = legacy_badge_lists([o.price for o in offers], [o.total_minutes for o in offers])
+    mismatches = []
+    for o, new, old, front, ref in zip(offers, ranking.badges, legacy, ranking.pareto, brute_force_front(offers)):
+        for badge in ("cheapest", "shortest"):
+            if (badge in new) != (badge in old):
+                mismatches.append(f"{badge} {o.id}")
+        if front != ref:
+            mismatches.append(f"pareto {o.id}")
+    best = ranking.order[0] if offers else None
+    if best is not None and not ranking.pareto[best]:
+        mismatches.append(f"best_value {offers[best].id} not on the front")
+    if offers and flight_ranking.rank_offers(offers, "price").order != legacy_order(offers):
+        mismatches.append("price order")
+    return mismatches
+
+
+def clear_parser_caches() -> None:
+    flight_normalizer._duration_to_minutes_cached.cache_clear()
+    flight_normalizer._datetime_parts_cached.cache_clear()
+    flight_normalizer._format_duration_minutes.cache_clear()
+
+
+def _best_ms(fn, setup=None, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def run() -> int:
+    payload = make_offers_payload(250, round_trip=True, max_stops=1)
+    durations, stamps = payload_strings(payload)
+    mismatches = check_equivalence(payload)
+
+    rows = [
+        {
+            "function": "duration_to_minutes",
+            "calls": len(durations),
+            "distinct": len(set(durations)),
+            "legacy_us": f"{time_calls(legacy_parse_iso8601_duration_to_minutes, [(d,) for d in durations]):.3f}",
+            "memoized_us": f"{time_calls(flight_normalizer._parse_iso8601_duration_to_minutes, [(d,) for d in durations]):.3f}",
+        },
+        {
+            "function": "parse_datetime_iso",
+            "calls": len(stamps),
+            "distinct": len(set(stamps)),
+            "legacy_us": f"{time_calls(legacy_parse_datetime_iso, [(t,) for t in stamps]):.3f}",
+            "memoized_us": f"{time_calls(flight_normalizer._parse_datetime_iso, [(t,) for t in stamps]):.3f}",
+        },
+    ]
+    print("offers=250 round_trip=yes max_stops=1")
+    print_table(rows, ["function", "calls", "distinct", "legacy_us", "memoized_us"])
+
+    parse = lambda: flight_normalizer.parse_all_offers(payload, "2030-06-15")  # noqa: E731
+    cold = _best_ms(parse, setup=clear_parser_caches)
+    warm = _best_ms(parse)
+    print(f"parse_all_offers: cold caches {cold:.2f} ms, warm caches {warm:.2f} ms")
+    print(f"cache info: duration {flight_normalizer._duration_to_minutes_cached.cache_info()}")
+    print(f"            datetime {flight_normalizer._datetime_parts_cached.cache_info()}")
+
+    rank_rows = []
+    for n in (250, 1000, 5000):
+        ranked_payload = make_offers_payload(n, round_trip=True, max_stops=2)
+        offers = flight_normalizer.parse_all_offers(ranked_payload, "2030-06-15")
+        prices, minutes = [o.price for o in offers], [o.total_minutes for o in offers]
+        front = flight_ranking.rank_offers(offers).pareto
+        rank_rows.append({
+            "offers": n,
+            "front": sum(front),
+            "legacy_badges_ms": f"{_best_ms(lambda: legacy_badge_lists(prices, minutes)):.2f}",
+            "rank_offers_ms": f"{_best_ms(lambda: flight_ranking.rank_offers(offers)):.2f}",
+            "brute_front_ms": f"{_best_ms(lambda: brute_force_front(offers), repeat=1):.0f}" if n <= 1000 else "-",
+        })
+        if n <= 1000:
+            mismatches += check_ranking(ranked_payload)
+    print()
+    print_table(rank_rows, ["offers", "front", "legacy_badges_ms", "rank_offers_ms", "brute_front_ms"])
+
+    if mismatches:
+        print(f"MISMATCHES ({len(mismatches)}): {mismatches[:20]}")
+        return 1
+    print("results identical: yes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,375 @@
+"""
+Offer model benchmark: compact slotted Offers (parse_all_offers) vs the original
+per-offer dicts, on a synthetic 250-offer round-trip payload. Reports parse time,
+retained memory, pickled size (what the search cache stores) and the cost of
+serializing the top 10 at the response boundary. Also checks that to_dict()
+reproduces the original JSON shape exactly.
+
+    python -m main.benchmarks.offer_model
+"""
+from __future__ import annotations
+
+import pickle
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+from typing import Any
+
+from main.benchmarks import print_table
+from main.benchmarks.fixtures import make_offers_payload
+from main.flight_normalizer import (
+    _format_duration_minutes,
+    _get_city_for_iata,
+    _parse_datetime_iso,
+    _parse_iso8601_duration_to_minutes,
+    _safe_float,
+    _safe_str,
+    parse_all_offers,
+)
+
+# ---------------------------------------------------------------------------
+# Reference (dict-based) implementation, kept verbatim for comparison
+# ---------------------------------------------------------------------------
+
+
+def legacy_normalize_segment(seg: dict[str, Any], carriers: dict[str, str]) -> dict[str, Any]:
+    dep = seg.get("departure") or {}
+    arr = seg.get("arrival") or {}
+    dep_at = dep.get("at") or ""
+    arr_at = arr.get("at") or ""
+    dep_parsed = _parse_datetime_iso(dep_at)
+    arr_parsed = _parse_datetime_iso(arr_at)
+
+    carrier_code = _safe_str(seg.get("carrierCode") or seg.get("operating", {}).get("carrierCode")).upper()
+    aircraft = seg.get("aircraft") or {}
+    aircraft_code = _safe_str(aircraft.get("code"))
+
+    dur_str = seg.get("duration") or ""
+    dur_min = _parse_iso8601_duration_to_minutes(dur_str)
+
+    return {
+        "departure_iata": _safe_str(dep.get("iataCode")).upper() or "",
+        "arrival_iata": _safe_str(arr.get("iataCode")).upper() or "",
+        "departure_at": dep_at,
+        "arrival_at": arr_at,
+        "departure_date": dep_parsed[0] if dep_parsed else "",
+        "departure_time": dep_parsed[1] if dep_parsed else "",
+        "arrival_date": arr_parsed[0] if arr_parsed else "",
+        "arrival_time": arr_parsed[1] if arr_parsed else "",
+        "carrier_code": carrier_code,
+        "carrier_name": carriers.get(carrier_code) or carrier_code,
+        "number": _safe_str(seg.get("number")),
+        "aircraft_code": aircraft_code,
+        "duration": _format_duration_minutes(dur_min),
+        "duration_minutes": dur_min,
+        "departure_terminal": _safe_str(dep.get("terminal")),
+        "arrival_terminal": _safe_str(arr.get("terminal")),
+    }
+
+
+def legacy_normalize_flight_offer(
+    offer: dict[str, Any],
+    dictionaries: dict[str, Any] | None = None,
+    reference_depart_date: str | None = None,
+    include_raw: bool = False,
+) -> dict[str, Any] | None:
+    """
+    Convert a single Amadeus flight offer to normalized format.
+    Returns None if offer is invalid (e.g. no price).
+    """
+    if not offer or not isinstance(offer, dict):
+        return None
+
+    carriers = {}
+    locations = {}
+    if dictionaries:
+        carriers = (dictionaries.get("carriers") or {}) or {}
+        locations = (dictionaries.get("locations") or {}) or {}
+
+    # Price
+    price_obj = offer.get("price") or {}
+    total_raw = price_obj.get("total") or price_obj.get("grandTotal")
+    price = _safe_float(total_raw)
+    if price is None:
+        return None
+    currency = _safe_str(price_obj.get("currency")).upper() or "USD"
+
+    # Id
+    offer_id = _safe_str(offer.get("id"))
+
+    # Itineraries: first = outbound, second = return
+    itineraries = offer.get("itineraries") or []
+    if not itineraries:
+        return None
+
+    outbound_segments: list[dict[str, Any]] = []
+    return_segments: list[dict[str, Any]] = []
+    total_minutes = 0
+    first_dep_datetime = ""
+    first_dep_date = ""
+    last_arr_datetime = ""
+    last_arr_date = ""
+    airline_codes_set: set[str] = set()
+
+    for idx, itin in enumerate(itineraries):
+        segs = itin.get("segments") or []
+        itin_dur = _parse_iso8601_duration_to_minutes(itin.get("duration"))
+        if itin_dur is not None:
+            total_minutes += itin_dur
+
+        for seg in segs:
+            ns = legacy_normalize_segment(seg, carriers)
+            if ns.get("carrier_code"):
+                airline_codes_set.add(ns["carrier_code"])
+            if idx == 0:
+                outbound_segments.append(ns)
+            else:
+                return_segments.append(ns)
+
+    if outbound_segments:
+        first_dep_datetime = outbound_segments[0].get("departure_at", "")
+        first_dep_date = outbound_segments[0].get("departure_date", "")
+        last_out = outbound_segments[-1]
+        last_arr_datetime = last_out.get("arrival_at", "")
+        last_arr_date = last_out.get("arrival_date", "")
+    if return_segments:
+        last_ret = return_segments[-1]
+        last_arr_datetime = last_ret.get("arrival_at", "")
+        last_arr_date = last_ret.get("arrival_date", "")
+
+    # Departure / arrival from first/last segment
+    dep_iata = outbound_segments[0].get("departure_iata", "") if outbound_segments else ""
+    if return_segments:
+        arr_iata = return_segments[-1].get("arrival_iata", "")
+    else:
+        arr_iata = outbound_segments[-1].get("arrival_iata", "") if outbound_segments else ""
+
+    dep_city = _get_city_for_iata(dep_iata) if dep_iata else ""
+    arr_city = _get_city_for_iata(arr_iata) if arr_iata else ""
+
+    # Locations dict: Amadeus may have locations[IATA] = {cityCode}
+    if dep_iata and not dep_city:
+        loc = locations.get(dep_iata) or {}
+        dep_city = _safe_str(loc.get("cityCode")) or dep_iata
+    if arr_iata and not arr_city:
+        loc = locations.get(arr_iata) or {}
+        arr_city = _safe_str(loc.get("cityCode")) or arr_iata
+
+    # Stops
+    total_segments = len(outbound_segments) + len(return_segments)
+    stops = max(0, total_segments - (2 if return_segments else 1))
+    is_direct = stops == 0
+    if stops == 0:
+        stop_label = "Direct"
+    elif stops == 1:
+        stop_label = "1 stop"
+    else:
+        stop_label = f"{stops} stops"
+
+    # Next day arrival
+    next_day_arrival = False
+    if first_dep_date and last_arr_date and first_dep_date != last_arr_date:
+        next_day_arrival = True
+
+    # Days left
+    days_left: int | None = None
+    if reference_depart_date or first_dep_date:
+        ref = reference_depart_date or first_dep_date
+        try:
+            dep_d = datetime.strptime(ref[:10], "%Y-%m-%d").date()
+            days_left = (dep_d - date.today()).days
+        except (ValueError, TypeError):
+            pass
+
+    # Cabin / baggage from travelerPricings
+    cabin = ""
+    baggage = ""
+    try:
+        tp = (offer.get("travelerPricings") or [])
+        if tp:
+            fds = (tp[0].get("fareDetailsBySegment") or [])
+            if fds:
+                cabin = _safe_str(fds[0].get("cabin"))
+            # Baggage: check fareDetailsBySegment includedCheckedBags
+            for fd in fds:
+                bags = fd.get("includedCheckedBags") or {}
+                if isinstance(bags, dict) and bags.get("quantity") is not None:
+                    qty = bags.get("quantity", 0)
+                    baggage = f"{qty} checked" if qty else ""
+                    break
+    except Exception:
+        pass
+
+    # Validating airline codes
+    val_codes = offer.get("validatingAirlineCodes") or []
+    validating_airline_codes = [x for x in val_codes if x] if isinstance(val_codes, list) else []
+
+    # Primary airline
+    primary_airline = ""
+    if validating_airline_codes:
+        pc = validating_airline_codes[0]
+        primary_airline = carriers.get(pc) or pc
+    elif airline_codes_set:
+        primary_airline = carriers.get(next(iter(airline_codes_set))) or next(iter(airline_codes_set))
+
+    # Outbound / return_leg
+    outbound = {
+        "segments": outbound_segments,
+        "duration_minutes": sum(s.get("duration_minutes") or 0 for s in outbound_segments),
+    }
+    outbound["duration"] = _format_duration_minutes(outbound["duration_minutes"])
+
+    return_leg: dict[str, Any] | None = None
+    if return_segments:
+        return_leg = {
+            "segments": return_segments,
+            "duration_minutes": sum(s.get("duration_minutes") or 0 for s in return_segments),
+        }
+        return_leg["duration"] = _format_duration_minutes(return_leg["duration_minutes"])
+
+    trip_type = "round_trip" if return_segments else "one_way"
+
+    # Route display: always show outbound (origin → destination), not overall return arrival
+    outbound_arr_iata = outbound_segments[-1].get("arrival_iata", "") if outbound_segments else ""
+    route_display = f"{dep_iata} → {outbound_arr_iata}" if dep_iata and outbound_arr_iata else ""
+    price_display = f"{price:.2f} {currency}" if price is not None else ""
+
+    # Outbound destination (for session/store when round-trip)
+    result_outbound_arr_iata = outbound_arr_iata
+
+    result: dict[str, Any] = {
+        "id": offer_id,
+        "price": price,
+        "currency": currency,
+        "total_duration": _format_duration_minutes(total_minutes),
+        "total_minutes": total_minutes,
+        "stops": stops,
+        "stop_label": stop_label,
+        "is_direct": is_direct,
+        "airline_codes": list(airline_codes_set),
+        "airline_names": [carriers.get(c) or c for c in airline_codes_set],
+        "primary_airline": primary_airline,
+        "departure_city": dep_city,
+        "departure_airport": dep_iata,
+        "departure_iata": dep_iata,
+        "departure_terminal": outbound_segments[0].get("departure_terminal", "") if outbound_segments else "",
+        "departure_datetime": first_dep_datetime,
+        "departure_date": first_dep_date,
+        "departure_time": outbound_segments[0].get("departure_time", "") if outbound_segments else "",
+        "arrival_city": arr_city,
+        "arrival_airport": arr_iata,
+        "arrival_iata": arr_iata,
+        "arrival_terminal": (
+            (return_segments[-1] if return_segments else outbound_segments[-1]).get("arrival_terminal", "")
+        ) if outbound_segments or return_segments else "",
+        "arrival_datetime": last_arr_datetime,
+        "arrival_date": last_arr_date,
+        "arrival_time": (
+            (return_segments[-1] if return_segments else outbound_segments[-1]).get("arrival_time", "")
+        ) if outbound_segments or return_segments else "",
+        "next_day_arrival": next_day_arrival,
+        "days_left": days_left,
+        "segments": outbound_segments + return_segments,
+        "outbound": outbound,
+        "return_leg": return_leg,
+        "trip_type": trip_type,
+        "cabin": cabin,
+        "baggage": baggage,
+        "validating_airline_codes": validating_airline_codes,
+        "booking_classes": [],
+        "badges": [],
+        "route_display": route_display,
+        "price_display": price_display,
+        "outbound_arrival_iata": result_outbound_arr_iata,
+    }
+
+    if include_raw:
+        result["raw_offer"] = offer
+
+    return result
+
+
+def legacy_normalize_all_offers(payload: dict[str, Any], reference_depart_date: str | None = None) -> list[dict]:
+    dictionaries = payload.get("dictionaries") or {}
+    out = []
+    for offer in payload.get("data") or []:
+        norm = legacy_normalize_flight_offer(offer, dictionaries, reference_depart_date)
+        if norm:
+            out.append(norm)
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Measurements
+# ---------------------------------------------------------------------------
+
+
+def check_equivalence(payload: dict[str, Any]) -> list[str]:
+    """Offer ids whose to_dict() differs from the legacy dict (empty when identical)."""
+    legacy = legacy_normalize_all_offers(payload, "2030-06-15")
+    compact = [o.to_dict() for o in parse_all_offers(payload, "2030-06-15")]
+    if len(legacy) != len(compact):
+        return [f"count {len(compact)} != {len(legacy)}"]
+    return [a["id"] for a, b in zip(legacy, compact) if a != b]
+
+
+def _best_ms(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def _retained_kib(fn) -> float:
+    tracemalloc.start()
+    result = fn()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / 1024
+
+
+def measure(n: int = 250) -> list[dict[str, Any]]:
+    payload = make_offers_payload(n, round_trip=True, max_stops=1)
+    legacy = legacy_normalize_all_offers(payload, "2030-06-15")
+    compact = parse_all_offers(payload, "2030-06-15")
+    legacy_blob = pickle.dumps(legacy, pickle.HIGHEST_PROTOCOL)
+    compact_blob = pickle.dumps(compact, pickle.HIGHEST_PROTOCOL)
+    top = sorted(compact, key=lambda o: (o.price, o.total_minutes))[:10]
+    return [
+        {
+            "model": "dict",
+            "parse_ms": f"{_best_ms(lambda: legacy_normalize_all_offers(payload, '2030-06-15')):.2f}",
+            "retained_kib": f"{_retained_kib(lambda: legacy_normalize_all_offers(payload, '2030-06-15')):.0f}",
+            "pickle_kib": f"{len(legacy_blob) / 1024:.0f}",
+            "unpickle_ms": f"{_best_ms(lambda: pickle.loads(legacy_blob)):.2f}",
+            "top10_json_ms": "0.00",
+        },
+        {
+            "model": "compact",
+            "parse_ms": f"{_best_ms(lambda: parse_all_offers(payload, '2030-06-15')):.2f}",
+            "retained_kib": f"{_retained_kib(lambda: parse_all_offers(payload, '2030-06-15')):.0f}",
+            "pickle_kib": f"{len(compact_blob) / 1024:.0f}",
+            "unpickle_ms": f"{_best_ms(lambda: pickle.loads(compact_blob)):.2f}",
+            "top10_json_ms": f"{_best_ms(lambda: [o.to_dict() for o in top]):.2f}",
+        },
+    ]
+
+
+def run() -> int:
+    payload = make_offers_payload(250, round_trip=True, max_stops=1)
+    mismatches = check_equivalence(payload) + check_equivalence(make_offers_payload(250, round_trip=False, max_stops=2))
+    print("offers=250 round_trip=yes max_stops=1")
+    print_table(measure(250), ["model", "parse_ms", "retained_kib", "pickle_kib", "unpickle_ms", "top10_json_ms"])
+    if mismatches:
+        print(f"MISMATCHES ({len(mismatches)}): {mismatches[:20]}")
+        return 1
+    print("to_dict() identical to legacy dicts: yes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,147 @@
+"""
+Search pipeline benchmark: the stages cheap_flight_search_api runs on an Amadeus payload.
+    normalize   parse_all_offers (compact Offers, what the search cache stores)
+    to_dicts    normalize_all_offers (full JSON shape for every offer)
+    dedupe      _deduplicate_flights
+    rank        rank_offers over all offers (Pareto front, scores, badges, sort=best order)
+    serialize   top 10 in that order, to_dict + badges
+Per stage: best-of-N time, offers/s, net allocated blocks and peak traced memory.
+Scenarios: synthetic one-way / round-trip / multi-stop payloads at 10, 250 and 5000 offers,
+plus every recorded payload in main/benchmarks/data/.
+
+    python -m main.benchmarks.pipeline [--sizes 10,250] [--json out.json] [--compare baseline.json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from main.benchmarks import print_table
+from main.benchmarks.fixtures import load_recorded, make_offers_payload
+from main.cheap_flight_finder import _deduplicate_flights
+from main.flight_normalizer import normalize_all_offers, parse_all_offers
+from main.flight_ranking import rank_offers
+
+SIZES = (10, 250, 5000)
+SHAPES = {
+    "one_way": {"round_trip": False, "max_stops": 0},
+    "round_trip": {"round_trip": True, "max_stops": 0},
+    "multi_stop": {"round_trip": True, "max_stops": 2},
+}
+# Flag a stage when it is this much slower than the baseline
+REGRESSION_RATIO = 1.25
+
+
+def scenarios(sizes=SIZES) -> list[tuple[str, dict[str, Any]]]:
+    out = [
+        (f"{shape}/{n}", make_offers_payload(n, **kw))
+        for n in sizes
+        for shape, kw in SHAPES.items()
+    ]
+    out += [(f"recorded/{name}", payload) for name, payload in load_recorded().items()]
+    return out
+
+
+def _serialize_top(offers, ranking):
+    return [{**offers[i].to_dict(), "badges": ranking.badges[i]} for i in ranking.order[:10]]
+
+
+def stages(payload: dict[str, Any]) -> list[tuple[str, Callable[[], Any]]]:
+    """(name, thunk) per stage; inputs of later stages are computed up front."""
+    offers = parse_all_offers(payload, "2030-06-15")
+    deduped = _deduplicate_flights(offers)
+    ranking = rank_offers(deduped)
+    return [
+        ("normalize", lambda: parse_all_offers(payload, "2030-06-15")),
+        ("to_dicts", lambda: normalize_all_offers(payload, "2030-06-15")),
+        ("dedupe", lambda: _deduplicate_flights(offers)),
+        ("rank", lambda: rank_offers(deduped)),
+        ("serialize", lambda: _serialize_top(deduped, ranking)),
+    ]
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> dict[str, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+
+    # Allocations measured on a separate run: tracemalloc slows everything down
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks_before
+    del result
+    return {"ms": best * 1000, "alloc_blocks": blocks, "peak_kib": peak / 1024}
+
+
+def run_suite(sizes=SIZES, repeat: int | None = None) -> list[dict[str, Any]]:
+    rows = []
+    for name, payload in scenarios(sizes):
+        n = len(payload.get("data") or [])
+        reps = repeat or (20 if n <= 250 else 3)
+        for stage, fn in stages(payload):
+            m = measure(fn, reps)
+            rows.append({
+                "scenario": name,
+                "offers": n,
+                "stage": stage,
+                "ms": round(m["ms"], 3),
+                "offers_per_s": round(n / (m["ms"] / 1000)) if m["ms"] else 0,
+                "alloc_blocks": m["alloc_blocks"],
+                "peak_kib": round(m["peak_kib"], 1),
+            })
+    return rows
+
+
+def compare(rows: list[dict[str, Any]], baseline: list[dict[str, Any]]) -> list[str]:
+    """Stages slower than REGRESSION_RATIO x baseline; adds a vs_base column to rows."""
+    base = {(r["scenario"], r["stage"]): r for r in baseline}
+    slower = []
+    for r in rows:
+        b = base.get((r["scenario"], r["stage"]))
+        if not b or not b["ms"]:
+            continue
+        ratio = r["ms"] / b["ms"]
+        r["vs_base"] = f"{ratio:.2f}x"
+        if ratio > REGRESSION_RATIO:
+            slower.append(f"{r['scenario']} {r['stage']}: {b['ms']} -> {r['ms']} ms")
+    return slower
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)))
+    parser.add_argument("--repeat", type=int)
+    parser.add_argument("--json", help="Write results here (use as a baseline later)")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier --json run")
+    args = parser.parse_args(argv)
+
+    rows = run_suite(tuple(int(s) for s in args.sizes.split(",") if s), args.repeat)
+    columns = ["scenario", "offers", "stage", "ms", "offers_per_s", "alloc_blocks", "peak_kib"]
+    slower: list[str] = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            slower = compare(rows, json.load(f))
+        columns.append("vs_base")
+    print_table(rows, columns)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=1)
+    if slower:
+        print(f"SLOWER THAN BASELINE ({len(slower)}):")
+        for line in slower:
+            print("  ", line)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
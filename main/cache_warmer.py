@@ -0,0 +1,174 @@
+"""
+Search cache warmer behind `manage.py warm_flight_cache`.
+Routes come from the command line, or else from the routes users searched most over the
+last CFF_WARM_LOOKBACK_DAYS days (price history rows of user searches; the warmer's own
+rows are recorded as "warm" and never count). For each route and each of the next N
+departure dates, the search-cache entry is refetched when it is missing or will stop
+being fresh within `ahead` seconds; fresh entries are left alone. The mode=full entry
+(250 offers) of a date is refreshed the same way, but only if someone searched it: it is
+never fetched just to fill the cache.
+Refetches run on a small thread pool (bounded concurrency) at LOW upstream priority, so
+they queue behind user searches in amadeus_limiter and leave its reserve to them, and each
+one spends a call of the run's RateBudget. A search already in flight for the same key is
+joined instead of repeated. Nearest departures are warmed first, so whatever the budget
+cannot cover is the furthest out.
+The search cache must live in a shared backend (CFF_SEARCH_CACHE_ALIAS pointing at a
+database / Redis / Memcached cache): with the default process-local LocMemCache a cron
+run would only fill its own memory, which the web workers never see (is_shared_cache()).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import NamedTuple
+
+import requests
+from django.conf import settings
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from main.cheap_flight_finder import AmadeusError, AmadeusRateLimitError, refresh_search
+from main.deadline import DeadlineExceeded
+from main.flight_cache import make_search_key, search_cache
+from main.models import RoutePriceSnapshot
+from main.price_history import price_history
+from main.price_watch import RateBudget
+from main.singleflight import SingleFlightTimeout
+
+logger = logging.getLogger(__name__)
+
+SOURCE = "warm"
+# Price history sources recorded by user searches (the search API and the streaming search)
+USER_SOURCES = ("amadeus", "stream")
+# Recent round trips per route looked at for its usual stay
+STAY_SAMPLE = 200
+# Cache backends that live and die with one process
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+class WarmRoute(NamedTuple):
+    origin: str
+    destination: str
+    currency: str
+    stay: int | None = None  # round trip: nights between departure and return; None: one way
+
+
+def parse_route(spec: str, currency: str = "USD", stay: int | None = None) -> WarmRoute:
+    """'WAW-BCN' or 'WAW-BCN:EUR'. Raises ValueError."""
+    route, _, cur = spec.strip().upper().partition(":")
+    origin, _, destination = route.partition("-")
+    cur = cur or currency.upper()
+    if len(origin) != 3 or len(destination) != 3 or not (origin + destination).isalpha() or len(cur) != 3:
+        raise ValueError(f"invalid route {spec!r} (use ORIGIN-DESTINATION or ORIGIN-DESTINATION:CURRENCY)")
+    return WarmRoute(origin, destination, cur, stay)
+
+
+def popular_routes(limit: int, lookback_days: int) -> list[WarmRoute]:
+    """The most searched (route, currency, trip type) combinations, round trips with their usual stay."""
+    recent = RoutePriceSnapshot.objects.filter(
+        recorded_at__gte=timezone.now() - timedelta(days=lookback_days), source__in=USER_SOURCES,
+    )
+    rows = (
+        recent.values("origin", "destination", "currency")
+        .annotate(
+            one_way=Count("id", filter=Q(return_date__isnull=True)),
+            round_trip=Count("id", filter=Q(return_date__isnull=False)),
+        )
+    )
+    ranked = [
+        (count, r["origin"], r["destination"], r["currency"], round_trip)
+        for r in rows
+        for count, round_trip in ((r["one_way"], False), (r["round_trip"], True))
+        if count
+    ]
+    ranked.sort(key=lambda x: (-x[0], *x[1:]))
+
+    routes = []
+    for _, origin, destination, currency, round_trip in ranked[:limit]:
+        stay = None
+        if round_trip:
+            stays = recent.filter(
+                origin=origin, destination=destination, currency=currency, return_date__isnull=False,
+            ).order_by("-recorded_at").values_list("depart_date", "return_date")[:STAY_SAMPLE]
+            stay = Counter((ret - dep).days for dep, ret in stays).most_common(1)[0][0]
+        routes.append(WarmRoute(origin, destination, currency, stay))
+    return routes
+
+
+def is_shared_cache() -> bool:
+    """True when the search cache is visible to other processes (the web workers)."""
+    return not isinstance(search_cache.backend, PROCESS_LOCAL_BACKENDS)
+
+
+def _fresh(entry: dict | None, ahead: float) -> bool:
+    """Cached and still fresh `ahead` seconds from now."""
+    return entry is not None and search_cache.age(entry) < search_cache.ttl - ahead
+
+
+def warm(
+    routes: list[WarmRoute],
+    days: int,
+    start_in: int = 1,
+    adults: int = 1,
+    ahead: float | None = None,
+    concurrency: int | None = None,
+    budget: RateBudget | None = None,
+    dry_run: bool = False,
+    today: date | None = None,
+) -> dict[str, int]:
+    """Warm the next `days` departure dates (from today + start_in) of every route; returns counters."""
+    ahead = float(ahead if ahead is not None else getattr(settings, "CFF_WARM_AHEAD_S", 300))
+    concurrency = max(1, concurrency or int(getattr(settings, "CFF_WARM_CONCURRENCY", 4)))
+    budget = budget or RateBudget(
+        int(getattr(settings, "CFF_WARM_BUDGET", 100)),
+        float(getattr(settings, "CFF_WARM_CALLS_PER_MINUTE", 30)),
+    )
+    today = today or timezone.localdate()
+    stats = {"routes": len(routes), "warmed": 0, "fresh": 0, "deferred": 0, "rate_limited": 0, "errors": 0}
+
+    slots = threading.BoundedSemaphore(concurrency)
+    jobs: list[tuple[str, Future]] = []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="cff-warm") as pool:
+        for offset in range(start_in, start_in + max(0, days)):
+            depart_day = today + timedelta(days=offset)
+            for route in routes:
+                depart = depart_day.isoformat()
+                ret = (depart_day + timedelta(days=route.stay)).isoformat() if route.stay is not None else None
+                for full in (False, True):
+                    key = make_search_key(route.origin, route.destination, depart, ret, route.currency, adults,
+                                          full=full)
+                    entry = search_cache.get(key)
+                    if entry is None and full:
+                        continue  # nobody searched the 250-offer set for this date
+                    if _fresh(entry, ahead):
+                        stats["fresh"] += 1
+                        continue
+                    if dry_run or budget.exhausted:
+                        stats["deferred"] += 1
+                        continue
+                    budget.acquire()
+                    slots.acquire()
+                    job = pool.submit(refresh_search, route.origin, route.destination, depart, ret, route.currency,
+                                      adults, source=SOURCE, full=full)
+                    job.add_done_callback(lambda _: slots.release())
+                    jobs.append((key, job))
+
+    for key, job in jobs:
+        try:
+            job.result()
+        except AmadeusRateLimitError as e:
+            logger.info("Cache warm deferred for %s: %s", key, e)
+            stats["rate_limited"] += 1
+        except (AmadeusError, requests.exceptions.RequestException, SingleFlightTimeout,
+                DeadlineExceeded, ValueError) as e:
+            logger.warning("Cache warm failed for %s: %s", key, e)
+            stats["errors"] += 1
+        else:
+            stats["warmed"] += 1
+    price_history.flush()
+    return stats
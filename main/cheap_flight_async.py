@@ -0,0 +1,351 @@
+"""
+Async (ASGI) versions of the flight search, location autocomplete and Google Places views.
+Same URLs, parameters and responses as their cheap_flight_finder twins, but upstream calls
+are awaited on async_http_client (httpx), so a search waiting on Amadeus holds no thread:
+under an ASGI server one worker keeps many searches in flight at once.
+Everything else is shared with the sync views: the Amadeus token, rate limiter
+(acquire_async), circuit breakers, search and location caches (through the async cache
+API, so a DatabaseCache backend works too). Offer parsing, price history and the trend
+lookup (which may touch the database) run via sync_to_async.
+core/urls.py routes to these views when CFF_ASYNC_VIEWS is set (start.sh SERVER=asgi).
+Module globals (URLs, keys, breakers, limiter) are read from cheap_flight_finder at call
+time, so settings and test patches on that module apply here too.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
+
+from main import airport_data
+from main import cheap_flight_finder as cff
+from main.cheap_flight_finder import AmadeusError, AmadeusRateLimitError, AmadeusUnavailableError
+from main.circuit_breaker import CircuitOpen
+from main.deadline import Deadline, DeadlineExceeded, optional_timeout
+from main.flight_cache import make_search_key, search_cache
+from main.http_client import async_http_client
+from main.rate_limit import RateLimited, priority, priority_for
+
+logger = logging.getLogger(__name__)
+
+
+# ---- Amadeus ----
+async def _access_token() -> str:
+    # A cached token costs nothing; only a refresh (one POST) goes to a worker thread
+    return cff._TOKEN_MANAGER.peek() or await sync_to_async(cff.get_access_token, thread_sensitive=False)()
+
+
+async def _amadeus_get(
+    url: str,
+    params: dict[str, Any],
+    cap: float,
+    deadline: Deadline | None = None,
+) -> httpx.Response:
+    """cheap_flight_finder._amadeus_get (same limiter, breaker, retries) on the async client."""
+    retries = max(0, int(getattr(settings, "CFF_AMADEUS_RETRIES", 2)))
+    for attempt in range(retries + 1):
+        try:
+            cff.amadeus_breaker.check()
+            await cff.amadeus_limiter.acquire_async(deadline=deadline)
+            token = await _access_token()
+            timeout = optional_timeout(deadline, cap)
+            cff.amadeus_breaker.before_call()
+        except CircuitOpen as e:
+            raise AmadeusUnavailableError(str(e), retry_after=e.retry_in) from e
+        except RateLimited as e:
+            raise AmadeusRateLimitError(str(e), retry_after=e.retry_after) from e
+        try:
+            resp = await async_http_client.get(
+                url, headers={"Authorization": f"Bearer {token}"}, params=params,
+                timeout=timeout, upstream="amadeus", retries=0,
+            )
+        except httpx.TransportError as e:
+            cff.amadeus_breaker.record(False, f"{type(e).__name__}: {e}")
+            delay = None if attempt == retries else cff._backoff_delay(attempt, deadline)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        except Exception as e:
+            cff.amadeus_breaker.record(False, f"{type(e).__name__}: {e}")
+            raise
+        cff.amadeus_breaker.record(resp.status_code < 500, f"HTTP {resp.status_code}")
+        if resp.status_code == 401:
+            cff._TOKEN_MANAGER.invalidate(token)
+        if resp.status_code not in cff._RETRY_STATUSES or attempt == retries:
+            return resp
+        if resp.status_code == 429:
+            await cff.amadeus_limiter.apenalize(cff._penalty(resp, attempt))
+        else:
+            delay = cff._backoff_delay(attempt, deadline)
+            if delay is None:
+                return resp
+            await asyncio.sleep(delay)
+    return resp
+
+
+async def get_offers(
+    origin: str,
+    destination: str,
+    depart_date: str,
+    currency: str,
+    max_items: int = 10,
+    return_date: str | None = None,
+    adults: int = 1,
+    deadline: Deadline | None = None,
+) -> dict:
+    params = cff._offers_params(origin, destination, depart_date, currency, max_items, return_date, adults)
+    resp = await _amadeus_get(cff.OFFERS_URL, params, 20, deadline=deadline)
+    cff._raise_for_offers(resp)
+    return resp.json()
+
+
+async def _search_amadeus_locations(
+    keyword: str,
+    limit: int = 10,
+    deadline: Deadline | None = None,
+) -> list[dict[str, Any]]:
+    """cheap_flight_finder._search_amadeus_locations on the async client (same cache, best effort)."""
+    k = (keyword or "").strip().upper()
+    if len(k) < cff._MIN_KEYWORD_LEN:
+        return []
+
+    cached_results = await cff.location_cache.aget(k)
+    if cached_results is not None:
+        return cached_results[:limit]
+
+    params = {
+        "subType": "AIRPORT,CITY",
+        "keyword": k,
+        "page[limit]": cff._LOCATIONS_PAGE_LIMIT,
+    }
+    try:
+        resp = await _amadeus_get(cff.LOCATIONS_URL, params, 10, deadline=deadline)
+    except AmadeusRateLimitError as e:
+        logger.warning("Amadeus locations lookup skipped for keyword=%s: %s", k, e)
+        return []
+    except AmadeusError:
+        return []
+    except DeadlineExceeded:
+        logger.warning("Amadeus locations lookup skipped, request deadline exhausted (keyword=%s)", k)
+        return []
+    except httpx.TimeoutException:
+        logger.warning("Amadeus locations API timeout for keyword=%s", k)
+        return []
+    except httpx.HTTPError as e:
+        logger.warning("Amadeus locations API request failed: %s", e)
+        return []
+
+    if resp.status_code != 200:
+        if resp.status_code == 429:
+            logger.warning("Amadeus locations API rate limit (429)")
+        return []
+    try:
+        data = resp.json()
+    except Exception:
+        return []
+
+    results = cff._normalize_locations(data)
+    await cff.location_cache.aset(k, results)
+    return results[:limit]
+
+
+async def resolve_to_iata(query: str, deadline: Deadline | None = None) -> str | None:
+    """cheap_flight_finder.resolve_to_iata: local mapping first, then the Amadeus API."""
+    q = airport_data.normalize_input(query)
+    if not q:
+        return None
+    iata_local = airport_data.resolve_to_iata_local(q)
+    if iata_local:
+        return iata_local
+    api_results = await _search_amadeus_locations(q, limit=1, deadline=deadline)
+    if api_results:
+        return (api_results[0].get("iata_code") or "").upper() or None
+    # An unknown 3-letter code is passed through (Amadeus flight-offers accepts it)
+    return q.upper() if airport_data.looks_like_iata(q) else None
+
+
+async def resolve_pair(
+    origin_query: str,
+    destination_query: str,
+    deadline: Deadline | None = None,
+) -> tuple[str | None, str | None]:
+    """Both endpoints at once; lookups that need the API wait concurrently."""
+    origin_iata, destination_iata = await asyncio.gather(
+        resolve_to_iata(origin_query, deadline),
+        resolve_to_iata(destination_query, deadline),
+    )
+    return origin_iata, destination_iata
+
+
+async def search_locations(query: str, limit: int = 10) -> list[dict[str, Any]]:
+    q = airport_data.normalize_input(query)
+    if not q:
+        return []
+    out, complete = cff._local_locations(q, limit)
+    if complete:
+        return out
+    return cff._merge_locations(out, await _search_amadeus_locations(q, limit=limit - len(out)), limit)
+
+
+# ---- Search ----
+async def cached_search(
+    origin_iata: str,
+    destination_iata: str,
+    depart_date: str,
+    return_date: str | None,
+    currency: str,
+    adults: int,
+    source: str = "amadeus",
+    deadline: Deadline | None = None,
+    full: bool = False,
+) -> tuple[dict[str, Any], str]:
+    """cheap_flight_finder.cached_search with the upstream call awaited."""
+    key = make_search_key(origin_iata, destination_iata, depart_date, return_date, currency, adults, full=full)
+    max_items = cff.FULL_MAX_ITEMS if full else cff.SEARCH_MAX_ITEMS
+
+    async def fetch():
+        with priority(priority_for(source)):
+            payload = await get_offers(
+                origin=origin_iata, destination=destination_iata, depart_date=depart_date, currency=currency,
+                max_items=max_items, return_date=return_date, adults=adults, deadline=deadline,
+            )
+        return await sync_to_async(cff._process_offers)(
+            payload, origin_iata, destination_iata, depart_date, return_date, currency, source,
+        )
+
+    def refresh():
+        # Stale-entry refreshes run on the cache's background thread, like the sync path
+        with priority(priority_for("refresh")):
+            return cff._fetch_flights(
+                origin_iata, destination_iata, depart_date, return_date, currency, adults,
+                max_items=max_items, source="refresh",
+            )
+
+    wait = optional_timeout(deadline, search_cache.wait_timeout)
+    return await search_cache.aget_or_fetch(key, fetch, source=source, refresh=refresh, timeout=wait)
+
+
+async def cheap_flight_search_api(request):
+    """Async cheap_flight_finder.cheap_flight_search_api (same parameters and responses)."""
+    start_ms = time.time() * 1000
+    deadline = Deadline(float(getattr(settings, "CFF_SEARCH_DEADLINE", 25)))
+    q, errors = cff._parse_search_params(request)
+    if errors:
+        return cff._search_failure(q, deadline, start_ms, errors, 400)
+
+    with deadline.stage("resolve"):
+        origin_iata, destination_iata = await resolve_pair(q["origin_query"], q["destination_query"], deadline)
+    if not origin_iata or not destination_iata:
+        return cff._unresolved(q, deadline, start_ms, origin_iata, destination_iata)
+
+    try:
+        with deadline.stage("search"):
+            entry, cache_status = await cached_search(
+                origin_iata,
+                destination_iata,
+                q["depart_date"],
+                q["return_date"] if q["trip_type"] == "round_trip" else None,
+                q["currency"],
+                q["adults"],
+                deadline=deadline,
+                full=q["mode"] == "full",
+            )
+    except cff.SEARCH_ERRORS as e:
+        return cff._search_error_response(e, q, deadline, start_ms, (origin_iata, destination_iata))
+
+    # The price trend loads a route's history from the database on first use
+    return await sync_to_async(cff._search_response)(
+        q, origin_iata, destination_iata, entry, cache_status, deadline, start_ms,
+    )
+
+
+async def cheap_flight_locations_api(request):
+    """Async cheap_flight_finder.cheap_flight_locations_api."""
+    q, limit = cff._locations_params(request)
+    if len(q) < 2:
+        return cff._locations_response([])
+    return cff._locations_response(await search_locations(q, limit=limit))
+
+
+# ---- Google Places ----
+async def _places_search_text(query: str) -> dict | None:
+    if not query or not cff.GOOGLE_PLACES_API_KEY:
+        return None
+    try:
+        cff.places_breaker.before_call()
+    except CircuitOpen as e:
+        logger.warning("Places searchText skipped: %s", e)
+        return None
+    try:
+        resp = await async_http_client.post(
+            cff.PLACES_SEARCH_TEXT_URL,
+            headers=cff._places_headers(),
+            json={"textQuery": query},
+            timeout=10,
+            upstream="google_places",
+        )
+    except httpx.HTTPError as e:
+        cff.places_breaker.record(False, f"{type(e).__name__}: {e}")
+        raise
+    cff.places_breaker.record(resp.status_code < 500, f"HTTP {resp.status_code}")
+    if resp.status_code != 200:
+        logger.warning("Places searchText status=%s body=%s", resp.status_code, resp.text[:200])
+        return None
+    return resp.json()
+
+
+@require_GET
+async def place_photo_api(request):
+    """Async cheap_flight_finder.place_photo_api: image bytes or 204."""
+    query = (request.GET.get("query") or "").strip()
+    if not query or not cff.GOOGLE_PLACES_API_KEY:
+        return HttpResponse(status=204)
+
+    try:
+        url = cff._photo_media_url(await _places_search_text(query))
+        if not url:
+            return HttpResponse(status=204)
+        cff.places_breaker.before_call()
+        try:
+            img_resp = await async_http_client.get(
+                url,
+                params={"maxWidthPx": 800, "key": cff.GOOGLE_PLACES_API_KEY},
+                timeout=10,
+                follow_redirects=True,
+                upstream="google_places",
+            )
+        except httpx.HTTPError as e:
+            cff.places_breaker.record(False, f"{type(e).__name__}: {e}")
+            raise
+        cff.places_breaker.record(img_resp.status_code < 500, f"HTTP {img_resp.status_code}")
+        if img_resp.status_code != 200:
+            return HttpResponse(status=204)
+        ct = img_resp.headers.get("Content-Type") or "image/jpeg"
+        return HttpResponse(img_resp.content, content_type=ct)
+    except CircuitOpen:
+        return HttpResponse(status=204)
+    except Exception:
+        logger.exception("Place photo fetch failed for query=%s", query[:50])
+        return HttpResponse(status=204)
+
+
+@require_GET
+async def place_details_api(request):
+    """Async cheap_flight_finder.place_details_api."""
+    query = (request.GET.get("query") or "").strip()
+    if not query or not cff.GOOGLE_PLACES_API_KEY:
+        return JsonResponse({"success": False, "error": "Missing query or API key"}, status=400)
+
+    try:
+        return cff._place_details_response(query, await _places_search_text(query))
+    except Exception as e:
+        logger.exception("Place details failed for query=%s", query[:50])
+        return JsonResponse({"success": False, "error": str(e)}, status=500)
@@ -1,19 +1,37 @@
 # main/cheap_flight_finder.py
+import codecs
 import json
 import logging
 import os
+import random
+import threading
 import time
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 import requests
 from dotenv import load_dotenv
+from django.conf import settings
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
 from django.views.decorators.http import require_GET, require_http_methods, require_POST
 from django.views.decorators.csrf import ensure_csrf_cookie
 
-from main import airport_data
-from main.flight_normalizer import apply_badges, normalize_all_offers
+from main import airport_data, flight_results
+from main.amadeus_token import AmadeusTokenManager
+from main.circuit_breaker import CircuitOpen, amadeus_breaker, places_breaker
+from main.deadline import Deadline, DeadlineExceeded, optional_timeout
+from main.flight_cache import make_search_key, search_cache
+from main.flight_normalizer import Offer, parse_all_offers
+from main.flight_ranking import SORTS, rank_offers
+from main.http_client import TIMEOUT_ERRORS, TRANSPORT_ERRORS, http_client
+from main.json_stream import JsonArrayStream
+from main.location_cache import location_cache
+from main.price_history import cheapest, price_history
+from main.price_trend import price_trend
+from main.rate_limit import RateLimited, amadeus_limiter, priority, priority_for
+from main.singleflight import SingleFlightTimeout
 
 # Session key for flight context (auth redirect flow)
 CFF_SESSION_KEY = "cff_selected_flight"
@@ -26,46 +44,198 @@ logger = logging.getLogger(__name__)
 AMADEUS_CLIENT_ID = os.getenv("AMADEUS_CLIENT_ID")
 AMADEUS_CLIENT_SECRET = os.getenv("AMADEUS_CLIENT_SECRET")
 
-TOKEN_URL = "https://test.api.amadeus.com/v1/security/oauth2/token"
-OFFERS_URL = "https://test.api.amadeus.com/v2/shopping/flight-offers"
-LOCATIONS_URL = "https://test.api.amadeus.com/v1/reference-data/locations"
+# AMADEUS_BASE_URL / GOOGLE_PLACES_BASE_URL can point at a local stand-in (main/upstream_standin.py)
+AMADEUS_BASE_URL = getattr(settings, "AMADEUS_BASE_URL", "https://test.api.amadeus.com").rstrip("/")
+TOKEN_URL = f"{AMADEUS_BASE_URL}/v1/security/oauth2/token"
+OFFERS_URL = f"{AMADEUS_BASE_URL}/v2/shopping/flight-offers"
+LOCATIONS_URL = f"{AMADEUS_BASE_URL}/v1/reference-data/locations"
 
-# Cache for Amadeus location search (keyword -> (results, timestamp))
-_LOCATIONS_CACHE: dict[str, tuple[list[dict[str, Any]], float]] = {}
-_LOCATIONS_CACHE_TTL = 300  # seconds
 _MIN_KEYWORD_LEN = 2
+# Always fetch a full page so one cached entry serves every limit
+_LOCATIONS_PAGE_LIMIT = 20
+
+# Offers per search: the default top of the market, and mode=full (Amadeus maximum)
+SEARCH_MAX_ITEMS = 15
+FULL_MAX_ITEMS = 250
+# Summaries in a mode=full search response; the rest via the results API (view=summary)
+FULL_PAGE_SIZE = 50
 
 
 class AmadeusError(Exception):
     pass
 
 
-def get_access_token() -> str:
-    if not AMADEUS_CLIENT_ID or not AMADEUS_CLIENT_SECRET:
-        raise AmadeusError("AMADEUS_CLIENT_ID and AMADEUS_CLIENT_SECRET not set.")
+class AmadeusRateLimitError(AmadeusError):
+    """Amadeus answered 429, or the rate limiter had no call slot within the deadline."""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
 
+
+class AmadeusUnavailableError(AmadeusError):
+    """The Amadeus circuit breaker is open: failing fast instead of waiting out a timeout."""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _fetch_access_token() -> tuple[str, int | None]:
+    """POST client_credentials to the token endpoint. Returns (token, expires_in)."""
     data = {
         "grant_type": "client_credentials",
         "client_id": AMADEUS_CLIENT_ID,
         "client_secret": AMADEUS_CLIENT_SECRET,
     }
-    resp = requests.post(TOKEN_URL, data=data, timeout=15)
+    # Behind the same breaker as the API calls: an Amadeus outage usually takes the token endpoint too
+    try:
+        amadeus_breaker.before_call()
+    except CircuitOpen as e:
+        raise AmadeusUnavailableError(str(e), retry_after=e.retry_in) from e
+    try:
+        resp = http_client.post(TOKEN_URL, data=data, timeout=15, upstream="amadeus")
+    except Exception as e:
+        amadeus_breaker.record(False, f"{type(e).__name__}: {e}")
+        raise
+    amadeus_breaker.record(resp.status_code < 500, f"HTTP {resp.status_code}")
     if resp.status_code != 200:
         raise AmadeusError(f"Failed to get token: {resp.text}")
-    return resp.json().get("access_token")
+    body = resp.json()
+    token = body.get("access_token")
+    if not token:
+        raise AmadeusError("Failed to get token: empty access_token")
+    return token, body.get("expires_in")
 
 
-def get_offers(
+# Shared by every Amadeus caller in this process
+_TOKEN_MANAGER = AmadeusTokenManager(_fetch_access_token)
+
+
+def get_access_token() -> str:
+    if not AMADEUS_CLIENT_ID or not AMADEUS_CLIENT_SECRET:
+        raise AmadeusError("AMADEUS_CLIENT_ID and AMADEUS_CLIENT_SECRET not set.")
+    return _TOKEN_MANAGER.get_token()
+
+
+# Statuses worth retrying for an idempotent GET
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Never start a retry with less than this left on the deadline
+_MIN_ATTEMPT_S = 1.0
+
+
+def _retry_after(resp: requests.Response) -> float | None:
+    """Retry-After in seconds (delta-seconds or HTTP-date), None if absent or unparseable."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_delay(attempt: int, deadline: Deadline | None) -> float | None:
+    """Full-jitter exponential backoff before attempt + 1; None if the deadline has no room for it."""
+    base = float(getattr(settings, "CFF_AMADEUS_BACKOFF_S", 0.25))
+    delay = random.uniform(0, base * 2 ** attempt)
+    if deadline is not None and deadline.remaining() < delay + _MIN_ATTEMPT_S:
+        return None
+    return delay
+
+
+def _backoff(attempt: int, deadline: Deadline | None) -> bool:
+    delay = _backoff_delay(attempt, deadline)
+    if delay is None:
+        return False
+    time.sleep(delay)
+    return True
+
+
+def _penalty(resp: requests.Response, attempt: int) -> float:
+    """Seconds to block amadeus_limiter after a 429: its Retry-After, else the backoff step."""
+    retry_after = _retry_after(resp)
+    return retry_after if retry_after is not None else float(getattr(settings, "CFF_AMADEUS_BACKOFF_S", 0.25)) * 2 ** attempt
+
+
+def _amadeus_get(
+    url: str,
+    params: dict[str, Any],
+    cap: float,
+    deadline: Deadline | None = None,
+    stream: bool = False,
+) -> requests.Response:
+    """
+    GET an Amadeus endpoint through amadeus_limiter, at the caller's rate_limit.priority.
+    429 / 5xx / connection errors are retried up to CFF_AMADEUS_RETRIES times with jittered
+    backoff while the deadline leaves room; a 429 blocks the limiter for its Retry-After, so the
+    retry (and everyone else) waits that out. Returns the last response, whatever its status.
+    Raises AmadeusRateLimitError when no call slot is free in time, AmadeusUnavailableError while
+    amadeus_breaker is open, requests exceptions when the last attempt failed.
+    The breaker is only claimed (before_call) once the slot and the token are in hand, so a
+    half-open probe always goes out and records its outcome.
+    """
+    retries = max(0, int(getattr(settings, "CFF_AMADEUS_RETRIES", 2)))
+    for attempt in range(retries + 1):
+        try:
+            amadeus_breaker.check()
+            amadeus_limiter.acquire(deadline=deadline)
+            token = get_access_token()
+            timeout = optional_timeout(deadline, cap)
+            amadeus_breaker.before_call()
+        except CircuitOpen as e:
+            raise AmadeusUnavailableError(str(e), retry_after=e.retry_in) from e
+        except RateLimited as e:
+            raise AmadeusRateLimitError(str(e), retry_after=e.retry_after) from e
+        try:
+            resp = http_client.get(
+                url, headers={"Authorization": f"Bearer {token}"}, params=params,
+                timeout=timeout, stream=stream, upstream="amadeus", retries=0,
+            )
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            amadeus_breaker.record(False, f"{type(e).__name__}: {e}")
+            if attempt == retries or not _backoff(attempt, deadline):
+                raise
+            continue
+        except Exception as e:
+            amadeus_breaker.record(False, f"{type(e).__name__}: {e}")
+            raise
+        amadeus_breaker.record(resp.status_code < 500, f"HTTP {resp.status_code}")
+        if resp.status_code == 401:
+            _TOKEN_MANAGER.invalidate(token)
+        if resp.status_code not in _RETRY_STATUSES or attempt == retries:
+            return resp
+        if resp.status_code == 429:
+            amadeus_limiter.penalize(_penalty(resp, attempt))
+        elif not _backoff(attempt, deadline):
+            return resp
+        resp.close()
+    return resp
+
+
+def _raise_for_offers(resp: requests.Response) -> None:
+    if resp.status_code == 200:
+        return
+    text = resp.text
+    resp.close()
+    if resp.status_code == 429:
+        raise AmadeusRateLimitError(f"Failed to get offers: {text}", retry_after=_retry_after(resp))
+    raise AmadeusError(f"Failed to get offers: {text}")
+
+
+def _offers_params(
     origin: str,
     destination: str,
     depart_date: str,
     currency: str,
-    max_items: int = 10,
-    return_date: str | None = None,
-    adults: int = 1,
-) -> dict:
-    token = get_access_token()
-    headers = {"Authorization": f"Bearer {token}"}
+    max_items: int,
+    return_date: str | None,
+    adults: int,
+) -> dict[str, Any]:
     params: dict[str, Any] = {
         "originLocationCode": origin.upper().strip(),
         "destinationLocationCode": destination.upper().strip(),
@@ -76,12 +246,68 @@ def get_offers(
     }
     if return_date and return_date.strip():
         params["returnDate"] = return_date.strip()
-    resp = requests.get(OFFERS_URL, headers=headers, params=params, timeout=20)
-    if resp.status_code != 200:
-        raise AmadeusError(f"Failed to get offers: {resp.text}")
+    return params
+
+
+def get_offers(
+    origin: str,
+    destination: str,
+    depart_date: str,
+    currency: str,
+    max_items: int = 10,
+    return_date: str | None = None,
+    adults: int = 1,
+    deadline: Deadline | None = None,
+) -> dict:
+    params = _offers_params(origin, destination, depart_date, currency, max_items, return_date, adults)
+    resp = _amadeus_get(OFFERS_URL, params, 20, deadline=deadline)
+    _raise_for_offers(resp)
     return resp.json()
 
 
+class OffersStream:
+    """
+    Raw offers in arrival order while the Amadeus response downloads.
+    After iteration, .payload is the whole response (dictionaries included).
+    With a deadline, a body still downloading when it runs out raises DeadlineExceeded.
+    """
+
+    def __init__(self, resp: requests.Response, deadline: Deadline | None = None):
+        self._resp = resp
+        self._deadline = deadline
+        self.payload: dict[str, Any] = {}
+
+    def __iter__(self):
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        parser = JsonArrayStream("data")
+        try:
+            for chunk in self._resp.iter_content(chunk_size=8192):
+                if self._deadline is not None and self._deadline.expired():
+                    raise DeadlineExceeded(f"Request budget of {self._deadline.budget_s}s exhausted mid-body")
+                yield from parser.feed(decoder.decode(chunk))
+            parser.feed(decoder.decode(b"", final=True))
+        finally:
+            self._resp.close()
+        self.payload = json.loads(parser.text or "{}")
+
+
+def open_offers_stream(
+    origin: str,
+    destination: str,
+    depart_date: str,
+    currency: str,
+    max_items: int = 10,
+    return_date: str | None = None,
+    adults: int = 1,
+    deadline: Deadline | None = None,
+) -> OffersStream:
+    """Like get_offers, but returns as soon as the headers are in; iterate for offers."""
+    params = _offers_params(origin, destination, depart_date, currency, max_items, return_date, adults)
+    resp = _amadeus_get(OFFERS_URL, params, 20, deadline=deadline, stream=True)
+    _raise_for_offers(resp)
+    return OffersStream(resp, deadline)
+
+
 def _fmt_time(iso_str: str) -> str:
     """
     ISO datetime (YYYY-MM-DDTHH:MM:SS) dəyərini sadə HH:MM formatına çevirir.
@@ -142,35 +368,39 @@ def pick_cheapest(offers: dict) -> dict | None:
 
 
 # ---- Location Resolver (city/airport/IATA) ----
-def _search_amadeus_locations(keyword: str, limit: int = 10) -> list[dict[str, Any]]:
+def _search_amadeus_locations(
+    keyword: str,
+    limit: int = 10,
+    deadline: Deadline | None = None,
+) -> list[dict[str, Any]]:
     """
     Call Amadeus Airport & City Search API.
-    Cached by keyword. Returns list of normalized location dicts.
+    Cached by keyword (location_cache, including empty results). Returns list of normalized location dicts.
+    Best effort: returns [] on errors or when the deadline has run out.
     """
     k = (keyword or "").strip().upper()
     if len(k) < _MIN_KEYWORD_LEN:
         return []
 
-    # Check cache
-    now = time.time()
-    if k in _LOCATIONS_CACHE:
-        cached_results, ts = _LOCATIONS_CACHE[k]
-        if now - ts < _LOCATIONS_CACHE_TTL:
-            return cached_results[:limit]
+    cached_results = location_cache.get(k)
+    if cached_results is not None:
+        return cached_results[:limit]
 
-    try:
-        token = get_access_token()
-    except AmadeusError:
-        return []
-
-    headers = {"Authorization": f"Bearer {token}"}
     params = {
         "subType": "AIRPORT,CITY",
         "keyword": k,
-        "page[limit]": min(limit, 20),
+        "page[limit]": _LOCATIONS_PAGE_LIMIT,
     }
     try:
-        resp = requests.get(LOCATIONS_URL, headers=headers, params=params, timeout=10)
+        resp = _amadeus_get(LOCATIONS_URL, params, 10, deadline=deadline)
+    except AmadeusRateLimitError as e:
+        logger.warning("Amadeus locations lookup skipped for keyword=%s: %s", k, e)
+        return []
+    except AmadeusError:
+        return []
+    except DeadlineExceeded:
+        logger.warning("Amadeus locations lookup skipped, request deadline exhausted (keyword=%s)", k)
+        return []
     except requests.exceptions.Timeout:
         logger.warning("Amadeus locations API timeout for keyword=%s", k)
         return []
@@ -188,6 +418,13 @@ def _search_amadeus_locations(keyword: str, limit: int = 10) -> list[dict[str, A
     except Exception:
         return []
 
+    results = _normalize_locations(data)
+    location_cache.set(k, results)
+    return results[:limit]
+
+
+def _normalize_locations(data: dict[str, Any]) -> list[dict[str, Any]]:
+    """Amadeus locations response -> location dicts, deduplicated by IATA."""
     raw = data.get("data") or []
     results: list[dict[str, Any]] = []
     seen_iata: set[str] = set()
@@ -211,14 +448,12 @@ def _search_amadeus_locations(keyword: str, limit: int = 10) -> list[dict[str, A
             "country_code": country,
             "source": "api",
         })
-        if len(results) >= limit:
+        if len(results) >= _LOCATIONS_PAGE_LIMIT:
             break
-
-    _LOCATIONS_CACHE[k] = (results, now)
     return results
 
 
-def resolve_to_iata(query: str) -> str | None:
+def resolve_to_iata(query: str, deadline: Deadline | None = None) -> str | None:
     """
     Resolve user input (city, airport name, or IATA) to a single IATA code.
     Fallback order: normalize -> 3-letter IATA check -> local mapping -> Amadeus API.
@@ -234,7 +469,7 @@ def resolve_to_iata(query: str) -> str | None:
         if iata_local:
             return iata_local
         # Might be valid IATA not in our list; try Amadeus to validate
-        api_results = _search_amadeus_locations(q, limit=1)
+        api_results = _search_amadeus_locations(q, limit=1, deadline=deadline)
         if api_results:
             return (api_results[0].get("iata_code") or "").upper() or None
         # Return as-is if 3 letters (Amadeus flight-offers accepts it)
@@ -246,13 +481,49 @@ def resolve_to_iata(query: str) -> str | None:
         return iata_local
 
     # 3) Amadeus API
-    api_results = _search_amadeus_locations(q, limit=1)
+    api_results = _search_amadeus_locations(q, limit=1, deadline=deadline)
     if api_results:
         return (api_results[0].get("iata_code") or "").upper() or None
 
     return None
 
 
+_resolve_executor: ThreadPoolExecutor | None = None
+_resolve_executor_lock = threading.Lock()
+
+
+def _get_resolve_executor() -> ThreadPoolExecutor:
+    global _resolve_executor
+    if _resolve_executor is None:
+        with _resolve_executor_lock:
+            if _resolve_executor is None:
+                _resolve_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="cff-resolve")
+    return _resolve_executor
+
+
+def resolve_pair(
+    origin_query: str,
+    destination_query: str,
+    deadline: Deadline | None = None,
+) -> tuple[str | None, str | None]:
+    """
+    resolve_to_iata for both endpoints. When either needs the Amadeus API, the two run
+    concurrently, so the slower lookup sets the wait instead of the sum of both.
+    """
+    origin_local = airport_data.resolve_to_iata_local(origin_query)
+    destination_local = airport_data.resolve_to_iata_local(destination_query)
+    if origin_local and destination_local:
+        return origin_local, destination_local
+    if origin_local:
+        return origin_local, resolve_to_iata(destination_query, deadline)
+    if destination_local:
+        return resolve_to_iata(origin_query, deadline), destination_local
+
+    origin_future = _get_resolve_executor().submit(resolve_to_iata, origin_query, deadline)
+    destination_iata = resolve_to_iata(destination_query, deadline)
+    return origin_future.result(), destination_iata
+
+
 def search_locations(query: str, limit: int = 10) -> list[dict[str, Any]]:
     """
     Search locations for autocomplete.
@@ -263,18 +534,30 @@ def search_locations(query: str, limit: int = 10) -> list[dict[str, Any]]:
     if not q:
         return []
 
-    # Local first
-    local_results = airport_data.search_local(q, limit=limit)
-    seen = {r.get("iata_code") for r in local_results if r.get("iata_code")}
-    out: list[dict[str, Any]] = []
-    for r in local_results:
-        out.append({**r, "source": r.get("source") or "local"})
-
-    if len(out) >= limit:
-        return out[:limit]
-
-    # Amadeus for more
-    api_results = _search_amadeus_locations(q, limit=limit - len(out))
+    out, complete = _local_locations(q, limit)
+    if complete:
+        return out
+    return _merge_locations(out, _search_amadeus_locations(q, limit=limit - len(out)), limit)
+
+
+def _local_locations(q: str, limit: int) -> tuple[list[dict[str, Any]], bool]:
+    """(local matches, complete): complete when the Amadeus lookup should be skipped."""
+    # Local first; fuzzy (typo / native spelling) matches only when nothing matched as typed
+    local_results = airport_data.search_local(q, limit=limit, fuzzy=False)
+    fuzzy = False
+    if not local_results:
+        local_results = airport_data.search_fuzzy(q, limit=limit)
+        fuzzy = bool(local_results)
+    out = [{**r, "source": r.get("source") or "local"} for r in local_results]
+    # Amadeus matches keywords as substrings, so a misspelt or native keyword would come back empty
+    if len(out) >= limit or fuzzy or airport_data.alias_iatas(q):
+        return out[:limit], True
+    return out, False
+
+
+def _merge_locations(out: list[dict[str, Any]], api_results: list[dict[str, Any]], limit: int) -> list[dict[str, Any]]:
+    """Local matches plus Amadeus ones, deduplicated by IATA."""
+    seen = {r.get("iata_code") for r in out if r.get("iata_code")}
     for r in api_results:
         code = r.get("iata_code")
         if code and code not in seen:
@@ -282,27 +565,19 @@ def search_locations(query: str, limit: int = 10) -> list[dict[str, Any]]:
             out.append(r)
             if len(out) >= limit:
                 break
-
     return out[:limit]
 
 
-def cheap_flight_locations_api(request):
-    """
-    JSON API for location autocomplete.
-    GET params: q (min 2 chars), limit? (default 10)
-    """
+def _locations_params(request) -> tuple[str, int]:
     q = (request.GET.get("q") or "").strip()
     try:
         limit = max(1, min(20, int(request.GET.get("limit") or 10)))
     except (ValueError, TypeError):
         limit = 10
+    return q, limit
 
-    if len(q) < 2:
-        return JsonResponse(
-            {"success": True, "data": [], "errors": []},
-        )
 
-    results = search_locations(q, limit=limit)
+def _locations_response(results: list[dict[str, Any]]) -> JsonResponse:
     # Ensure label format: "City (IATA)" or "Airport (IATA)"
     out = []
     for r in results:
@@ -325,18 +600,32 @@ def cheap_flight_locations_api(request):
     )
 
 
-def _deduplicate_flights(flights: list[dict[str, Any]]) -> list[dict[str, Any]]:
+def cheap_flight_locations_api(request):
+    """
+    JSON API for location autocomplete.
+    GET params: q (min 2 chars), limit? (default 10)
+    """
+    q, limit = _locations_params(request)
+    if len(q) < 2:
+        return _locations_response([])
+    return _locations_response(search_locations(q, limit=limit))
+
+
+def _dedupe_key(f: Offer) -> tuple[str, str, float]:
+    route = f.route_display or f"{f.departure_iata}-{f.arrival_iata}"
+    dep = f.departure_datetime or ""
+    return (route, dep[:19] if dep else "", round(float(f.price or 0), 2))
+
+
+def _deduplicate_flights(flights: list[Offer]) -> list[Offer]:
     """
     Remove duplicates: same route, same departure datetime, same price.
     Keeps first occurrence.
     """
     seen: set[tuple[str, str, float]] = set()
-    out: list[dict[str, Any]] = []
+    out: list[Offer] = []
     for f in flights:
-        route = f.get("route_display") or f"{f.get('departure_iata')}-{f.get('arrival_iata')}"
-        dep = f.get("departure_datetime") or ""
-        price = float(f.get("price") or 0)
-        key = (route, dep[:19] if dep else "", round(price, 2))
+        key = _dedupe_key(f)
         if key in seen:
             continue
         seen.add(key)
@@ -344,30 +633,152 @@ def _deduplicate_flights(flights: list[dict[str, Any]]) -> list[dict[str, Any]]:
     return out
 
 
-def cheap_flight_search_api(request):
+def _fetch_flights(
+    origin_iata: str,
+    destination_iata: str,
+    depart_date: str,
+    return_date: str | None,
+    currency: str,
+    adults: int,
+    max_items: int = SEARCH_MAX_ITEMS,
+    deadline: Deadline | None = None,
+    source: str = "amadeus",
+) -> tuple[list[Offer], int]:
     """
-    JSON API for flight search. Returns normalized flights, filter-ready.
-    GET params: origin, destination, depart_date, return_date?, currency?, trip_type?, adults?
+    Live Amadeus search -> compact, deduplicated offers (serialized with to_dict() on the way out).
+    Returns (flights, raw_offer_count). Raises AmadeusError / requests exceptions / DeadlineExceeded.
+    source: who searched, as recorded in price history.
     """
-    start_ms = time.time() * 1000
-    errors: list[str] = []
-    warnings: list[str] = []
+    payload = get_offers(
+        origin=origin_iata,
+        destination=destination_iata,
+        depart_date=depart_date,
+        currency=currency,
+        max_items=max_items,
+        return_date=return_date,
+        adults=adults,
+        deadline=deadline,
+    )
+    return _process_offers(payload, origin_iata, destination_iata, depart_date, return_date, currency, source)
 
-    origin_query = (request.GET.get("origin") or "").strip()
-    destination_query = (request.GET.get("destination") or "").strip()
-    depart_date = (request.GET.get("depart_date") or "").strip()
-    return_date = (request.GET.get("return_date") or "").strip()
-    currency = (request.GET.get("currency") or "USD").upper().strip()
-    trip_type = (request.GET.get("trip_type") or "one_way").strip().lower()
+
+def _process_offers(
+    payload: dict[str, Any],
+    origin_iata: str,
+    destination_iata: str,
+    depart_date: str,
+    return_date: str | None,
+    currency: str,
+    source: str = "amadeus",
+) -> tuple[list[Offer], int]:
+    """Offers response -> (deduplicated offers, raw count); records price history (may hit the database)."""
+    raw_data = payload.get("data") or []
+    if not raw_data:
+        return [], 0
+    flights = parse_all_offers(
+        payload,
+        reference_depart_date=depart_date,
+        include_raw=False,
+    )
+    flights = _deduplicate_flights(flights)
+    price_history.record(origin_iata, destination_iata, depart_date, return_date, currency, flights, source=source)
+    return flights, len(raw_data)
+
+
+def cached_search(
+    origin_iata: str,
+    destination_iata: str,
+    depart_date: str,
+    return_date: str | None,
+    currency: str,
+    adults: int,
+    source: str = "amadeus",
+    deadline: Deadline | None = None,
+    full: bool = False,
+) -> tuple[dict[str, Any], str]:
+    """
+    Normalized flights for one search key, served from search_cache when possible.
+    Returns (cache entry, status) where status is "hit" | "stale" | "miss" | "coalesced".
+    Identical concurrent searches share one upstream call. With a deadline, both the
+    upstream call and the wait for someone else's call are bounded by it.
+    full: fetch FULL_MAX_ITEMS offers (cached under their own key).
+    Upstream calls for background sources (rate_limit.LOW_PRIORITY_SOURCES) queue behind user traffic.
+    """
+    key = make_search_key(origin_iata, destination_iata, depart_date, return_date, currency, adults, full=full)
+    max_items = FULL_MAX_ITEMS if full else SEARCH_MAX_ITEMS
+
+    def fetch():
+        with priority(priority_for(source)):
+            return _fetch_flights(
+                origin_iata, destination_iata, depart_date, return_date, currency, adults,
+                max_items=max_items, deadline=deadline, source=source,
+            )
+
+    def refresh():
+        # Background refreshes outlive the request, so they keep the default timeouts
+        with priority(priority_for("refresh")):
+            return _fetch_flights(
+                origin_iata, destination_iata, depart_date, return_date, currency, adults,
+                max_items=max_items, source="refresh",
+            )
+
+    wait = optional_timeout(deadline, search_cache.wait_timeout)
+    return search_cache.get_or_fetch(key, fetch, source=source, refresh=refresh, timeout=wait)
+
+
+def refresh_search(
+    origin_iata: str,
+    destination_iata: str,
+    depart_date: str,
+    return_date: str | None,
+    currency: str,
+    adults: int,
+    source: str = "refresh",
+    deadline: Deadline | None = None,
+    full: bool = False,
+) -> dict[str, Any]:
+    """
+    Refetch one search-cache entry whatever its age (cache warmers, price watches) and return it.
+    A fetch already in flight for the key is joined instead of repeated. Raises like cached_search.
+    full: the mode=full entry (FULL_MAX_ITEMS offers), as in cached_search.
+    """
+    key = make_search_key(origin_iata, destination_iata, depart_date, return_date, currency, adults, full=full)
+    max_items = FULL_MAX_ITEMS if full else SEARCH_MAX_ITEMS
+
+    def fetch():
+        with priority(priority_for(source)):
+            return _fetch_flights(
+                origin_iata, destination_iata, depart_date, return_date, currency, adults,
+                max_items=max_items, deadline=deadline, source=source,
+            )
+
+    wait = optional_timeout(deadline, search_cache.wait_timeout)
+    entry, _ = search_cache.inflight.do(key, lambda: search_cache.refresh(key, fetch, source=source), timeout=wait)
+    return entry
+
+
+def _parse_search_params(request) -> tuple[dict[str, Any], list[str]]:
+    """Search API query params (normalized) and validation errors."""
+    q: dict[str, Any] = {
+        "origin_query": (request.GET.get("origin") or "").strip(),
+        "destination_query": (request.GET.get("destination") or "").strip(),
+        "depart_date": (request.GET.get("depart_date") or "").strip(),
+        "return_date": (request.GET.get("return_date") or "").strip(),
+        "currency": (request.GET.get("currency") or "USD").upper().strip(),
+        "trip_type": (request.GET.get("trip_type") or "one_way").strip().lower(),
+        "sort": (request.GET.get("sort") or "best").strip().lower(),
+        "mode": (request.GET.get("mode") or "top").strip().lower(),
+    }
     try:
-        adults = max(1, min(9, int(request.GET.get("adults") or 1)))
+        q["adults"] = max(1, min(9, int(request.GET.get("adults") or 1)))
     except (ValueError, TypeError):
-        adults = 1
+        q["adults"] = 1
+    depart_date, return_date, trip_type = q["depart_date"], q["return_date"], q["trip_type"]
 
-    # Validation
-    if not origin_query:
+    errors: list[str] = []
+    if not q["origin_query"]:
         errors.append("invalid origin")
-    if not destination_query:
+    if not q["destination_query"]:
         errors.append("invalid destination")
     if not depart_date:
         errors.append("missing date")
@@ -375,6 +786,10 @@ def cheap_flight_search_api(request):
         errors.append("invalid depart_date format (use YYYY-MM-DD)")
     if trip_type == "round_trip" and not return_date:
         errors.append("return_date required for round trip")
+    if q["sort"] not in SORTS:
+        errors.append("invalid sort (use best, price or duration)")
+    if q["mode"] not in ("top", "full"):
+        errors.append("invalid mode (use top or full)")
 
     # Date validation: return must be >= departure for round trip
     if trip_type == "round_trip" and depart_date and return_date and len(depart_date) >= 10 and len(return_date) >= 10:
@@ -387,170 +802,105 @@ def cheap_flight_search_api(request):
                 errors.append("return_date cannot be before depart_date")
         except (ValueError, TypeError):
             pass
+    return q, errors
 
-    if errors:
-        return JsonResponse(
-            {
-                "success": False,
-                "meta": {
-                    "origin_query": origin_query,
-                    "destination_query": destination_query,
-                    "trip_type": trip_type,
-                    "currency": currency,
-                    "result_count": 0,
-                    "search_time_ms": round((time.time() * 1000) - start_ms, 0),
-                },
-                "data": [],
-                "warnings": [],
-                "errors": errors,
-            },
-            status=400,
-        )
 
-    # Resolve origin/destination
-    origin_iata = resolve_to_iata(origin_query)
-    destination_iata = resolve_to_iata(destination_query)
+def did_you_mean(query: str, limit: int = 3) -> list[dict[str, Any]]:
+    """Close spellings of a query that resolved to nothing (never used to pick an airport)."""
+    return [
+        {k: r.get(k) for k in ("iata_code", "city_name", "airport_name", "country_code")}
+        for r in airport_data.search_fuzzy(query, limit=limit)
+    ]
 
-    if not origin_iata:
-        return JsonResponse(
-            {
-                "success": False,
-                "meta": {
-                    "origin_query": origin_query,
-                    "destination_query": destination_query,
-                    "origin_iata": None,
-                    "destination_iata": destination_iata,
-                    "trip_type": trip_type,
-                    "currency": currency,
-                    "result_count": 0,
-                    "search_time_ms": round((time.time() * 1000) - start_ms, 0),
-                },
-                "data": [],
-                "warnings": [],
-                "errors": ["invalid origin"],
-            },
-            status=400,
-        )
 
-    if not destination_iata:
-        return JsonResponse(
-            {
-                "success": False,
-                "meta": {
-                    "origin_query": origin_query,
-                    "destination_query": destination_query,
-                    "origin_iata": origin_iata,
-                    "destination_iata": None,
-                    "trip_type": trip_type,
-                    "currency": currency,
-                    "result_count": 0,
-                    "search_time_ms": round((time.time() * 1000) - start_ms, 0),
-                },
-                "data": [],
-                "warnings": [],
-                "errors": ["invalid destination"],
-            },
-            status=400,
-        )
-
-    # Amadeus call
-    try:
-        rd = return_date if trip_type == "round_trip" else None
-        payload = get_offers(
-            origin=origin_iata,
-            destination=destination_iata,
-            depart_date=depart_date,
-            currency=currency,
-            max_items=15,
-            return_date=rd,
-            adults=adults,
-        )
-    except AmadeusError as e:
-        err_str = str(e).lower()
-        if "429" in err_str or "rate" in err_str or "quota" in err_str:
-            return JsonResponse(
-                {
-                    "success": False,
-                    "meta": {
-                        "origin_query": origin_query,
-                        "destination_query": destination_query,
-                        "origin_iata": origin_iata,
-                        "destination_iata": destination_iata,
-                        "trip_type": trip_type,
-                        "currency": currency,
-                        "result_count": 0,
-                        "search_time_ms": round((time.time() * 1000) - start_ms, 0),
-                    },
-                    "data": [],
-                    "warnings": [],
-                    "errors": ["rate limited"],
-                },
-                status=429,
-            )
-        return JsonResponse(
-            {
-                "success": False,
-                "meta": {
-                    "origin_query": origin_query,
-                    "destination_query": destination_query,
-                    "origin_iata": origin_iata,
-                    "destination_iata": destination_iata,
-                    "trip_type": trip_type,
-                    "currency": currency,
-                    "result_count": 0,
-                    "search_time_ms": round((time.time() * 1000) - start_ms, 0),
-                },
-                "data": [],
-                "warnings": [],
-                "errors": ["api temporarily unavailable"],
-            },
-            status=503,
-        )
-    except requests.exceptions.Timeout:
-        return JsonResponse(
-            {
-                "success": False,
-                "meta": {
-                    "origin_query": origin_query,
-                    "destination_query": destination_query,
-                    "origin_iata": origin_iata,
-                    "destination_iata": destination_iata,
-                    "trip_type": trip_type,
-                    "currency": currency,
-                    "result_count": 0,
-                    "search_time_ms": round((time.time() * 1000) - start_ms, 0),
-                },
-                "data": [],
-                "warnings": [],
-                "errors": ["api temporarily unavailable"],
-            },
-            status=503,
-        )
-    except (requests.exceptions.RequestException, ValueError) as e:
+def _unresolved(
+    q: dict[str, Any], deadline: Deadline, start_ms: float, origin_iata: str | None, destination_iata: str | None,
+) -> JsonResponse:
+    """400 for an origin or destination that resolved to nothing, with "did you mean" suggestions."""
+    if not origin_iata:
+        return _search_failure(q, deadline, start_ms, ["invalid origin"], 400, (None, destination_iata),
+                               suggestions=did_you_mean(q["origin_query"]))
+    return _search_failure(q, deadline, start_ms, ["invalid destination"], 400, (origin_iata, None),
+                           suggestions=did_you_mean(q["destination_query"]))
+
+
+def _search_failure(
+    q: dict[str, Any],
+    deadline: Deadline,
+    start_ms: float,
+    errors: list[str],
+    status: int,
+    iatas: tuple[str | None, str | None] | None = None,
+    retry_after: float | None = None,
+    suggestions: list[dict[str, Any]] | None = None,
+) -> JsonResponse:
+    """
+    Error response of the search API; iatas adds origin_iata / destination_iata to meta,
+    suggestions ("did you mean") the locations a misspelt origin or destination may be.
+    """
+    meta: dict[str, Any] = {
+        "origin_query": q["origin_query"],
+        "destination_query": q["destination_query"],
+    }
+    if iatas is not None:
+        meta["origin_iata"], meta["destination_iata"] = iatas
+    meta.update({
+        "trip_type": q["trip_type"],
+        "currency": q["currency"],
+        "result_count": 0,
+        "search_time_ms": round((time.time() * 1000) - start_ms, 0),
+        "timings_ms": deadline.timings(),
+    })
+    body: dict[str, Any] = {"success": False, "meta": meta, "data": [], "warnings": [], "errors": errors}
+    if suggestions:
+        body["suggestions"] = suggestions
+    resp = JsonResponse(body, status=status)
+    if retry_after:
+        resp["Retry-After"] = str(max(1, round(retry_after)))
+    return resp
+
+
+def _search_error_response(
+    e: Exception,
+    q: dict[str, Any],
+    deadline: Deadline,
+    start_ms: float,
+    iatas: tuple[str | None, str | None],
+) -> JsonResponse:
+    """429 / 503 for an exception from cached_search (or its async twin)."""
+    if isinstance(e, AmadeusRateLimitError):
+        return _search_failure(q, deadline, start_ms, ["rate limited"], 429, iatas, retry_after=e.retry_after)
+    if isinstance(e, AmadeusUnavailableError):
+        return _search_failure(q, deadline, start_ms, ["api temporarily unavailable"], 503, iatas,
+                               retry_after=e.retry_after)
+    if not isinstance(e, (AmadeusError, SingleFlightTimeout, DeadlineExceeded) + TIMEOUT_ERRORS):
         logger.exception("Flight search API error: %s", e)
-        return JsonResponse(
-            {
-                "success": False,
-                "meta": {
-                    "origin_query": origin_query,
-                    "destination_query": destination_query,
-                    "origin_iata": origin_iata,
-                    "destination_iata": destination_iata,
-                    "trip_type": trip_type,
-                    "currency": currency,
-                    "result_count": 0,
-                    "search_time_ms": round((time.time() * 1000) - start_ms, 0),
-                },
-                "data": [],
-                "warnings": [],
-                "errors": ["api temporarily unavailable"],
-            },
-            status=503,
-        )
+    return _search_failure(q, deadline, start_ms, ["api temporarily unavailable"], 503, iatas)
+
+
+# Exceptions a search turns into an error response instead of a 500
+SEARCH_ERRORS = (AmadeusError, SingleFlightTimeout, DeadlineExceeded, ValueError) + TRANSPORT_ERRORS
+
+
+def _search_response(
+    q: dict[str, Any],
+    origin_iata: str,
+    destination_iata: str,
+    entry: dict[str, Any],
+    cache_status: str,
+    deadline: Deadline,
+    start_ms: float,
+) -> JsonResponse:
+    """Success response of the search API for a cached_search result."""
+    origin_query, destination_query = q["origin_query"], q["destination_query"]
+    depart_date, return_date, trip_type = q["depart_date"], q["return_date"], q["trip_type"]
+    currency, sort, mode = q["currency"], q["sort"], q["mode"]
+    rd = return_date if trip_type == "round_trip" else None
+    warnings: list[str] = []
 
-    # Normalize
-    raw_data = payload.get("data") or []
-    if not raw_data:
+    cache_meta = search_cache.meta(entry, cache_status)
+    raw_count = entry.get("raw_count") or 0
+    if not raw_count:
         search_ms = round((time.time() * 1000) - start_ms, 0)
         return JsonResponse(
             {
@@ -564,6 +914,8 @@ def cheap_flight_search_api(request):
                     "currency": currency,
                     "result_count": 0,
                     "search_time_ms": search_ms,
+                    "timings_ms": deadline.timings(),
+                    "cache": cache_meta,
                 },
                 "data": [],
                 "warnings": warnings,
@@ -571,19 +923,30 @@ def cheap_flight_search_api(request):
             },
         )
 
-    flights = normalize_all_offers(
-        payload,
-        reference_depart_date=depart_date,
-        include_raw=False,
+    # Ranking over all cached offers; only the offers returned are serialized
+    offers: list[Offer] = entry.get("flights") or []
+    search_key = make_search_key(origin_iata, destination_iata, depart_date, rd, currency, q["adults"],
+                                 full=mode == "full")
+    if mode == "full":
+        # Summaries only (smaller responses); cheap_flight_offer_api serves one offer in full
+        index = flight_results.result_index(search_key, entry)
+        flights = index.rows(index.ranking(sort).order[:FULL_PAGE_SIZE], summary=True)
+    else:
+        ranking = rank_offers(offers, sort)
+        flights = [
+            {**offers[i].to_dict(), "badges": ranking.badges[i], "score": ranking.scores[i],
+             "pareto": ranking.pareto[i]}
+            for i in ranking.order[:10]
+        ]
+        if raw_count > 10:
+            warnings.append("Some results may be limited due to API constraints.")
+
+    best = cheapest(offers)
+    trend = (
+        price_trend.assess(origin_iata, destination_iata, best.currency or currency, rd is not None,
+                           depart_date, best.price)
+        if best is not None else None
     )
-    flights = _deduplicate_flights(flights)
-    flights = apply_badges(flights)
-    flights.sort(key=lambda x: (float(x.get("price") or 0), x.get("total_minutes") or 0))
-    flights = flights[:10]
-
-    if len(raw_data) > 10:
-        warnings.append("Some results may be limited due to API constraints.")
-
     search_ms = round((time.time() * 1000) - start_ms, 0)
 
     # Resolve destination to city name and country
@@ -610,9 +973,16 @@ def cheap_flight_search_api(request):
                 "depart_date": depart_date,
                 "return_date": return_date,
                 "trip_type": trip_type,
+                "sort": sort,
                 "currency": currency,
                 "result_count": len(flights),
+                "total_count": len(offers),
+                "mode": mode,
+                "price_trend": trend,
+                "search_id": flight_results.register(search_key),
                 "search_time_ms": search_ms,
+                "timings_ms": deadline.timings(),
+                "cache": cache_meta,
             },
             "data": flights,
             "warnings": warnings,
@@ -621,6 +991,48 @@ def cheap_flight_search_api(request):
     )
 
 
+def cheap_flight_search_api(request):
+    """
+    JSON API for flight search. Returns normalized flights, filter-ready.
+    GET params: origin, destination, depart_date, return_date?, currency?, trip_type?, adults?,
+    sort? (best | price | duration, see flight_ranking), mode? (top | full).
+    mode=full fetches FULL_MAX_ITEMS offers once and returns the first FULL_PAGE_SIZE as summaries.
+    meta.search_id refines the cached result set via cheap_flight_results_api; cheap_flight_offer_api
+    expands one offer.
+    All upstream calls share one CFF_SEARCH_DEADLINE budget; meta.timings_ms has per-stage times.
+    The async twin (same responses, upstream I/O without threads) is cheap_flight_async.
+    """
+    start_ms = time.time() * 1000
+    deadline = Deadline(float(getattr(settings, "CFF_SEARCH_DEADLINE", 25)))
+    q, errors = _parse_search_params(request)
+    if errors:
+        return _search_failure(q, deadline, start_ms, errors, 400)
+
+    # Resolve origin/destination (concurrently when the API is needed)
+    with deadline.stage("resolve"):
+        origin_iata, destination_iata = resolve_pair(q["origin_query"], q["destination_query"], deadline)
+    if not origin_iata or not destination_iata:
+        return _unresolved(q, deadline, start_ms, origin_iata, destination_iata)
+
+    # Amadeus call (through the search cache)
+    try:
+        with deadline.stage("search"):
+            entry, cache_status = cached_search(
+                origin_iata,
+                destination_iata,
+                q["depart_date"],
+                q["return_date"] if q["trip_type"] == "round_trip" else None,
+                q["currency"],
+                q["adults"],
+                deadline=deadline,
+                full=q["mode"] == "full",
+            )
+    except SEARCH_ERRORS as e:
+        return _search_error_response(e, q, deadline, start_ms, (origin_iata, destination_iata))
+
+    return _search_response(q, origin_iata, destination_iata, entry, cache_status, deadline, start_ms)
+
+
 # ---- API: store / restore flight context (auth flow) ----
 def _flight_context_valid(ts: float) -> bool:
     return ts and (time.time() - float(ts)) < CFF_SESSION_MAX_AGE
@@ -780,12 +1192,13 @@ def city_guide_api(request):
             {"success": False, "error": result.get("error", "City guide unavailable")},
             status=400 if result.get("error") else 500,
         )
-    return JsonResponse({"success": True, "data": result.get("data", {})})
+    return JsonResponse({"success": True, "data": result.get("data", {}), "stale": bool(result.get("stale"))})
 
 
 GOOGLE_PLACES_API_KEY = os.getenv("GOOGLE_PLACES_API_KEY")
 # Places API (New) - legacy API returns REQUEST_DENIED for new projects
-PLACES_SEARCH_TEXT_URL = "https://places.googleapis.com/v1/places:searchText"
+GOOGLE_PLACES_BASE_URL = getattr(settings, "GOOGLE_PLACES_BASE_URL", "https://places.googleapis.com").rstrip("/")
+PLACES_SEARCH_TEXT_URL = f"{GOOGLE_PLACES_BASE_URL}/v1/places:searchText"
 _FIELD_MASK = "places.id,places.displayName,places.rating,places.userRatingCount,places.priceLevel,places.priceRange,places.formattedAddress,places.photos,places.googleMapsUri"
 
 _PRICE_MAP = {
@@ -796,27 +1209,60 @@ _PRICE_MAP = {
 }
 
 
-def _places_search_text(query: str) -> dict | None:
-    """Call Places API (New) text search. Returns JSON or None."""
-    if not query or not GOOGLE_PLACES_API_KEY:
-        return None
-    headers = {
+def _places_headers() -> dict[str, str]:
+    return {
         "Content-Type": "application/json",
         "X-Goog-Api-Key": GOOGLE_PLACES_API_KEY,
         "X-Goog-FieldMask": _FIELD_MASK,
     }
-    resp = requests.post(
-        PLACES_SEARCH_TEXT_URL,
-        headers=headers,
-        json={"textQuery": query},
-        timeout=10,
-    )
+
+
+def _places_search_text(query: str) -> dict | None:
+    """Call Places API (New) text search. Returns JSON or None."""
+    if not query or not GOOGLE_PLACES_API_KEY:
+        return None
+    headers = _places_headers()
+    try:
+        places_breaker.before_call()
+    except CircuitOpen as e:
+        logger.warning("Places searchText skipped: %s", e)
+        return None
+    try:
+        resp = http_client.post(
+            PLACES_SEARCH_TEXT_URL,
+            headers=headers,
+            json={"textQuery": query},
+            timeout=10,
+            upstream="google_places",
+        )
+    except requests.exceptions.RequestException as e:
+        places_breaker.record(False, f"{type(e).__name__}: {e}")
+        raise
+    places_breaker.record(resp.status_code < 500, f"HTTP {resp.status_code}")
     if resp.status_code != 200:
         logger.warning("Places searchText status=%s body=%s", resp.status_code, resp.text[:200])
         return None
     return resp.json()
 
 
+def _photo_media_url(data: dict | None) -> str | None:
+    """Media URL of the first place's first photo in a searchText response."""
+    if not data:
+        return None
+    places = data.get("places") or []
+    if not places:
+        return None
+    photos = (places[0].get("photos") or [])[:1]
+    if not photos:
+        return None
+    photo_name = photos[0].get("name")
+    if not photo_name or "/media" in photo_name:
+        return None
+    # Photo media: https://places.googleapis.com/v1/places/PHOTO_NAME/media?maxWidthPx=800&key=API_KEY
+    media_name = photo_name.rstrip("/") + "/media"
+    return f"{GOOGLE_PLACES_BASE_URL}/v1/{media_name}"
+
+
 @require_GET
 def place_photo_api(request):
     """
@@ -828,36 +1274,100 @@ def place_photo_api(request):
         return HttpResponse(status=204)
 
     try:
-        data = _places_search_text(query)
-        if not data:
-            return HttpResponse(status=204)
-        places = data.get("places") or []
-        if not places:
+        url = _photo_media_url(_places_search_text(query))
+        if not url:
             return HttpResponse(status=204)
-        photos = (places[0].get("photos") or [])[:1]
-        if not photos:
-            return HttpResponse(status=204)
-        photo_name = photos[0].get("name")
-        if not photo_name or "/media" in photo_name:
-            return HttpResponse(status=204)
-        # Photo media: https://places.googleapis.com/v1/places/PHOTO_NAME/media?maxWidthPx=800&key=API_KEY
-        media_name = photo_name.rstrip("/") + "/media"
-        url = f"https://places.googleapis.com/v1/{media_name}"
-        img_resp = requests.get(
-            url,
-            params={"maxWidthPx": 800, "key": GOOGLE_PLACES_API_KEY},
-            timeout=10,
-            allow_redirects=True,
-        )
+        places_breaker.before_call()
+        try:
+            img_resp = http_client.get(
+                url,
+                params={"maxWidthPx": 800, "key": GOOGLE_PLACES_API_KEY},
+                timeout=10,
+                allow_redirects=True,
+                upstream="google_places",
+            )
+        except requests.exceptions.RequestException as e:
+            places_breaker.record(False, f"{type(e).__name__}: {e}")
+            raise
+        places_breaker.record(img_resp.status_code < 500, f"HTTP {img_resp.status_code}")
         if img_resp.status_code != 200:
             return HttpResponse(status=204)
         ct = img_resp.headers.get("Content-Type") or "image/jpeg"
         return HttpResponse(img_resp.content, content_type=ct)
+    except CircuitOpen:
+        return HttpResponse(status=204)
     except Exception:
         logger.exception("Place photo fetch failed for query=%s", query[:50])
         return HttpResponse(status=204)
 
 
+def _place_details_response(query: str, data: dict | None) -> JsonResponse:
+    """place_details_api response for a searchText result (None: the search failed)."""
+    if not data:
+        return JsonResponse({"success": False, "error": "Search failed"}, status=500)
+    places = data.get("places") or []
+    if not places:
+        return JsonResponse({"success": True, "data": None})
+
+    place = places[0]
+    display_name = place.get("displayName") or {}
+    name = display_name.get("text", "") if isinstance(display_name, dict) else str(display_name or "")
+    rating = place.get("rating")
+    user_ratings_total = place.get("userRatingCount")
+    price_level_raw = place.get("priceLevel")
+    price_range = place.get("priceRange")  # may have formattedPrice or similar
+    formatted_address = place.get("formattedAddress")
+    photos = (place.get("photos") or [])[:1]
+    photo_name = photos[0].get("name") if photos else None
+    google_maps_uri = place.get("googleMapsUri")
+    place_id = place.get("id", "").replace("places/", "") if place.get("id") else None
+
+    maps_url = google_maps_uri or f"https://www.google.com/maps/search/?api=1&query={requests.utils.quote(name + ' ' + query)}"
+    if place_id and not google_maps_uri:
+        maps_url = f"https://www.google.com/maps/place/?q=place_id:{place_id}"
+
+    photo_url = None
+    if photo_name:
+        photo_url = f"/cheap-flight-finder/api/place-photo/?query={requests.utils.quote(query)}"
+
+    price_str = _PRICE_MAP.get(price_level_raw, "") if isinstance(price_level_raw, str) else ""
+
+    # priceRange: { startPrice: {currencyCode, units, nanos}, endPrice: {...} }
+    def _fmt_money(m: dict) -> str:
+        if not isinstance(m, dict):
+            return ""
+        cc = m.get("currencyCode") or "USD"
+        sym = "$" if cc == "USD" else (cc + " ")
+        u = m.get("units") or "0"
+        try:
+            n = int(m.get("nanos") or 0)
+            if n:
+                return f"{sym}{int(u)}.{str(n).zfill(9).rstrip('0')}"
+            return f"{sym}{int(u)}"
+        except (ValueError, TypeError):
+            return f"{sym}{u}"
+
+    if isinstance(price_range, dict) and price_range:
+        start = _fmt_money(price_range.get("startPrice") or {})
+        end = _fmt_money(price_range.get("endPrice") or {})
+        if start and end:
+            price_str = f"{start} – {end}"
+        elif start:
+            price_str = price_str or f"From {start}"
+
+    out = {
+        "name": name,
+        "rating": round(float(rating), 1) if rating is not None else None,
+        "user_ratings_total": user_ratings_total,
+        "price_level": price_level_raw,
+        "price_display": price_str,
+        "formatted_address": formatted_address or "",
+        "photo_url": photo_url,
+        "maps_url": maps_url,
+    }
+    return JsonResponse({"success": True, "data": out})
+
+
 @require_GET
 def place_details_api(request):
     """
@@ -869,70 +1379,7 @@ def place_details_api(request):
         return JsonResponse({"success": False, "error": "Missing query or API key"}, status=400)
 
     try:
-        data = _places_search_text(query)
-        if not data:
-            return JsonResponse({"success": False, "error": "Search failed"}, status=500)
-        places = data.get("places") or []
-        if not places:
-            return JsonResponse({"success": True, "data": None})
-
-        place = places[0]
-        display_name = place.get("displayName") or {}
-        name = display_name.get("text", "") if isinstance(display_name, dict) else str(display_name or "")
-        rating = place.get("rating")
-        user_ratings_total = place.get("userRatingCount")
-        price_level_raw = place.get("priceLevel")
-        price_range = place.get("priceRange")  # may have formattedPrice or similar
-        formatted_address = place.get("formattedAddress")
-        photos = (place.get("photos") or [])[:1]
-        photo_name = photos[0].get("name") if photos else None
-        google_maps_uri = place.get("googleMapsUri")
-        place_id = place.get("id", "").replace("places/", "") if place.get("id") else None
-
-        maps_url = google_maps_uri or f"https://www.google.com/maps/search/?api=1&query={requests.utils.quote(name + ' ' + query)}"
-        if place_id and not google_maps_uri:
-            maps_url = f"https://www.google.com/maps/place/?q=place_id:{place_id}"
-
-        photo_url = None
-        if photo_name:
-            photo_url = f"/cheap-flight-finder/api/place-photo/?query={requests.utils.quote(query)}"
-
-        price_str = _PRICE_MAP.get(price_level_raw, "") if isinstance(price_level_raw, str) else ""
-
-        # priceRange: { startPrice: {currencyCode, units, nanos}, endPrice: {...} }
-        def _fmt_money(m: dict) -> str:
-            if not isinstance(m, dict):
-                return ""
-            cc = m.get("currencyCode") or "USD"
-            sym = "$" if cc == "USD" else (cc + " ")
-            u = m.get("units") or "0"
-            try:
-                n = int(m.get("nanos") or 0)
-                if n:
-                    return f"{sym}{int(u)}.{str(n).zfill(9).rstrip('0')}"
-                return f"{sym}{int(u)}"
-            except (ValueError, TypeError):
-                return f"{sym}{u}"
-
-        if isinstance(price_range, dict) and price_range:
-            start = _fmt_money(price_range.get("startPrice") or {})
-            end = _fmt_money(price_range.get("endPrice") or {})
-            if start and end:
-                price_str = f"{start} – {end}"
-            elif start:
-                price_str = price_str or f"From {start}"
-
-        out = {
-            "name": name,
-            "rating": round(float(rating), 1) if rating is not None else None,
-            "user_ratings_total": user_ratings_total,
-            "price_level": price_level_raw,
-            "price_display": price_str,
-            "formatted_address": formatted_address or "",
-            "photo_url": photo_url,
-            "maps_url": maps_url,
-        }
-        return JsonResponse({"success": True, "data": out})
+        return _place_details_response(query, _places_search_text(query))
     except Exception as e:
         logger.exception("Place details failed for query=%s", query[:50])
         return JsonResponse({"success": False, "error": str(e)}, status=500)
@@ -0,0 +1,174 @@
+"""
+Per-upstream circuit breakers (Amadeus, Google Places, OpenAI, OpenWeather).
+After CFF_BREAKER_FAILURES consecutive failures (timeouts, connection errors, 5xx) a
+breaker opens: calls fail at once with CircuitOpen instead of waiting out their timeout,
+and callers fall back to stale cached data where they have it. After CFF_BREAKER_RESET_S
+one probe call is let through (half-open); its success closes the breaker, its failure
+opens it for another period.
+Usage at a call site:
+    breaker.check()                # optional: fail fast before slow setup (claims nothing)
+    ... rate limiter, auth token ...
+    breaker.before_call()          # raises CircuitOpen; right before the call, it may be the probe
+    ... call ...
+    breaker.record(ok, error)      # on every outcome, including exceptions
+State is per process; the analytics dashboard's Upstreams page shows all breakers.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable
+
+from django.conf import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """The upstream's breaker is open; retry_in is seconds until the next probe."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit open, next probe in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int | None = None,
+        reset_timeout: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, int(
+            failure_threshold if failure_threshold is not None else getattr(settings, "CFF_BREAKER_FAILURES", 5)
+        ))
+        self.reset_timeout = float(
+            reset_timeout if reset_timeout is not None else getattr(settings, "CFF_BREAKER_RESET_S", 30)
+        )
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_started: float | None = None
+        self.calls = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self.opened = 0
+        self.last_error = ""
+        self.last_failure_at: float | None = None  # wall clock, for display
+
+    def _retry_in(self, now: float) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - now)
+
+    def is_open(self) -> bool:
+        """True while calls would be refused (a due probe counts as not open)."""
+        with self._lock:
+            now = self._clock()
+            if self.state == OPEN:
+                return self._retry_in(now) > 0
+            return self.state == HALF_OPEN and not self._probe_stuck(now)
+
+    def _probe_stuck(self, now: float) -> bool:
+        # A probe whose caller never recorded an outcome must not block the breaker forever
+        return self._probe_started is None or now - self._probe_started >= self.reset_timeout
+
+    def check(self) -> None:
+        """Raise CircuitOpen if before_call() would, without counting a call or claiming the probe."""
+        with self._lock:
+            now = self._clock()
+            if self.state == OPEN and self._retry_in(now) > 0:
+                self.short_circuited += 1
+                raise CircuitOpen(self.name, self._retry_in(now))
+            if self.state == HALF_OPEN and not self._probe_stuck(now):
+                self.short_circuited += 1
+                raise CircuitOpen(self.name, self.reset_timeout - (now - self._probe_started))
+
+    def before_call(self) -> None:
+        """Raise CircuitOpen if the call must not go out; otherwise count it (it may be the probe)."""
+        with self._lock:
+            now = self._clock()
+            if self.state == OPEN:
+                retry_in = self._retry_in(now)
+                if retry_in > 0:
+                    self.short_circuited += 1
+                    raise CircuitOpen(self.name, retry_in)
+                self.state = HALF_OPEN
+                self._probe_started = now
+            elif self.state == HALF_OPEN:
+                if not self._probe_stuck(now):
+                    self.short_circuited += 1
+                    raise CircuitOpen(self.name, self.reset_timeout - (now - self._probe_started))
+                self._probe_started = now
+            self.calls += 1
+
+    def record(self, ok: bool, error: str = "") -> None:
+        with self._lock:
+            if ok:
+                self.state = CLOSED
+                self.consecutive_failures = 0
+                self._probe_started = None
+                return
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error[:200]
+            self.last_failure_at = time.time()
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opened += 1
+                self.state = OPEN
+                self._opened_at = self._clock()
+                self._probe_started = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._probe_started = None
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            now = self._clock()
+            return {
+                "name": self.name,
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "retry_in_s": round(self._retry_in(now), 1) if self.state == OPEN else None,
+                "calls": self.calls,
+                "failures": self.failures,
+                "short_circuited": self.short_circuited,
+                "opened": self.opened,
+                "last_error": self.last_error,
+                "last_failure_at": self.last_failure_at,
+            }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """The process-wide breaker for an upstream (created on first use)."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def all_stats() -> list[dict[str, Any]]:
+    with _breakers_lock:
+        breakers = sorted(_breakers.values(), key=lambda b: b.name)
+    return [b.stats() for b in breakers]
+
+
+amadeus_breaker = get_breaker("amadeus")
+places_breaker = get_breaker("google_places")
+openai_breaker = get_breaker("openai")
+openweather_breaker = get_breaker("openweather")
@@ -2,19 +2,33 @@
 AI-powered city guide for Cheap Flight Finder.
 Uses OpenAI API for structured destination insights.
 Cautious wording for uncertain data (events, weather, etc.).
+The last good guide per city is kept in the cache and served (stale) while the OpenAI
+circuit breaker is open.
 """
 import json
 import logging
 import os
 from typing import Any
+from urllib.parse import quote
 
+from django.core.cache import cache
 from dotenv import load_dotenv
 
+from main.circuit_breaker import CircuitOpen, openai_breaker
+from main.http_client import http_client
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Last good guide per city, the fallback while OpenAI is unavailable
+LAST_GOOD_TTL = 7 * 24 * 3600
+
+
+def _last_good_key(city: str, country: str) -> str:
+    # Quoted: memcached rejects spaces and non-ASCII in keys ("São Paulo", "Kraków")
+    return "city_guide:last:" + quote(f"{city.strip().lower()}|{country.strip().lower()}")
 
 
 def get_city_guide(
@@ -73,23 +87,38 @@ Rules:
 - Use real, well-known establishment names when possible.
 - Output only the JSON object."""
 
+    try:
+        openai_breaker.before_call()
+    except CircuitOpen as e:
+        logger.warning("City guide for %s served from cache or skipped: %s", location, e)
+        last_good = cache.get(_last_good_key(city, country))
+        if last_good is not None:
+            return {"success": True, "data": last_good, "stale": True}
+        return {"success": False, "error": "City guide temporarily unavailable"}
+
     try:
         import requests
 
-        resp = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": "gpt-4o-mini",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.5,
-                "max_tokens": 1600,
-            },
-            timeout=25,
-        )
+        try:
+            resp = http_client.post(
+                "https://api.openai.com/v1/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {OPENAI_API_KEY}",
+                    "Content-Type": "application/json",
+                },
+                json={
+                    "model": "gpt-4o-mini",
+                    "messages": [{"role": "user", "content": prompt}],
+                    "temperature": 0.5,
+                    "max_tokens": 1600,
+                },
+                timeout=25,
+                upstream="openai",
+            )
+        except requests.exceptions.RequestException as e:
+            openai_breaker.record(False, f"{type(e).__name__}: {e}")
+            raise
+        openai_breaker.record(resp.status_code < 500, f"HTTP {resp.status_code}")
 
         if resp.status_code != 200:
             logger.warning("OpenAI API error: %s %s", resp.status_code, resp.text[:200])
@@ -135,6 +164,7 @@ Rules:
             "car_rental": parsed.get("car_rental", ""),
             "local_tips": parsed.get("local_tips", ""),
         }
+        cache.set(_last_good_key(city, country), result, timeout=LAST_GOOD_TTL)
         return {"success": True, "data": result}
 
     except json.JSONDecodeError as e:
@@ -0,0 +1,21 @@
+"""
+Numeric CFF_* settings, read at use time (so override_settings applies) and falling back
+to the default when unset or malformed.
+"""
+from __future__ import annotations
+
+from django.conf import settings
+
+
+def int_setting(name: str, default: int) -> int:
+    try:
+        return int(getattr(settings, name, default))
+    except (ValueError, TypeError):
+        return default
+
+
+def float_setting(name: str, default: float) -> float:
+    try:
+        return float(getattr(settings, name, default))
+    except (ValueError, TypeError):
+        return default
@@ -0,0 +1,55 @@
+"""
+Request-wide time budget.
+One Deadline is created per request and passed down to every upstream call, which
+uses timeout(cap) instead of its own fixed timeout: a slow first stage leaves less
+time for the next one instead of stacking on top of it.
+"""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's budget ran out before an upstream call could start."""
+
+
+class Deadline:
+    def __init__(self, budget_s: float, clock: Callable[[], float] = time.monotonic):
+        self.budget_s = budget_s
+        self._clock = clock
+        self._start = clock()
+        self.expires_at = self._start + budget_s
+        self.stages: dict[str, float] = {}
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self._clock())
+
+    def expired(self) -> bool:
+        return self._clock() >= self.expires_at
+
+    def timeout(self, cap: float) -> float:
+        """Seconds an upstream call may take: min(cap, remaining). Raises DeadlineExceeded at 0."""
+        left = self.expires_at - self._clock()
+        if left <= 0:
+            raise DeadlineExceeded(f"Request budget of {self.budget_s}s exhausted")
+        return min(cap, left)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Record the stage's elapsed milliseconds in stages[name]."""
+        t0 = self._clock()
+        try:
+            yield
+        finally:
+            self.stages[name] = round((self._clock() - t0) * 1000, 1)
+
+    def timings(self) -> dict[str, float]:
+        """Per-stage elapsed ms plus total since the deadline was created."""
+        return {**self.stages, "total": round((self._clock() - self._start) * 1000, 1)}
+
+
+def optional_timeout(deadline: Deadline | None, cap: float) -> float:
+    """timeout(cap) when there is a deadline, else cap."""
+    return deadline.timeout(cap) if deadline is not None else cap
@@ -0,0 +1,258 @@
+"""
+Flight search result cache.
+Normalized flight lists keyed by (origin, destination, depart, return, currency, adults).
+Fresh entries are served as-is; stale entries (inside the stale-while-revalidate window)
+are served at once while a single background refresh runs.
+Concurrent misses on the same key are coalesced into one upstream fetch.
+aget_or_fetch() is the async views' way in: the same entries and counters, with an
+awaited fetch.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+from django.conf import settings
+from django.core.cache import caches
+
+from main.conf import int_setting
+from main.flight_normalizer import Offer
+from main.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# v2: flights are compact flight_normalizer.Offer objects
+CACHE_KEY_PREFIX = "cff:search:v2"
+
+# Entry shape stored in the backend
+#   {"flights": [Offer, ...], "raw_count": int, "created_at": float, "source": str}
+CacheEntry = dict[str, Any]
+FetchFn = Callable[[], tuple[list[Offer], int]]
+AsyncFetchFn = Callable[[], Awaitable[tuple[list[Offer], int]]]
+
+
+def make_search_key(
+    origin: str,
+    destination: str,
+    depart_date: str,
+    return_date: str | None,
+    currency: str,
+    adults: int,
+    full: bool = False,
+) -> str:
+    """full: the 250-offer result set (a separate entry from the default top-of-market one)."""
+    parts = [
+        CACHE_KEY_PREFIX,
+        (origin or "").upper().strip(),
+        (destination or "").upper().strip(),
+        (depart_date or "").strip()[:10],
+        (return_date or "").strip()[:10] or "-",
+        (currency or "").upper().strip(),
+        str(int(adults or 1)),
+    ]
+    if full:
+        parts.append("full")
+    return ":".join(parts)
+
+
+class FlightSearchCache:
+    """
+    TTL + stale-while-revalidate cache on top of a Django cache backend
+    (backend_alias, default CFF_SEARCH_CACHE_ALIAS).
+    ttl: seconds an entry is fresh. stale_ttl: extra seconds a stale entry may be served.
+    """
+
+    def __init__(
+        self,
+        backend_alias: str | None = None,
+        ttl: int | None = None,
+        stale_ttl: int | None = None,
+    ):
+        self._backend_alias = backend_alias
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.coalesced = 0
+        self.inflight = SingleFlight()
+
+    @property
+    def backend(self):
+        return caches[self._backend_alias or getattr(settings, "CFF_SEARCH_CACHE_ALIAS", "default")]
+
+    @property
+    def ttl(self) -> int:
+        return self._ttl if self._ttl is not None else int_setting("CFF_SEARCH_CACHE_TTL", 600)
+
+    @property
+    def stale_ttl(self) -> int:
+        return self._stale_ttl if self._stale_ttl is not None else int_setting("CFF_SEARCH_CACHE_STALE_TTL", 1800)
+
+    @property
+    def wait_timeout(self) -> int:
+        return int_setting("CFF_SINGLEFLIGHT_WAIT", 30)
+
+    def get(self, key: str) -> CacheEntry | None:
+        entry = self.backend.get(key)
+        return entry if isinstance(entry, dict) else None
+
+    async def aget(self, key: str) -> CacheEntry | None:
+        # The backend's async API: DatabaseCache must not be called on the event loop
+        entry = await self.backend.aget(key)
+        return entry if isinstance(entry, dict) else None
+
+    @staticmethod
+    def _entry(flights: list[Offer], raw_count: int, source: str) -> CacheEntry:
+        return {"flights": flights, "raw_count": raw_count, "created_at": time.time(), "source": source}
+
+    def set(self, key: str, flights: list[Offer], raw_count: int, source: str = "amadeus") -> CacheEntry:
+        entry = self._entry(flights, raw_count, source)
+        self.backend.set(key, entry, timeout=self.ttl + self.stale_ttl)
+        return entry
+
+    async def aset(self, key: str, flights: list[Offer], raw_count: int, source: str = "amadeus") -> CacheEntry:
+        entry = self._entry(flights, raw_count, source)
+        await self.backend.aset(key, entry, timeout=self.ttl + self.stale_ttl)
+        return entry
+
+    def age(self, entry: CacheEntry) -> float:
+        return max(0.0, time.time() - float(entry.get("created_at") or 0))
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return self.age(entry) < self.ttl
+
+    def get_or_fetch(
+        self,
+        key: str,
+        fetch: FetchFn,
+        source: str = "amadeus",
+        refresh: FetchFn | None = None,
+        timeout: float | None = None,
+    ) -> tuple[CacheEntry, str]:
+        """
+        Return (entry, status). status: "hit" | "stale" | "miss" | "coalesced".
+        On miss, fetch() runs inline and its errors propagate. Concurrent misses wait
+        for the same fetch ("coalesced") and get its entry or its error; a waiter raises
+        SingleFlightTimeout after timeout (default CFF_SINGLEFLIGHT_WAIT) seconds.
+        On stale, the entry is returned and one background refresh (refresh or fetch) is started.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            if self.is_fresh(entry):
+                self.hits += 1
+                return entry, "hit"
+            self.stale_hits += 1
+            self._refresh_in_background(key, refresh or fetch, "refresh")
+            return entry, "stale"
+
+        def _fetch_and_set():
+            flights, raw_count = fetch()
+            return self.set(key, flights, raw_count, source=source)
+
+        wait = self.wait_timeout if timeout is None else timeout
+        entry, shared = self.inflight.do(key, _fetch_and_set, timeout=wait)
+        if shared:
+            self.coalesced += 1
+            return entry, "coalesced"
+        self.misses += 1
+        return entry, "miss"
+
+    async def aget_or_fetch(
+        self,
+        key: str,
+        fetch: AsyncFetchFn,
+        source: str = "amadeus",
+        refresh: FetchFn | None = None,
+        timeout: float | None = None,
+    ) -> tuple[CacheEntry, str]:
+        """
+        get_or_fetch() with an async fetch; misses are coalesced per event loop.
+        Backend calls go through the async cache API, so any backend works under ASGI.
+        A stale entry's background refresh runs the (sync) refresh function on a thread, as
+        get_or_fetch does; without one, the stale entry is served and not refreshed.
+        """
+        entry = await self.aget(key)
+        if entry is not None:
+            if self.is_fresh(entry):
+                self.hits += 1
+                return entry, "hit"
+            self.stale_hits += 1
+            if refresh is not None and await self.backend.aadd(self._refresh_lock_key(key), 1, timeout=60):
+                self._start_refresh(key, refresh, "refresh")
+            return entry, "stale"
+
+        async def _fetch_and_set():
+            flights, raw_count = await fetch()
+            return await self.aset(key, flights, raw_count, source=source)
+
+        wait = self.wait_timeout if timeout is None else timeout
+        entry, shared = await self.inflight.do_async(key, _fetch_and_set, timeout=wait)
+        if shared:
+            self.coalesced += 1
+            return entry, "coalesced"
+        self.misses += 1
+        return entry, "miss"
+
+    def refresh(self, key: str, fetch: FetchFn, source: str = "refresh") -> CacheEntry:
+        """Fetch and store unconditionally (used by background refresh and warmers)."""
+        flights, raw_count = fetch()
+        self.refreshes += 1
+        return self.set(key, flights, raw_count, source=source)
+
+    @staticmethod
+    def _refresh_lock_key(key: str) -> str:
+        return f"{key}:refreshing"
+
+    def _refresh_in_background(self, key: str, fetch: FetchFn, source: str) -> bool:
+        # add() is atomic on the backend, so only one refresh runs per key at a time
+        if not self.backend.add(self._refresh_lock_key(key), 1, timeout=60):
+            return False
+        self._start_refresh(key, fetch, source)
+        return True
+
+    def _start_refresh(self, key: str, fetch: FetchFn, source: str) -> None:
+        """Run refresh() on a daemon thread; the caller holds the key's refresh lock."""
+        lock_key = self._refresh_lock_key(key)
+
+        def _run():
+            try:
+                self.refresh(key, fetch, source=source)
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.warning("Background flight cache refresh failed for %s: %s", key, e)
+            finally:
+                self.backend.delete(lock_key)
+
+        threading.Thread(target=_run, name="cff-cache-refresh", daemon=True).start()
+
+    def meta(self, entry: CacheEntry, status: str) -> dict:
+        """Meta block describing where a result came from."""
+        return {
+            "hit": status in ("hit", "stale"),
+            "stale": status == "stale",
+            "coalesced": status == "coalesced",
+            "age_s": round(self.age(entry), 0),
+            "source": entry.get("source") or "",
+        }
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "coalesced": self.coalesced,
+            "singleflight": self.inflight.stats(),
+            "ttl_s": self.ttl,
+            "stale_ttl_s": self.stale_ttl,
+        }
+
+
+# Shared by the search API and everything that feeds it
+search_cache = FlightSearchCache()
@@ -0,0 +1,350 @@
+"""
+Flexible-date price calendar and round-trip price matrix for Cheap Flight Finder.
+Fans out one cached search per date (pair) over a bounded worker pool, at most
+CFF_FANOUT_PER_REQUEST at a time per request so one large matrix cannot hold every
+worker, all inside the request's CFF_SEARCH_DEADLINE (location lookups included).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Hashable, Iterator
+
+import requests
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from main.cheap_flight_finder import AmadeusError, AmadeusRateLimitError, cached_search, resolve_pair
+from main.deadline import Deadline, DeadlineExceeded
+from main.flight_normalizer import Offer, badge_lists
+from main.singleflight import SingleFlightTimeout
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_MAX_DAYS = 7
+# Matrix is (2N+1) x (2M+1) upstream calls at worst, so keep the windows small
+MATRIX_MAX_DAYS = 3
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def fanout_executor() -> ThreadPoolExecutor:
+    """Process-wide pool shared by all fan-out endpoints (bounds upstream concurrency)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = max(1, int(getattr(settings, "CFF_FANOUT_WORKERS", 14)))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cff-fanout")
+    return _executor
+
+
+def fan_out(
+    calls: list[tuple[Hashable, Callable[[], Any]]],
+    deadline: Deadline,
+) -> Iterator[tuple[Hashable, Any]]:
+    """
+    Run calls on the shared pool, at most CFF_FANOUT_PER_REQUEST at once, and yield
+    (key, result) as they finish; then (key, None) for every call the deadline cut off.
+    """
+    limit = max(1, int(getattr(settings, "CFF_FANOUT_PER_REQUEST", 7)))
+    pool = fanout_executor()
+    todo = list(reversed(calls))
+    running: dict[Future, Hashable] = {}
+    while todo or running:
+        while todo and len(running) < limit:
+            key, call = todo.pop()
+            running[pool.submit(call)] = key
+        done, _ = wait(running, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for fut in done:
+            yield running.pop(fut), fut.result()
+    for fut, key in running.items():
+        fut.cancel()
+        yield key, None
+    for key, _ in reversed(todo):
+        yield key, None
+
+
+def _request_deadline() -> Deadline:
+    """Whole request budget, as for a single search; cells still running after it are reported as timeouts."""
+    return Deadline(float(getattr(settings, "CFF_SEARCH_DEADLINE", 25)))
+
+
+def _parse_date(s: str) -> date | None:
+    try:
+        return datetime.strptime((s or "")[:10], "%Y-%m-%d").date()
+    except (ValueError, TypeError):
+        return None
+
+
+def _cell_error(e: Exception) -> str:
+    if isinstance(e, DeadlineExceeded):
+        return "timeout"
+    if isinstance(e, AmadeusRateLimitError):
+        return "rate limited"
+    return "api temporarily unavailable"
+
+
+def _empty_cell(depart_date: str, return_date: str | None, currency: str, error: str | None) -> dict[str, Any]:
+    return {
+        "depart_date": depart_date,
+        "return_date": return_date or "",
+        "min_price": None,
+        "currency": currency,
+        "result_count": 0,
+        "cached": False,
+        "error": error,
+    }
+
+
+def price_cell(
+    origin_iata: str,
+    destination_iata: str,
+    depart_date: str,
+    return_date: str | None,
+    currency: str,
+    adults: int,
+    pick: Callable[[list[Offer]], Offer | None] | None = None,
+    source: str = "calendar",
+    deadline: Deadline | None = None,
+) -> dict[str, Any]:
+    """
+    Cheapest offer for one (depart, return) pair, via the search cache.
+    Never raises: failures are reported in the cell's error field.
+    """
+    cell = _empty_cell(depart_date, return_date, currency, None)
+    try:
+        entry, status = cached_search(
+            origin_iata, destination_iata, depart_date, return_date, currency, adults, source=source,
+            deadline=deadline,
+        )
+    except (AmadeusError, requests.exceptions.RequestException, SingleFlightTimeout,
+            DeadlineExceeded, ValueError) as e:
+        cell["error"] = _cell_error(e)
+        return cell
+    except Exception:
+        # One bad cell (e.g. a database error underneath) must not abort the whole calendar
+        logger.exception("Price cell %s-%s %s/%s failed", origin_iata, destination_iata, depart_date, return_date)
+        cell["error"] = "internal error"
+        return cell
+
+    flights = entry.get("flights") or []
+    best = pick(flights) if pick else min(flights, key=lambda f: float(f.price or 0), default=None)
+    cell["cached"] = status in ("hit", "stale")
+    cell["result_count"] = len(flights)
+    if best:
+        cell["min_price"] = best.price
+        cell["currency"] = best.currency or currency
+    return cell
+
+
+def _pick_cheapest_badged(flights: list[Offer]) -> Offer | None:
+    """The first offer the search page would badge "cheapest"."""
+    badges = badge_lists([f.price for f in flights], [f.total_minutes for f in flights])
+    return next((f for f, b in zip(flights, badges) if "cheapest" in b), None)
+
+
+def _common_params(request) -> tuple[dict[str, Any], list[str]]:
+    errors: list[str] = []
+    origin_query = (request.GET.get("origin") or "").strip()
+    destination_query = (request.GET.get("destination") or "").strip()
+    currency = (request.GET.get("currency") or "USD").upper().strip()
+    try:
+        adults = max(1, min(9, int(request.GET.get("adults") or 1)))
+    except (ValueError, TypeError):
+        adults = 1
+    if not origin_query:
+        errors.append("invalid origin")
+    if not destination_query:
+        errors.append("invalid destination")
+    return {
+        "origin_query": origin_query,
+        "destination_query": destination_query,
+        "currency": currency,
+        "adults": adults,
+    }, errors
+
+
+@require_GET
+def cheap_flight_calendar_api(request):
+    """
+    Cheapest price per departure date in a ±N-day window.
+    GET params: origin, destination, depart_date, days? (default 3, max 7), return_date?, currency?, adults?
+    With return_date, each cell keeps the same trip length.
+    """
+    start_ms = time.time() * 1000
+    deadline = _request_deadline()
+    params, errors = _common_params(request)
+    center = _parse_date(request.GET.get("depart_date") or "")
+    return_d = _parse_date(request.GET.get("return_date") or "")
+    try:
+        days = max(0, min(CALENDAR_MAX_DAYS, int(request.GET.get("days") or 3)))
+    except (ValueError, TypeError):
+        days = 3
+    if not center:
+        errors.append("invalid depart_date format (use YYYY-MM-DD)")
+    if center and return_d and return_d < center:
+        errors.append("return_date cannot be before depart_date")
+
+    meta = {**params, "days": days, "result_count": 0}
+    if errors:
+        meta["search_time_ms"] = round((time.time() * 1000) - start_ms, 0)
+        return JsonResponse({"success": False, "meta": meta, "data": [], "warnings": [], "errors": errors}, status=400)
+
+    origin_iata, destination_iata = resolve_pair(params["origin_query"], params["destination_query"], deadline)
+    meta.update({"origin_iata": origin_iata, "destination_iata": destination_iata})
+    if not origin_iata or not destination_iata:
+        meta["search_time_ms"] = round((time.time() * 1000) - start_ms, 0)
+        return JsonResponse(
+            {
+                "success": False,
+                "meta": meta,
+                "data": [],
+                "warnings": [],
+                "errors": ["invalid origin" if not origin_iata else "invalid destination"],
+            },
+            status=400,
+        )
+
+    today = date.today()
+    trip_len = (return_d - center) if return_d else None
+    dates = [center + timedelta(days=off) for off in range(-days, days + 1)]
+    dates = [d for d in dates if d >= today]
+
+    def cell_call(dep: str, ret: str | None) -> Callable[[], dict[str, Any]]:
+        return lambda: price_cell(origin_iata, destination_iata, dep, ret, params["currency"], params["adults"],
+                                  deadline=deadline)
+
+    calls = []
+    for d in dates:
+        ret = (d + trip_len).isoformat() if trip_len is not None else None
+        calls.append(((d.isoformat(), ret), cell_call(d.isoformat(), ret)))
+    cells: list[dict[str, Any]] = [
+        cell if cell is not None else _empty_cell(dep, ret, params["currency"], "timeout")
+        for (dep, ret), cell in fan_out(calls, deadline)
+    ]
+    cells.sort(key=lambda c: c["depart_date"])
+
+    priced = [c for c in cells if c["min_price"] is not None]
+    cheapest = min(priced, key=lambda c: float(c["min_price"]), default=None)
+    warnings = []
+    if len(dates) < len(range(-days, days + 1)):
+        warnings.append("Past dates were skipped.")
+    if any(c["error"] for c in cells):
+        warnings.append("Some dates could not be priced.")
+
+    meta.update({
+        "cheapest_date": cheapest["depart_date"] if cheapest else None,
+        "cheapest_price": cheapest["min_price"] if cheapest else None,
+        "result_count": len(priced),
+        "cached_count": sum(1 for c in cells if c["cached"]),
+        "search_time_ms": round((time.time() * 1000) - start_ms, 0),
+    })
+    return JsonResponse({"success": True, "meta": meta, "data": cells, "warnings": warnings, "errors": []})
+
+
+def _ndjson(obj: dict[str, Any]) -> str:
+    return json.dumps(obj, separators=(",", ":")) + "\n"
+
+
+@require_GET
+def cheap_flight_matrix_api(request):
+    """
+    Round-trip depart x return price matrix, streamed as NDJSON.
+    GET params: origin, destination, depart_date, return_date, depart_days? (default 1),
+    return_days? (default 1, both max 3), currency?, adults?
+    Lines: one {"type": "meta"}, one {"type": "cell"} per pair as it finishes, then {"type": "summary"}.
+    """
+    start_ms = time.time() * 1000
+    deadline = _request_deadline()
+    params, errors = _common_params(request)
+    depart_center = _parse_date(request.GET.get("depart_date") or "")
+    return_center = _parse_date(request.GET.get("return_date") or "")
+    try:
+        depart_days = max(0, min(MATRIX_MAX_DAYS, int(request.GET.get("depart_days") or 1)))
+        return_days = max(0, min(MATRIX_MAX_DAYS, int(request.GET.get("return_days") or 1)))
+    except (ValueError, TypeError):
+        depart_days = return_days = 1
+    if not depart_center:
+        errors.append("invalid depart_date format (use YYYY-MM-DD)")
+    if not return_center:
+        errors.append("return_date required for round trip")
+    if depart_center and return_center and return_center < depart_center:
+        errors.append("return_date cannot be before depart_date")
+
+    meta = {
+        **params,
+        "trip_type": "round_trip",
+        "depart_days": depart_days,
+        "return_days": return_days,
+    }
+    if errors:
+        meta["search_time_ms"] = round((time.time() * 1000) - start_ms, 0)
+        return JsonResponse({"success": False, "meta": meta, "data": [], "warnings": [], "errors": errors}, status=400)
+
+    origin_iata, destination_iata = resolve_pair(params["origin_query"], params["destination_query"], deadline)
+    meta.update({"origin_iata": origin_iata, "destination_iata": destination_iata})
+    if not origin_iata or not destination_iata:
+        meta["search_time_ms"] = round((time.time() * 1000) - start_ms, 0)
+        return JsonResponse(
+            {
+                "success": False,
+                "meta": meta,
+                "data": [],
+                "warnings": [],
+                "errors": ["invalid origin" if not origin_iata else "invalid destination"],
+            },
+            status=400,
+        )
+
+    today = date.today()
+    depart_dates = [depart_center + timedelta(days=o) for o in range(-depart_days, depart_days + 1)]
+    return_dates = [return_center + timedelta(days=o) for o in range(-return_days, return_days + 1)]
+    pairs = [
+        (d.isoformat(), r.isoformat())
+        for d in depart_dates
+        for r in return_dates
+        if d >= today and r >= d
+    ]
+    meta["depart_dates"] = [d.isoformat() for d in depart_dates if d >= today]
+    meta["return_dates"] = [r.isoformat() for r in return_dates if r >= today]
+    meta["cell_count"] = len(pairs)
+
+    def cell_call(dep: str, ret: str) -> Callable[[], dict[str, Any]]:
+        return lambda: price_cell(origin_iata, destination_iata, dep, ret, params["currency"], params["adults"],
+                                  _pick_cheapest_badged, "matrix", deadline)
+
+    calls = [((dep, ret), cell_call(dep, ret)) for dep, ret in pairs]
+
+    def stream():
+        yield _ndjson({"type": "meta", **meta})
+        cells: list[dict[str, Any]] = []
+        for (dep, ret), cell in fan_out(calls, deadline):
+            if cell is None:
+                cell = _empty_cell(dep, ret, params["currency"], "timeout")
+            cells.append(cell)
+            yield _ndjson({"type": "cell", **cell})
+
+        priced = [c for c in cells if c["min_price"] is not None]
+        cheapest = min(priced, key=lambda c: float(c["min_price"]), default=None)
+        yield _ndjson({
+            "type": "summary",
+            "cheapest": cheapest,
+            "result_count": len(priced),
+            "error_count": sum(1 for c in cells if c["error"]),
+            "cached_count": sum(1 for c in cells if c["cached"]),
+            "search_time_ms": round((time.time() * 1000) - start_ms, 0),
+        })
+
+    resp = StreamingHttpResponse(stream(), content_type="application/x-ndjson")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"
+    return resp
@@ -5,39 +5,53 @@ Null-safe, defensive parsing. Supports one-way and round-trip.
 from __future__ import annotations
 
 import re
+import sys
 from datetime import date, datetime
+from functools import lru_cache
 from typing import Any
 
+from main import flight_ranking
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
 
-def _parse_iso8601_duration_to_minutes(dur: str | None) -> int | None:
-    """
-    PT2H30M -> 150, PT1H -> 60, P1D -> 1440.
-    Returns None if invalid or empty.
-    """
-    if not dur or not isinstance(dur, str):
-        return None
+_DURATION_RE = re.compile(
+    r"^P(?:(\d+)Y)?(?:(\d+)M)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)(?:[.,]\d+)?S)?)?$"
+)
+
+
+# Amadeus reuses a small set of durations and timestamps, so the parsers are memoized (bounded)
+@lru_cache(maxsize=1024)
+def _duration_to_minutes_cached(dur: str) -> int | None:
     s = dur.strip().upper()
     if not s.startswith("P"):
         return None
-    total = 0
     # PT2H30M: T 이후 H, M, S
-    m = re.match(r"^P(?:(\d+)Y)?(?:(\d+)M)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)(?:[.,]\d+)?S)?)?$", s)
+    m = _DURATION_RE.match(s)
     if m:
         y, mo, d, h, mi, sec = m.groups()
-        total = (int(y or 0) * 365 * 24 * 60 +
-                 int(mo or 0) * 30 * 24 * 60 +
-                 int(d or 0) * 24 * 60 +
-                 int(h or 0) * 60 +
-                 int(mi or 0) +
-                 int(float(sec or 0)))
-        return total
+        return (int(y or 0) * 365 * 24 * 60 +
+                int(mo or 0) * 30 * 24 * 60 +
+                int(d or 0) * 24 * 60 +
+                int(h or 0) * 60 +
+                int(mi or 0) +
+                int(float(sec or 0)))
     return None
 
 
+def _parse_iso8601_duration_to_minutes(dur: str | None) -> int | None:
+    """
+    PT2H30M -> 150, PT1H -> 60, P1D -> 1440.
+    Returns None if invalid or empty.
+    """
+    if not dur or not isinstance(dur, str):
+        return None
+    return _duration_to_minutes_cached(dur)
+
+
+@lru_cache(maxsize=1024)
 def _format_duration_minutes(minutes: int | None) -> str:
     """150 -> '2h 30m'"""
     if minutes is None or minutes < 0:
@@ -69,26 +83,35 @@ def _safe_str(val: Any) -> str:
     return s if s else ""
 
 
+@lru_cache(maxsize=4096)
+def _datetime_parts_cached(iso_str: str) -> tuple[str, str, str] | None:
+    if "T" not in iso_str:
+        return None
+    date_part, _, rest = iso_str.partition("T")
+    # Interned: the same dates and times repeat across segments and offers
+    return (sys.intern(date_part[:10]), sys.intern(rest[:5]), sys.intern(iso_str[:19]))
+
+
 def _parse_datetime_iso(iso_str: str | None) -> tuple[str, str, str] | None:
     """
     '2025-06-15T14:30:00' -> (date, time, full).
     Returns (date_str, time_str, datetime_str) or None.
     """
-    if not iso_str or "T" not in str(iso_str):
-        return None
-    try:
-        parts = str(iso_str).split("T", 1)
-        date_part = parts[0][:10]
-        time_part = (parts[1][:8] if len(parts) > 1 else "")[:5]  # HH:MM
-        return (date_part, time_part, str(iso_str)[:19])
-    except Exception:
+    if not iso_str:
         return None
+    if isinstance(iso_str, str):
+        return _datetime_parts_cached(iso_str)
+    return _parse_datetime_iso(str(iso_str))
 
 
+@lru_cache(maxsize=2048)
 def _get_city_for_iata(iata: str) -> str:
-    """Optional: map IATA to city name via airport_data."""
+    """Optional: map IATA to city name via airport_data (static index, so safe to memoize)."""
     try:
         from main import airport_data
+        city = airport_data.iata_to_city(iata)
+        if city:
+            return city
         results = airport_data.search_local(iata, limit=1)
         if results and results[0].get("city_name"):
             return results[0]["city_name"]
@@ -98,59 +121,226 @@ def _get_city_for_iata(iata: str) -> str:
 
 
 # ---------------------------------------------------------------------------
-# Segment normalization
+# Compact model
+# Offers are parsed once into slotted objects with interned strings (IATA codes,
+# carriers, dates and times repeat across offers). The JSON dict shape is only
+# built by to_dict(), at the response boundary.
 # ---------------------------------------------------------------------------
 
 
-def _normalize_segment(seg: dict[str, Any], carriers: dict[str, str]) -> dict[str, Any]:
-    dep = seg.get("departure") or {}
-    arr = seg.get("arrival") or {}
-    dep_at = dep.get("at") or ""
-    arr_at = arr.get("at") or ""
-    dep_parsed = _parse_datetime_iso(dep_at)
-    arr_parsed = _parse_datetime_iso(arr_at)
-
-    carrier_code = _safe_str(seg.get("carrierCode") or seg.get("operating", {}).get("carrierCode")).upper()
-    aircraft = seg.get("aircraft") or {}
-    aircraft_code = _safe_str(aircraft.get("code"))
-
-    dur_str = seg.get("duration") or ""
-    dur_min = _parse_iso8601_duration_to_minutes(dur_str)
-
-    return {
-        "departure_iata": _safe_str(dep.get("iataCode")).upper() or "",
-        "arrival_iata": _safe_str(arr.get("iataCode")).upper() or "",
-        "departure_at": dep_at,
-        "arrival_at": arr_at,
-        "departure_date": dep_parsed[0] if dep_parsed else "",
-        "departure_time": dep_parsed[1] if dep_parsed else "",
-        "arrival_date": arr_parsed[0] if arr_parsed else "",
-        "arrival_time": arr_parsed[1] if arr_parsed else "",
-        "carrier_code": carrier_code,
-        "carrier_name": carriers.get(carrier_code) or carrier_code,
-        "number": _safe_str(seg.get("number")),
-        "aircraft_code": aircraft_code,
-        "duration": _format_duration_minutes(dur_min),
-        "duration_minutes": dur_min,
-        "departure_terminal": _safe_str(dep.get("terminal")),
-        "arrival_terminal": _safe_str(arr.get("terminal")),
-    }
+def _interned(val: Any) -> str:
+    return sys.intern(_safe_str(val))
+
+
+class Segment:
+    __slots__ = (
+        "departure_iata", "arrival_iata", "departure_at", "arrival_at",
+        "departure_date", "departure_time", "arrival_date", "arrival_time",
+        "carrier_code", "carrier_name", "number", "aircraft_code", "duration_minutes",
+        "departure_terminal", "arrival_terminal",
+    )
+
+    # Pickled as a plain tuple (the search cache pickles entries)
+    def __getstate__(self) -> tuple:
+        return tuple(getattr(self, k) for k in self.__slots__)
+
+    def __setstate__(self, state: tuple) -> None:
+        for k, v in zip(self.__slots__, state):
+            setattr(self, k, v)
+
+    @classmethod
+    def from_raw(cls, seg: dict[str, Any], carriers: dict[str, str]) -> Segment:
+        s = cls.__new__(cls)
+        dep = seg.get("departure") or {}
+        arr = seg.get("arrival") or {}
+        dep_at = dep.get("at") or ""
+        arr_at = arr.get("at") or ""
+        # One pass per timestamp: date and time come from the memoized parser, already interned
+        dep_parsed = _parse_datetime_iso(dep_at) or ("", "", "")
+        arr_parsed = _parse_datetime_iso(arr_at) or ("", "", "")
+        carrier_code = sys.intern(_safe_str(seg.get("carrierCode") or seg.get("operating", {}).get("carrierCode")).upper())
+        carrier_name = carriers.get(carrier_code) or carrier_code
+        s.departure_iata = sys.intern(_safe_str(dep.get("iataCode")).upper())
+        s.arrival_iata = sys.intern(_safe_str(arr.get("iataCode")).upper())
+        s.departure_at = sys.intern(dep_at) if isinstance(dep_at, str) else dep_at
+        s.arrival_at = sys.intern(arr_at) if isinstance(arr_at, str) else arr_at
+        s.departure_date, s.departure_time = dep_parsed[0], dep_parsed[1]
+        s.arrival_date, s.arrival_time = arr_parsed[0], arr_parsed[1]
+        s.carrier_code = carrier_code
+        s.carrier_name = sys.intern(carrier_name) if isinstance(carrier_name, str) else carrier_name
+        s.number = _safe_str(seg.get("number"))
+        s.aircraft_code = _interned((seg.get("aircraft") or {}).get("code"))
+        s.duration_minutes = _parse_iso8601_duration_to_minutes(seg.get("duration") or "")
+        s.departure_terminal = _interned(dep.get("terminal"))
+        s.arrival_terminal = _interned(arr.get("terminal"))
+        return s
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "departure_iata": self.departure_iata,
+            "arrival_iata": self.arrival_iata,
+            "departure_at": self.departure_at,
+            "arrival_at": self.arrival_at,
+            "departure_date": self.departure_date,
+            "departure_time": self.departure_time,
+            "arrival_date": self.arrival_date,
+            "arrival_time": self.arrival_time,
+            "carrier_code": self.carrier_code,
+            "carrier_name": self.carrier_name,
+            "number": self.number,
+            "aircraft_code": self.aircraft_code,
+            "duration": _format_duration_minutes(self.duration_minutes),
+            "duration_minutes": self.duration_minutes,
+            "departure_terminal": self.departure_terminal,
+            "arrival_terminal": self.arrival_terminal,
+        }
 
 
-# ---------------------------------------------------------------------------
-# Main normalization
-# ---------------------------------------------------------------------------
+def _leg_dict(segments: list[dict[str, Any]]) -> dict[str, Any]:
+    minutes = sum(s.get("duration_minutes") or 0 for s in segments)
+    return {"segments": segments, "duration_minutes": minutes, "duration": _format_duration_minutes(minutes)}
+
+
+class Offer:
+    """One normalized offer. Everything derivable from the segments is computed in to_dict()."""
+
+    __slots__ = (
+        "id", "price", "currency", "total_minutes", "airline_codes", "airline_names", "primary_airline",
+        "departure_city", "arrival_city", "days_left", "outbound", "inbound",
+        "cabin", "baggage", "validating_airline_codes", "raw_offer",
+    )
+
+    __getstate__ = Segment.__getstate__
+    __setstate__ = Segment.__setstate__
+
+    @property
+    def stops(self) -> int:
+        return max(0, len(self.outbound) + len(self.inbound) - (2 if self.inbound else 1))
+
+    @property
+    def departure_iata(self) -> str:
+        return self.outbound[0].departure_iata if self.outbound else ""
+
+    @property
+    def departure_datetime(self) -> str:
+        return self.outbound[0].departure_at if self.outbound else ""
+
+    @property
+    def _last_segment(self) -> Segment | None:
+        if self.inbound:
+            return self.inbound[-1]
+        return self.outbound[-1] if self.outbound else None
+
+    @property
+    def arrival_iata(self) -> str:
+        last = self._last_segment
+        return last.arrival_iata if last else ""
+
+    @property
+    def outbound_arrival_iata(self) -> str:
+        return self.outbound[-1].arrival_iata if self.outbound else ""
+
+    @property
+    def route_display(self) -> str:
+        dep, arr = self.departure_iata, self.outbound_arrival_iata
+        return f"{dep} → {arr}" if dep and arr else ""
+
+    def to_summary(self) -> dict[str, Any]:
+        """List-view subset of to_dict(): no segments or legs (see the offer detail API)."""
+        last_seg = self._last_segment
+        stops = self.stops
+        return {
+            "id": self.id,
+            "price": self.price,
+            "currency": self.currency,
+            "price_display": f"{self.price:.2f} {self.currency}",
+            "total_duration": _format_duration_minutes(self.total_minutes),
+            "total_minutes": self.total_minutes,
+            "stops": stops,
+            "is_direct": stops == 0,
+            "airline_codes": list(self.airline_codes),
+            "primary_airline": self.primary_airline,
+            "departure_iata": self.departure_iata,
+            "departure_datetime": self.departure_datetime,
+            "arrival_iata": self.arrival_iata,
+            "arrival_datetime": last_seg.arrival_at if last_seg else "",
+            "trip_type": "round_trip" if self.inbound else "one_way",
+            "route_display": self.route_display,
+        }
 
+    def to_dict(self) -> dict[str, Any]:
+        """The normalized JSON shape served by the API (see normalize_flight_offer)."""
+        outbound_segments = [s.to_dict() for s in self.outbound]
+        return_segments = [s.to_dict() for s in self.inbound]
+        first = outbound_segments[0] if outbound_segments else {}
+        last_seg = self._last_segment
+        first_dep_date = first.get("departure_date", "")
+        last_arr_date = last_seg.arrival_date if last_seg else ""
+        stops = self.stops
+        if stops == 0:
+            stop_label = "Direct"
+        elif stops == 1:
+            stop_label = "1 stop"
+        else:
+            stop_label = f"{stops} stops"
+        dep_iata = self.departure_iata
+        arr_iata = self.arrival_iata
+
+        result: dict[str, Any] = {
+            "id": self.id,
+            "price": self.price,
+            "currency": self.currency,
+            "total_duration": _format_duration_minutes(self.total_minutes),
+            "total_minutes": self.total_minutes,
+            "stops": stops,
+            "stop_label": stop_label,
+            "is_direct": stops == 0,
+            "airline_codes": list(self.airline_codes),
+            "airline_names": list(self.airline_names),
+            "primary_airline": self.primary_airline,
+            "departure_city": self.departure_city,
+            "departure_airport": dep_iata,
+            "departure_iata": dep_iata,
+            "departure_terminal": first.get("departure_terminal", ""),
+            "departure_datetime": first.get("departure_at", ""),
+            "departure_date": first_dep_date,
+            "departure_time": first.get("departure_time", ""),
+            "arrival_city": self.arrival_city,
+            "arrival_airport": arr_iata,
+            "arrival_iata": arr_iata,
+            "arrival_terminal": last_seg.arrival_terminal if last_seg else "",
+            "arrival_datetime": last_seg.arrival_at if last_seg else "",
+            "arrival_date": last_arr_date,
+            "arrival_time": last_seg.arrival_time if last_seg else "",
+            "next_day_arrival": bool(first_dep_date and last_arr_date and first_dep_date != last_arr_date),
+            "days_left": self.days_left,
+            "segments": outbound_segments + return_segments,
+            "outbound": _leg_dict(outbound_segments),
+            "return_leg": _leg_dict(return_segments) if return_segments else None,
+            "trip_type": "round_trip" if return_segments else "one_way",
+            "cabin": self.cabin,
+            "baggage": self.baggage,
+            "validating_airline_codes": list(self.validating_airline_codes),
+            "booking_classes": [],
+            "badges": [],
+            "route_display": self.route_display,
+            "price_display": f"{self.price:.2f} {self.currency}",
+            "outbound_arrival_iata": self.outbound_arrival_iata,
+        }
+        if self.raw_offer is not None:
+            result["raw_offer"] = self.raw_offer
+        return result
 
-def normalize_flight_offer(
+
+def parse_offer(
     offer: dict[str, Any],
     dictionaries: dict[str, Any] | None = None,
     reference_depart_date: str | None = None,
     include_raw: bool = False,
-) -> dict[str, Any] | None:
+) -> Offer | None:
     """
-    Convert a single Amadeus flight offer to normalized format.
-    Returns None if offer is invalid (e.g. no price).
+    Amadeus flight offer -> compact Offer.
+    Returns None if offer is invalid (e.g. no price or itineraries).
     """
     if not offer or not isinstance(offer, dict):
         return None
@@ -161,98 +351,60 @@ def normalize_flight_offer(
         carriers = (dictionaries.get("carriers") or {}) or {}
         locations = (dictionaries.get("locations") or {}) or {}
 
-    # Price
     price_obj = offer.get("price") or {}
-    total_raw = price_obj.get("total") or price_obj.get("grandTotal")
-    price = _safe_float(total_raw)
+    price = _safe_float(price_obj.get("total") or price_obj.get("grandTotal"))
     if price is None:
         return None
-    currency = _safe_str(price_obj.get("currency")).upper() or "USD"
-
-    # Id
-    offer_id = _safe_str(offer.get("id"))
 
     # Itineraries: first = outbound, second = return
     itineraries = offer.get("itineraries") or []
     if not itineraries:
         return None
 
-    outbound_segments: list[dict[str, Any]] = []
-    return_segments: list[dict[str, Any]] = []
+    o = Offer.__new__(Offer)
+    o.id = _safe_str(offer.get("id"))
+    o.price = price
+    o.currency = sys.intern(_safe_str(price_obj.get("currency")).upper() or "USD")
+
+    outbound: list[Segment] = []
+    inbound: list[Segment] = []
     total_minutes = 0
-    first_dep_datetime = ""
-    first_dep_date = ""
-    last_arr_datetime = ""
-    last_arr_date = ""
     airline_codes_set: set[str] = set()
-
     for idx, itin in enumerate(itineraries):
-        segs = itin.get("segments") or []
         itin_dur = _parse_iso8601_duration_to_minutes(itin.get("duration"))
         if itin_dur is not None:
             total_minutes += itin_dur
-
-        for seg in segs:
-            ns = _normalize_segment(seg, carriers)
-            if ns.get("carrier_code"):
-                airline_codes_set.add(ns["carrier_code"])
-            if idx == 0:
-                outbound_segments.append(ns)
-            else:
-                return_segments.append(ns)
-
-    if outbound_segments:
-        first_dep_datetime = outbound_segments[0].get("departure_at", "")
-        first_dep_date = outbound_segments[0].get("departure_date", "")
-        last_out = outbound_segments[-1]
-        last_arr_datetime = last_out.get("arrival_at", "")
-        last_arr_date = last_out.get("arrival_date", "")
-    if return_segments:
-        last_ret = return_segments[-1]
-        last_arr_datetime = last_ret.get("arrival_at", "")
-        last_arr_date = last_ret.get("arrival_date", "")
-
-    # Departure / arrival from first/last segment
-    dep_iata = outbound_segments[0].get("departure_iata", "") if outbound_segments else ""
-    if return_segments:
-        arr_iata = return_segments[-1].get("arrival_iata", "")
-    else:
-        arr_iata = outbound_segments[-1].get("arrival_iata", "") if outbound_segments else ""
-
+        for seg in itin.get("segments") or []:
+            ns = Segment.from_raw(seg, carriers)
+            if ns.carrier_code:
+                airline_codes_set.add(ns.carrier_code)
+            (outbound if idx == 0 else inbound).append(ns)
+    o.outbound = tuple(outbound)
+    o.inbound = tuple(inbound)
+    o.total_minutes = total_minutes
+    o.airline_codes = tuple(airline_codes_set)
+    o.airline_names = tuple(carriers.get(c) or c for c in o.airline_codes)
+
+    dep_iata = o.departure_iata
+    arr_iata = o.arrival_iata
     dep_city = _get_city_for_iata(dep_iata) if dep_iata else ""
     arr_city = _get_city_for_iata(arr_iata) if arr_iata else ""
-
     # Locations dict: Amadeus may have locations[IATA] = {cityCode}
     if dep_iata and not dep_city:
-        loc = locations.get(dep_iata) or {}
-        dep_city = _safe_str(loc.get("cityCode")) or dep_iata
+        dep_city = _safe_str((locations.get(dep_iata) or {}).get("cityCode")) or dep_iata
     if arr_iata and not arr_city:
-        loc = locations.get(arr_iata) or {}
-        arr_city = _safe_str(loc.get("cityCode")) or arr_iata
-
-    # Stops
-    total_segments = len(outbound_segments) + len(return_segments)
-    stops = max(0, total_segments - (2 if return_segments else 1))
-    is_direct = stops == 0
-    if stops == 0:
-        stop_label = "Direct"
-    elif stops == 1:
-        stop_label = "1 stop"
-    else:
-        stop_label = f"{stops} stops"
-
-    # Next day arrival
-    next_day_arrival = False
-    if first_dep_date and last_arr_date and first_dep_date != last_arr_date:
-        next_day_arrival = True
+        arr_city = _safe_str((locations.get(arr_iata) or {}).get("cityCode")) or arr_iata
+    o.departure_city = sys.intern(dep_city)
+    o.arrival_city = sys.intern(arr_city)
 
     # Days left
-    days_left: int | None = None
+    o.days_left = None
+    first_dep_date = outbound[0].departure_date if outbound else ""
     if reference_depart_date or first_dep_date:
         ref = reference_depart_date or first_dep_date
         try:
             dep_d = datetime.strptime(ref[:10], "%Y-%m-%d").date()
-            days_left = (dep_d - date.today()).days
+            o.days_left = (dep_d - date.today()).days
         except (ValueError, TypeError):
             pass
 
@@ -264,7 +416,7 @@ def normalize_flight_offer(
         if tp:
             fds = (tp[0].get("fareDetailsBySegment") or [])
             if fds:
-                cabin = _safe_str(fds[0].get("cabin"))
+                cabin = _interned(fds[0].get("cabin"))
             # Baggage: check fareDetailsBySegment includedCheckedBags
             for fd in fds:
                 bags = fd.get("includedCheckedBags") or {}
@@ -274,157 +426,131 @@ def normalize_flight_offer(
                     break
     except Exception:
         pass
+    o.cabin = cabin
+    o.baggage = baggage
 
-    # Validating airline codes
+    # Validating airline codes / primary airline
     val_codes = offer.get("validatingAirlineCodes") or []
-    validating_airline_codes = [x for x in val_codes if x] if isinstance(val_codes, list) else []
-
-    # Primary airline
+    o.validating_airline_codes = tuple(x for x in val_codes if x) if isinstance(val_codes, list) else ()
     primary_airline = ""
-    if validating_airline_codes:
-        pc = validating_airline_codes[0]
+    if o.validating_airline_codes:
+        pc = o.validating_airline_codes[0]
         primary_airline = carriers.get(pc) or pc
-    elif airline_codes_set:
-        primary_airline = carriers.get(next(iter(airline_codes_set))) or next(iter(airline_codes_set))
-
-    # Outbound / return_leg
-    outbound = {
-        "segments": outbound_segments,
-        "duration_minutes": sum(s.get("duration_minutes") or 0 for s in outbound_segments),
-    }
-    outbound["duration"] = _format_duration_minutes(outbound["duration_minutes"])
-
-    return_leg: dict[str, Any] | None = None
-    if return_segments:
-        return_leg = {
-            "segments": return_segments,
-            "duration_minutes": sum(s.get("duration_minutes") or 0 for s in return_segments),
-        }
-        return_leg["duration"] = _format_duration_minutes(return_leg["duration_minutes"])
-
-    trip_type = "round_trip" if return_segments else "one_way"
-
-    # Route display: always show outbound (origin → destination), not overall return arrival
-    outbound_arr_iata = outbound_segments[-1].get("arrival_iata", "") if outbound_segments else ""
-    route_display = f"{dep_iata} → {outbound_arr_iata}" if dep_iata and outbound_arr_iata else ""
-    price_display = f"{price:.2f} {currency}" if price is not None else ""
-
-    # Outbound destination (for session/store when round-trip)
-    result_outbound_arr_iata = outbound_arr_iata
-
-    result: dict[str, Any] = {
-        "id": offer_id,
-        "price": price,
-        "currency": currency,
-        "total_duration": _format_duration_minutes(total_minutes),
-        "total_minutes": total_minutes,
-        "stops": stops,
-        "stop_label": stop_label,
-        "is_direct": is_direct,
-        "airline_codes": list(airline_codes_set),
-        "airline_names": [carriers.get(c) or c for c in airline_codes_set],
-        "primary_airline": primary_airline,
-        "departure_city": dep_city,
-        "departure_airport": dep_iata,
-        "departure_iata": dep_iata,
-        "departure_terminal": outbound_segments[0].get("departure_terminal", "") if outbound_segments else "",
-        "departure_datetime": first_dep_datetime,
-        "departure_date": first_dep_date,
-        "departure_time": outbound_segments[0].get("departure_time", "") if outbound_segments else "",
-        "arrival_city": arr_city,
-        "arrival_airport": arr_iata,
-        "arrival_iata": arr_iata,
-        "arrival_terminal": (
-            (return_segments[-1] if return_segments else outbound_segments[-1]).get("arrival_terminal", "")
-        ) if outbound_segments or return_segments else "",
-        "arrival_datetime": last_arr_datetime,
-        "arrival_date": last_arr_date,
-        "arrival_time": (
-            (return_segments[-1] if return_segments else outbound_segments[-1]).get("arrival_time", "")
-        ) if outbound_segments or return_segments else "",
-        "next_day_arrival": next_day_arrival,
-        "days_left": days_left,
-        "segments": outbound_segments + return_segments,
-        "outbound": outbound,
-        "return_leg": return_leg,
-        "trip_type": trip_type,
-        "cabin": cabin,
-        "baggage": baggage,
-        "validating_airline_codes": validating_airline_codes,
-        "booking_classes": [],
-        "badges": [],
-        "route_display": route_display,
-        "price_display": price_display,
-        "outbound_arrival_iata": result_outbound_arr_iata,
-    }
-
-    if include_raw:
-        result["raw_offer"] = offer
-
-    return result
+    elif o.airline_codes:
+        primary_airline = carriers.get(o.airline_codes[0]) or o.airline_codes[0]
+    o.primary_airline = primary_airline
 
+    o.raw_offer = offer if include_raw else None
+    return o
 
-def normalize_all_offers(
-    payload: dict[str, Any],
+
+def apply_dictionaries(o: Offer, dictionaries: dict[str, Any] | None) -> Offer:
+    """
+    Fill in what parse_offer(offer) without dictionaries left as codes: carrier names and
+    cities from the response's locations. For offers parsed before the dictionaries arrived.
+    """
+    if not dictionaries:
+        return o
+    carriers = (dictionaries.get("carriers") or {}) or {}
+    locations = (dictionaries.get("locations") or {}) or {}
+    if carriers:
+        for seg in o.outbound + o.inbound:
+            name = carriers.get(seg.carrier_code)
+            if name:
+                seg.carrier_name = sys.intern(name) if isinstance(name, str) else name
+        o.airline_names = tuple(carriers.get(c) or c for c in o.airline_codes)
+        pc = o.validating_airline_codes[0] if o.validating_airline_codes else (o.airline_codes or ("",))[0]
+        if pc:
+            o.primary_airline = carriers.get(pc) or pc
+    dep_iata, arr_iata = o.departure_iata, o.arrival_iata
+    if dep_iata and o.departure_city == dep_iata:
+        o.departure_city = sys.intern(_safe_str((locations.get(dep_iata) or {}).get("cityCode")) or dep_iata)
+    if arr_iata and o.arrival_city == arr_iata:
+        o.arrival_city = sys.intern(_safe_str((locations.get(arr_iata) or {}).get("cityCode")) or arr_iata)
+    return o
+
+
+# ---------------------------------------------------------------------------
+# Dict API (JSON shape)
+# ---------------------------------------------------------------------------
+
+
+def _normalize_segment(seg: dict[str, Any], carriers: dict[str, str]) -> dict[str, Any]:
+    return Segment.from_raw(seg, carriers).to_dict()
+
+
+def normalize_flight_offer(
+    offer: dict[str, Any],
+    dictionaries: dict[str, Any] | None = None,
     reference_depart_date: str | None = None,
     include_raw: bool = False,
-) -> list[dict[str, Any]]:
+) -> dict[str, Any] | None:
     """
-    Normalize all offers from Amadeus flight-offers response.
-    Returns list of normalized offers, skips invalid ones.
+    Convert a single Amadeus flight offer to normalized format.
+    Returns None if offer is invalid (e.g. no price).
     """
+    parsed = parse_offer(offer, dictionaries, reference_depart_date, include_raw)
+    return parsed.to_dict() if parsed else None
+
+
+def parse_all_offers(
+    payload: dict[str, Any],
+    reference_depart_date: str | None = None,
+    include_raw: bool = False,
+) -> list[Offer]:
+    """All valid offers from an Amadeus flight-offers response, as compact Offers."""
     if not payload or not isinstance(payload, dict):
         return []
 
     data = payload.get("data") or []
     dictionaries = payload.get("dictionaries") or {}
-
-    results: list[dict[str, Any]] = []
+    results: list[Offer] = []
     for offer in data:
-        norm = normalize_flight_offer(
+        parsed = parse_offer(
             offer,
             dictionaries=dictionaries,
             reference_depart_date=reference_depart_date,
             include_raw=include_raw,
         )
-        if norm:
-            results.append(norm)
-
+        if parsed:
+            results.append(parsed)
     return results
 
 
+def normalize_all_offers(
+    payload: dict[str, Any],
+    reference_depart_date: str | None = None,
+    include_raw: bool = False,
+) -> list[dict[str, Any]]:
+    """
+    Normalize all offers from Amadeus flight-offers response.
+    Returns list of normalized offers, skips invalid ones.
+    """
+    return [o.to_dict() for o in parse_all_offers(payload, reference_depart_date, include_raw)]
+
+
+def badge_lists(
+    prices: list[Any],
+    minutes: list[int | None],
+    stops: list[int | None] | None = None,
+    departures: list[str | None] | None = None,
+) -> list[list[str]]:
+    """
+    Badges per flight from parallel lists (see flight_ranking.rank):
+    cheapest, shortest, best_value (best-scored offer on the Pareto front).
+    """
+    return flight_ranking.rank(prices, minutes, stops, departures).badges
+
+
 def apply_badges(flights: list[dict[str, Any]]) -> list[dict[str, Any]]:
     """
-    Add badges: cheapest, shortest, best_value (placeholder).
+    Add badges: cheapest, shortest, best_value.
     Mutates each flight's badges list.
     """
     if not flights:
         return flights
-
-    # Cheapest
-    min_price = min((f.get("price") or float("inf")) for f in flights)
-    for f in flights:
-        if (f.get("price") or 0) == min_price:
-            f.setdefault("badges", []).append("cheapest")
-
-    # Shortest (lowest total_minutes)
-    valid_mins = [f.get("total_minutes") for f in flights if f.get("total_minutes") is not None]
-    if valid_mins:
-        min_mins = min(valid_mins)
-        for f in flights:
-            if f.get("total_minutes") == min_mins:
-                badges = f.setdefault("badges", [])
-                if "shortest" not in badges:
-                    badges.append("shortest")
-
-    # Best value: cheapest among shortest-duration flights (placeholder)
-    shortest_flights = [f for f in flights if "shortest" in (f.get("badges") or [])]
-    if shortest_flights:
-        best_val_price = min((f.get("price") or float("inf")) for f in shortest_flights)
-        for f in shortest_flights:
-            if (f.get("price") or 0) == best_val_price:
-                badges = f.setdefault("badges", [])
-                if "best_value" not in badges:
-                    badges.append("best_value")
-
+    computed = flight_ranking.rank_dicts(flights).badges
+    for f, new in zip(flights, computed):
+        badges = f.setdefault("badges", [])
+        badges.extend(b for b in new if b not in badges)
     return flights
@@ -0,0 +1,175 @@
+"""
+Ranking of flight offers for the search page and APIs.
+One pass over parallel lists gives the Pareto front over (price, total minutes, stops,
+departure-time preference), a weighted score per offer, the badges and the order for
+sort=best|price|duration. O(n log n): one sort plus a small table per (stops, departure) cell.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Sequence
+
+if TYPE_CHECKING:
+    from main.flight_normalizer import Offer
+
+SORTS = ("best", "price", "duration")
+DEFAULT_SORT = "best"
+
+# Stops beyond this count as this many (keeps the cell table small)
+MAX_STOPS = 3
+# Departure hour -> preference bucket, lower is better: day, shoulder, night
+DEPARTURE_BUCKETS = 3
+# Weights of the normalized criteria in the score; they sum to 1
+WEIGHTS = {"price": 0.55, "minutes": 0.25, "stops": 0.15, "departure": 0.05}
+
+_INF = float("inf")
+
+
+@lru_cache(maxsize=4096)
+def departure_bucket(value: str | None) -> int:
+    """0 for 07:00-20:59, 1 for 05:00-06:59 and 21:00-22:59, 2 otherwise or unknown."""
+    if not value:
+        return DEPARTURE_BUCKETS - 1
+    s = value.split("T", 1)[1] if "T" in value else value
+    try:
+        hour = int(s[:2])
+    except ValueError:
+        return DEPARTURE_BUCKETS - 1
+    if 7 <= hour < 21:
+        return 0
+    if 5 <= hour < 7 or 21 <= hour < 23:
+        return 1
+    return 2
+
+
+class Ranking:
+    """Result of rank(): everything is indexed like the input lists."""
+
+    __slots__ = ("order", "scores", "pareto", "badges")
+
+    def __init__(self, order: list[int], scores: list[float], pareto: list[bool], badges: list[list[str]]):
+        self.order = order
+        self.scores = scores
+        self.pareto = pareto
+        self.badges = badges
+
+
+def _price(p: Any) -> float:
+    try:
+        return float(p) if p else _INF
+    except (TypeError, ValueError):
+        return _INF
+
+
+def pareto_front(prices: Sequence[float], minutes: Sequence[float], stops: Sequence[int],
+                 buckets: Sequence[int]) -> list[bool]:
+    """
+    True for offers no other offer beats on all four criteria (lower is better everywhere).
+    Offers are visited by (price, minutes, ...); dom[s][b] is the shortest duration seen so far
+    among offers with at most s stops and bucket at most b, so dominance is one lookup.
+    Only front members update dom (at most 4 x 3 cells each). Identical offers do not
+    dominate each other.
+    """
+    n = len(prices)
+    dom = [[_INF] * DEPARTURE_BUCKETS for _ in range(MAX_STOPS + 1)]
+    front = [False] * n
+    prev: tuple | None = None
+    prev_front = False
+    for p, m, s, b, i in sorted(zip(prices, minutes, stops, buckets, range(n))):
+        crit = (p, m, s, b)
+        if crit == prev:
+            front[i] = prev_front
+            continue
+        prev = crit
+        prev_front = dom[s][b] > m
+        if not prev_front:
+            continue
+        front[i] = True
+        for row in dom[s:]:
+            for b2 in range(b, DEPARTURE_BUCKETS):
+                if m < row[b2]:
+                    row[b2] = m
+    return front
+
+
+def _normalized(values: Sequence[float]) -> list[float]:
+    """Excess over the best value as a fraction of it, capped at 1 (unknown counts as 1)."""
+    lo = min(values)
+    if lo == _INF:
+        return [1.0] * len(values)
+    if lo <= 0:
+        return [0.0 if v == lo else 1.0 for v in values]
+    return [v / lo - 1 if v < 2 * lo else 1.0 for v in values]
+
+
+def rank(
+    prices: Sequence[Any],
+    minutes: Sequence[int | None],
+    stops: Sequence[int | None] | None = None,
+    departures: Sequence[str | None] | None = None,
+    sort: str = DEFAULT_SORT,
+) -> Ranking:
+    """
+    Rank offers given as parallel lists (stops / departures default to direct, daytime).
+    order: indices for `sort` ("best": Pareto front first, then by score; "price"; "duration").
+    scores: 0..1, higher is better. Badges: cheapest, shortest, best_value (top of the front).
+    """
+    n = len(prices)
+    if not n:
+        return Ranking([], [], [], [])
+    p = [_price(x) for x in prices]
+    m = [float(x) if x is not None else _INF for x in minutes]
+    s = [x if x and x <= MAX_STOPS else (MAX_STOPS if x else 0) for x in stops] if stops is not None else [0] * n
+    b = [departure_bucket(x) for x in departures] if departures is not None else [0] * n
+
+    front = pareto_front(p, m, s, b)
+    wp, wm = WEIGHTS["price"], WEIGHTS["minutes"]
+    ws, wd = WEIGHTS["stops"] / MAX_STOPS, WEIGHTS["departure"] / (DEPARTURE_BUCKETS - 1)
+    scores = [
+        round(1 - (wp * xp + wm * xm + ws * xs + wd * xb), 4)
+        for xp, xm, xs, xb in zip(_normalized(p), _normalized(m), s, b)
+    ]
+
+    best_keys = list(zip([not f for f in front], [-sc for sc in scores], p, m))
+    best_key = best_keys.__getitem__
+    if sort == "price":
+        order = sorted(range(n), key=list(zip(p, m)).__getitem__)
+    elif sort == "duration":
+        order = sorted(range(n), key=list(zip(m, p)).__getitem__)
+    else:
+        order = sorted(range(n), key=best_key)
+
+    badges: list[list[str]] = [[] for _ in range(n)]
+    min_price = min(p)
+    for i in range(n):
+        if p[i] == min_price and min_price != _INF:
+            badges[i].append("cheapest")
+    min_minutes = min(m)
+    if min_minutes != _INF:
+        for i in range(n):
+            if m[i] == min_minutes:
+                badges[i].append("shortest")
+    best = min(range(n), key=best_key) if sort in ("price", "duration") else order[0]
+    badges[best].append("best_value")
+    return Ranking(order, scores, front, badges)
+
+
+def rank_offers(offers: Sequence[Offer], sort: str = DEFAULT_SORT) -> Ranking:
+    return rank(
+        [o.price for o in offers],
+        [o.total_minutes for o in offers],
+        [o.stops for o in offers],
+        [o.departure_datetime for o in offers],
+        sort,
+    )
+
+
+def rank_dicts(flights: Sequence[dict[str, Any]], sort: str = DEFAULT_SORT) -> Ranking:
+    """Same as rank_offers for normalized flight dicts (normalize_flight_offer shape)."""
+    return rank(
+        [f.get("price") for f in flights],
+        [f.get("total_minutes") for f in flights],
+        [f.get("stops") for f in flights],
+        [f.get("departure_datetime") or f.get("departure_time") for f in flights],
+        sort,
+    )
@@ -0,0 +1,308 @@
+"""
+Refining a cached search without another upstream call.
+The search APIs hand out a search_id (a handle on the search cache key); the results API
+filters, sorts and paginates that cached result set in memory, and the offer API serves
+one offer of it in full (segments and legs).
+Each set gets per-attribute indexes once (bitmasks per stop count and airline, sorted
+price / departure-time lists with prefix masks), so a query is a few integer ANDs plus
+one walk over the sort order.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Any
+
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from main.flight_cache import search_cache
+from main.flight_normalizer import Offer
+from main.flight_ranking import SORTS, Ranking, rank_offers
+
+HANDLE_PREFIX = "cff:results:v1"
+VIEWS = ("full", "summary")
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+# Result sets whose indexes are kept in this process
+INDEX_CACHE_SIZE = 64
+
+
+def search_id_for(key: str) -> str:
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def register(key: str) -> str:
+    """Handle for a search cache key; lives as long as a cache entry can."""
+    search_id = search_id_for(key)
+    search_cache.backend.set(f"{HANDLE_PREFIX}:{search_id}", key, timeout=search_cache.ttl + search_cache.stale_ttl)
+    return search_id
+
+
+def resolve(search_id: str) -> str | None:
+    key = search_cache.backend.get(f"{HANDLE_PREFIX}:{search_id}")
+    return key if isinstance(key, str) else None
+
+
+def _departure_minute(offer: Offer) -> int | None:
+    at = offer.departure_datetime
+    if "T" not in at:
+        return None
+    try:
+        h, m = at.split("T", 1)[1][:5].split(":")
+        return int(h) * 60 + int(m)
+    except ValueError:
+        return None
+
+
+def parse_hhmm(value: str) -> int | None:
+    try:
+        h, m = value.strip().split(":")
+        h, m = int(h), int(m)
+    except (ValueError, AttributeError):
+        return None
+    return h * 60 + m if 0 <= h <= 24 and 0 <= m < 60 and h * 60 + m <= 24 * 60 else None
+
+
+class _SortedMasks:
+    """Values in ascending order with prefix masks: prefix[j] has the first j offers set."""
+
+    __slots__ = ("values", "prefix")
+
+    def __init__(self, pairs: list[tuple[float, int]]):
+        pairs.sort()
+        self.values = [v for v, _ in pairs]
+        self.prefix = [0]
+        for _, i in pairs:
+            self.prefix.append(self.prefix[-1] | (1 << i))
+
+    def at_most(self, hi: float) -> int:
+        return self.prefix[bisect_right(self.values, hi)]
+
+    def between(self, lo: float, hi: float) -> int:
+        """lo <= value <= hi; lo > hi is a wrap-around window (22:00-06:00: value >= lo or value <= hi)."""
+        low = self.prefix[bisect_left(self.values, lo)]
+        if lo > hi:
+            return (self.prefix[-1] ^ low) | self.prefix[bisect_right(self.values, hi)]
+        return self.prefix[bisect_right(self.values, hi)] ^ low
+
+
+class ResultIndex:
+    """Per-attribute indexes over one cached result set (bit i = offers[i])."""
+
+    def __init__(self, offers: list[Offer]):
+        self.offers = offers
+        self.by_id = {o.id: i for i, o in enumerate(offers)}
+        self.all = (1 << len(offers)) - 1
+        self.by_stops: dict[int, int] = {}
+        self.by_airline: dict[str, int] = {}
+        self.airline_names: dict[str, str] = {}
+        prices: list[tuple[float, int]] = []
+        departures: list[tuple[int, int]] = []
+        for i, o in enumerate(offers):
+            bit = 1 << i
+            self.by_stops[o.stops] = self.by_stops.get(o.stops, 0) | bit
+            for code, name in zip(o.airline_codes, o.airline_names):
+                self.by_airline[code] = self.by_airline.get(code, 0) | bit
+                self.airline_names.setdefault(code, name)
+            if o.price:
+                prices.append((float(o.price), i))
+            minute = _departure_minute(o)
+            if minute is not None:
+                departures.append((minute, i))
+        self.price = _SortedMasks(prices)
+        self.departure = _SortedMasks(departures)
+        self._rankings: dict[str, Ranking] = {}
+        self._lock = threading.Lock()
+
+    def ranking(self, sort: str) -> Ranking:
+        with self._lock:
+            if sort not in self._rankings:
+                self._rankings[sort] = rank_offers(self.offers, sort)
+            return self._rankings[sort]
+
+    def mask(
+        self,
+        max_stops: int | None = None,
+        airlines: list[str] | None = None,
+        depart_after: int | None = None,
+        depart_before: int | None = None,
+        max_price: float | None = None,
+    ) -> int:
+        mask = self.all
+        if max_stops is not None:
+            stops_mask = 0
+            for stops, m in self.by_stops.items():
+                if stops <= max_stops:
+                    stops_mask |= m
+            mask &= stops_mask
+        if airlines:
+            airline_mask = 0
+            for code in airlines:
+                airline_mask |= self.by_airline.get(code, 0)
+            mask &= airline_mask
+        if depart_after is not None or depart_before is not None:
+            mask &= self.departure.between(
+                depart_after if depart_after is not None else 0,
+                depart_before if depart_before is not None else 24 * 60,
+            )
+        if max_price is not None:
+            mask &= self.price.at_most(max_price)
+        return mask
+
+    def facets(self) -> dict[str, Any]:
+        """Counts over the whole set, for building filter controls."""
+        return {
+            "stops": {str(s): m.bit_count() for s, m in sorted(self.by_stops.items())},
+            "airlines": [
+                {"code": code, "name": self.airline_names.get(code) or code, "count": m.bit_count()}
+                for code, m in sorted(self.by_airline.items(), key=lambda kv: -kv[1].bit_count())
+            ],
+            "price": {"min": self.price.values[0], "max": self.price.values[-1]} if self.price.values else None,
+        }
+
+    def rows(self, indices: list[int], summary: bool = False) -> list[dict[str, Any]]:
+        """Serialized offers with badges / score / pareto from the sort=best ranking."""
+        ranking = self.ranking("best")
+        return [
+            {**(self.offers[i].to_summary() if summary else self.offers[i].to_dict()),
+             "badges": ranking.badges[i], "score": ranking.scores[i], "pareto": ranking.pareto[i]}
+            for i in indices
+        ]
+
+    def query(self, mask: int, sort: str, offset: int, limit: int) -> tuple[list[int], int]:
+        """(indices of one page in `sort` order, total matching)."""
+        total = mask.bit_count()
+        page: list[int] = []
+        if offset >= total:
+            return page, total
+        seen = 0
+        for i in self.ranking(sort).order:
+            if mask >> i & 1:
+                if seen >= offset:
+                    page.append(i)
+                    if len(page) == limit:
+                        break
+                seen += 1
+        return page, total
+
+
+_indexes: OrderedDict[tuple[str, float], ResultIndex] = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def result_index(key: str, entry: dict[str, Any]) -> ResultIndex:
+    """Index for a cache entry; rebuilt when the entry is refreshed (new created_at)."""
+    ident = (key, float(entry.get("created_at") or 0))
+    with _indexes_lock:
+        index = _indexes.get(ident)
+        if index is not None:
+            _indexes.move_to_end(ident)
+            return index
+    index = ResultIndex(entry.get("flights") or [])
+    with _indexes_lock:
+        _indexes[ident] = index
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def _cached(search_id: str) -> tuple[str, dict[str, Any]] | None:
+    key = resolve(search_id) if search_id else None
+    entry = search_cache.get(key) if key else None
+    return (key, entry) if entry is not None else None
+
+
+def _expired(meta: dict[str, Any]) -> JsonResponse:
+    return JsonResponse(
+        {"success": False, "meta": meta, "data": [], "errors": ["search expired, please search again"]},
+        status=404,
+    )
+
+
+@require_GET
+def cheap_flight_results_api(request):
+    """
+    Filter / sort / paginate a cached search. Never calls the upstream API.
+    GET params: search_id (from a search response's meta), max_stops?, airlines? (comma-separated
+    carrier codes), depart_after? / depart_before? (HH:MM; after > before is an overnight window),
+    max_price?, sort? (best | price | duration), page? (1-based), page_size? (max MAX_PAGE_SIZE),
+    view? (full | summary: Offer.to_summary rows).
+    """
+    errors: list[str] = []
+    search_id = (request.GET.get("search_id") or "").strip()
+    sort = (request.GET.get("sort") or "best").strip().lower()
+    view = (request.GET.get("view") or "full").strip().lower()
+    airlines = [c.strip().upper() for c in (request.GET.get("airlines") or "").split(",") if c.strip()]
+    filters: dict[str, Any] = {"airlines": airlines or None}
+
+    if not search_id:
+        errors.append("missing search_id")
+    if sort not in SORTS:
+        errors.append("invalid sort (use best, price or duration)")
+    if view not in VIEWS:
+        errors.append("invalid view (use full or summary)")
+    try:
+        page = max(1, int(request.GET.get("page") or 1))
+        page_size = max(1, min(MAX_PAGE_SIZE, int(request.GET.get("page_size") or PAGE_SIZE)))
+    except (ValueError, TypeError):
+        page, page_size = 1, PAGE_SIZE
+        errors.append("invalid page")
+    for name, parse in (("max_stops", int), ("max_price", float)):
+        raw = (request.GET.get(name) or "").strip()
+        filters[name] = None
+        if raw:
+            try:
+                filters[name] = parse(raw)
+            except ValueError:
+                errors.append(f"invalid {name}")
+    for name in ("depart_after", "depart_before"):
+        raw = (request.GET.get(name) or "").strip()
+        filters[name] = parse_hhmm(raw) if raw else None
+        if raw and filters[name] is None:
+            errors.append(f"invalid {name} (use HH:MM)")
+
+    meta = {"search_id": search_id, "sort": sort, "page": page, "page_size": page_size, "total": 0}
+    if errors:
+        return JsonResponse({"success": False, "meta": meta, "data": [], "errors": errors}, status=400)
+
+    found = _cached(search_id)
+    if found is None:
+        return _expired(meta)
+    key, entry = found
+    index = result_index(key, entry)
+    indices, total = index.query(index.mask(**filters), sort, (page - 1) * page_size, page_size)
+    flights = index.rows(indices, summary=view == "summary")
+    meta.update({
+        "total": total,
+        "total_pages": (total + page_size - 1) // page_size,
+        "result_count": len(flights),
+        "facets": index.facets(),
+        "cache": search_cache.meta(entry, "hit"),
+    })
+    return JsonResponse({"success": True, "meta": meta, "data": flights, "errors": []})
+
+
+@require_GET
+def cheap_flight_offer_api(request):
+    """
+    One offer of a cached search in full (to_dict(): segments, legs, cabin, baggage),
+    for list views that only had its summary. GET params: search_id, offer_id.
+    """
+    search_id = (request.GET.get("search_id") or "").strip()
+    offer_id = (request.GET.get("offer_id") or "").strip()
+    meta = {"search_id": search_id, "offer_id": offer_id}
+    if not search_id or not offer_id:
+        return JsonResponse({"success": False, "meta": meta, "data": None, "errors": ["missing search_id or offer_id"]},
+                            status=400)
+    found = _cached(search_id)
+    if found is None:
+        return _expired(meta)
+    index = result_index(*found)
+    i = index.by_id.get(offer_id)
+    if i is None:
+        return JsonResponse({"success": False, "meta": meta, "data": None, "errors": ["offer not found"]}, status=404)
+    flight = index.rows([i])[0]
+    return JsonResponse({"success": True, "meta": meta, "data": flight, "errors": []})
@@ -0,0 +1,225 @@
+"""
+Streaming (NDJSON) variant of the flight search API.
+The meta line goes out before any lookup or upstream call; offers follow one per line as
+they are parsed out of the Amadeus response, and a final line carries badges and the ranking.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from datetime import datetime
+from typing import Any, Generator, Iterator
+
+import requests
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from main import airport_data, flight_results
+from main.cheap_flight_finder import (
+    SEARCH_MAX_ITEMS,
+    AmadeusError,
+    _dedupe_key,
+    _deduplicate_flights,
+    cached_search,
+    did_you_mean,
+    open_offers_stream,
+    resolve_pair,
+)
+from main.deadline import Deadline, DeadlineExceeded, optional_timeout
+from main.flight_cache import make_search_key, search_cache
+from main.flight_calendar import _cell_error, _common_params, _ndjson
+from main.flight_normalizer import Offer, apply_dictionaries, parse_offer
+from main.flight_ranking import SORTS, rank_offers
+from main.price_history import price_history
+from main.singleflight import SingleFlightTimeout
+
+logger = logging.getLogger(__name__)
+
+# Same page size as cached_search, so a streamed search fills the cache for the JSON API
+STREAM_MAX_ITEMS = SEARCH_MAX_ITEMS
+
+
+def _ranking_line(offers: list[Offer], raw_count: int, cache_meta: dict, start_ms: float,
+                  deadline: Deadline, sort: str) -> dict[str, Any]:
+    ranking = rank_offers(offers, sort)
+    carriers = {code: name for o in offers for code, name in zip(o.airline_codes, o.airline_names)}
+    warnings = []
+    if raw_count > 10:
+        warnings.append("Some results may be limited due to API constraints.")
+    return {
+        "type": "ranking",
+        "sort": sort,
+        "order": [offers[i].id for i in ranking.order],
+        "badges": {o.id: b for o, b in zip(offers, ranking.badges) if b},
+        "scores": {o.id: sc for o, sc in zip(offers, ranking.scores)},
+        "carriers": carriers,
+        "result_count": len(offers),
+        "raw_count": raw_count,
+        "cache": cache_meta,
+        "warnings": warnings,
+        "search_time_ms": round((time.time() * 1000) - start_ms, 0),
+        "timings_ms": deadline.timings(),
+    }
+
+
+def _stream_live(origin_iata: str, destination_iata: str, depart_date: str, return_date: str | None,
+                 currency: str, adults: int, key: str, deadline: Deadline) -> Generator[str, None, dict]:
+    """
+    Offer lines straight off the wire (carrier names arrive last, in the ranking line).
+    Returns the cache entry built from the offers parsed on the way.
+    """
+    with deadline.stage("upstream_headers"):
+        stream = open_offers_stream(
+            origin_iata, destination_iata, depart_date, currency,
+            max_items=STREAM_MAX_ITEMS, return_date=return_date, adults=adults, deadline=deadline,
+        )
+    seen: set[tuple] = set()
+    offers: list[Offer] = []
+    t0 = time.monotonic()
+    for raw in stream:
+        offer = parse_offer(raw, reference_depart_date=depart_date)
+        if offer is None:
+            continue
+        k = _dedupe_key(offer)
+        if k in seen:
+            continue
+        seen.add(k)
+        offers.append(offer)
+        if "first_offer" not in deadline.stages:
+            deadline.stages["first_offer"] = round((time.monotonic() - t0) * 1000, 1)
+        yield _ndjson({"type": "offer", **offer.to_dict()})
+    deadline.stages["upstream_body"] = round((time.monotonic() - t0) * 1000, 1)
+
+    # Same entry cached_search would build: names from the dictionaries, _deduplicate_flights order
+    dictionaries = stream.payload.get("dictionaries") or {}
+    for offer in offers:
+        apply_dictionaries(offer, dictionaries)
+    offers = _deduplicate_flights(offers)
+    raw_count = len(stream.payload.get("data") or [])
+    entry = search_cache.set(key, offers, raw_count, source="amadeus")
+    price_history.record(origin_iata, destination_iata, depart_date, return_date, currency, offers, source="stream")
+    return entry
+
+
+def _replay(entry: dict, status: str, start_ms: float, deadline: Deadline, sort: str) -> Iterator[str]:
+    """A cached (or someone else's just-fetched) result as offer lines in `sort` order, then the ranking."""
+    offers: list[Offer] = entry.get("flights") or []
+    line = _ranking_line(offers, entry.get("raw_count") or 0, search_cache.meta(entry, status),
+                         start_ms, deadline, sort)
+    by_id = {o.id: o for o in offers}
+    for offer_id in line["order"]:
+        yield _ndjson({"type": "offer", **by_id[offer_id].to_dict()})
+    yield _ndjson(line)
+
+
+def _route_line(params: dict[str, Any], origin_iata: str, destination_iata: str) -> dict[str, Any]:
+    destination_city = airport_data.iata_to_city(destination_iata)
+    if not destination_city and not airport_data.looks_like_iata(params["destination_query"]):
+        destination_city = params["destination_query"]
+    return {
+        "type": "route",
+        "origin_iata": origin_iata,
+        "destination_iata": destination_iata,
+        "destination_city": destination_city or destination_iata,
+        "destination_country": airport_data.iata_to_country(destination_iata),
+    }
+
+
+@require_GET
+def cheap_flight_search_stream_api(request):
+    """
+    NDJSON flight search. GET params: same as cheap_flight_search_api.
+    Lines: {"type": "meta"} at once (before any lookup); {"type": "route"} with the resolved
+    airports, search_id and whether the search is cached; one {"type": "offer"} per normalized
+    offer (arrival order, or ranked when served from cache or from an identical in-flight
+    stream); then {"type": "ranking"} with ids in `sort` order, badges, scores and carrier
+    names, or {"type": "error"} if resolution or the upstream call failed.
+    """
+    start_ms = time.time() * 1000
+    deadline = Deadline(float(getattr(settings, "CFF_SEARCH_DEADLINE", 25)))
+    params, errors = _common_params(request)
+    depart_date = (request.GET.get("depart_date") or "").strip()
+    return_date = (request.GET.get("return_date") or "").strip()
+    trip_type = (request.GET.get("trip_type") or "one_way").strip().lower()
+    sort = (request.GET.get("sort") or "best").strip().lower()
+    if sort not in SORTS:
+        errors.append("invalid sort (use best, price or duration)")
+    if not depart_date:
+        errors.append("missing date")
+    elif len(depart_date) < 10:
+        errors.append("invalid depart_date format (use YYYY-MM-DD)")
+    if trip_type == "round_trip" and not return_date:
+        errors.append("return_date required for round trip")
+    if trip_type == "round_trip" and len(depart_date) >= 10 and len(return_date) >= 10:
+        try:
+            if datetime.strptime(return_date[:10], "%Y-%m-%d") < datetime.strptime(depart_date[:10], "%Y-%m-%d"):
+                errors.append("return_date cannot be before depart_date")
+        except (ValueError, TypeError):
+            pass
+
+    meta = {**params, "trip_type": trip_type, "sort": sort, "depart_date": depart_date, "return_date": return_date}
+    if errors:
+        meta["search_time_ms"] = round((time.time() * 1000) - start_ms, 0)
+        return JsonResponse({"success": False, "meta": meta, "data": [], "warnings": [], "errors": errors}, status=400)
+
+    rd = return_date if trip_type == "round_trip" else None
+    currency, adults = params["currency"], params["adults"]
+
+    def error_line(message: str, **extra: Any) -> str:
+        return _ndjson({
+            "type": "error",
+            "errors": [message],
+            **extra,
+            "search_time_ms": round((time.time() * 1000) - start_ms, 0),
+            "timings_ms": deadline.timings(),
+        })
+
+    def stream():
+        yield _ndjson({"type": "meta", **meta})
+        key = None
+        try:
+            with deadline.stage("resolve"):
+                origin_iata, destination_iata = resolve_pair(
+                    params["origin_query"], params["destination_query"], deadline,
+                )
+            if not origin_iata or not destination_iata:
+                which = "origin" if not origin_iata else "destination"
+                yield error_line(f"invalid {which}", suggestions=did_you_mean(params[f"{which}_query"]))
+                return
+            route = _route_line(params, origin_iata, destination_iata)
+            key = make_search_key(origin_iata, destination_iata, depart_date, rd, currency, adults)
+            cached = search_cache.get(key) is not None
+            # Valid once the ranking line is out (the cache is filled by then)
+            yield _ndjson({**route, "cached": cached, "search_id": flight_results.register(key)})
+            if cached:
+                # Counts the hit and starts a refresh if stale; returns at once
+                entry, status = cached_search(
+                    origin_iata, destination_iata, depart_date, rd, currency, adults, deadline=deadline,
+                )
+                yield from _replay(entry, status, start_ms, deadline, sort)
+                return
+
+            # Identical concurrent streams share one upstream call: the leader streams it,
+            # the others wait for its cache entry and replay it ranked
+            entry, shared = yield from search_cache.inflight.do_iter(
+                key,
+                lambda: _stream_live(origin_iata, destination_iata, depart_date, rd, currency, adults, key, deadline),
+                timeout=optional_timeout(deadline, search_cache.wait_timeout),
+            )
+            if shared:
+                search_cache.coalesced += 1
+                yield from _replay(entry, "coalesced", start_ms, deadline, sort)
+            else:
+                search_cache.misses += 1
+                yield _ndjson(_ranking_line(entry.get("flights") or [], entry.get("raw_count") or 0,
+                                            search_cache.meta(entry, "miss"), start_ms, deadline, sort))
+        except (AmadeusError, requests.exceptions.RequestException, SingleFlightTimeout,
+                DeadlineExceeded, ValueError) as e:
+            logger.warning("Streaming flight search failed for %s: %s", key or meta, e)
+            yield error_line(_cell_error(e))
+
+    resp = StreamingHttpResponse(stream(), content_type="application/x-ndjson")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"
+    return resp
@@ -1,10 +1,14 @@
+import logging
 import os
 import time
-import requests
 import feedparser
 from datetime import datetime, timezone
 from django.core.cache import cache
 
+from main.http_client import http_client
+
+logger = logging.getLogger(__name__)
+
 CACHE_KEY = "home_feed_v1"
 CACHE_TTL = int(os.getenv("CACHE_TTL_SECONDS", "1800"))  # 30 dəq
 
@@ -17,7 +21,7 @@ def fetch_hn(limit=15):
     """Hacker News (Algolia) — dev xəbərləri"""
     query = os.getenv("HN_QUERY", "python OR django OR ai")
     url = "https://hn.algolia.com/api/v1/search_by_date"
-    r = requests.get(url, params={"query": query, "tags": "story", "hitsPerPage": limit}, timeout=15)
+    r = http_client.get(url, params={"query": query, "tags": "story", "hitsPerPage": limit}, timeout=15)
     r.raise_for_status()
     items = []
     for h in r.json().get("hits", []):
@@ -44,7 +48,7 @@ def fetch_devto(limit=12):
     params = {"per_page": limit}
     if tag:
         params["tag"] = tag
-    r = requests.get("https://dev.to/api/articles", params=params,
+    r = http_client.get("https://dev.to/api/articles", params=params,
                      headers={"User-Agent": "PortfolioFeed/1.0"}, timeout=15)
     r.raise_for_status()
     items = []
@@ -61,11 +65,23 @@ def fetch_devto(limit=12):
         })
     return items
 
+def _parse_feed(url):
+    """RSS/Atom feed, or None if it is down (one dead feed must not empty the whole home feed)"""
+    try:
+        r = http_client.get(url, timeout=15)
+        r.raise_for_status()
+    except Exception as e:
+        logger.warning("Feed %s unavailable: %s", url, e)
+        return None
+    return feedparser.parse(r.content)
+
 def fetch_arxiv(limit=12):
     """arXiv — AI/LG/CL tədqiqatları (RSS/Atom)"""
     q = "cat:cs.AI+OR+cs.LG+OR+cs.CL"
     url = f"http://export.arxiv.org/api/query?search_query={q}&sortBy=submittedDate&sortOrder=descending&max_results={limit}"
-    feed = feedparser.parse(url)
+    feed = _parse_feed(url)
+    if feed is None:
+        return []
     items = []
     for e in feed.entries:
         pub = None
@@ -91,7 +107,9 @@ def fetch_press(limit_per_feed=8):
     ]
     items = []
     for f in feeds:
-        parsed = feedparser.parse(f)
+        parsed = _parse_feed(f)
+        if parsed is None:
+            continue
         for e in parsed.entries[:limit_per_feed]:
             pub = None
             if getattr(e, "published_parsed", None):
@@ -0,0 +1,293 @@
+"""
+Shared outbound HTTP clients for every integration (Amadeus, Google Places, OpenAI,
+OpenWeather, Marketstack, news feeds, ip-api).
+http_client: one requests.Session per process with keep-alive connection pools per host
+(CFF_HTTP_POOL_HOSTS hosts, CFF_HTTP_POOL_SIZE connections each), so repeated calls to an
+upstream skip the TCP and TLS handshakes. async_http_client: the same for async views, on
+one httpx.AsyncClient per event loop.
+Calls get a default (connect, read) timeout of CFF_HTTP_CONNECT_TIMEOUT /
+CFF_HTTP_READ_TIMEOUT unless they pass their own.
+GETs are retried up to CFF_HTTP_RETRIES times on connection errors and 502/503/504 with a
+short jittered backoff; callers with their own retry policy (the Amadeus client) pass
+retries=0. Other methods are never retried.
+Every call is timed and counted per upstream (status codes, errors, retries) in one table
+shared by both clients; the analytics dashboard's Upstreams page shows the numbers.
+requests / httpx exceptions propagate unchanged (see TIMEOUT_ERRORS, TRANSPORT_ERRORS).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Any
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from main.conf import float_setting, int_setting
+
+logger = logging.getLogger(__name__)
+
+# Statuses a GET is retried on (429 is left to callers: it needs Retry-After handling)
+RETRY_STATUSES = frozenset({502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# Either client's exceptions, for callers that serve both
+TIMEOUT_ERRORS = (requests.exceptions.Timeout, httpx.TimeoutException)
+TRANSPORT_ERRORS = (requests.exceptions.RequestException, httpx.HTTPError)
+_RETRYABLE_ERRORS = (
+    requests.exceptions.ConnectionError, requests.exceptions.Timeout, httpx.TransportError,
+)
+
+
+def default_timeout() -> tuple[float, float]:
+    """(connect, read) seconds for calls that pass no timeout."""
+    return float_setting("CFF_HTTP_CONNECT_TIMEOUT", 5), float_setting("CFF_HTTP_READ_TIMEOUT", 25)
+
+
+class _UpstreamStats:
+    __slots__ = ("calls", "errors", "retries", "statuses", "total_ms", "max_ms", "last_ms")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.statuses: dict[int, int] = {}
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+    def as_dict(self, name: str) -> dict[str, Any]:
+        return {
+            "name": name,
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "statuses": dict(sorted(self.statuses.items())),
+            "avg_ms": round(self.total_ms / self.calls, 1) if self.calls else None,
+            "max_ms": round(self.max_ms, 1),
+            "last_ms": round(self.last_ms, 1),
+        }
+
+
+class CallStats:
+    """Per-upstream call counters and latency (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[str, _UpstreamStats] = {}
+
+    def record(self, upstream: str, ms: float, status: int | None, retried: bool) -> None:
+        """status None: the call raised (connection error, timeout, ...)."""
+        with self._lock:
+            s = self._stats.get(upstream)
+            if s is None:
+                s = self._stats[upstream] = _UpstreamStats()
+            s.calls += 1
+            s.retries += retried
+            s.total_ms += ms
+            s.max_ms = max(s.max_ms, ms)
+            s.last_ms = ms
+            if status is None:
+                s.errors += 1
+            else:
+                s.statuses[status] = s.statuses.get(status, 0) + 1
+
+    def stats(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return [s.as_dict(name) for name, s in sorted(self._stats.items())]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+class _RetryPolicy:
+    def __init__(self, retries: int | None, backoff: float | None):
+        self.retries = int(retries if retries is not None else int_setting("CFF_HTTP_RETRIES", 1))
+        self.backoff = float(backoff if backoff is not None else float_setting("CFF_HTTP_BACKOFF_S", 0.2))
+
+    def attempts(self, method: str, retries: int | None) -> int:
+        if method not in IDEMPOTENT_METHODS:
+            return 1
+        return 1 + (self.retries if retries is None else retries)
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+
+class HttpClient(_RetryPolicy):
+    def __init__(
+        self,
+        pool_hosts: int | None = None,
+        pool_size: int | None = None,
+        retries: int | None = None,
+        backoff: float | None = None,
+        calls: CallStats | None = None,
+    ):
+        super().__init__(retries, backoff)
+        self.pool_hosts = int(pool_hosts if pool_hosts is not None else int_setting("CFF_HTTP_POOL_HOSTS", 16))
+        self.pool_size = int(pool_size if pool_size is not None else int_setting("CFF_HTTP_POOL_SIZE", 20))
+        self.calls = calls or CallStats()
+        self._session = self._make_session()
+
+    def _make_session(self) -> requests.Session:
+        session = requests.Session()
+        # Retries are done here (with stats), not by urllib3
+        adapter = HTTPAdapter(pool_connections=self.pool_hosts, pool_maxsize=self.pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        # One session serves every user and upstream: never carry cookies between calls
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        return session
+
+    default_timeout = staticmethod(default_timeout)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        upstream: str | None = None,
+        timeout: Any = None,
+        retries: int | None = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """
+        Send one request through the shared session; `upstream` labels the stats (default: the
+        URL's host). Returns the last response whatever its status; raises the last
+        requests exception when every attempt failed.
+        """
+        method = method.upper()
+        upstream = upstream or urlsplit(url).hostname or "unknown"
+        if timeout is None:
+            timeout = default_timeout()
+        attempts = self.attempts(method, retries)
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            start = time.perf_counter()
+            try:
+                resp = self._session.request(method, url, timeout=timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self.calls.record(upstream, (time.perf_counter() - start) * 1000, None, attempt > 0)
+                if last or not isinstance(e, _RETRYABLE_ERRORS):
+                    raise
+                logger.info("%s %s failed (%s), retrying", method, upstream, type(e).__name__)
+            else:
+                self.calls.record(upstream, (time.perf_counter() - start) * 1000, resp.status_code, attempt > 0)
+                if last or resp.status_code not in RETRY_STATUSES:
+                    return resp
+                resp.close()
+            time.sleep(self.delay(attempt))
+        raise AssertionError("unreachable")
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> list[dict[str, Any]]:
+        return self.calls.stats()
+
+    def reset_stats(self) -> None:
+        self.calls.reset()
+
+    def close(self) -> None:
+        self._session.close()
+
+
+class AsyncHttpClient(_RetryPolicy):
+    """
+    httpx twin of HttpClient for async views. An httpx.AsyncClient (and its pool) is bound
+    to the event loop it was created on, so there is one per running loop: under ASGI that is
+    one per worker; under WSGI every async view runs on a fresh loop and gets a fresh pool.
+    """
+
+    def __init__(
+        self,
+        pool_hosts: int | None = None,
+        pool_size: int | None = None,
+        retries: int | None = None,
+        backoff: float | None = None,
+        calls: CallStats | None = None,
+    ):
+        super().__init__(retries, backoff)
+        hosts = int(pool_hosts if pool_hosts is not None else int_setting("CFF_HTTP_POOL_HOSTS", 16))
+        size = int(pool_size if pool_size is not None else int_setting("CFF_HTTP_POOL_SIZE", 20))
+        self.limits = httpx.Limits(max_connections=hosts * size, max_keepalive_connections=size)
+        self.calls = calls or CallStats()
+        self._clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            # As with the session: a jar that never stores a cookie
+            jar = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+            client = self._clients[loop] = httpx.AsyncClient(limits=self.limits, cookies=httpx.Cookies(jar))
+        return client
+
+    @staticmethod
+    def _timeout(timeout: Any) -> httpx.Timeout:
+        connect, read = default_timeout()
+        if timeout is None:
+            return httpx.Timeout(read, connect=connect)
+        if isinstance(timeout, tuple):
+            return httpx.Timeout(timeout[1], connect=timeout[0])
+        return httpx.Timeout(timeout)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        upstream: str | None = None,
+        timeout: Any = None,
+        retries: int | None = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """Like HttpClient.request; timeout may be seconds, (connect, read) or None."""
+        method = method.upper()
+        upstream = upstream or urlsplit(url).hostname or "unknown"
+        client = self._client()
+        attempts = self.attempts(method, retries)
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            start = time.perf_counter()
+            try:
+                resp = await client.request(method, url, timeout=self._timeout(timeout), **kwargs)
+            except httpx.HTTPError as e:
+                self.calls.record(upstream, (time.perf_counter() - start) * 1000, None, attempt > 0)
+                if last or not isinstance(e, _RETRYABLE_ERRORS):
+                    raise
+                logger.info("%s %s failed (%s), retrying", method, upstream, type(e).__name__)
+            else:
+                self.calls.record(upstream, (time.perf_counter() - start) * 1000, resp.status_code, attempt > 0)
+                if last or resp.status_code not in RETRY_STATUSES:
+                    return resp
+                await resp.aclose()
+            await asyncio.sleep(self.delay(attempt))
+        raise AssertionError("unreachable")
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self) -> None:
+        """Close the current loop's client."""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+# Every outbound call in this process goes through one of these (they share the stats)
+http_client = HttpClient()
+async_http_client = AsyncHttpClient(calls=http_client.calls)
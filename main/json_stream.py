@@ -0,0 +1,89 @@
+"""
+Incremental extraction of one top-level JSON array from a document that arrives in chunks.
+Used to hand Amadeus offers ("data": [...]) to the client before the whole response is in.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any
+
+
+class JsonArrayStream:
+    """
+    feed(text) -> items of the top-level `key` array completed by this chunk (parsed).
+    The full text is kept in .text so the rest of the document (e.g. dictionaries)
+    can be read with json.loads once the stream ends.
+    """
+
+    def __init__(self, key: str = "data"):
+        self._key = key
+        self._parts: list[str] = []
+        self._buf = ""          # unconsumed text (from the start of the current item, if any)
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._last_string = ""
+        self._in_array = False
+        self._item_start = -1
+        self.items_seen = 0
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, text: str) -> list[Any]:
+        self._parts.append(text)
+        buf = self._buf + text
+        offset = len(self._buf)
+        items: list[Any] = []
+        i = offset
+        n = len(buf)
+        while i < n:
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._string_start >= 0:
+                        self._last_string = buf[self._string_start:i]
+            elif c == '"':
+                self._in_string = True
+                self._string_start = i + 1
+            elif c in "{[":
+                if c == "[" and self._depth == 1 and self._last_string == self._key and not self._in_array:
+                    self._in_array = True
+                elif self._in_array and self._depth == 2 and self._item_start < 0:
+                    self._item_start = i
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._in_array:
+                    if self._depth == 2 and self._item_start >= 0:
+                        items.append(json.loads(buf[self._item_start:i + 1]))
+                        self.items_seen += 1
+                        self._item_start = -1
+                    elif self._depth == 1:
+                        self._in_array = False
+                        self._key = None  # first occurrence only
+            elif c == "," and self._depth == 1:
+                self._last_string = ""
+            i += 1
+
+        # Keep only what an unfinished item or key string still needs
+        keep_from = n
+        if self._item_start >= 0:
+            keep_from = self._item_start
+        elif self._in_string and self._depth == 1:
+            keep_from = self._string_start
+        self._buf = buf[keep_from:]
+        if self._item_start >= 0:
+            self._item_start -= keep_from
+        if self._in_string and self._depth == 1:
+            self._string_start -= keep_from
+        else:
+            self._string_start = -1
+        return items
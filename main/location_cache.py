@@ -0,0 +1,180 @@
+"""
+Two-level cache for Amadeus location search results.
+L1: bounded in-process LRU with per-entry expiry (no backend round trip on hot keywords).
+L2: Django cache backend, so workers share entries when it is Redis / Memcached.
+Empty results are cached too, with a shorter TTL, so repeated misses do not hit the API.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+from urllib.parse import quote
+
+from django.core.cache import caches
+
+from main.conf import int_setting
+
+CACHE_KEY_PREFIX = "cff:locations:v1"
+
+Results = list[dict[str, Any]]
+
+
+class LocationCache:
+    """
+    max_entries bounds L1 (least recently used evicted first). ttl / negative_ttl are seconds
+    for non-empty / empty results; None reads CFF_LOCATION_CACHE_* settings.
+    Stored entry: {"results": [...], "expires_at": float}.
+    """
+
+    def __init__(
+        self,
+        backend_alias: str | None = "default",
+        max_entries: int | None = None,
+        ttl: int | None = None,
+        negative_ttl: int | None = None,
+    ):
+        self._backend_alias = backend_alias
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._l1: OrderedDict[str, tuple[Results, float]] = OrderedDict()
+        self.hits = 0
+        self.l2_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def backend(self):
+        return caches[self._backend_alias] if self._backend_alias else None
+
+    @property
+    def max_entries(self) -> int:
+        if self._max_entries is not None:
+            return self._max_entries
+        return max(1, int_setting("CFF_LOCATION_CACHE_SIZE", 2048))
+
+    @property
+    def ttl(self) -> int:
+        return self._ttl if self._ttl is not None else int_setting("CFF_LOCATION_CACHE_TTL", 3600)
+
+    @property
+    def negative_ttl(self) -> int:
+        if self._negative_ttl is not None:
+            return self._negative_ttl
+        return int_setting("CFF_LOCATION_CACHE_NEGATIVE_TTL", 60)
+
+    @staticmethod
+    def _key(keyword: str) -> str:
+        # Quoted: memcached rejects spaces and non-ASCII in keys
+        return f"{CACHE_KEY_PREFIX}:{quote(keyword.strip().upper())}"
+
+    def _l1_put(self, key: str, results: Results, expires_at: float) -> None:
+        # Caller holds the lock
+        self._l1[key] = (results, expires_at)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.max_entries:
+            self._l1.popitem(last=False)
+            self.evictions += 1
+
+    def _l1_get(self, key: str, now: float) -> Results | None:
+        with self._lock:
+            item = self._l1.get(key)
+            if item is None:
+                return None
+            results, expires_at = item
+            if expires_at <= now:
+                del self._l1[key]
+                self.expirations += 1
+                return None
+            self._l1.move_to_end(key)
+            self.hits += 1
+            if not results:
+                self.negative_hits += 1
+            return results
+
+    def _l2_result(self, key: str, entry: Any, now: float) -> Results | None:
+        """Promote a live L2 entry into L1 (or count the miss)."""
+        if isinstance(entry, dict) and float(entry.get("expires_at") or 0) > now:
+            results = entry.get("results") or []
+            with self._lock:
+                self._l1_put(key, results, float(entry["expires_at"]))
+                self.hits += 1
+                self.l2_hits += 1
+                if not results:
+                    self.negative_hits += 1
+            return results
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get(self, keyword: str) -> Results | None:
+        """Cached results for keyword ([] is a cached miss), or None if not cached."""
+        key = self._key(keyword)
+        now = time.time()
+        results = self._l1_get(key, now)
+        if results is not None:
+            return results
+        entry = self.backend.get(key) if self.backend is not None else None
+        return self._l2_result(key, entry, now)
+
+    async def aget(self, keyword: str) -> Results | None:
+        """get() for async views: L2 through the backend's async API."""
+        key = self._key(keyword)
+        now = time.time()
+        results = self._l1_get(key, now)
+        if results is not None:
+            return results
+        entry = await self.backend.aget(key) if self.backend is not None else None
+        return self._l2_result(key, entry, now)
+
+    def _l1_set(self, key: str, results: Results) -> tuple[int, float]:
+        ttl = self.ttl if results else self.negative_ttl
+        expires_at = time.time() + ttl
+        if ttl > 0:
+            with self._lock:
+                self._l1_put(key, results, expires_at)
+        return ttl, expires_at
+
+    def set(self, keyword: str, results: Results) -> None:
+        key = self._key(keyword)
+        ttl, expires_at = self._l1_set(key, results)
+        if ttl > 0 and self.backend is not None:
+            self.backend.set(key, {"results": results, "expires_at": expires_at}, timeout=ttl)
+
+    async def aset(self, keyword: str, results: Results) -> None:
+        key = self._key(keyword)
+        ttl, expires_at = self._l1_set(key, results)
+        if ttl > 0 and self.backend is not None:
+            await self.backend.aset(key, {"results": results, "expires_at": expires_at}, timeout=ttl)
+
+    def clear(self) -> None:
+        """Drop L1 only (L2 entries expire on their own)."""
+        with self._lock:
+            self._l1.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._l1)
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "l2_hits": self.l2_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl,
+            "negative_ttl_s": self.negative_ttl,
+        }
+
+
+# Shared by autocomplete and resolve_to_iata
+location_cache = LocationCache()
@@ -0,0 +1,113 @@
+"""
+Trigram index for typo-tolerant location autocomplete.
+Names (city, airport, aliases such as native spellings) are accent-folded, split into
+padded character trigrams and stored in postings lists. Candidates come only from the
+postings of a query's rarest trigrams (prefix filtering), which keeps lookups on the full
+airport table at a fraction of a millisecond (python -m main.benchmarks airports).
+"""
+from __future__ import annotations
+
+import math
+import unicodedata
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Iterable
+
+# Letters NFKD does not decompose into ASCII + combining mark
+_FOLD = str.maketrans({
+    "ı": "i", "ł": "l", "ø": "o", "đ": "d", "ð": "d", "þ": "th",
+    "æ": "ae", "œ": "oe", "ß": "ss", "ə": "a",
+})
+
+
+def fold(text: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace: 'İstanbul' -> 'istanbul'."""
+    s = unicodedata.normalize("NFKD", (text or "").lower()).translate(_FOLD)
+    s = "".join(c if c.isalnum() else " " for c in s if not unicodedata.combining(c))
+    return " ".join(s.split())
+
+
+def trigrams(folded: str) -> frozenset[str]:
+    """Padded trigrams per word ('  w', ' wa', 'war', ..., 'aw '), as in pg_trgm."""
+    grams: set[str] = set()
+    for word in folded.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+# Postings at least this long are also kept as sets
+COMMON_POSTINGS = 256
+
+
+class TrigramIndex:
+    """
+    entries: (position, name, rank) triples; several names may share a position.
+    Score per name: max(Jaccard, 0.9 * share of the query's trigrams found in the name),
+    so both typos ("Barcelna") and unfinished words ("Warsz") score high.
+    Ranked by score, then popularity (lower rank first).
+    """
+
+    __slots__ = ("_postings", "_common", "_sizes", "_positions", "_ranks")
+
+    def __init__(self, entries: Iterable[tuple[int, str, int]]):
+        postings: dict[str, list[int]] = defaultdict(list)
+        sizes: list[int] = []
+        positions: list[int] = []
+        ranks: dict[int, int] = {}
+        seen: set[tuple[int, str]] = set()
+        for pos, name, rank in entries:
+            folded = fold(name)
+            if not folded or (pos, folded) in seen:
+                continue
+            seen.add((pos, folded))
+            grams = trigrams(folded)
+            name_id = len(sizes)
+            for g in grams:
+                postings[g].append(name_id)
+            sizes.append(len(grams))
+            positions.append(pos)
+            ranks[pos] = min(rank, ranks.get(pos, rank))
+        self._postings = {g: tuple(ids) for g, ids in postings.items()}
+        # Long postings as sets too: candidates are looked up in them instead of walking them
+        self._common = {g: frozenset(ids) for g, ids in postings.items() if len(ids) >= COMMON_POSTINGS}
+        self._sizes = tuple(sizes)
+        self._positions = tuple(positions)
+        self._ranks = ranks
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def search(self, query: str, limit: int, threshold: float = 0.45) -> list[tuple[int, float]]:
+        """Best (position, score) pairs with score >= threshold, one per position."""
+        grams = trigrams(fold(query))
+        if not grams:
+            return []
+        # score <= shared / nq, so a match shares at least `need` of the query's trigrams and
+        # must be in the postings of one of its (nq - need + 1) rarest ones. Only those lists
+        # are counted; the common trigrams ("  a", " sa") only add to candidates found there.
+        nq = len(grams)
+        need = max(1, math.ceil(threshold * nq - 1e-9))
+        ordered = sorted(grams, key=lambda g: len(self._postings.get(g, ())))
+        probe = nq - need + 1
+        shared = Counter(chain.from_iterable(self._postings.get(g, ()) for g in ordered[:probe]))
+        for g in ordered[probe:]:
+            common = self._common.get(g)
+            if common is not None:
+                shared.update(common.intersection(shared))
+            else:
+                shared.update([name_id for name_id in self._postings.get(g, ()) if name_id in shared])
+
+        best: dict[int, float] = {}
+        for name_id, n in shared.items():
+            if n < need:
+                continue
+            jaccard = n / (nq + self._sizes[name_id] - n)
+            score = max(jaccard, 0.9 * n / nq)
+            if score < threshold:
+                continue
+            pos = self._positions[name_id]
+            if score > best.get(pos, 0.0):
+                best[pos] = score
+        ranked = sorted(best.items(), key=lambda item: (-round(item[1], 2), self._ranks[item[0]], item[0]))
+        return ranked[:limit]
@@ -0,0 +1,140 @@
+"""
+Management command: build the compact airport table (main/data/airports.bin).
+
+Without arguments the table is built from airport_data.POPULAR_LOCATIONS.
+With --airports (OurAirports airports.csv) every airport that has an IATA code and
+scheduled service is added, ranked after the popular list (large > medium > small).
+With --cities (CITY_CODES_PATH by default) metropolitan city codes (LON, NYC, PAR, ...)
+are added as KIND_CITY entries, placed at the centre of their airports and ranked after
+the popular list but ahead of the individual airports.
+
+The bundled table is built from the OurAirports dump (public domain,
+https://ourairports.com/data/) with:
+    python manage.py build_airport_table --airports airports.csv --countries countries.csv \
+        --include-unscheduled
+main/data/city_codes.csv comes from the airportsdata package's iata_macs.csv
+(MIT, Copyright (c) 2020- Mike Borsetti). airport_data's tests fail when POPULAR_LOCATIONS
+and the bundled table disagree: rebuild after editing the list.
+"""
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import airport_data, airport_table
+
+# Rank bands: popular list first, then by airport size
+_TYPE_RANK = {"large_airport": 10_000, "medium_airport": 100_000, "small_airport": 1_000_000}
+_CITY_RANK = 1_000
+
+CITY_CODES_PATH = os.path.join(os.path.dirname(airport_table.DEFAULT_PATH), "city_codes.csv")
+
+
+def _read_countries(path: str) -> dict[str, str]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return {(r.get("code") or "").upper(): (r.get("name") or "") for r in csv.DictReader(f)}
+
+
+def _read_airports(path: str, countries: dict[str, str], scheduled_only: bool) -> list[dict]:
+    rows = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for i, r in enumerate(csv.DictReader(f)):
+            iata = (r.get("iata_code") or "").strip().upper()
+            kind = r.get("type") or ""
+            if len(iata) != 3 or kind not in _TYPE_RANK:
+                continue
+            if scheduled_only and (r.get("scheduled_service") or "").lower() != "yes":
+                continue
+            country = (r.get("iso_country") or "").upper()
+            rows.append({
+                "iata": iata,
+                "city": r.get("municipality") or "",
+                "airport": r.get("name") or "",
+                "country": country,
+                "country_name": countries.get(country, ""),
+                "lat": r.get("latitude_deg") or None,
+                "lon": r.get("longitude_deg") or None,
+                "rank": _TYPE_RANK[kind] + i,
+                "kind": airport_table.KIND_AIRPORT,
+            })
+    return rows
+
+
+def _read_cities(path: str, airports: list[dict], countries: dict[str, str]) -> list[dict]:
+    """City code rows (city_code, city, country, airport_code) -> one KIND_CITY entry per code."""
+    coords = {a["iata"]: (a["lat"], a["lon"]) for a in airports if a.get("lat") and a.get("lon")}
+    cities: dict[str, dict] = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            code = (r.get("city_code") or "").strip().upper()
+            if len(code) != 3:
+                continue
+            country = (r.get("country") or "").upper()
+            city = cities.setdefault(code, {
+                "iata": code,
+                "city": r.get("city") or "",
+                "airport": "All airports",
+                "country": country,
+                "country_name": countries.get(country, ""),
+                "rank": _CITY_RANK + len(cities),
+                "kind": airport_table.KIND_CITY,
+                "points": [],
+            })
+            point = coords.get((r.get("airport_code") or "").strip().upper())
+            if point:
+                city["points"].append(point)
+    for city in cities.values():
+        points = city.pop("points")
+        if points:
+            city["lat"] = sum(float(lat) for lat, _ in points) / len(points)
+            city["lon"] = sum(float(lon) for _, lon in points) / len(points)
+    return list(cities.values())
+
+
+class Command(BaseCommand):
+    help = "Build the memory-mapped airport table used by airport_data lookups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--airports", help="OurAirports airports.csv")
+        parser.add_argument("--countries", help="OurAirports countries.csv (country names)")
+        parser.add_argument("--include-unscheduled", action="store_true", help="Keep airports without scheduled service")
+        parser.add_argument("--cities", default=CITY_CODES_PATH,
+                            help="City codes CSV: city_code, city, country, airport_code ('' to skip)")
+        parser.add_argument("--output", default=airport_table.DEFAULT_PATH)
+
+    def handle(self, *args, **options):
+        locations = []
+        for rank, loc in enumerate(airport_data.POPULAR_LOCATIONS):
+            locations.append({**loc, "rank": rank, "kind": airport_table.KIND_AIRPORT})
+
+        countries = {}
+        if options.get("countries"):
+            try:
+                countries = _read_countries(options["countries"])
+            except (OSError, csv.Error) as e:
+                raise CommandError(f"Cannot read {options['countries']}: {e}")
+
+        if options.get("airports"):
+            try:
+                extra = _read_airports(options["airports"], countries, not options.get("include_unscheduled"))
+            except (OSError, csv.Error) as e:
+                raise CommandError(f"Cannot read {options['airports']}: {e}")
+            # Popular entries win on duplicate IATA, but take coordinates from the dataset
+            coords = {r["iata"]: (r["lat"], r["lon"]) for r in extra}
+            for loc in locations:
+                loc["lat"], loc["lon"] = coords.get(loc["iata"], (None, None))
+            locations += extra
+
+        if options.get("cities"):
+            for loc in airport_data.POPULAR_LOCATIONS:
+                countries.setdefault(loc["country"], loc["country_name"])
+            try:
+                cities = _read_cities(options["cities"], locations, countries)
+            except (OSError, csv.Error) as e:
+                raise CommandError(f"Cannot read {options['cities']}: {e}")
+            # A city code that is also an airport code (DXB, ...) stays the airport
+            airports = {loc["iata"] for loc in locations}
+            locations += [c for c in cities if c["iata"] not in airports]
+
+        count = airport_table.write_table(locations, options["output"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} locations to {options['output']}"))
@@ -0,0 +1,32 @@
+"""
+Management command: re-check active price watches and email users when a price drops.
+Meant for cron, e.g. every 30 minutes:
+    python manage.py check_price_watches --budget 30 --per-minute 20
+Upstream calls are capped by --budget (default CFF_WATCH_BUDGET) and paced by --per-minute
+(default CFF_WATCH_CALLS_PER_MINUTE); fresh search cache entries are free.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.price_watch import RateBudget, check_watches
+
+
+class Command(BaseCommand):
+    help = "Re-check watched routes through the search cache and send price-drop emails"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Watches per batch (default CFF_WATCH_BATCH)")
+        parser.add_argument("--budget", type=int, default=None, help="Max upstream searches this run")
+        parser.add_argument("--per-minute", type=float, default=None, help="Max upstream searches per minute")
+
+    def handle(self, *args, **options):
+        budget = RateBudget(
+            options["budget"] if options["budget"] is not None else int(getattr(settings, "CFF_WATCH_BUDGET", 30)),
+            options["per_minute"] if options["per_minute"] is not None
+            else float(getattr(settings, "CFF_WATCH_CALLS_PER_MINUTE", 20)),
+        )
+        stats = check_watches(batch_size=options["batch_size"], budget=budget)
+        self.stdout.write(self.style.SUCCESS(
+            "Checked {checked} watches ({upstream_calls} upstream, {cache_hits} cached), "
+            "{notified} alerts sent, {errors} errors, {deferred} deferred, {expired} expired".format(**stats)
+        ))
@@ -0,0 +1,56 @@
+"""
+Management command: serve the local Amadeus / Google Places stand-in (main/upstream_standin.py).
+    python manage.py run_upstream_standin --latency-ms 250 --jitter-ms 150 --error-rate 0.01 --rate-limit-rate 0.02
+Then run the app with AMADEUS_BASE_URL and GOOGLE_PLACES_BASE_URL set to http://127.0.0.1:8765
+(and any non-empty AMADEUS_CLIENT_ID / GOOGLE_PLACES_API_KEY).
+"""
+from django.core.management.base import BaseCommand
+
+from main.upstream_standin import DEFAULT_PORT, Standin, StandinConfig, make_server
+
+
+class Command(BaseCommand):
+    help = "Serve recorded or synthetic Amadeus and Google Places responses for load tests"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+        parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every response")
+        parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform random extra latency")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered 500")
+        parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered 429")
+        parser.add_argument("--max-rps", type=float, default=0.0, help="Answer 429 above this many requests per second")
+        parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429")
+        parser.add_argument("--recordings", default=None, help="Directory of recorded flight-offers JSON")
+        parser.add_argument("--no-recordings", action="store_true", help="Always serve synthetic offers")
+        parser.add_argument("--seed", type=int, default=None, help="Seed for latency and fault injection")
+
+    def handle(self, *args, **options):
+        config = StandinConfig(
+            latency_ms=options["latency_ms"],
+            jitter_ms=options["jitter_ms"],
+            error_rate=options["error_rate"],
+            rate_limit_rate=options["rate_limit_rate"],
+            max_rps=options["max_rps"],
+            retry_after=options["retry_after"],
+            seed=options["seed"],
+        )
+        if options["no_recordings"]:
+            config.recordings = None
+        elif options["recordings"]:
+            config.recordings = options["recordings"]
+        standin = Standin(config)
+        server = make_server(standin, options["host"], options["port"])
+        host, port = server.server_address[:2]
+        self.stdout.write(self.style.SUCCESS(
+            f"Upstream stand-in on http://{host}:{port} ({len(standin.recorded)} recordings); "
+            f"set AMADEUS_BASE_URL and GOOGLE_PLACES_BASE_URL to it. Ctrl-C to stop."
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write("Served {requests} requests ({rate_limited} rate limited, {errors} errors)".format(
+                **standin.stats))
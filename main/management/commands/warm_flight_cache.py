@@ -0,0 +1,78 @@
+"""
+Management command: refresh the search cache for popular routes before users ask for them.
+Meant for cron, e.g. every 5 minutes (keep --ahead at least the cron interval):
+    python manage.py warm_flight_cache --days 7
+    python manage.py warm_flight_cache --route WAW-BCN --route WAW-LIS:EUR --stay 7
+Without --route the --top most searched routes of the last --lookback-days days are warmed.
+Upstream calls run at low priority behind user searches, --concurrency at a time, capped by
+--budget (default CFF_WARM_BUDGET) and paced by --per-minute (default CFF_WARM_CALLS_PER_MINUTE).
+Refuses to run unless the search cache (CFF_SEARCH_CACHE_ALIAS) is a shared backend: warming a
+process-local cache would be thrown away when the command exits.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.cache_warmer import is_shared_cache, parse_route, popular_routes, warm
+from main.price_watch import RateBudget
+
+
+class Command(BaseCommand):
+    help = "Refresh search-cache entries of popular routes for the next departure dates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--route", action="append", default=[],
+                            help="ORIGIN-DESTINATION[:CURRENCY], repeatable (default: most searched routes)")
+        parser.add_argument("--currency", default="USD", help="Currency for --route without one")
+        parser.add_argument("--stay", type=int, default=None, help="Warm --route as round trips of this many nights")
+        parser.add_argument("--top", type=int, default=None, help="Routes taken from search history (default CFF_WARM_TOP_ROUTES)")
+        parser.add_argument("--lookback-days", type=int, default=None,
+                            help="Search history window (default CFF_WARM_LOOKBACK_DAYS)")
+        parser.add_argument("--days", type=int, default=None, help="Departure dates per route (default CFF_WARM_DAYS)")
+        parser.add_argument("--start-in", type=int, default=1, help="First departure date, days from today")
+        parser.add_argument("--adults", type=int, default=1)
+        parser.add_argument("--ahead", type=float, default=None,
+                            help="Refresh entries this many seconds before they go stale (default CFF_WARM_AHEAD_S)")
+        parser.add_argument("--concurrency", type=int, default=None, help="Parallel upstream searches (default CFF_WARM_CONCURRENCY)")
+        parser.add_argument("--budget", type=int, default=None, help="Max upstream searches this run")
+        parser.add_argument("--per-minute", type=float, default=None, help="Max upstream searches per minute")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be refreshed")
+
+    def handle(self, *args, **options):
+        if not is_shared_cache():
+            alias = getattr(settings, "CFF_SEARCH_CACHE_ALIAS", "default")
+            raise CommandError(
+                f"The search cache is process-local ({settings.CACHES[alias]['BACKEND']}): warmed entries "
+                "would never reach the web workers. Point CFF_SEARCH_CACHE_ALIAS at a shared cache "
+                "(database, Redis, Memcached)."
+            )
+        if options["route"]:
+            try:
+                routes = [parse_route(spec, options["currency"], options["stay"]) for spec in options["route"]]
+            except ValueError as e:
+                raise CommandError(str(e))
+        else:
+            routes = popular_routes(
+                options["top"] if options["top"] is not None else int(getattr(settings, "CFF_WARM_TOP_ROUTES", 20)),
+                options["lookback_days"] if options["lookback_days"] is not None
+                else int(getattr(settings, "CFF_WARM_LOOKBACK_DAYS", 7)),
+            )
+        budget = RateBudget(
+            options["budget"] if options["budget"] is not None else int(getattr(settings, "CFF_WARM_BUDGET", 100)),
+            options["per_minute"] if options["per_minute"] is not None
+            else float(getattr(settings, "CFF_WARM_CALLS_PER_MINUTE", 30)),
+        )
+        stats = warm(
+            routes,
+            days=options["days"] if options["days"] is not None else int(getattr(settings, "CFF_WARM_DAYS", 7)),
+            start_in=options["start_in"],
+            adults=max(1, min(9, options["adults"])),
+            ahead=options["ahead"],
+            concurrency=options["concurrency"],
+            budget=budget,
+            dry_run=options["dry_run"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "{prefix}{routes} routes: {warmed} warmed, {fresh} fresh, {deferred} deferred, "
+            "{rate_limited} rate limited, {errors} errors".format(
+                prefix="[dry run] " if options["dry_run"] else "", **stats)
+        ))
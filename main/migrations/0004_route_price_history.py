@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_add_user_to_list_tag'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceWatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.CharField(max_length=3)),
+                ('destination', models.CharField(max_length=3)),
+                ('depart_date', models.DateField()),
+                ('return_date', models.DateField(blank=True, null=True)),
+                ('currency', models.CharField(default='EUR', max_length=3)),
+                ('adults', models.PositiveSmallIntegerField(default=1)),
+                ('target_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('last_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('last_notified_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('last_checked_at', models.DateTimeField(blank=True, null=True)),
+                ('active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_watches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['depart_date', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RoutePriceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.CharField(max_length=3)),
+                ('destination', models.CharField(max_length=3)),
+                ('depart_date', models.DateField()),
+                ('return_date', models.DateField(blank=True, null=True)),
+                ('currency', models.CharField(max_length=3)),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('offer_count', models.PositiveSmallIntegerField(default=0)),
+                ('source', models.CharField(blank=True, max_length=16)),
+                ('recorded_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['origin', 'destination', 'depart_date', 'return_date', 'currency', 'recorded_at'], name='route_price_history_idx')],
+            },
+        ),
+    ]
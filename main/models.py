@@ -80,3 +80,54 @@ class Subtask(models.Model):
 
     def __str__(self):
         return self.title
+
+
+class RoutePriceSnapshot(models.Model):
+    """
+    Cheapest price seen for one search (route, dates, currency) at one moment.
+    Append-only: rows are written in batches by main.price_history and never updated.
+    """
+    origin = models.CharField(max_length=3)
+    destination = models.CharField(max_length=3)
+    depart_date = models.DateField()
+    return_date = models.DateField(null=True, blank=True)
+    currency = models.CharField(max_length=3)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2)
+    offer_count = models.PositiveSmallIntegerField(default=0)
+    source = models.CharField(max_length=16, blank=True)
+    recorded_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["origin", "destination", "depart_date", "return_date", "currency", "recorded_at"],
+                name="route_price_history_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.origin}-{self.destination} {self.depart_date} {self.min_price} {self.currency}"
+
+
+class PriceWatch(models.Model):
+    """A user's watched route; check_price_watches emails them when the price drops."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="price_watches")
+    origin = models.CharField(max_length=3)
+    destination = models.CharField(max_length=3)
+    depart_date = models.DateField()
+    return_date = models.DateField(null=True, blank=True)
+    currency = models.CharField(max_length=3, default="EUR")
+    adults = models.PositiveSmallIntegerField(default=1)
+    # Alert at or below this price; without it any drop below the last alerted price counts
+    target_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    last_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    last_notified_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    last_checked_at = models.DateTimeField(null=True, blank=True)
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["depart_date", "id"]
+
+    def __str__(self):
+        return f"{self.origin}-{self.destination} {self.depart_date} ({self.user})"
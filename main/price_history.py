@@ -0,0 +1,173 @@
+"""
+Price history: the cheapest normalized price of every upstream search, appended to
+RoutePriceSnapshot in batches. record() only buffers, so searches never write: a flusher
+thread (started with the first record) writes the buffer with one bulk_create when it
+reaches CFF_PRICE_HISTORY_BATCH rows or its oldest row is CFF_PRICE_HISTORY_FLUSH_S old,
+and once more at interpreter exit (atexit), so a worker restart keeps what it buffered.
+Commands call flush() themselves when they are done.
+History is best effort: a failed write is logged and never fails a search.
+Each recorded price also trains the in-memory price trend (see price_trend).
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from typing import Iterable
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from main.conf import int_setting
+from main.flight_normalizer import Offer
+from main.price_trend import PriceTrendModel, price_trend
+
+logger = logging.getLogger(__name__)
+
+
+def _date(s: str | None) -> date | None:
+    try:
+        return date.fromisoformat((s or "")[:10])
+    except ValueError:
+        return None
+
+
+def cheapest(offers: Iterable[Offer]) -> Offer | None:
+    return min((o for o in offers if o.price), key=lambda o: o.price, default=None)
+
+
+class SnapshotRecorder:
+    """background=False: no flusher thread, rows wait for flush() (tests)."""
+
+    def __init__(self, batch_size: int | None = None, flush_after: int | None = None,
+                 trend: PriceTrendModel | None = None, background: bool = True):
+        self._batch_size = batch_size
+        self._flush_after = flush_after
+        self.trend = trend
+        self._background = background
+        self._buffer: list = []
+        self._oldest = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher: threading.Thread | None = None
+        self._database = ""
+        self.written = 0
+        self.dropped = 0
+
+    @property
+    def batch_size(self) -> int:
+        return self._batch_size or int_setting("CFF_PRICE_HISTORY_BATCH", 50)
+
+    @property
+    def flush_after(self) -> int:
+        return self._flush_after if self._flush_after is not None else int_setting("CFF_PRICE_HISTORY_FLUSH_S", 30)
+
+    def record(
+        self,
+        origin: str,
+        destination: str,
+        depart_date: str,
+        return_date: str | None,
+        currency: str,
+        offers: list[Offer],
+        source: str = "amadeus",
+    ) -> None:
+        """Buffer one snapshot for a search result (nothing is recorded for an empty result)."""
+        from main.models import RoutePriceSnapshot
+
+        if not getattr(settings, "CFF_PRICE_HISTORY", True):
+            return
+        best = cheapest(offers)
+        depart = _date(depart_date)
+        if best is None or depart is None:
+            return
+        if self.trend is not None:
+            # Before buffering: a first-time route loads its history without this row
+            self.trend.observe(origin, destination, best.currency or currency, bool(return_date), depart, best.price)
+        row = RoutePriceSnapshot(
+            origin=origin.upper()[:3],
+            destination=destination.upper()[:3],
+            depart_date=depart,
+            return_date=_date(return_date),
+            currency=(best.currency or currency).upper()[:3],
+            min_price=Decimal(str(best.price)).quantize(Decimal("0.01")),
+            offer_count=min(len(offers), 32767),
+            source=(source or "")[:16],
+            recorded_at=timezone.now(),
+        )
+        with self._lock:
+            first = not self._buffer
+            if first:
+                self._oldest = time.monotonic()
+            self._buffer.append(row)
+            wake = first or len(self._buffer) >= self.batch_size
+        if self._background:
+            self._start_flusher()
+            if wake:  # start the age timer / batch is full
+                self._wake.set()
+
+    def _start_flusher(self) -> None:
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._database = connections["default"].settings_dict.get("NAME") or ""
+            self._flusher = threading.Thread(target=self._run, name="cff-price-history", daemon=True)
+            self._flusher.start()
+        atexit.register(self._flush_at_exit)
+
+    def _next_flush_in(self) -> float | None:
+        """Seconds until the buffer is due (0: now), None while it is empty."""
+        with self._lock:
+            if not self._buffer:
+                return None
+            if len(self._buffer) >= self.batch_size:
+                return 0.0
+            return max(0.0, self._oldest + self.flush_after - time.monotonic())
+
+    def _run(self) -> None:
+        while True:
+            wait = self._next_flush_in()
+            if wait is None or wait > 0:
+                self._wake.wait(wait)
+                self._wake.clear()
+                continue
+            try:
+                self.flush()
+            finally:
+                connections.close_all()  # this thread's connections only
+
+    def _flush_at_exit(self) -> None:
+        # Rows buffered against another database (a test database, since torn down) stay unwritten
+        if (connections["default"].settings_dict.get("NAME") or "") != self._database:
+            return
+        self.flush()
+
+    def flush(self) -> int:
+        """Write everything buffered with one bulk_create; returns the rows written."""
+        from main.models import RoutePriceSnapshot
+
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        try:
+            RoutePriceSnapshot.objects.bulk_create(rows, batch_size=500)
+        except Exception as e:
+            self.dropped += len(rows)
+            logger.warning("Price history write failed, %d snapshots dropped: %s", len(rows), e)
+            return 0
+        self.written += len(rows)
+        return len(rows)
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+
+# Fed by every upstream flight search (see cheap_flight_finder._fetch_flights)
+price_history = SnapshotRecorder(trend=price_trend)
@@ -0,0 +1,276 @@
+"""
+Buy-now-or-wait price trend per route, kept in memory.
+For each (origin, destination, currency, trip type) and days-to-departure band, a ring
+buffer holds the most recent cheapest prices (RoutePriceSnapshot). Quartiles per band are
+recomputed with NumPy only after new observations, so assess() is a few dict lookups.
+A route's history is loaded from the database once per process (one query, vectorized
+into the bands) on a background thread, never on the request that first asks: until the
+load lands assess() returns None and observe() queues its price for the route. A failed
+load leaves nothing cached, so the next call schedules it again. With CFF_PRICE_HISTORY
+off nothing is loaded: trends are built from this process's searches only.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+
+from main.conf import int_setting
+
+logger = logging.getLogger(__name__)
+
+# Days-to-departure band edges: [0, 4) [4, 8) [8, 15) [15, 31) [31, 61) [61, 121) [121, ...)
+BAND_EDGES = np.array([0, 4, 8, 15, 31, 61, 121])
+# Prices kept per band (the newest win)
+BAND_CAPACITY = 256
+# Rows loaded per route from the database
+HISTORY_ROWS = 5000
+# A nearer band this much cheaper (median) suggests waiting
+WAIT_RATIO = 0.97
+
+RouteKey = tuple[str, str, str, bool]
+
+
+_EDGES = tuple(int(x) for x in BAND_EDGES)
+
+
+def band_of(days: int) -> int:
+    return max(0, bisect_right(_EDGES, days) - 1)
+
+
+class _Band:
+    __slots__ = ("prices", "count", "pos", "quartiles")
+
+    def __init__(self):
+        self.prices = np.empty(BAND_CAPACITY, dtype=np.float64)
+        self.count = 0
+        self.pos = 0
+        self.quartiles: np.ndarray | None = None
+
+    def extend(self, values: np.ndarray) -> None:
+        values = values[-BAND_CAPACITY:]
+        n = len(values)
+        end = self.pos + n
+        if end <= BAND_CAPACITY:
+            self.prices[self.pos:end] = values
+        else:
+            split = BAND_CAPACITY - self.pos
+            self.prices[self.pos:] = values[:split]
+            self.prices[:n - split] = values[split:]
+        self.pos = end % BAND_CAPACITY
+        self.count = min(BAND_CAPACITY, self.count + n)
+        self.quartiles = None
+
+    def stats(self) -> np.ndarray:
+        """(p25, median, p75) of the window, cached until the next observation."""
+        if self.quartiles is None:
+            self.quartiles = np.quantile(self.prices[:self.count], (0.25, 0.5, 0.75))
+        return self.quartiles
+
+
+class RouteTrend:
+    __slots__ = ("bands",)
+
+    def __init__(self):
+        self.bands = [_Band() for _ in BAND_EDGES]
+
+    def load(self, days: np.ndarray, prices: np.ndarray) -> None:
+        """Bulk-add observations (arrays in recording order)."""
+        bands = np.searchsorted(BAND_EDGES, days, side="right") - 1
+        keep = bands >= 0
+        bands, prices = bands[keep], prices[keep]
+        for b in np.unique(bands):
+            self.bands[b].extend(prices[bands == b])
+
+
+class PriceTrendModel:
+    """
+    In-process trend estimator; one RouteTrend per route, LRU-bounded.
+    background=False loads history inline on first use (tests, scripts).
+    """
+
+    def __init__(self, max_routes: int | None = None, min_samples: int | None = None, load_history: bool = True,
+                 background: bool = True):
+        self._max_routes = max_routes
+        self._min_samples = min_samples
+        self._load_history = load_history
+        self._background = background
+        self._routes: OrderedDict[RouteKey, RouteTrend] = OrderedDict()
+        # Routes whose history is being loaded -> (days, price) observed meanwhile
+        self._loading: dict[RouteKey, list[tuple[int, float]]] = {}
+        self._lock = threading.Lock()
+        self._loader: ThreadPoolExecutor | None = None
+
+    @property
+    def max_routes(self) -> int:
+        return self._max_routes or int_setting("CFF_TREND_MAX_ROUTES", 2048)
+
+    @property
+    def min_samples(self) -> int:
+        return self._min_samples or int_setting("CFF_TREND_MIN_SAMPLES", 8)
+
+    def _add(self, key: RouteKey, route: RouteTrend) -> None:
+        """Under _lock."""
+        self._routes[key] = route
+        while len(self._routes) > self.max_routes:
+            self._routes.popitem(last=False)
+
+    def _route(self, key: RouteKey, observation: tuple[int, float] | None = None) -> RouteTrend | None:
+        """
+        The route's trend, or None while its history is loading. A passed observation is queued
+        for the route (None is then also returned once it has been added along with the history).
+        Never queries the database on the calling thread unless background=False.
+        """
+        with self._lock:
+            route = self._routes.get(key)
+            if route is not None:
+                self._routes.move_to_end(key)
+                return route
+            if not self._load_history or not getattr(settings, "CFF_PRICE_HISTORY", True):
+                route = RouteTrend()
+                self._add(key, route)
+                return route
+            pending = self._loading.get(key)
+            schedule = pending is None
+            if schedule:
+                pending = self._loading[key] = []
+            if observation is not None:
+                pending.append(observation)
+        if schedule:
+            if self._background:
+                self._submit(key)
+            else:
+                self._load(key)
+                if observation is None:
+                    with self._lock:
+                        return self._routes.get(key)
+        return None
+
+    def _submit(self, key: RouteKey) -> None:
+        with self._lock:
+            if self._loader is None:
+                # One loader thread: history queries queue up instead of piling onto the database
+                self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cff-trend-load")
+            loader = self._loader
+        loader.submit(self._load_in_background, key)
+
+    def _load_in_background(self, key: RouteKey) -> None:
+        try:
+            self._load(key)
+        finally:
+            connections.close_all()  # this thread's connections only
+
+    def _load(self, key: RouteKey) -> None:
+        from main.models import RoutePriceSnapshot
+
+        origin, destination, currency, round_trip = key
+        try:
+            rows = list(
+                RoutePriceSnapshot.objects.filter(
+                    origin=origin, destination=destination, currency=currency, return_date__isnull=not round_trip,
+                )
+                .order_by("-recorded_at")
+                .values_list("depart_date", "recorded_at", "min_price")[:HISTORY_ROWS]
+            )
+        except Exception as e:
+            logger.warning("Price trend history unavailable for %s: %s", key, e)
+            with self._lock:
+                # Nothing cached: the next assess / observe for the route tries again
+                self._loading.pop(key, None)
+            return
+        route = RouteTrend()
+        if rows:
+            rows.reverse()
+            depart = np.fromiter((r[0].toordinal() for r in rows), dtype=np.int64, count=len(rows))
+            recorded = np.fromiter((r[1].date().toordinal() for r in rows), dtype=np.int64, count=len(rows))
+            prices = np.fromiter((float(r[2]) for r in rows), dtype=np.float64, count=len(rows))
+            route.load(depart - recorded, prices)
+        with self._lock:
+            pending = self._loading.pop(key, None)
+            if pending is None:  # clear() ran meanwhile
+                return
+            for days, price in pending:
+                route.bands[band_of(days)].extend(np.array([price]))
+            self._add(key, route)
+
+    def wait_loaded(self, timeout: float | None = None) -> None:
+        """Block until the history loads scheduled so far have finished (tests, commands)."""
+        with self._lock:
+            loader = self._loader
+        if loader is not None:
+            loader.submit(lambda: None).result(timeout)  # single worker: runs after the queued loads
+
+    @staticmethod
+    def key(origin: str, destination: str, currency: str, round_trip: bool) -> RouteKey:
+        return (origin.upper(), destination.upper(), currency.upper(), bool(round_trip))
+
+    def observe(self, origin: str, destination: str, currency: str, round_trip: bool,
+                depart_date: date, price: float, on: date | None = None) -> None:
+        days = (depart_date - (on or date.today())).days
+        if days < 0:
+            return
+        route = self._route(self.key(origin, destination, currency, round_trip), (days, float(price)))
+        if route is None:  # queued with the route's history load
+            return
+        with self._lock:
+            route.bands[band_of(days)].extend(np.array([float(price)]))
+
+    def assess(self, origin: str, destination: str, currency: str, round_trip: bool,
+               depart_date: date | str, price: float | None, on: date | None = None) -> dict[str, Any] | None:
+        """
+        {"level": low | typical | high, "advice": buy | wait, "typical_low", "typical_high",
+        "median", "samples", "days_to_departure"}, or None without enough history.
+        depart_date may be an ISO string (as the search APIs receive it).
+        """
+        if isinstance(depart_date, str):
+            try:
+                depart_date = date.fromisoformat(depart_date[:10])
+            except ValueError:
+                return None
+        if not price:
+            return None
+        days = (depart_date - (on or date.today())).days
+        if days < 0:
+            return None
+        route = self._route(self.key(origin, destination, currency, round_trip))
+        if route is None:
+            return None
+        b = band_of(days)
+        with self._lock:
+            band = route.bands[b]
+            if band.count < self.min_samples:
+                return None
+            p25, median, p75 = (float(x) for x in band.stats())
+            nearer = route.bands[b - 1] if b > 0 else None
+            nearer_median = float(nearer.stats()[1]) if nearer and nearer.count >= self.min_samples else None
+            samples = band.count
+
+        level = "low" if price <= p25 else "high" if price >= p75 else "typical"
+        # Wait only when the price is not already low and closer departures are usually cheaper
+        wait = level != "low" and nearer_median is not None and nearer_median < median * WAIT_RATIO
+        return {
+            "level": level,
+            "advice": "wait" if wait else "buy",
+            "typical_low": round(p25, 2),
+            "typical_high": round(p75, 2),
+            "median": round(median, 2),
+            "samples": samples,
+            "days_to_departure": days,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._routes.clear()
+            self._loading.clear()
+
+
+# Fed by price_history.record; read by the search APIs
+price_trend = PriceTrendModel()
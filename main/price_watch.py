@@ -0,0 +1,173 @@
+"""
+Price-drop watcher behind `manage.py check_price_watches`.
+Active watches are re-checked least recently checked first, in batches. A fresh
+search-cache entry is used as is and costs nothing; a missing or stale one is refetched
+synchronously through refresh_search (single-flight, shared Amadeus token) and spends one
+call of the run's RateBudget. Watches for the same search share one lookup. Once the budget is spent the
+rest waits for the next run.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from decimal import Decimal
+from typing import Any, Callable
+
+import requests
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from main.cheap_flight_finder import AmadeusError, refresh_search
+from main.deadline import Deadline, DeadlineExceeded
+from main.flight_cache import make_search_key, search_cache
+from main.models import PriceWatch
+from main.price_history import cheapest, price_history
+from main.singleflight import SingleFlightTimeout
+
+logger = logging.getLogger(__name__)
+
+
+class RateBudget:
+    """At most max_calls upstream calls, spaced at least 60 / per_minute seconds apart."""
+
+    def __init__(self, max_calls: int, per_minute: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.max_calls = max(0, max_calls)
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.used = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._last: float | None = None
+
+    @property
+    def exhausted(self) -> bool:
+        return self.used >= self.max_calls
+
+    def acquire(self) -> None:
+        if self._last is not None:
+            wait = self._last + self.interval - self._clock()
+            if wait > 0:
+                self._sleep(wait)
+        self._last = self._clock()
+        self.used += 1
+
+
+def default_budget() -> RateBudget:
+    return RateBudget(
+        int(getattr(settings, "CFF_WATCH_BUDGET", 30)),
+        float(getattr(settings, "CFF_WATCH_CALLS_PER_MINUTE", 20)),
+    )
+
+
+def should_notify(watch: PriceWatch, price: Decimal) -> bool:
+    """
+    With a target: at or below it, and below the last alerted price.
+    Without: below the last alerted price, or below the previous check if never alerted.
+    The first check only sets the baseline.
+    """
+    if watch.target_price is not None:
+        return price <= watch.target_price and (watch.last_notified_price is None or price < watch.last_notified_price)
+    reference = watch.last_notified_price if watch.last_notified_price is not None else watch.last_price
+    return reference is not None and price < reference
+
+
+def _watch_key(w: PriceWatch) -> str:
+    return make_search_key(w.origin, w.destination, w.depart_date.isoformat(),
+                           w.return_date.isoformat() if w.return_date else None, w.currency, w.adults)
+
+
+def _alert_context(watch: PriceWatch, price: Decimal, previous: Decimal | None, offer) -> dict[str, Any]:
+    return {
+        "route_display": f"{watch.origin} → {watch.destination}",
+        "depart_date": watch.depart_date.isoformat(),
+        "return_date": watch.return_date.isoformat() if watch.return_date else "",
+        "price_display": f"{price:.2f} {watch.currency}",
+        "previous_display": f"{previous:.2f} {watch.currency}" if previous is not None else "",
+        "target_display": f"{watch.target_price:.2f} {watch.currency}" if watch.target_price is not None else "",
+        "primary_airline": offer.primary_airline,
+        "total_duration": offer.to_summary()["total_duration"],
+        "stops": offer.stops,
+    }
+
+
+def _send_alert(watch: PriceWatch, ctx: dict[str, Any]) -> bool:
+    from accounts.email.service import send_price_drop_alert
+
+    to_email = (watch.user.email or "").strip()
+    return bool(to_email) and send_price_drop_alert(to_email=to_email, alert_ctx=ctx)
+
+
+def check_watches(
+    batch_size: int | None = None,
+    budget: RateBudget | None = None,
+    notify: Callable[[PriceWatch, dict[str, Any]], bool] = _send_alert,
+) -> dict[str, int]:
+    """
+    Run one pass; returns counters. Cache hits are still served after the budget is spent.
+    notify(watch, ctx) sends the alert and returns True if it went out.
+    """
+    batch_size = max(1, batch_size or int(getattr(settings, "CFF_WATCH_BATCH", 20)))
+    budget = budget or default_budget()
+    stats = {"checked": 0, "upstream_calls": 0, "cache_hits": 0, "notified": 0, "errors": 0, "deferred": 0}
+
+    today = timezone.localdate()
+    stats["expired"] = PriceWatch.objects.filter(active=True, depart_date__lt=today).update(active=False)
+    watches = list(
+        PriceWatch.objects.filter(active=True)
+        .select_related("user")
+        .order_by(F("last_checked_at").asc(nulls_first=True), "id")
+    )
+
+    for start in range(0, len(watches), batch_size):
+        batch = watches[start:start + batch_size]
+        groups: dict[str, list[PriceWatch]] = {}
+        for w in batch:
+            groups.setdefault(_watch_key(w), []).append(w)
+
+        updated: list[PriceWatch] = []
+        for key, group in groups.items():
+            entry = search_cache.get(key)
+            if entry is not None and search_cache.is_fresh(entry):
+                stats["cache_hits"] += 1
+            else:
+                if budget.exhausted:
+                    continue
+                budget.acquire()
+                stats["upstream_calls"] += 1
+                w = group[0]
+                try:
+                    # Synchronous: a stale entry must not be judged, and a background refresh
+                    # would die with the command
+                    entry = refresh_search(
+                        w.origin, w.destination, w.depart_date.isoformat(),
+                        w.return_date.isoformat() if w.return_date else None, w.currency, w.adults,
+                        source="watcher", deadline=Deadline(float(getattr(settings, "CFF_SEARCH_DEADLINE", 25))),
+                    )
+                except (AmadeusError, requests.exceptions.RequestException, SingleFlightTimeout,
+                        DeadlineExceeded, ValueError) as e:
+                    logger.warning("Price watch check failed for %s: %s", key, e)
+                    stats["errors"] += len(group)
+                    continue
+
+            best = cheapest(entry.get("flights") or [])
+            now = timezone.now()
+            for w in group:
+                stats["checked"] += 1
+                w.last_checked_at = now
+                if best is not None:
+                    price = Decimal(str(best.price)).quantize(Decimal("0.01"))
+                    if should_notify(w, price):
+                        previous = w.last_notified_price if w.last_notified_price is not None else w.last_price
+                        if notify(w, _alert_context(w, price, previous, best)):
+                            w.last_notified_price = price
+                            stats["notified"] += 1
+                    w.last_price = price
+                updated.append(w)
+
+        PriceWatch.objects.bulk_update(updated, ["last_price", "last_notified_price", "last_checked_at"])
+        price_history.flush()
+
+    # Skipped once the budget ran out; they are first in line next run
+    stats["deferred"] = len(watches) - stats["checked"] - stats["errors"]
+    return stats
@@ -0,0 +1,270 @@
+"""
+Upstream rate limiting (Amadeus).
+Every Amadeus call takes a token from a TokenBucket first: CFF_AMADEUS_RATE calls per
+second with bursts up to CFF_AMADEUS_BURST. Calls run at the priority set with
+`with priority(LOW):` (default HIGH). User traffic goes first; background work (LOW:
+price watchers, prefetch, stale-entry refreshes) waits while user requests are queued
+and leaves CFF_AMADEUS_RESERVE tokens for them.
+A 429 blocks the bucket for its Retry-After (penalize()). With CFF_AMADEUS_RATE_SHARED the
+per-second call count and the Retry-After block are also kept in the default cache, so
+every worker process sharing that cache stays under one quota.
+A caller that would have to wait past its deadline (or CFF_AMADEUS_MAX_WAIT) gets
+RateLimited at once instead of queueing. Async views wait with acquire_async(), on the
+same bucket, without holding a thread.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+from django.conf import settings
+from django.core.cache import cache
+
+from main.deadline import Deadline
+
+HIGH = 0
+LOW = 1
+# cached_search sources whose upstream calls queue behind user traffic
+LOW_PRIORITY_SOURCES = frozenset({"watcher", "prefetch", "refresh", "warm"})
+
+
+class RateLimited(Exception):
+    """No upstream call allowed in time; retry_after is the suggested wait in seconds."""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+_priority: ContextVar[int] = ContextVar("upstream_priority", default=HIGH)
+
+
+def priority_for(source: str) -> int:
+    return LOW if source in LOW_PRIORITY_SOURCES else HIGH
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    """Upstream calls made inside the block (in this thread) run at `level`."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket with two priorities. rate <= 0 disables limiting
+    (Retry-After blocks still apply).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float | None = None,
+        burst: float | None = None,
+        reserve: float | None = None,
+        shared: bool | None = None,
+        max_wait: float | None = None,
+    ):
+        self.name = name
+        self.rate = float(rate if rate is not None else getattr(settings, "CFF_AMADEUS_RATE", 10))
+        self.burst = max(1.0, float(burst if burst is not None else getattr(settings, "CFF_AMADEUS_BURST", self.rate)))
+        self.reserve = float(reserve if reserve is not None else getattr(settings, "CFF_AMADEUS_RESERVE", 2))
+        self.shared = bool(shared if shared is not None else getattr(settings, "CFF_AMADEUS_RATE_SHARED", False))
+        self.max_wait = float(max_wait if max_wait is not None else getattr(settings, "CFF_AMADEUS_MAX_WAIT", 10))
+        self._cache_prefix = f"cff:ratelimit:{name}"
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._high_waiting = 0
+        self._cond = threading.Condition()
+        self.acquired = 0
+        self.waited_s = 0.0
+        self.rejected = 0
+        self.penalties = 0
+
+    def _refill(self, now: float) -> None:
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _wait_for(self, level: int, now: float) -> float:
+        """Seconds to wait before `level` may take a token, or 0.0 after taking it. Under _cond."""
+        self._refill(now)
+        blocked = self._blocked_until - now
+        need = min(1.0 + (self.reserve if level == LOW else 0.0), self.burst)
+        if blocked > 0:
+            return blocked
+        if self.rate <= 0:
+            return 0.0
+        if level == LOW and self._high_waiting:
+            return 1.0 / self.rate
+        if self._tokens >= need:
+            self._tokens -= 1.0
+            return 0.0
+        return (need - self._tokens) / self.rate
+
+    def _limit(self, deadline: Deadline | None) -> float:
+        return min(self.max_wait, deadline.remaining()) if deadline is not None else self.max_wait
+
+    def _reject(self, limit: float, wait: float) -> RateLimited:
+        self.rejected += 1
+        return RateLimited(f"{self.name} rate limit: no call slot within {limit:.1f}s", retry_after=wait)
+
+    def _acquired(self, start: float) -> float:
+        waited = time.monotonic() - start
+        self.acquired += 1
+        self.waited_s += waited
+        return waited
+
+    def acquire(self, level: int | None = None, deadline: Deadline | None = None) -> float:
+        """
+        Take one token at `level` (default: current_priority()), waiting if needed.
+        Returns seconds waited. Raises RateLimited.
+        """
+        level = current_priority() if level is None else level
+        start = time.monotonic()
+        limit = self._limit(deadline)
+        with self._cond:
+            if level == HIGH:
+                self._high_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._wait_for(level, now)
+                    if not wait:
+                        break
+                    if now + wait - start > limit:
+                        raise self._reject(limit, wait)
+                    self._cond.wait(wait)
+            finally:
+                if level == HIGH:
+                    self._high_waiting -= 1
+                    # Low-priority waiters re-check once user traffic has drained
+                    self._cond.notify_all()
+        if self.shared:
+            while (wait := self._shared_wait()) is not None:
+                if time.monotonic() + wait - start > limit:
+                    raise self._reject(limit, wait)
+                time.sleep(wait)
+        return self._acquired(start)
+
+    async def acquire_async(self, level: int | None = None, deadline: Deadline | None = None) -> float:
+        """acquire() for async views: waits with asyncio.sleep instead of holding a thread."""
+        level = current_priority() if level is None else level
+        start = time.monotonic()
+        limit = self._limit(deadline)
+        if level == HIGH:
+            with self._cond:
+                self._high_waiting += 1
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    wait = self._wait_for(level, now)
+                if not wait:
+                    break
+                if now + wait - start > limit:
+                    raise self._reject(limit, wait)
+                await asyncio.sleep(wait)
+        finally:
+            if level == HIGH:
+                with self._cond:
+                    self._high_waiting -= 1
+                    self._cond.notify_all()
+        if self.shared:
+            while (wait := await self._ashared_wait()) is not None:
+                if time.monotonic() + wait - start > limit:
+                    raise self._reject(limit, wait)
+                await asyncio.sleep(wait)
+        return self._acquired(start)
+
+    def _shared_wait(self) -> float | None:
+        """Cross-process part: None once a call slot is taken, else seconds to wait (Retry-After block or full second)."""
+        per_second = max(1, math.floor(self.rate)) if self.rate > 0 else 0
+        now = time.time()
+        blocked = float(cache.get(f"{self._cache_prefix}:blocked") or 0) - now
+        if blocked > 0:
+            return blocked
+        if not per_second:
+            return None
+        second = int(now)
+        key = f"{self._cache_prefix}:{second}"
+        cache.add(key, 0, timeout=5)
+        try:
+            count = cache.incr(key)
+        except ValueError:  # expired between add() and incr()
+            count = 1
+        return None if count <= per_second else second + 1 - now
+
+    async def _ashared_wait(self) -> float | None:
+        """_shared_wait() through the async cache API (DatabaseCache must not run on the event loop)."""
+        per_second = max(1, math.floor(self.rate)) if self.rate > 0 else 0
+        now = time.time()
+        blocked = float(await cache.aget(f"{self._cache_prefix}:blocked") or 0) - now
+        if blocked > 0:
+            return blocked
+        if not per_second:
+            return None
+        second = int(now)
+        key = f"{self._cache_prefix}:{second}"
+        await cache.aadd(key, 0, timeout=5)
+        try:
+            count = await cache.aincr(key)
+        except ValueError:
+            count = 1
+        return None if count <= per_second else second + 1 - now
+
+    def _penalize_local(self, seconds: float) -> None:
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self.penalties += 1
+
+    def penalize(self, seconds: float) -> None:
+        """Upstream said 429: no calls for `seconds` (this process, and every worker if shared)."""
+        if seconds <= 0:
+            return
+        self._penalize_local(seconds)
+        if self.shared:
+            cache.set(f"{self._cache_prefix}:blocked", time.time() + seconds, timeout=math.ceil(seconds) + 1)
+
+    async def apenalize(self, seconds: float) -> None:
+        """penalize() for async views."""
+        if seconds <= 0:
+            return
+        self._penalize_local(seconds)
+        if self.shared:
+            await cache.aset(f"{self._cache_prefix}:blocked", time.time() + seconds, timeout=math.ceil(seconds) + 1)
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            blocked = max(0.0, self._blocked_until - time.monotonic())
+            self._refill(time.monotonic())
+            tokens = self._tokens
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "tokens": round(tokens, 2),
+            "blocked_s": round(blocked, 2),
+            "acquired": self.acquired,
+            "waited_s": round(self.waited_s, 3),
+            "rejected": self.rejected,
+            "penalties": self.penalties,
+            "shared": self.shared,
+        }
+
+
+# Every Amadeus call in this process goes through this bucket (see cheap_flight_finder._amadeus_get)
+amadeus_limiter = TokenBucket("amadeus")
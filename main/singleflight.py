@@ -0,0 +1,169 @@
+"""
+Single-flight call coalescing.
+Concurrent calls with the same key share one execution: the first caller (leader)
+runs the function, everyone else waits (bounded) for its result or its error.
+do_async() is the same for coroutines, coalescing callers on the same event loop, and
+do_iter() for generators whose items only the leader's consumer sees.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Generator
+
+
+class SingleFlightTimeout(Exception):
+    """A waiter gave up before the leader finished."""
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, wait_timeout: float | None = 30.0):
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+        self._async_calls: dict[tuple[int, str], asyncio.Future] = {}
+        self.wait_timeout = wait_timeout
+        self.leaders = 0
+        self.waiters = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def _join(self, key: str) -> tuple[_Call, bool]:
+        """The key's in-flight call, and whether the caller just started it (leader)."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                return call, True
+            call.waiters += 1
+            self.waiters += 1
+            return call, False
+
+    def _wait(self, call: _Call, key: str, timeout: float | None) -> Any:
+        wait = self.wait_timeout if timeout is None else timeout
+        if not call.done.wait(wait):
+            with self._lock:
+                self.timeouts += 1
+            raise SingleFlightTimeout(f"Timed out after {wait}s waiting for in-flight call {key}")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _fail(self, call: _Call, error: BaseException) -> None:
+        call.error = error
+        with self._lock:
+            self.errors += 1
+
+    def _finish(self, key: str, call: _Call) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+        call.done.set()
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: float | None = None) -> tuple[Any, bool]:
+        """
+        Run fn() once per key across concurrent callers.
+        Returns (result, shared) where shared is True for waiters.
+        Waiters re-raise the leader's exception, or SingleFlightTimeout after timeout seconds.
+        """
+        call, leader = self._join(key)
+        if not leader:
+            return self._wait(call, key, timeout), True
+        try:
+            call.result = fn()
+        except BaseException as e:
+            self._fail(call, e)
+            raise
+        finally:
+            self._finish(key, call)
+        return call.result, False
+
+    def do_iter(
+        self, key: str, fn: Callable[[], Generator[Any, None, Any]], timeout: float | None = None,
+    ) -> Generator[Any, None, tuple[Any, bool]]:
+        """
+        do() for a generator function: the leader re-yields fn()'s items as they come and
+        shares its return value; waiters yield nothing and get it once the leader is done.
+        Use as `result, shared = yield from flight.do_iter(key, fn)`.
+        """
+        call, leader = self._join(key)
+        if not leader:
+            return self._wait(call, key, timeout), True
+        try:
+            call.result = yield from fn()
+        except GeneratorExit:
+            # The leader's consumer went away (e.g. client disconnect): waiters must not see GeneratorExit
+            self._fail(call, SingleFlightTimeout(f"In-flight call {key} was abandoned"))
+            raise
+        except BaseException as e:
+            self._fail(call, e)
+            raise
+        finally:
+            self._finish(key, call)
+        return call.result, False
+
+    async def do_async(
+        self, key: str, fn: Callable[[], Awaitable[Any]], timeout: float | None = None,
+    ) -> tuple[Any, bool]:
+        """do() for a coroutine function; waiters await the leader without blocking the loop."""
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)
+        with self._lock:
+            future = self._async_calls.get(call_key)
+            leader = future is None
+            if leader:
+                future = self._async_calls[call_key] = loop.create_future()
+                self.leaders += 1
+            else:
+                self.waiters += 1
+
+        if not leader:
+            wait = self.wait_timeout if timeout is None else timeout
+            try:
+                # shield: a waiter timing out must not cancel the leader's result
+                return await asyncio.wait_for(asyncio.shield(future), wait), True
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self.timeouts += 1
+                raise SingleFlightTimeout(f"Timed out after {wait}s waiting for in-flight call {key}") from None
+
+        try:
+            result = await fn()
+        except BaseException as e:
+            with self._lock:
+                self.errors += 1
+            if isinstance(e, asyncio.CancelledError):
+                future.set_exception(SingleFlightTimeout(f"In-flight call {key} was cancelled"))
+            else:
+                future.set_exception(e)
+            future.exception()  # retrieved: no "never retrieved" warning when nobody waited
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self._async_calls.pop(call_key, None)
+        return result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._async_calls)
+
+    def stats(self) -> dict:
+        return {
+            "leaders": self.leaders,
+            "waiters": self.waiters,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "in_flight": self.in_flight(),
+        }
@@ -1,9 +1,11 @@
 # main/stock_predictor.py
-import os, io, sys, time, requests
+import os, io, sys, time
 from dotenv import load_dotenv
 from openai import OpenAI
 from django.shortcuts import render
 
+from main.http_client import http_client
+
 load_dotenv()
 
 class Stock_Market:
@@ -16,7 +18,7 @@ class Stock_Market:
         self.stock_name = (stock_name or "").strip().upper()
         url = "https://api.marketstack.com/v1/eod"
         params = {"access_key": self.api_key, "symbols": self.stock_name, "limit": 365}
-        resp = requests.get(url, params=params, timeout=10)
+        resp = http_client.get(url, params=params, timeout=10, upstream="marketstack")
         data = resp.json()
         self.daily_data = data.get("data", [])
         return self.daily_data
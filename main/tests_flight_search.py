@@ -0,0 +1,1220 @@
+"""
+Flight search pipeline tests: token cache and upstream plumbing.
+No network: Amadeus calls are replaced with fakes.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+
+from main import airport_data, airport_table, cheap_flight_async, cheap_flight_finder, flight_ranking
+from main.amadeus_token import AmadeusTokenManager
+from main.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+from main.deadline import Deadline, DeadlineExceeded
+from main.benchmarks import airport_lookup, normalizer, offer_model, pipeline
+from main.benchmarks.fixtures import RECORDED_DIR, load_recorded, make_offers_payload
+from main.flight_cache import FlightSearchCache, make_search_key, search_cache
+from main.flight_normalizer import parse_all_offers
+from main.http_client import HttpClient
+from main.location_cache import LocationCache, location_cache
+from main.location_trigram import TrigramIndex, fold, trigrams
+from main.rate_limit import HIGH, LOW, RateLimited, TokenBucket, priority
+from main.singleflight import SingleFlight, SingleFlightTimeout
+from main.upstream_standin import Standin, StandinConfig, make_server
+
+
+# SimpleTestCase only: searches here must not buffer price history (written at exit) or load it
+_no_price_history = override_settings(CFF_PRICE_HISTORY=False)
+
+
+def setUpModule():
+    _no_price_history.enable()
+
+
+def tearDownModule():
+    _no_price_history.disable()
+
+
+def make_offer(offer_id, price, dep_at="2030-06-15T08:00:00", arr_at="2030-06-15T10:30:00",
+               origin="WAW", destination="BCN", duration="PT2H30M", carrier="LO"):
+    return {
+        "id": str(offer_id),
+        "price": {"total": str(price), "currency": "EUR"},
+        "itineraries": [{
+            "duration": duration,
+            "segments": [{
+                "departure": {"iataCode": origin, "at": dep_at},
+                "arrival": {"iataCode": destination, "at": arr_at},
+                "carrierCode": carrier,
+                "number": str(100 + int(offer_id)),
+                "duration": duration,
+            }],
+        }],
+        "validatingAirlineCodes": [carrier],
+    }
+
+
+def make_payload(prices, **kw):
+    return {
+        "data": [make_offer(i + 1, p, **kw) for i, p in enumerate(prices)],
+        "dictionaries": {"carriers": {"LO": "LOT"}},
+    }
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class AmadeusTokenManagerTestCase(SimpleTestCase):
+    def test_token_cached_until_margin(self):
+        clock = FakeClock()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return f"tok-{len(calls)}", 1799
+
+        mgr = AmadeusTokenManager(fetch, margin=60, clock=clock)
+        self.assertEqual(mgr.get_token(), "tok-1")
+        clock.now += 1700
+        self.assertEqual(mgr.get_token(), "tok-1")
+        clock.now += 100  # past expires_in - margin
+        self.assertEqual(mgr.get_token(), "tok-2")
+        self.assertEqual(mgr.stats()["refreshes"], 2)
+        self.assertEqual(mgr.stats()["hits"], 1)
+
+    def test_concurrent_misses_refresh_once(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.05)
+            return "tok", 1799
+
+        mgr = AmadeusTokenManager(fetch)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(mgr.get_token())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["tok"] * 8)
+
+    def test_invalidate_forces_refresh(self):
+        n = iter(range(10))
+        mgr = AmadeusTokenManager(lambda: (f"tok-{next(n)}", 1799))
+        first = mgr.get_token()
+        mgr.invalidate("some-other-token")
+        self.assertEqual(mgr.get_token(), first)
+        mgr.invalidate(first)
+        self.assertNotEqual(mgr.get_token(), first)
+
+
+class FlightSearchCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_miss_then_hit(self):
+        c = FlightSearchCache(ttl=60, stale_ttl=60)
+        key = make_search_key("waw", "bcn", "2030-06-15", None, "eur", 1)
+        fetch = mock.Mock(return_value=([{"id": "1"}], 1))
+        entry, status = c.get_or_fetch(key, fetch)
+        self.assertEqual(status, "miss")
+        entry, status = c.get_or_fetch(key, fetch)
+        self.assertEqual(status, "hit")
+        self.assertEqual(entry["flights"], [{"id": "1"}])
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_stale_served_and_refreshed_once(self):
+        c = FlightSearchCache(ttl=60, stale_ttl=600)
+        key = make_search_key("WAW", "BCN", "2030-06-15", None, "EUR", 1)
+        c.set(key, [{"id": "old"}], 1)
+        entry = c.get(key)
+        entry["created_at"] -= 120
+        cache.set(key, entry)
+
+        done = threading.Event()
+
+        def fetch():
+            done.set()
+            return [{"id": "new"}], 1
+
+        entry, status = c.get_or_fetch(key, fetch)
+        self.assertEqual(status, "stale")
+        self.assertEqual(entry["flights"], [{"id": "old"}])
+        self.assertTrue(done.wait(2))
+        for _ in range(50):
+            if c.get(key)["flights"] == [{"id": "new"}]:
+                break
+            time.sleep(0.01)
+        fresh = c.get(key)
+        self.assertEqual(fresh["flights"], [{"id": "new"}])
+        self.assertEqual(fresh["source"], "refresh")
+
+
+class LocationCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        location_cache.clear()
+
+    def test_lru_eviction_and_l2_sharing(self):
+        c = LocationCache(max_entries=2, ttl=60, negative_ttl=5)
+        c.set("war", [{"iata_code": "WAW"}])
+        c.set("bar", [{"iata_code": "BCN"}])
+        self.assertEqual(c.get("war"), [{"iata_code": "WAW"}])
+        c.set("lon", [{"iata_code": "LHR"}])  # evicts "bar", the least recently used
+        self.assertEqual(c.stats()["evictions"], 1)
+        self.assertEqual(c.stats()["size"], 2)
+
+        # Another worker (fresh L1) finds entries in the shared backend
+        other = LocationCache(max_entries=2, ttl=60, negative_ttl=5)
+        self.assertEqual(other.get("BAR"), [{"iata_code": "BCN"}])
+        self.assertEqual(other.stats()["l2_hits"], 1)
+        self.assertIsNone(other.get("nowhere"))
+        self.assertEqual(other.stats()["misses"], 1)
+
+    def test_negative_results_expire_sooner(self):
+        c = LocationCache(backend_alias=None, ttl=60, negative_ttl=5)
+        c.set("qqq", [])
+        self.assertEqual(c.get("qqq"), [])
+        self.assertEqual(c.stats()["negative_hits"], 1)
+        with mock.patch("main.location_cache.time.time", return_value=time.time() + 10):
+            self.assertIsNone(c.get("qqq"))
+        self.assertEqual(c.stats()["expirations"], 1)
+
+    def test_amadeus_locations_called_once_per_keyword(self):
+        resp = mock.Mock(status_code=200)
+        resp.json.return_value = {"data": []}
+        with mock.patch.object(cheap_flight_finder, "get_access_token", return_value="t"), \
+                mock.patch.object(cheap_flight_finder.http_client, "get", return_value=resp) as get:
+            self.assertEqual(cheap_flight_finder._search_amadeus_locations("qxqx"), [])
+            self.assertEqual(cheap_flight_finder._search_amadeus_locations("QXQX", limit=1), [])
+        self.assertEqual(get.call_count, 1)
+
+
+class SingleFlightTestCase(SimpleTestCase):
+    def _run_concurrently(self, n, target):
+        out = []
+        threads = [threading.Thread(target=lambda: out.append(target())) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return out
+
+    def test_concurrent_calls_share_one_execution(self):
+        sf = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def fn():
+            calls.append(1)
+            release.wait(2)
+            return "result"
+
+        def call():
+            return sf.do("k", fn)
+
+        timer = threading.Timer(0.1, release.set)
+        timer.start()
+        out = self._run_concurrently(6, call)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(r for r, _ in out), ["result"] * 6)
+        self.assertEqual(sum(1 for _, shared in out if shared), 5)
+        self.assertEqual(sf.stats()["waiters"], 5)
+        self.assertEqual(sf.stats()["in_flight"], 0)
+
+    def test_waiters_get_leader_error(self):
+        sf = SingleFlight()
+
+        def fn():
+            time.sleep(0.1)
+            raise ValueError("upstream down")
+
+        def call():
+            try:
+                sf.do("k", fn)
+            except ValueError as e:
+                return str(e)
+
+        self.assertEqual(self._run_concurrently(4, call), ["upstream down"] * 4)
+
+    def test_waiter_timeout(self):
+        sf = SingleFlight()
+        release = threading.Event()
+        leader = threading.Thread(target=lambda: sf.do("k", lambda: release.wait(2)))
+        leader.start()
+        time.sleep(0.05)
+        with self.assertRaises(SingleFlightTimeout):
+            sf.do("k", lambda: None, timeout=0.05)
+        release.set()
+        leader.join()
+
+    def test_do_iter_leader_streams_and_abandoned_leader_fails_waiters(self):
+        sf = SingleFlight()
+
+        def fn():
+            yield 1
+            yield 2
+            return "done"
+
+        def consume():
+            result = yield from sf.do_iter("k", fn)
+            return result
+
+        gen = consume()
+        self.assertEqual(next(gen), 1)
+        waiter = []
+        t = threading.Thread(target=lambda: waiter.append(self._catch(lambda: sf.do("k", lambda: "other"))))
+        t.start()
+        time.sleep(0.05)
+        gen.close()  # the leader's consumer goes away mid-stream
+        t.join()
+        self.assertIsInstance(waiter[0], SingleFlightTimeout)
+        self.assertEqual(list(sf.do_iter("k", fn)), [1, 2])
+        self.assertEqual(sf.stats()["in_flight"], 0)
+
+    @staticmethod
+    def _catch(fn):
+        try:
+            return fn()
+        except Exception as e:
+            return e
+        self.assertEqual(sf.stats()["timeouts"], 1)
+
+
+class CheapFlightSearchApiTestCase(SimpleTestCase):
+    url = "/cheap-flight-finder/api/search/"
+    params = {"origin": "WAW", "destination": "BCN", "depart_date": "2030-06-15", "currency": "EUR"}
+
+    def setUp(self):
+        cache.clear()
+
+    def test_second_search_is_cache_hit(self):
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=make_payload([120, 99])) as m:
+            first = self.client.get(self.url, self.params).json()
+            second = self.client.get(self.url, self.params).json()
+        self.assertEqual(m.call_count, 1)
+        self.assertFalse(first["meta"]["cache"]["hit"])
+        self.assertTrue(second["meta"]["cache"]["hit"])
+        self.assertEqual(second["meta"]["cache"]["source"], "amadeus")
+        self.assertEqual([f["price"] for f in second["data"]], [99.0, 120.0])
+        self.assertIn("cheapest", second["data"][0]["badges"])
+        self.assertEqual(set(first["meta"]["timings_ms"]), {"resolve", "search", "total"})
+
+    def test_resolvers_run_concurrently_and_share_the_deadline(self):
+        def slow_locations(keyword, limit=10, deadline=None):
+            time.sleep(0.3)
+            return [{"iata_code": {"QQVVZZ": "AAA", "JJKKXX": "BBB"}[keyword.upper()]}]
+
+        offers_timeouts = []
+
+        def fake_offers(**kw):
+            offers_timeouts.append(kw["deadline"].timeout(20))
+            return make_payload([80])
+
+        params = {**self.params, "origin": "Qqvvzz", "destination": "Jjkkxx"}
+        with self.settings(CFF_SEARCH_DEADLINE=5), \
+                mock.patch.object(cheap_flight_finder, "_search_amadeus_locations", side_effect=slow_locations), \
+                mock.patch.object(cheap_flight_finder, "get_offers", side_effect=fake_offers):
+            body = self.client.get(self.url, params).json()
+        self.assertEqual((body["meta"]["origin_iata"], body["meta"]["destination_iata"]), ("AAA", "BBB"))
+        self.assertLess(body["meta"]["timings_ms"]["resolve"], 550)
+        # The resolve stage came out of the offers call's budget
+        self.assertLess(offers_timeouts[0], 4.8)
+
+    def test_exhausted_deadline_is_503(self):
+        with mock.patch.object(cheap_flight_finder, "get_offers", side_effect=DeadlineExceeded("spent")):
+            resp = self.client.get(self.url, self.params)
+        self.assertEqual(resp.status_code, 503)
+        self.assertIn("timings_ms", resp.json()["meta"])
+
+
+    def test_sort_parameter(self):
+        payload = make_payload([99, 120])
+        payload["data"][1]["itineraries"][0]["duration"] = "PT1H30M"  # pricier but faster
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=payload):
+            by_price = self.client.get(self.url, {**self.params, "sort": "price"}).json()
+            by_duration = self.client.get(self.url, {**self.params, "sort": "duration"}).json()
+            bad = self.client.get(self.url, {**self.params, "sort": "random"})
+        self.assertEqual([f["id"] for f in by_price["data"]], ["1", "2"])
+        self.assertEqual([f["id"] for f in by_duration["data"]], ["2", "1"])
+        self.assertTrue(all(f["pareto"] for f in by_price["data"]))
+        self.assertEqual(bad.status_code, 400)
+
+
+class CheapFlightResultsApiTestCase(SimpleTestCase):
+    url = "/cheap-flight-finder/api/search/results/"
+
+    def setUp(self):
+        cache.clear()
+
+    def _search(self, payload):
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=payload) as m:
+            body = self.client.get("/cheap-flight-finder/api/search/", CheapFlightSearchApiTestCase.params).json()
+        m.assert_called_once()
+        return body["meta"]["search_id"]
+
+    def test_filters_sort_and_pages_without_upstream_calls(self):
+        payload = make_offers_payload(40, round_trip=False, max_stops=2, depart_date="2030-06-15")
+        search_id = self._search(payload)
+        offers = parse_all_offers(payload, "2030-06-15")
+        with mock.patch.object(cheap_flight_finder, "get_offers") as m:
+            body = self.client.get(self.url, {"search_id": search_id, "max_stops": 1, "airlines": "LH,KL",
+                                              "depart_after": "08:00", "depart_before": "16:30",
+                                              "max_price": 600, "sort": "price", "page_size": 2}).json()
+            pages = [self.client.get(self.url, {"search_id": search_id, "sort": "duration", "page": p,
+                                                "page_size": 7}).json() for p in range(1, 8)]
+        m.assert_not_called()
+
+        expected = sorted(
+            (o for o in offers if o.stops <= 1 and {"LH", "KL"} & set(o.airline_codes) and o.price <= 600
+             and "08:00" <= o.departure_datetime[11:16] <= "16:30"),
+            key=lambda o: (o.price, o.total_minutes),
+        )
+        self.assertEqual(body["meta"]["total"], len(expected))
+        self.assertEqual([f["id"] for f in body["data"]], [o.id for o in expected[:2]])
+        self.assertEqual(body["meta"]["facets"]["stops"],
+                         {str(n): sum(o.stops == n for o in offers) for n in (0, 1, 2)})
+
+        ids = [f["id"] for p in pages for f in p["data"]]
+        self.assertEqual(pages[0]["meta"]["total_pages"], 6)
+        self.assertEqual(pages[-1]["data"], [])
+        self.assertEqual(sorted(ids, key=int), [o.id for o in offers])
+        minutes = [f["total_minutes"] for p in pages for f in p["data"]]
+        self.assertEqual(minutes, sorted(minutes))
+
+    def test_overnight_departure_window_wraps_midnight(self):
+        payload = make_payload([100, 110, 120, 130])
+        for offer, at in zip(payload["data"], ("23:15", "05:30", "06:00", "12:00")):
+            offer["itineraries"][0]["segments"][0]["departure"]["at"] = f"2030-06-15T{at}:00"
+        search_id = self._search(payload)
+        overnight = self.client.get(self.url, {"search_id": search_id, "depart_after": "22:00",
+                                               "depart_before": "06:00", "sort": "price"}).json()
+        daytime = self.client.get(self.url, {"search_id": search_id, "depart_after": "06:00",
+                                             "depart_before": "22:00", "sort": "price"}).json()
+        self.assertEqual([f["id"] for f in overnight["data"]], ["1", "2", "3"])
+        self.assertEqual([f["id"] for f in daytime["data"]], ["3", "4"])
+
+    def test_full_mode_summaries_and_offer_detail(self):
+        payload = make_offers_payload(250)
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=payload) as m:
+            body = self.client.get("/cheap-flight-finder/api/search/",
+                                   {**CheapFlightSearchApiTestCase.params, "mode": "full"}).json()
+            search_id = body["meta"]["search_id"]
+            last = self.client.get(self.url, {"search_id": search_id, "view": "summary", "page": 5,
+                                              "page_size": 50}).json()
+            detail = self.client.get("/cheap-flight-finder/api/search/offer/",
+                                     {"search_id": search_id, "offer_id": last["data"][-1]["id"]}).json()
+        m.assert_called_once()
+        self.assertEqual(m.call_args.kwargs["max_items"], cheap_flight_finder.FULL_MAX_ITEMS)
+        self.assertEqual((body["meta"]["result_count"], body["meta"]["total_count"]), (50, 250))
+        self.assertNotIn("segments", body["data"][0])
+        self.assertEqual(len(last["data"]), 50)
+        self.assertEqual(detail["data"]["id"], last["data"][-1]["id"])
+        self.assertIn("segments", detail["data"])
+        self.assertNotIn("raw_offer", detail["data"])
+        # Parsed offers are the only copy: no raw offers are cached next to them
+        self.assertEqual([k for k in cache._cache if "cff:offer" in k], [])
+        self.assertEqual(self.client.get("/cheap-flight-finder/api/search/offer/",
+                                         {"search_id": search_id, "offer_id": "999"}).status_code, 404)
+
+    def test_unknown_search_id_and_bad_filters(self):
+        self.assertEqual(self.client.get(self.url, {"search_id": "0" * 16}).status_code, 404)
+        resp = self.client.get(self.url, {"search_id": "x", "depart_after": "25:00", "max_stops": "one"})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()["errors"], ["invalid max_stops", "invalid depart_after (use HH:MM)"])
+
+
+class FlightRankingTestCase(SimpleTestCase):
+    def test_front_and_badges_match_references(self):
+        for kw in ({"round_trip": True, "max_stops": 2}, {"round_trip": False, "max_stops": 1}):
+            self.assertEqual(normalizer.check_ranking(make_offers_payload(300, **kw)), [])
+
+    def test_dominated_offers_rank_after_the_front(self):
+        # 0 dominates 1 (same time, cheaper, fewer stops); 2 is a night departure
+        ranking = flight_ranking.rank(
+            [100, 110, 90, None], [120, 120, 120, 60], [0, 1, 0, 0],
+            ["2030-06-15T09:00:00", "2030-06-15T09:00:00", "2030-06-15T01:30:00", None],
+        )
+        self.assertEqual(ranking.pareto, [True, False, True, True])
+        self.assertEqual(ranking.order, [2, 0, 3, 1])
+        self.assertEqual(ranking.badges, [[], [], ["cheapest", "best_value"], ["shortest"]])
+        self.assertEqual(flight_ranking.rank([100, 110, 90], [120, 60, 200], sort="duration").order, [1, 0, 2])
+
+
+class DeadlineTestCase(SimpleTestCase):
+    def test_timeout_is_capped_by_remaining_budget(self):
+        clock = FakeClock()
+        d = Deadline(10, clock=clock)
+        self.assertEqual(d.timeout(20), 10)
+        with d.stage("resolve"):
+            clock.now += 7
+        self.assertEqual(d.timeout(20), 3)
+        self.assertEqual(d.timings(), {"resolve": 7000.0, "total": 7000.0})
+        clock.now += 3
+        self.assertTrue(d.expired())
+        with self.assertRaises(DeadlineExceeded):
+            d.timeout(20)
+
+
+class CheapFlightCalendarApiTestCase(SimpleTestCase):
+    url = "/cheap-flight-finder/api/calendar/"
+
+    def setUp(self):
+        cache.clear()
+
+    def test_calendar_fans_out_and_feeds_search_cache(self):
+        def fake_offers(origin, destination, depart_date, currency, max_items=10, return_date=None, adults=1,
+                        deadline=None):
+            day = int(depart_date[-2:])
+            return make_payload([100 + day, 300], dep_at=f"{depart_date}T08:00:00", arr_at=f"{depart_date}T10:30:00")
+
+        params = {"origin": "WAW", "destination": "BCN", "depart_date": "2030-06-15", "days": 2, "currency": "EUR"}
+        with mock.patch.object(cheap_flight_finder, "get_offers", side_effect=fake_offers) as m:
+            data = self.client.get(self.url, params).json()
+            self.assertEqual(m.call_count, 5)
+            search = self.client.get("/cheap-flight-finder/api/search/", {
+                "origin": "WAW", "destination": "BCN", "depart_date": "2030-06-14", "currency": "EUR",
+            }).json()
+            self.assertEqual(m.call_count, 5)
+        self.assertEqual([c["depart_date"] for c in data["data"]],
+                         ["2030-06-13", "2030-06-14", "2030-06-15", "2030-06-16", "2030-06-17"])
+        self.assertEqual(data["meta"]["cheapest_date"], "2030-06-13")
+        self.assertEqual(data["meta"]["cheapest_price"], 113.0)
+        self.assertTrue(search["meta"]["cache"]["hit"])
+        self.assertEqual(search["meta"]["cache"]["source"], "calendar")
+
+    @override_settings(CFF_FANOUT_PER_REQUEST=2)
+    def test_calendar_caps_its_concurrency_and_survives_a_broken_cell(self):
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def fake_offers(origin, destination, depart_date, currency, max_items=10, return_date=None, adults=1,
+                        deadline=None):
+            with lock:
+                running.append(depart_date)
+                peak.append(len(running))
+            try:
+                time.sleep(0.02)
+                if depart_date.endswith("14"):
+                    raise RuntimeError("boom")
+                return make_payload([100], dep_at=f"{depart_date}T08:00:00", arr_at=f"{depart_date}T10:30:00")
+            finally:
+                with lock:
+                    running.remove(depart_date)
+
+        params = {"origin": "WAW", "destination": "BCN", "depart_date": "2030-06-15", "days": 2, "currency": "EUR"}
+        with mock.patch.object(cheap_flight_finder, "get_offers", side_effect=fake_offers), \
+                self.assertLogs("main.flight_calendar", "ERROR"):
+            data = self.client.get(self.url, params).json()
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(len(peak), 5)
+        self.assertEqual([c["error"] for c in data["data"]], [None, "internal error", None, None, None])
+        self.assertEqual(data["meta"]["result_count"], 4)
+
+    def test_default_calendar_runs_in_one_round_within_the_search_deadline(self):
+        lock = threading.Lock()
+        running = []
+        peak = []
+        release = threading.Event()
+
+        def fake_offers(origin, destination, depart_date, currency, max_items=10, return_date=None, adults=1,
+                        deadline=None):
+            with lock:
+                running.append(depart_date)
+                peak.append(len(running))
+            try:
+                if depart_date.endswith("18"):
+                    release.wait(5)
+                time.sleep(0.02)
+                return make_payload([100], dep_at=f"{depart_date}T08:00:00", arr_at=f"{depart_date}T10:30:00")
+            finally:
+                with lock:
+                    running.remove(depart_date)
+
+        params = {"origin": "WAW", "destination": "BCN", "depart_date": "2030-06-15", "currency": "EUR"}
+        with self.settings(CFF_SEARCH_DEADLINE=1), \
+                mock.patch.object(cheap_flight_finder, "get_offers", side_effect=fake_offers):
+            started = time.monotonic()
+            data = self.client.get(self.url, params).json()
+            elapsed = time.monotonic() - started
+            release.set()
+        self.assertEqual(max(peak), 7)
+        self.assertLess(elapsed, 2)
+        self.assertEqual([c["error"] for c in data["data"]], [None] * 6 + ["timeout"])
+
+    def test_calendar_requires_valid_date(self):
+        resp = self.client.get(self.url, {"origin": "WAW", "destination": "BCN", "depart_date": "soon"})
+        self.assertEqual(resp.status_code, 400)
+
+
+class CheapFlightMatrixApiTestCase(SimpleTestCase):
+    url = "/cheap-flight-finder/api/matrix/"
+
+    def setUp(self):
+        cache.clear()
+
+    def test_matrix_streams_every_pair(self):
+        def fake_offers(origin, destination, depart_date, currency, max_items=10, return_date=None, adults=1,
+                        deadline=None):
+            price = 100 + int(depart_date[-2:]) + int(return_date[-2:])
+            return make_payload([price + 50, price], dep_at=f"{depart_date}T08:00:00", arr_at=f"{depart_date}T10:30:00")
+
+        params = {
+            "origin": "WAW", "destination": "BCN", "depart_date": "2030-06-15", "return_date": "2030-06-20",
+            "depart_days": 1, "return_days": 1, "currency": "EUR",
+        }
+        with mock.patch.object(cheap_flight_finder, "get_offers", side_effect=fake_offers):
+            resp = self.client.get(self.url, params)
+            lines = [json.loads(line) for line in b"".join(resp.streaming_content).splitlines()]
+        self.assertEqual(resp["Content-Type"], "application/x-ndjson")
+        self.assertEqual(lines[0]["type"], "meta")
+        self.assertEqual(lines[-1]["type"], "summary")
+        cells = [ln for ln in lines if ln["type"] == "cell"]
+        self.assertEqual(len(cells), 9)
+        self.assertEqual(lines[-1]["cheapest"]["min_price"], 133.0)
+        self.assertEqual(lines[-1]["cheapest"]["depart_date"], "2030-06-14")
+
+    def test_matrix_skips_past_dates(self):
+        today = date.today()
+        params = {
+            "origin": "WAW", "destination": "BCN", "depart_date": today.isoformat(), "return_date": today.isoformat(),
+            "depart_days": 1, "return_days": 1, "currency": "EUR",
+        }
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=make_payload([100])):
+            lines = [json.loads(line) for line in b"".join(self.client.get(self.url, params).streaming_content).splitlines()]
+        tomorrow = (today + timedelta(days=1)).isoformat()
+        self.assertEqual(lines[0]["depart_dates"], [today.isoformat(), tomorrow])
+        self.assertEqual(lines[0]["return_dates"], [today.isoformat(), tomorrow])
+        self.assertEqual(lines[0]["cell_count"], 3)
+
+    def test_matrix_requires_return_date(self):
+        resp = self.client.get(self.url, {"origin": "WAW", "destination": "BCN", "depart_date": "2030-06-15"})
+        self.assertEqual(resp.status_code, 400)
+
+
+class CheapFlightSearchStreamApiTestCase(SimpleTestCase):
+    url = "/cheap-flight-finder/api/search/stream/"
+    params = {"origin": "WAW", "destination": "BCN", "depart_date": "2030-06-15", "currency": "EUR"}
+
+    def setUp(self):
+        cache.clear()
+
+    def _chunked_response(self, payload, chunk=300):
+        body = json.dumps(payload).encode()
+        resp = mock.Mock(status_code=200)
+        resp.iter_content.return_value = [body[i:i + chunk] for i in range(0, len(body), chunk)]
+        return resp
+
+    def _lines(self, resp):
+        return [json.loads(line) for line in b"".join(resp.streaming_content).splitlines()]
+
+    def test_offers_stream_before_ranking_then_fill_cache(self):
+        payload = make_payload([120, 99, 120])  # third is a duplicate of the first
+        payload["data"][2]["id"] = "3"
+        with mock.patch.object(cheap_flight_finder, "get_access_token", return_value="t"), \
+                mock.patch.object(cheap_flight_finder.http_client, "get", return_value=self._chunked_response(payload)):
+            resp = self.client.get(self.url, self.params)
+            lines = self._lines(resp)
+        self.assertEqual(resp["Content-Type"], "application/x-ndjson")
+        self.assertEqual([ln["type"] for ln in lines], ["meta", "route", "offer", "offer", "ranking"])
+        self.assertFalse(lines[1]["cached"])
+        self.assertEqual(lines[1]["destination_iata"], "BCN")
+        self.assertEqual([ln["price"] for ln in lines[2:4]], [120.0, 99.0])  # arrival order
+        ranking = lines[-1]
+        self.assertEqual(ranking["order"], ["2", "1"])
+        self.assertIn("cheapest", ranking["badges"]["2"])
+        self.assertEqual(ranking["carriers"], {"LO": "LOT"})
+        self.assertIn("first_offer", ranking["timings_ms"])
+
+        # The JSON API is now a cache hit with carrier names filled in
+        with mock.patch.object(cheap_flight_finder, "get_offers") as m:
+            body = self.client.get("/cheap-flight-finder/api/search/", self.params).json()
+        m.assert_not_called()
+        self.assertEqual(body["data"][0]["primary_airline"], "LOT")
+
+    def test_cached_search_streams_in_rank_order(self):
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=make_payload([120, 99])):
+            self.client.get("/cheap-flight-finder/api/search/", self.params)
+        lines = self._lines(self.client.get(self.url, self.params))
+        self.assertTrue(lines[1]["cached"])
+        self.assertEqual([ln["price"] for ln in lines if ln["type"] == "offer"], [99.0, 120.0])
+        self.assertTrue(lines[-1]["cache"]["hit"])
+
+    def test_upstream_error_is_last_line(self):
+        with mock.patch("main.flight_stream.open_offers_stream",
+                        side_effect=cheap_flight_finder.AmadeusError("Failed to get offers: 500")) as m:
+            lines = self._lines(self.client.get(self.url, self.params))
+        m.assert_called_once()
+        self.assertEqual([ln["type"] for ln in lines], ["meta", "route", "error"])
+        self.assertEqual(lines[-1]["errors"], ["api temporarily unavailable"])
+
+    def test_meta_line_goes_out_before_resolution(self):
+        with mock.patch("main.flight_stream.resolve_pair", return_value=("WAW", "")) as m:
+            content = iter(self.client.get(self.url, self.params).streaming_content)
+            meta = json.loads(next(content))
+            m.assert_not_called()
+            rest = [json.loads(line) for line in content]
+        self.assertEqual(meta["type"], "meta")
+        self.assertEqual([ln["type"] for ln in rest], ["error"])
+        self.assertEqual(rest[0]["errors"], ["invalid destination"])
+
+    def test_identical_concurrent_streams_share_one_upstream_call(self):
+        payload = make_payload([120, 99])
+        body = json.dumps(payload).encode()
+        waiters = search_cache.inflight.waiters
+        started = threading.Event()
+
+        def slow_body(chunk_size):
+            started.set()
+            # Hold the body until the other two streams are waiting on this one
+            until = time.monotonic() + 5
+            while search_cache.inflight.waiters < waiters + 2 and time.monotonic() < until:
+                time.sleep(0.01)
+            yield body
+
+        upstream = mock.Mock(status_code=200)
+        upstream.iter_content.side_effect = slow_body
+        results = {}
+
+        def run(name):
+            results[name] = self._lines(self.client.get(self.url, self.params))
+
+        with mock.patch.object(cheap_flight_finder, "get_access_token", return_value="t"), \
+                mock.patch.object(cheap_flight_finder.http_client, "get", return_value=upstream) as get:
+            leader = threading.Thread(target=run, args=("leader",))
+            leader.start()
+            self.assertTrue(started.wait(5))
+            followers = [threading.Thread(target=run, args=(f"f{i}",)) for i in range(2)]
+            for t in followers:
+                t.start()
+            for t in [leader, *followers]:
+                t.join()
+        get.assert_called_once()
+        self.assertFalse(results["leader"][-1]["cache"]["coalesced"])
+        for name in ("f0", "f1"):
+            lines = results[name]
+            self.assertTrue(lines[-1]["cache"]["coalesced"])
+            self.assertEqual([ln["price"] for ln in lines if ln["type"] == "offer"], [99.0, 120.0])
+            self.assertEqual(lines[-1]["carriers"], {"LO": "LOT"})
+
+    def test_body_download_is_bounded_by_the_deadline(self):
+        clock = [0.0]
+        body = json.dumps(make_payload([120, 99])).encode()
+
+        def slow_chunks(chunk_size):
+            for i in range(0, len(body), 100):
+                clock[0] += 10  # each chunk takes 10s against a 25s budget
+                yield body[i:i + 100]
+
+        upstream = mock.Mock(status_code=200)
+        upstream.iter_content.side_effect = slow_chunks
+        real_deadline = Deadline
+        with mock.patch("main.flight_stream.Deadline", lambda budget: real_deadline(budget, clock=lambda: clock[0])), \
+                mock.patch.object(cheap_flight_finder, "get_access_token", return_value="t"), \
+                mock.patch.object(cheap_flight_finder.http_client, "get", return_value=upstream):
+            lines = self._lines(self.client.get(self.url, self.params))
+        self.assertEqual(lines[-1]["type"], "error")
+        self.assertEqual(lines[-1]["errors"], ["timeout"])
+        upstream.close.assert_called_once()
+        self.assertIsNone(search_cache.get(make_search_key("WAW", "BCN", "2030-06-15", None, "EUR", 1)))
+
+
+class AirportIndexTestCase(SimpleTestCase):
+    def test_memory_index_matches_linear_scan(self):
+        index = airport_data._LocationIndex(airport_data.POPULAR_LOCATIONS)
+        self.assertEqual(airport_lookup.check_equivalence(index), [])
+
+    def test_mmap_table_matches_linear_scan(self):
+        with airport_lookup.seed_table() as table:
+            self.assertEqual(len(table), len(airport_data.POPULAR_LOCATIONS))
+            self.assertEqual(airport_lookup.check_equivalence(table), [])
+            with airport_lookup.using_index(table):
+                self.assertEqual(airport_lookup.check_fuzzy(), [])
+
+    def test_bundled_table_covers_popular_list_and_cities(self):
+        table = airport_table.load_default()
+        self.assertIsNotNone(table)
+        self.assertGreater(len(table), 5000)
+        # Rebuild with build_airport_table after editing POPULAR_LOCATIONS
+        for rank, loc in enumerate(airport_data.POPULAR_LOCATIONS):
+            pos = table.position(loc["iata"])
+            self.assertIsNotNone(pos, loc["iata"])
+            self.assertEqual((table.rank(pos), table.record(pos)["city_name"], table.record(pos)["country_code"]),
+                             (rank, loc["city"], loc["country"]), loc["iata"])
+        for code, city in (("LON", "London"), ("NYC", "New York"), ("PAR", "Paris")):
+            pos = table.position(code)
+            self.assertEqual(table.record(pos)["city_name"], city)
+            self.assertIsNotNone(table.coordinates(pos))
+        self.assertAlmostEqual(table.coordinates(table.position("WAW"))[0], 52.17, places=1)
+        table.close()
+
+    def test_bundled_table_name_index_matches_scan(self):
+        table = airport_table.load_default()
+        self.assertEqual(airport_lookup.check_table_search(table), [])
+        table.close()
+
+    def test_fuzzy_typos_and_native_spellings(self):
+        self.assertEqual(airport_lookup.check_fuzzy(), [])
+        # Same score: more popular first
+        self.assertEqual([r["iata_code"] for r in airport_data.search_local("İstanbul")][:2], ["IST", "SAW"])
+        self.assertEqual(airport_data.search_local("Nowhere"), [])
+        self.assertEqual(airport_data.search_local("Barcelna", fuzzy=False), [])
+
+    def test_typos_do_not_resolve_but_are_suggested(self):
+        self.assertIsNone(airport_data.resolve_to_iata_local("Parsi"))
+        self.assertIsNone(airport_data.resolve_to_iata_local("Barcelna"))
+        self.assertEqual(airport_data.resolve_to_iata_local("Wien"), "VIE")  # native spelling: exact alias
+        with mock.patch.object(cheap_flight_finder, "_search_amadeus_locations", return_value=[]), \
+                mock.patch.object(cheap_flight_finder, "get_offers") as offers:
+            resp = self.client.get("/cheap-flight-finder/api/search/", {
+                "origin": "WAW", "destination": "Barcelna", "depart_date": "2030-06-15"})
+        offers.assert_not_called()
+        self.assertEqual(resp.status_code, 400)
+        body = resp.json()
+        self.assertEqual(body["errors"], ["invalid destination"])
+        self.assertEqual(body["suggestions"][0]["iata_code"], "BCN")
+
+    def test_trigram_prefix_filter_matches_full_scan(self):
+        names = [loc["city"] for loc in airport_data.POPULAR_LOCATIONS] + [
+            loc["airport"] for loc in airport_data.POPULAR_LOCATIONS]
+        index = TrigramIndex((i, name, i) for i, name in enumerate(names))
+
+        def full_scan(query, threshold):
+            q = trigrams(fold(query))
+            best = {}
+            for pos, name in enumerate(names):
+                g = trigrams(fold(name))
+                n = len(q & g)
+                if n:
+                    score = max(n / len(q | g), 0.9 * n / len(q))
+                    if score >= threshold:
+                        best[pos] = max(best.get(pos, 0.0), score)
+            return sorted(best.items(), key=lambda item: (-round(item[1], 2), item[0]))
+
+        for query, _ in airport_lookup.FUZZY_QUERIES + [("Barcelona airport", None), ("Par", None)]:
+            for threshold in (0.3, 0.5):
+                self.assertEqual(index.search(query, 100, threshold), full_scan(query, threshold), query)
+
+    def test_fuzzy_match_skips_amadeus(self):
+        with mock.patch.object(cheap_flight_finder, "_search_amadeus_locations") as api:
+            results = cheap_flight_finder.search_locations("Warszawa")
+        api.assert_not_called()
+        self.assertEqual(results[0]["iata_code"], "WAW")
+
+
+class OfferModelTestCase(SimpleTestCase):
+    def test_to_dict_matches_legacy_normalizer(self):
+        self.assertEqual(offer_model.check_equivalence(make_offers_payload(40, round_trip=True)), [])
+        self.assertEqual(offer_model.check_equivalence(make_offers_payload(40, round_trip=False, max_stops=2)), [])
+        self.assertEqual(offer_model.check_equivalence(make_payload([120, 99])), [])
+
+    def test_offers_survive_the_cache_backend(self):
+        offers = parse_all_offers(make_offers_payload(5), "2030-06-15")
+        cache.set("offers", offers)
+        self.assertEqual([o.to_dict() for o in cache.get("offers")], [o.to_dict() for o in offers])
+
+    def test_memoized_parsers_match_originals(self):
+        self.assertEqual(normalizer.check_equivalence(make_offers_payload(40)), [])
+
+
+class PipelineBenchmarkTestCase(SimpleTestCase):
+    recorded = "waw_bcn_2030-06-15_2030-06-22_33"
+
+    def test_suite_runs_offline_and_flags_regressions(self):
+        rows = pipeline.run_suite(sizes=(10,), repeat=1)
+        self.assertEqual({r["scenario"] for r in rows},
+                         {"one_way/10", "round_trip/10", "multi_stop/10", f"recorded/{self.recorded}"})
+        self.assertEqual({r["stage"] for r in rows}, {"normalize", "to_dicts", "dedupe", "rank", "serialize"})
+        baseline = [{**r, "ms": r["ms"] / 10} for r in rows]
+        self.assertEqual(len(pipeline.compare(rows, baseline)), sum(1 for r in rows if r["ms"]))
+
+    def test_load_recorded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "waw_bcn_2.json"), "w") as f:
+                json.dump(make_payload([1, 2]), f)
+            self.assertEqual(list(load_recorded(tmp)), ["waw_bcn_2"])
+
+    def test_bundled_recording_parses_like_a_live_response(self):
+        payload = load_recorded()[self.recorded]
+        offers = parse_all_offers(payload, "2030-06-15")
+        self.assertEqual(len(offers), len(payload["data"]))
+        carriers = payload["dictionaries"]["carriers"]
+        self.assertTrue(all(o.primary_airline == carriers[o.validating_airline_codes[0]] for o in offers))
+        self.assertTrue(all(o.inbound and o.departure_iata == "WAW" for o in offers))
+        self.assertEqual(normalizer.check_equivalence(payload), [])
+        self.assertEqual(offer_model.check_equivalence(payload), [])
+
+
+class UpstreamStandinTestCase(SimpleTestCase):
+    """The real HTTP client code against the local stand-in server."""
+
+    def _serve(self, **config):
+        config.setdefault("recordings", None)
+        standin = Standin(StandinConfig(seed=1, **config))
+        server = make_server(standin, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = "http://%s:%s" % server.server_address[:2]
+        for name, value in {
+            "TOKEN_URL": f"{base}/v1/security/oauth2/token",
+            "OFFERS_URL": f"{base}/v2/shopping/flight-offers",
+            "LOCATIONS_URL": f"{base}/v1/reference-data/locations",
+            "PLACES_SEARCH_TEXT_URL": f"{base}/v1/places:searchText",
+            "GOOGLE_PLACES_BASE_URL": base,
+            "AMADEUS_CLIENT_ID": "standin",
+            "AMADEUS_CLIENT_SECRET": "standin",
+            "GOOGLE_PLACES_API_KEY": "standin",
+            "_TOKEN_MANAGER": AmadeusTokenManager(cheap_flight_finder._fetch_access_token),
+            "amadeus_limiter": TokenBucket("standin-test", rate=0),
+            "amadeus_breaker": CircuitBreaker("standin-test"),
+            "places_breaker": CircuitBreaker("standin-test-places"),
+        }.items():
+            patcher = mock.patch.object(cheap_flight_finder, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return standin
+
+    def test_offers_locations_and_places(self):
+        standin = self._serve(latency_ms=5)
+        payload = cheap_flight_finder.get_offers("WAW", "BCN", "2030-06-15", "PLN", max_items=25)
+        self.assertEqual(len(payload["data"]), 25)
+        self.assertEqual({o["price"]["currency"] for o in payload["data"]}, {"PLN"})
+        self.assertEqual(len(parse_all_offers(payload, "2030-06-15")), 25)
+        # Same search, same synthetic offers
+        again = cheap_flight_finder.get_offers("WAW", "BCN", "2030-06-15", "PLN", max_items=25)
+        self.assertEqual(again["data"], payload["data"])
+
+        with mock.patch.object(location_cache, "get", return_value=None):
+            found = cheap_flight_finder._search_amadeus_locations("Warsaw", limit=3)
+        self.assertIn("WAW", [r["iata_code"] for r in found])
+
+        details = self.client.get("/cheap-flight-finder/api/place-details/", {"query": "Hotel Warsaw"}).json()
+        self.assertEqual(details["data"]["name"], "Hotel Warsaw")
+        photo = self.client.get("/cheap-flight-finder/api/place-photo/", {"query": "Hotel Warsaw"})
+        self.assertEqual(photo["Content-Type"], "image/gif")
+        self.assertEqual(standin.stats["requests"], 6)  # token requests are not counted
+
+    def test_replays_recorded_offers(self):
+        self._serve(recordings=RECORDED_DIR)
+        recorded = load_recorded()[PipelineBenchmarkTestCase.recorded]
+        payload = cheap_flight_finder.get_offers("WAW", "BCN", "2030-06-15", "EUR", max_items=10,
+                                                 return_date="2030-06-22")
+        self.assertEqual(payload["data"], recorded["data"][:10])
+        self.assertEqual(payload["dictionaries"], recorded["dictionaries"])
+
+    def test_fault_injection(self):
+        standin = self._serve(rate_limit_rate=1.0, retry_after=0)
+        with self.assertRaises(cheap_flight_finder.AmadeusRateLimitError) as ctx:
+            cheap_flight_finder.get_offers("WAW", "BCN", "2030-06-15", "EUR")
+        self.assertIn("Too many requests", str(ctx.exception))
+        self.assertEqual(standin.stats["rate_limited"], 3)  # first call + CFF_AMADEUS_RETRIES
+
+        standin.config.rate_limit_rate, standin.config.error_rate = 0.0, 1.0
+        self.assertEqual(standin.handle("GET", "/v2/shopping/flight-offers", {}, b"")[0], 500)
+        standin = Standin(StandinConfig(recordings=None, max_rps=1))
+        statuses = [standin.handle("GET", "/v1/reference-data/locations", {"keyword": "WAW"}, b"")[0]
+                    for _ in range(2)]
+        self.assertEqual(statuses, [200, 429])
+
+
+class AsyncFlightViewsTestCase(SimpleTestCase):
+    """The async views against the stand-in: searches overlap instead of queueing."""
+
+    _serve = UpstreamStandinTestCase._serve
+
+    async def test_searches_wait_concurrently(self):
+        standin = self._serve(latency_ms=300)
+        cache.clear()
+        rf = RequestFactory()
+        params = {"origin": "WAW", "destination": "BCN", "currency": "EUR"}
+        started = time.monotonic()
+        responses = await asyncio.gather(*(
+            cheap_flight_async.cheap_flight_search_api(rf.get("/", {**params, "depart_date": f"2030-06-{day}"}))
+            for day in (10, 11, 12, 13, 14)
+        ))
+        elapsed = time.monotonic() - started
+        self.assertEqual([r.status_code for r in responses], [200] * 5)
+        self.assertEqual(standin.stats["requests"], 5)
+        self.assertLess(elapsed, 1.2)  # 5 x 300 ms one after another would be 1.5 s
+        body = json.loads(responses[0].content)
+        self.assertEqual(body["meta"]["destination_iata"], "BCN")
+        self.assertTrue(body["data"])
+
+        # Identical concurrent searches share one upstream call
+        same = rf.get("/", {**params, "depart_date": "2030-07-01"})
+        first, second = await asyncio.gather(cheap_flight_async.cheap_flight_search_api(same),
+                                             cheap_flight_async.cheap_flight_search_api(same))
+        self.assertEqual(standin.stats["requests"], 6)
+        statuses = {json.loads(r.content)["meta"]["cache"]["coalesced"] for r in (first, second)}
+        self.assertEqual(statuses, {True, False})
+
+    async def test_locations_and_places(self):
+        self._serve()
+        rf = RequestFactory()
+        with mock.patch.object(location_cache, "aget", mock.AsyncMock(return_value=None)):
+            resp = await cheap_flight_async.cheap_flight_locations_api(rf.get("/", {"q": "Qqvvzz"}))
+        self.assertEqual(json.loads(resp.content), {"success": True, "data": [], "errors": []})
+        details = await cheap_flight_async.place_details_api(rf.get("/", {"query": "Hotel Warsaw"}))
+        self.assertEqual(json.loads(details.content)["data"]["name"], "Hotel Warsaw")
+        photo = await cheap_flight_async.place_photo_api(rf.get("/", {"query": "Hotel Warsaw"}))
+        self.assertEqual(photo["Content-Type"], "image/gif")
+
+    async def test_rate_limited_search_is_429(self):
+        self._serve(rate_limit_rate=1.0, retry_after=60)
+        cache.clear()
+        resp = await cheap_flight_async.cheap_flight_search_api(RequestFactory().get("/", {
+            "origin": "WAW", "destination": "BCN", "depart_date": "2030-06-15", "currency": "EUR"}))
+        self.assertEqual(resp.status_code, 429)
+        self.assertIn("Retry-After", resp)
+
+
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "cff_test_cache"},
+})
+class AsyncViewsDatabaseCacheTestCase(TransactionTestCase):
+    """The async views against DatabaseCache (the shared backend build.sh creates): no sync cache calls on the loop."""
+
+    _serve = UpstreamStandinTestCase._serve
+
+    def setUp(self):
+        call_command("createcachetable", verbosity=0)
+        location_cache.clear()
+
+    async def test_search_and_locations(self):
+        self._serve()
+        limiter = TokenBucket("standin-db", rate=100, shared=True)
+        rf = RequestFactory()
+        params = {"origin": "WAW", "destination": "BCN", "depart_date": "2030-06-15", "currency": "EUR"}
+        with mock.patch.object(cheap_flight_finder, "amadeus_limiter", limiter):
+            first = await cheap_flight_async.cheap_flight_search_api(rf.get("/", params))
+            second = await cheap_flight_async.cheap_flight_search_api(rf.get("/", params))
+            full = await cheap_flight_async.cheap_flight_search_api(rf.get("/", {**params, "mode": "full"}))
+            locations = await cheap_flight_async.cheap_flight_locations_api(rf.get("/", {"q": "Qqvvzz"}))
+            again = await cheap_flight_async.cheap_flight_locations_api(rf.get("/", {"q": "Qqvvzz"}))
+        self.assertEqual([r.status_code for r in (first, second, full, locations, again)], [200] * 5)
+        self.assertTrue(json.loads(second.content)["meta"]["cache"]["hit"])
+        self.assertEqual(location_cache.stats()["hits"], 1)
+
+        # A stale entry is served and refreshed in the background
+        key = make_search_key("WAW", "BCN", "2030-06-15", None, "EUR", 1)
+        entry = await search_cache.aget(key)
+        entry["created_at"] -= search_cache.ttl + 1
+        await cache.aset(key, entry)
+        with mock.patch.object(cheap_flight_finder, "amadeus_limiter", limiter):
+            stale = await cheap_flight_async.cheap_flight_search_api(rf.get("/", params))
+        self.assertTrue(json.loads(stale.content)["meta"]["cache"]["stale"])
+
+
+class HttpClientTestCase(SimpleTestCase):
+    def test_keep_alive_and_stats(self):
+        server = make_server(Standin(StandinConfig(recordings=None)), port=0)
+        accepted = []
+        get_request = server.get_request
+        server.get_request = lambda: accepted.append(1) or get_request()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = "http://%s:%s" % server.server_address[:2]
+        client = HttpClient(retries=0)
+        self.addCleanup(client.close)
+
+        for _ in range(5):
+            resp = client.get(f"{base}/v1/reference-data/locations", params={"keyword": "WAW"}, upstream="standin")
+            self.assertEqual(resp.status_code, 200)
+        client.get(f"{base}/nowhere", upstream="standin")
+        self.assertEqual(len(accepted), 1)  # one connection, reused
+        stats = client.stats()[0]
+        self.assertEqual((stats["name"], stats["calls"], stats["errors"]), ("standin", 6, 0))
+        self.assertEqual(stats["statuses"], {200: 5, 404: 1})
+
+    def test_retries_idempotent_only(self):
+        client = HttpClient(retries=2, backoff=0)
+        unavailable, ok = mock.Mock(status_code=503), mock.Mock(status_code=200)
+        with mock.patch.object(client._session, "request", side_effect=[unavailable, ok]) as request:
+            self.assertIs(client.get("https://example.test/a"), ok)
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(request.call_args.kwargs["timeout"], HttpClient.default_timeout())
+        with mock.patch.object(client._session, "request", return_value=unavailable) as request:
+            self.assertIs(client.post("https://example.test/a"), unavailable)
+        self.assertEqual(request.call_count, 1)
+        with mock.patch.object(client._session, "request",
+                               side_effect=cheap_flight_finder.requests.exceptions.ConnectionError("down")):
+            with self.assertRaises(cheap_flight_finder.requests.exceptions.ConnectionError):
+                client.get("https://example.test/a")
+        stats = client.stats()[0]
+        self.assertEqual(stats["name"], "example.test")
+        self.assertEqual((stats["calls"], stats["retries"], stats["errors"]), (6, 3, 3))
+
+
+class RateLimitTestCase(SimpleTestCase):
+    def test_reserve_keeps_tokens_for_user_traffic(self):
+        bucket = TokenBucket("t", rate=20, burst=2, reserve=1, max_wait=0.01)
+        bucket.acquire(LOW)
+        with self.assertRaises(RateLimited):
+            bucket.acquire(LOW)  # the last token is reserved
+        bucket.acquire(HIGH)
+        with self.assertRaises(RateLimited):
+            bucket.acquire(HIGH)
+        self.assertEqual((bucket.acquired, bucket.rejected), (2, 2))
+
+    def test_low_priority_queues_behind_user_traffic(self):
+        bucket = TokenBucket("t", rate=20, burst=1, reserve=0, max_wait=2)
+        bucket.acquire(HIGH)  # drain
+        order = []
+
+        def background():
+            with priority(LOW):
+                bucket.acquire()
+            order.append("low")
+
+        low = threading.Thread(target=background)
+        low.start()
+        time.sleep(0.01)
+        bucket.acquire(HIGH)
+        order.append("high")
+        low.join()
+        self.assertEqual(order, ["high", "low"])
+
+    def test_retry_after_blocks_the_bucket_and_other_workers(self):
+        bucket = TokenBucket("shared-test", rate=0, shared=True)
+        other_worker = TokenBucket("shared-test", rate=0, shared=True)
+        bucket.penalize(5)
+        for b in (bucket, other_worker):
+            with self.assertRaises(RateLimited) as ctx:
+                b.acquire(deadline=Deadline(1))
+            self.assertGreater(ctx.exception.retry_after, 4)
+        cache.delete("cff:ratelimit:shared-test:blocked")
+
+    def test_retries_inside_the_deadline_then_429(self):
+        responses = [mock.Mock(status_code=503, headers={}), mock.Mock(status_code=429, headers={"Retry-After": "60"})]
+        limiter = TokenBucket("t", rate=0)
+        with mock.patch.object(cheap_flight_finder, "get_access_token", return_value="t"), \
+                mock.patch.object(cheap_flight_finder, "amadeus_limiter", limiter), \
+                mock.patch.object(cheap_flight_finder.time, "sleep"), \
+                mock.patch.object(cheap_flight_finder.http_client, "get", side_effect=responses) as get:
+            resp = self.client.get("/cheap-flight-finder/api/search/",
+                                   {"origin": "WAW", "destination": "BCN", "depart_date": "2030-06-15"})
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp.json()["errors"], ["rate limited"])
+        self.assertEqual(resp["Retry-After"], "60")  # longer than the deadline: no third call
+        self.assertEqual(limiter.stats()["penalties"], 1)
+
+
+class CircuitBreakerTestCase(SimpleTestCase):
+    def test_opens_probes_and_closes(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("t", failure_threshold=2, reset_timeout=30, clock=clock)
+        for _ in range(2):
+            breaker.before_call()
+            breaker.record(False, "timeout")
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitOpen) as ctx:
+            breaker.before_call()
+        self.assertEqual(ctx.exception.retry_in, 30)
+
+        clock.now += 30
+        breaker.before_call()  # the probe
+        self.assertEqual(breaker.state, HALF_OPEN)
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()  # one probe at a time
+        breaker.record(False, "HTTP 503")
+        self.assertEqual(breaker.state, OPEN)  # failed probe: another full period
+
+        clock.now += 30
+        breaker.before_call()
+        breaker.record(True)
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual((breaker.calls, breaker.failures, breaker.short_circuited, breaker.opened), (4, 3, 2, 2))
+
+    def test_open_amadeus_circuit_fails_fast(self):
+        breaker = CircuitBreaker("amadeus-test", failure_threshold=2, reset_timeout=60)
+        params = {"origin": "WAW", "destination": "BCN", "depart_date": "2030-06-15"}
+        with mock.patch.object(cheap_flight_finder, "get_access_token", return_value="t"), \
+                mock.patch.object(cheap_flight_finder, "amadeus_breaker", breaker), \
+                mock.patch.object(cheap_flight_finder, "amadeus_limiter", TokenBucket("t", rate=0)), \
+                mock.patch.object(cheap_flight_finder.time, "sleep"), \
+                mock.patch.object(cheap_flight_finder.http_client, "get",
+                                  side_effect=cheap_flight_finder.requests.exceptions.ConnectionError("down")) as get:
+            first = self.client.get("/cheap-flight-finder/api/search/", params)
+            second = self.client.get("/cheap-flight-finder/api/search/", {**params, "depart_date": "2030-06-16"})
+        self.assertEqual(get.call_count, 2)  # the third attempt and the second search never went out
+        self.assertEqual((first.status_code, second.status_code), (503, 503))
+        self.assertEqual(second["Retry-After"], "60")
+
+    def test_half_open_probe_is_not_lost_to_limiter_or_token_failures(self):
+        now = [0.0]
+        breaker = CircuitBreaker("amadeus-test", failure_threshold=1, reset_timeout=30, clock=lambda: now[0])
+        breaker.before_call()
+        breaker.record(False, "HTTP 503")
+        now[0] = 31.0  # the probe is due
+        limiter = mock.Mock()
+        limiter.acquire.side_effect = RateLimited("no slot", retry_after=1)
+        ok = mock.Mock(status_code=200)
+        with mock.patch.object(cheap_flight_finder, "amadeus_breaker", breaker), \
+                mock.patch.object(cheap_flight_finder, "get_access_token", return_value="t"), \
+                mock.patch.object(cheap_flight_finder.http_client, "get", return_value=ok) as get:
+            with mock.patch.object(cheap_flight_finder, "amadeus_limiter", limiter), \
+                    self.assertRaises(cheap_flight_finder.AmadeusRateLimitError):
+                cheap_flight_finder._amadeus_get(cheap_flight_finder.OFFERS_URL, {}, 5)
+            with mock.patch.object(cheap_flight_finder, "get_access_token",
+                                   side_effect=cheap_flight_finder.AmadeusError("no credentials")), \
+                    self.assertRaises(cheap_flight_finder.AmadeusError):
+                cheap_flight_finder._amadeus_get(cheap_flight_finder.OFFERS_URL, {}, 5)
+            self.assertEqual(breaker.state, OPEN)  # neither claimed the probe
+            self.assertIs(cheap_flight_finder._amadeus_get(cheap_flight_finder.OFFERS_URL, {}, 5), ok)
+        get.assert_called_once()
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_token_request_is_behind_the_amadeus_breaker(self):
+        breaker = CircuitBreaker("amadeus-test", failure_threshold=1, reset_timeout=60)
+        with mock.patch.object(cheap_flight_finder, "amadeus_breaker", breaker), \
+                mock.patch.object(cheap_flight_finder.http_client, "post",
+                                  side_effect=cheap_flight_finder.requests.exceptions.ConnectionError("down")) as post:
+            with self.assertRaises(cheap_flight_finder.requests.exceptions.ConnectionError):
+                cheap_flight_finder._fetch_access_token()
+            self.assertEqual(breaker.state, OPEN)
+            with self.assertRaises(cheap_flight_finder.AmadeusUnavailableError):
+                cheap_flight_finder._fetch_access_token()
+        post.assert_called_once()
+
+    def test_open_circuit_serves_last_good_weather(self):
+        from main import weather_app
+
+        breaker = CircuitBreaker("openweather-test", failure_threshold=1)
+        cache.set(weather_app._last_good_key("Warsaw"), {"current": {"city": "Warsaw"}, "daily": [], "sun": {}})
+        breaker.before_call()
+        breaker.record(False, "timeout")
+        with mock.patch.object(weather_app, "openweather_breaker", breaker), \
+                mock.patch.object(weather_app.http_client, "get") as get:
+            data = self.client.get("/weather-app/api/", {"city": "warsaw"}).json()
+            self.assertEqual(weather_app._get_json("https://example.invalid", {})[0], 0)
+        get.assert_not_called()
+        self.assertTrue(data["stale"])
+        self.assertEqual(data["current"]["city"], "Warsaw")
+
+    def test_last_good_keys_are_memcached_safe(self):
+        from main import city_guide, weather_app
+
+        for key in (city_guide._last_good_key(" São Paulo ", "Brazil"), city_guide._last_good_key("Kraków", "PL"),
+                    weather_app._last_good_key("Ho Chi Minh City")):
+            self.assertTrue(key.isascii() and key.isprintable(), key)
+            self.assertNotIn(" ", key)
+        self.assertNotEqual(city_guide._last_good_key("a b", "c"), city_guide._last_good_key("a_b", "c"))
@@ -0,0 +1,360 @@
+"""
+Price history, price trend and price-drop watcher tests.
+No network: Amadeus calls are replaced with fakes.
+"""
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from main import cheap_flight_finder
+from main.cache_warmer import WarmRoute, parse_route, popular_routes, warm
+from main.flight_cache import make_search_key, search_cache
+from main.flight_normalizer import parse_all_offers
+from main.models import PriceWatch, RoutePriceSnapshot
+from main.price_history import SnapshotRecorder, price_history
+from main.price_trend import PriceTrendModel, band_of, price_trend
+from main.price_watch import RateBudget, check_watches
+from main.tests_flight_search import FakeClock, make_payload
+
+User = get_user_model()
+
+DEPART = (date.today() + timedelta(days=30)).isoformat()
+
+
+class PriceHistoryTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        price_history.flush()
+
+    def test_buffered_rows_are_bulk_inserted(self):
+        recorder = SnapshotRecorder(batch_size=3, flush_after=3600, background=False)
+        offers = parse_all_offers(make_payload([120, 99.5]), DEPART)
+        with self.assertNumQueries(0):  # searches never write
+            for dest in ("BCN", "MAD", "OPO"):
+                recorder.record("WAW", dest, DEPART, None, "EUR", offers)
+            recorder.record("WAW", "LIS", DEPART, None, "EUR", [])  # empty result: nothing to record
+        self.assertEqual(recorder.pending(), 3)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(recorder.flush(), 3)
+        rows = RoutePriceSnapshot.objects.order_by("destination")
+        self.assertEqual([r.destination for r in rows], ["BCN", "MAD", "OPO"])
+        self.assertEqual(rows[0].min_price, Decimal("99.50"))
+        self.assertEqual(rows[0].offer_count, 2)
+
+    def test_searches_feed_the_history(self):
+        params = {"origin": "WAW", "destination": "BCN", "depart_date": DEPART, "currency": "EUR"}
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=make_payload([120, 99])):
+            self.client.get("/cheap-flight-finder/api/search/", params)
+            self.client.get("/cheap-flight-finder/api/search/", params)  # cache hit: not recorded again
+        self.assertEqual(price_history.flush(), 1)
+        self.assertEqual(RoutePriceSnapshot.objects.get().min_price, Decimal("99.00"))
+
+
+class PriceHistoryFlusherTestCase(TransactionTestCase):
+    # Transactional: rows are written by the recorder's own thread
+
+    def _count(self):
+        # The test database is shared-cache in-memory SQLite: a read during the flusher's write
+        # fails with "table is locked" instead of waiting
+        for _ in range(100):
+            try:
+                return RoutePriceSnapshot.objects.count()
+            except OperationalError:
+                time.sleep(0.01)
+        return RoutePriceSnapshot.objects.count()
+
+    def _wait_for_rows(self, count):
+        deadline = time.monotonic() + 5
+        while self._count() < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self._count()
+
+    def test_full_batch_and_old_rows_are_flushed_in_the_background(self):
+        offers = parse_all_offers(make_payload([120]), DEPART)
+        recorder = SnapshotRecorder(batch_size=2, flush_after=3600)
+        with self.assertNumQueries(0):
+            recorder.record("WAW", "BCN", DEPART, None, "EUR", offers)
+            recorder.record("WAW", "MAD", DEPART, None, "EUR", offers)
+        self.assertEqual(self._wait_for_rows(2), 2)
+
+        recorder = SnapshotRecorder(batch_size=50, flush_after=0.1)
+        recorder.record("WAW", "LIS", DEPART, None, "EUR", offers)  # traffic then goes idle
+        self.assertEqual(self._wait_for_rows(3), 3)
+        self.assertEqual(recorder.pending(), 0)
+
+
+class PriceTrendTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        price_trend.clear()
+
+    def test_levels_and_advice(self):
+        model = PriceTrendModel(min_samples=8, load_history=False)
+        today = date(2026, 1, 1)
+        depart = today + timedelta(days=40)
+        self.assertIsNone(model.assess("WAW", "BCN", "EUR", False, depart, 100, on=today))
+        for price in range(100, 200, 5):
+            model.observe("waw", "bcn", "eur", False, depart, price, on=today)
+        low = model.assess("WAW", "BCN", "EUR", False, depart, 100, on=today)
+        self.assertEqual((low["level"], low["advice"], low["samples"]), ("low", "buy", 20))
+        self.assertEqual(model.assess("WAW", "BCN", "EUR", False, depart, 150, on=today)["level"], "typical")
+        self.assertEqual(model.assess("WAW", "BCN", "EUR", False, depart, 195, on=today)["level"], "high")
+        # Other trip type, other route: no history
+        self.assertIsNone(model.assess("WAW", "BCN", "EUR", True, depart, 150, on=today))
+
+        # Departures 20 days out have been clearly cheaper: wait unless the price is already low
+        nearer = today + timedelta(days=20)
+        self.assertNotEqual(band_of(20), band_of(40))
+        for price in range(60, 100, 5):
+            model.observe("WAW", "BCN", "EUR", False, nearer, price, on=today)
+        self.assertEqual(model.assess("WAW", "BCN", "EUR", False, depart, 170, on=today)["advice"], "wait")
+        self.assertEqual(model.assess("WAW", "BCN", "EUR", False, depart, 100, on=today)["advice"], "buy")
+
+    def test_search_meta_has_price_trend(self):
+        params = {"origin": "WAW", "destination": "BCN", "depart_date": DEPART, "currency": "EUR"}
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=make_payload([120, 99])), \
+                mock.patch.object(price_trend, "_load_history", False):
+            meta = self.client.get("/cheap-flight-finder/api/search/", params).json()["meta"]
+            self.assertIsNone(meta["price_trend"])  # one observation is not a trend yet
+            for price in range(100, 300, 20):
+                price_trend.observe("WAW", "BCN", "EUR", False, date.fromisoformat(DEPART), price)
+            meta = self.client.get("/cheap-flight-finder/api/search/", params).json()["meta"]
+        self.assertEqual(meta["price_trend"]["level"], "low")
+        self.assertEqual(meta["price_trend"]["days_to_departure"], 30)
+
+
+class PriceTrendHistoryTestCase(TransactionTestCase):
+    # Transactional: history is loaded on the model's own thread
+
+    def setUp(self):
+        self.depart = date.today() + timedelta(days=30)
+        RoutePriceSnapshot.objects.bulk_create(
+            RoutePriceSnapshot(origin="WAW", destination="BCN", depart_date=self.depart, currency="EUR",
+                               min_price=Decimal(100 + i), offer_count=5, recorded_at=timezone.now())
+            for i in range(50)
+        )
+
+    def test_history_loads_off_the_request_thread(self):
+        model = PriceTrendModel(min_samples=8)
+        with self.assertNumQueries(0):
+            self.assertIsNone(model.assess("WAW", "BCN", "EUR", False, self.depart, 110))  # still loading
+            model.observe("WAW", "BCN", "EUR", False, self.depart, 90)  # queued behind the load
+            model.wait_loaded(5)
+            first = model.assess("WAW", "BCN", "EUR", False, self.depart, 110)
+        self.assertEqual((first["level"], first["samples"]), ("low", 51))
+
+        start = time.perf_counter()
+        for _ in range(1000):
+            model.assess("WAW", "BCN", "EUR", False, self.depart, 130)
+        self.assertLess((time.perf_counter() - start) / 1000, 0.001)
+
+    def test_failed_load_is_retried(self):
+        model = PriceTrendModel(min_samples=8)
+        with mock.patch.object(RoutePriceSnapshot.objects, "filter", side_effect=DatabaseError("down")):
+            self.assertIsNone(model.assess("WAW", "BCN", "EUR", False, self.depart, 110))
+            model.wait_loaded(5)
+        self.assertIsNone(model.assess("WAW", "BCN", "EUR", False, self.depart, 110))  # schedules it again
+        model.wait_loaded(5)
+        self.assertEqual(model.assess("WAW", "BCN", "EUR", False, self.depart, 110)["samples"], 50)
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class PriceWatchTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="watcher", email="watcher@example.com", password="pass123")
+        mail.outbox.clear()  # welcome email
+
+    def _watch(self, destination="BCN", **kw):
+        return PriceWatch.objects.create(user=self.user, origin="WAW", destination=destination,
+                                         depart_date=DEPART, currency="EUR", **kw)
+
+    def test_drop_is_emailed_once(self):
+        watch = self._watch()
+        prices = iter([[150], [120], [120]])
+        with mock.patch.object(cheap_flight_finder, "get_offers", side_effect=lambda **kw: make_payload(next(prices))):
+            for _ in range(3):
+                cache.clear()
+                call_command("check_price_watches", "--per-minute", "0", stdout=mock.Mock())
+        watch.refresh_from_db()
+        self.assertEqual(watch.last_price, Decimal("120.00"))
+        self.assertEqual(watch.last_notified_price, Decimal("120.00"))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("150.00 EUR", mail.outbox[0].body)
+        self.assertIn("Price drop", mail.outbox[0].subject)
+
+    def test_stale_entry_is_refreshed_before_notifying(self):
+        watch = self._watch(last_price=Decimal("150"))
+        key = make_search_key("WAW", "BCN", DEPART, None, "EUR", 1)
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=make_payload([150])):
+            cheap_flight_finder.refresh_search("WAW", "BCN", DEPART, None, "EUR", 1)
+        entry = search_cache.get(key)
+        entry["created_at"] -= search_cache.ttl + 1
+        cache.set(key, entry)
+
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=make_payload([120])) as m:
+            stats = check_watches(budget=RateBudget(1, per_minute=0))
+        m.assert_called_once()
+        self.assertEqual((stats["upstream_calls"], stats["cache_hits"], stats["notified"]), (1, 0, 1))
+        watch.refresh_from_db()
+        self.assertEqual(watch.last_price, Decimal("120.00"))
+        self.assertIn("120.00 EUR", mail.outbox[0].body)
+        self.assertTrue(search_cache.is_fresh(search_cache.get(key)))
+
+        # The refreshed entry is fresh: the next run is a free cache hit
+        with mock.patch.object(cheap_flight_finder, "get_offers") as m:
+            stats = check_watches(budget=RateBudget(0, per_minute=0))
+        m.assert_not_called()
+        self.assertEqual((stats["cache_hits"], stats["checked"]), (1, 1))
+
+    def test_shared_searches_and_rate_budget(self):
+        self._watch(target_price=Decimal("100"))
+        self._watch(target_price=Decimal("90"))  # same search as the first
+        for dest in ("MAD", "LIS", "OPO"):
+            self._watch(destination=dest)
+        PriceWatch.objects.create(user=self.user, origin="WAW", destination="ROM",
+                                  depart_date=date.today() - timedelta(days=1))
+
+        clock = FakeClock(0.0)
+        sleeps = []
+
+        def sleep(s):
+            sleeps.append(s)
+            clock.now += s
+
+        budget = RateBudget(2, per_minute=30, clock=clock, sleep=sleep)
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=make_payload([95])) as m:
+            stats = check_watches(batch_size=2, budget=budget)
+        self.assertEqual(m.call_count, 2)
+        self.assertEqual(sleeps, [2.0])
+        self.assertEqual((stats["checked"], stats["deferred"], stats["expired"], stats["notified"]), (3, 2, 1, 1))
+        self.assertEqual([m.to for m in mail.outbox], [["watcher@example.com"]])
+        # Deferred watches are first in line on the next run
+        self.assertEqual(
+            set(PriceWatch.objects.filter(active=True, last_checked_at__isnull=True).values_list("destination", flat=True)),
+            {"LIS", "OPO"},
+        )
+
+
+class CacheWarmerTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        price_history.flush()
+
+    def _snapshot(self, destination, source="amadeus", stay=None, count=1, currency="EUR"):
+        depart = date.today() + timedelta(days=10)
+        for _ in range(count):
+            RoutePriceSnapshot.objects.create(
+                origin="WAW", destination=destination, depart_date=depart,
+                return_date=depart + timedelta(days=stay) if stay is not None else None,
+                currency=currency, min_price=Decimal("100"), source=source, recorded_at=timezone.now(),
+            )
+
+    def test_popular_routes_from_user_searches(self):
+        self._snapshot("BCN", count=3)
+        self._snapshot("LIS", stay=7, count=2)
+        self._snapshot("LIS", stay=3)
+        self._snapshot("MAD", source="warm", count=5)  # the warmer's own searches never count
+        self._snapshot("OPO", source="watcher", count=4)
+        self.assertEqual(popular_routes(limit=5, lookback_days=7), [
+            WarmRoute("WAW", "BCN", "EUR", None),
+            WarmRoute("WAW", "LIS", "EUR", 7),
+        ])
+        self.assertEqual(popular_routes(limit=1, lookback_days=7), [WarmRoute("WAW", "BCN", "EUR", None)])
+
+    def test_parse_route(self):
+        self.assertEqual(parse_route("waw-bcn"), WarmRoute("WAW", "BCN", "USD", None))
+        self.assertEqual(parse_route("WAW-BCN:eur", stay=7), WarmRoute("WAW", "BCN", "EUR", 7))
+        for bad in ("WAW", "WAW-BC", "WAW-BCN:EU", "W1W-BCN"):
+            with self.assertRaises(ValueError):
+                parse_route(bad)
+
+    def test_warm_refreshes_missing_and_expiring_entries(self):
+        routes = [WarmRoute("WAW", "BCN", "EUR"), WarmRoute("WAW", "LIS", "EUR", 7)]
+        no_wait = dict(per_minute=0)
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=make_payload([95])) as m:
+            stats = warm(routes, days=3, ahead=60, budget=RateBudget(4, **no_wait))
+            self.assertEqual(m.call_count, 4)
+            # Nearest departures first: what the budget could not cover is the last date
+            self.assertEqual(
+                sorted(c.kwargs["depart_date"] for c in m.call_args_list)[-1],
+                (date.today() + timedelta(days=2)).isoformat(),
+            )
+            self.assertEqual((stats["warmed"], stats["deferred"], stats["errors"]), (4, 2, 0))
+            self.assertEqual(RoutePriceSnapshot.objects.filter(source="warm").count(), 4)
+
+            stats = warm(routes, days=3, ahead=60, budget=RateBudget(10, **no_wait))
+            self.assertEqual((stats["warmed"], stats["fresh"]), (2, 4))
+            # Entries about to go stale are refreshed again
+            stats = warm(routes, days=3, ahead=10 ** 6, budget=RateBudget(10, **no_wait), dry_run=True)
+            self.assertEqual((stats["warmed"], stats["deferred"]), (0, 6))
+        self.assertEqual(m.call_count, 6)
+
+        params = {"origin": "WAW", "destination": "LIS", "currency": "EUR", "trip_type": "round_trip",
+                  "depart_date": (date.today() + timedelta(days=1)).isoformat(),
+                  "return_date": (date.today() + timedelta(days=8)).isoformat()}
+        with mock.patch.object(cheap_flight_finder, "get_offers") as m:
+            resp = self.client.get("/cheap-flight-finder/api/search/", params)
+        m.assert_not_called()
+        self.assertEqual(resp.status_code, 200)
+
+    def test_warm_refreshes_searched_full_entries_only(self):
+        depart = (date.today() + timedelta(days=1)).isoformat()
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=make_payload([95])):
+            cheap_flight_finder.refresh_search("WAW", "BCN", depart, None, "EUR", 1, full=True)
+        full_key = make_search_key("WAW", "BCN", depart, None, "EUR", 1, full=True)
+        entry = search_cache.get(full_key)
+        entry["created_at"] -= search_cache.ttl
+        cache.set(full_key, entry)
+
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=make_payload([80])) as m:
+            stats = warm([WarmRoute("WAW", "BCN", "EUR")], days=2, ahead=60, budget=RateBudget(10, per_minute=0))
+        # Both default entries, and the full one of the day somebody searched it
+        self.assertEqual(stats["warmed"], 3)
+        self.assertEqual(sorted(c.kwargs["max_items"] for c in m.call_args_list),
+                         [cheap_flight_finder.SEARCH_MAX_ITEMS] * 2 + [cheap_flight_finder.FULL_MAX_ITEMS])
+        self.assertTrue(search_cache.is_fresh(search_cache.get(full_key)))
+        self.assertEqual(search_cache.get(full_key)["source"], "warm")
+
+    def test_command_refuses_process_local_cache(self):
+        with mock.patch.object(cheap_flight_finder, "get_offers") as m:
+            with self.assertRaisesMessage(CommandError, "process-local"):
+                call_command("warm_flight_cache", "--route", "WAW-BCN", stdout=mock.Mock())
+        m.assert_not_called()
+
+
+class WarmCommandTestCase(TransactionTestCase):
+    # Transactional: the warmer's worker threads read and write the shared (database) cache
+
+    @override_settings(CFF_SEARCH_CACHE_ALIAS="shared", CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "shared": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "cff_test_cache"},
+    })
+    def test_command(self):
+        call_command("createcachetable", verbosity=0)
+        CacheWarmerTestCase._snapshot(self, "BCN", count=2)
+        out = mock.Mock()
+        with mock.patch.object(cheap_flight_finder, "get_offers", return_value=make_payload([95])) as m:
+            call_command("warm_flight_cache", "--days", "2", "--per-minute", "0", "--concurrency", "1", stdout=out)
+            self.assertEqual(m.call_count, 2)
+            # Entries are in the shared backend, not this process's memory
+            cache.clear()
+            call_command("warm_flight_cache", "--route", "WAW-BCN:EUR", "--days", "2", "--per-minute", "0", "--concurrency", "1",
+                         stdout=out)
+            self.assertIn("1 routes: 0 warmed, 2 fresh", out.write.call_args.args[0])
+            call_command("warm_flight_cache", "--route", "WAW-MAD:EUR", "--days", "1", "--per-minute", "0", "--concurrency", "1",
+                         "--dry-run", stdout=out)
+        self.assertEqual(m.call_count, 2)
+        self.assertIn("1 routes: 0 warmed, 0 fresh, 1 deferred", out.write.call_args.args[0])
+        with self.assertRaises(CommandError):
+            call_command("warm_flight_cache", "--route", "WAW", stdout=out)
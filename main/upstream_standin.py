@@ -0,0 +1,220 @@
+"""
+Local stand-in for the upstream APIs the flight finder calls, for load tests without quota.
+Serves the Amadeus token, flight-offers and locations endpoints and Google Places
+searchText / photo media with recorded or synthetic payloads, behind configurable
+latency, error rate and 429 injection. Point the app at it through settings:
+    AMADEUS_BASE_URL=http://127.0.0.1:8765 GOOGLE_PLACES_BASE_URL=http://127.0.0.1:8765
+and start it with `python manage.py run_upstream_standin` (see that command for options).
+Flight offers replay a recording from main/benchmarks/data/ when one matches the route and
+dates (file stem origin_destination_depart[_return]_n), otherwise a deterministic synthetic
+payload per search.
+"""
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+from main import airport_data
+from main.benchmarks.fixtures import RECORDED_DIR, load_recorded, make_offers_payload
+
+DEFAULT_PORT = 8765
+# Offers per synthetic response when the request has no max
+DEFAULT_OFFERS = 250
+# 1x1 transparent GIF served as every place photo
+PHOTO_BYTES = bytes.fromhex("47494638396101000100800000000000ffffff21f90401000000002c00000000010001000002024401003b")
+
+
+class StandinConfig:
+    """
+    latency_ms (+ uniform jitter_ms) per response; error_rate answers 500, rate_limit_rate
+    answers 429 (with Retry-After), and max_rps answers 429 to requests over that rate.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        max_rps: float = 0.0,
+        retry_after: int = 1,
+        recordings: str | None = RECORDED_DIR,
+        seed: int | None = None,
+    ):
+        self.latency_ms = max(0.0, latency_ms)
+        self.jitter_ms = max(0.0, jitter_ms)
+        self.error_rate = min(1.0, max(0.0, error_rate))
+        self.rate_limit_rate = min(1.0, max(0.0, rate_limit_rate))
+        self.max_rps = max(0.0, max_rps)
+        self.retry_after = max(0, retry_after)
+        self.recordings = recordings
+        self.seed = seed
+
+
+class Standin:
+    """Request handling, independent of the HTTP server (the handler only forwards)."""
+
+    def __init__(self, config: StandinConfig | None = None):
+        self.config = config or StandinConfig()
+        self.recorded = load_recorded(self.config.recordings) if self.config.recordings else {}
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._window_start = 0.0
+        self._window_count = 0
+        self.stats: dict[str, int] = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    # -- fault injection ------------------------------------------------------
+
+    def _fault(self) -> int | None:
+        """429, 500 or None for this request (also counts it)."""
+        cfg = self.config
+        with self._lock:
+            self.stats["requests"] += 1
+            roll = self._rng.random()
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start, self._window_count = now, 0
+            self._window_count += 1
+            over_rate = cfg.max_rps > 0 and self._window_count > cfg.max_rps
+            if over_rate or roll < cfg.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return 429
+            if roll < cfg.rate_limit_rate + cfg.error_rate:
+                self.stats["errors"] += 1
+                return 500
+        return None
+
+    def _delay(self) -> float:
+        cfg = self.config
+        with self._lock:
+            jitter = self._rng.uniform(0, cfg.jitter_ms) if cfg.jitter_ms else 0.0
+        return (cfg.latency_ms + jitter) / 1000.0
+
+    # -- payloads -------------------------------------------------------------
+
+    def flight_offers(self, params: dict[str, str]) -> dict[str, Any]:
+        origin = params.get("originLocationCode", "WAW").upper()
+        destination = params.get("destinationLocationCode", "BCN").upper()
+        depart = params.get("departureDate", "2030-06-15")
+        ret = params.get("returnDate") or None
+        try:
+            n = max(1, int(params.get("max") or DEFAULT_OFFERS))
+        except ValueError:
+            n = DEFAULT_OFFERS
+        stem = "_".join(p for p in (origin, destination, depart, ret) if p).lower()
+        for name, payload in self.recorded.items():
+            if name.rsplit("_", 1)[0] == stem:
+                return {**payload, "data": (payload.get("data") or [])[:n]}
+        seed = zlib.crc32(f"{stem}:{n}".encode())
+        payload = make_offers_payload(n, round_trip=ret is not None, origin=origin, destination=destination,
+                                      depart_date=depart, return_date=ret or depart, seed=seed)
+        currency = params.get("currencyCode", "EUR").upper()
+        for offer in payload["data"]:
+            offer["price"]["currency"] = currency
+        return payload
+
+    @staticmethod
+    def locations(params: dict[str, str]) -> dict[str, Any]:
+        try:
+            limit = max(1, int(params.get("page[limit]") or 10))
+        except ValueError:
+            limit = 10
+        data = [
+            {
+                "type": "location",
+                "subType": "AIRPORT",
+                "name": (r.get("airport_name") or r.get("city_name") or "").upper(),
+                "iataCode": r.get("iata_code"),
+                "address": {"cityName": (r.get("city_name") or "").upper(), "countryCode": r.get("country_code")},
+            }
+            for r in airport_data.search_local(params.get("keyword", ""), limit=limit)
+        ]
+        return {"meta": {"count": len(data)}, "data": data}
+
+    @staticmethod
+    def places(body: dict[str, Any]) -> dict[str, Any]:
+        query = str(body.get("textQuery") or "")
+        h = zlib.crc32(query.encode())
+        place_id = f"standin{h:08x}"
+        return {"places": [{
+            "id": place_id,
+            "displayName": {"text": query.title() or "Stand-in place", "languageCode": "en"},
+            "rating": round(3.5 + (h % 15) / 10, 1),
+            "userRatingCount": 50 + h % 950,
+            "priceLevel": ("PRICE_LEVEL_INEXPENSIVE", "PRICE_LEVEL_MODERATE", "PRICE_LEVEL_EXPENSIVE")[h % 3],
+            "formattedAddress": f"{h % 200 + 1} Stand-in Street",
+            "photos": [{"name": f"places/{place_id}/photos/p1", "widthPx": 1, "heightPx": 1}],
+            "googleMapsUri": f"https://maps.google.com/?cid={h}",
+        }]}
+
+    # -- dispatch ---------------------------------------------------------------
+
+    def handle(self, method: str, path: str, params: dict[str, str], body: bytes) -> tuple[int, dict[str, str], bytes]:
+        """(status, headers, body) for one request; sleeps for the configured latency first."""
+        time.sleep(self._delay())
+        if path.endswith("/security/oauth2/token") and method == "POST":
+            # Token requests are never faulted: the client's token cache is not what load tests measure
+            return _json(200, {"type": "amadeusOAuth2Token", "access_token": "standin-token",
+                               "token_type": "Bearer", "expires_in": 1799, "state": "approved"})
+
+        fault = self._fault()
+        if fault == 429:
+            return _json(429, {"errors": [{"status": 429, "code": 38194, "title": "Too many requests"}]},
+                         {"Retry-After": str(self.config.retry_after)})
+        if fault == 500:
+            return _json(500, {"errors": [{"status": 500, "code": 141, "title": "SYSTEM ERROR HAS OCCURRED"}]})
+
+        if path.endswith("/shopping/flight-offers") and method == "GET":
+            return _json(200, self.flight_offers(params))
+        if path.endswith("/reference-data/locations") and method == "GET":
+            return _json(200, self.locations(params))
+        if path.endswith("/places:searchText") and method == "POST":
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                return _json(400, {"error": {"code": 400, "message": "invalid JSON"}})
+            return _json(200, self.places(payload if isinstance(payload, dict) else {}))
+        if path.endswith("/media") and method == "GET":
+            return 200, {"Content-Type": "image/gif"}, PHOTO_BYTES
+        return _json(404, {"errors": [{"status": 404, "title": "not found"}]})
+
+
+def _json(status: int, payload: dict[str, Any], headers: dict[str, str] | None = None) -> tuple[int, dict[str, str], bytes]:
+    return status, {"Content-Type": "application/json", **(headers or {})}, json.dumps(payload).encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    standin: Standin
+    protocol_version = "HTTP/1.1"
+
+    def _serve(self) -> None:
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        status, headers, payload = self.standin.handle(self.command, url.path, params, body)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = _serve
+
+    def log_message(self, format, *args):  # noqa: A002 (BaseHTTPRequestHandler signature)
+        pass
+
+
+def make_server(standin: Standin, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Threaded HTTP server (port 0 picks a free port); call serve_forever() / shutdown()."""
+    handler = type("StandinHandler", (_Handler,), {"standin": standin})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
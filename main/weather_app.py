@@ -1,25 +1,45 @@
 from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import render
 from django.http import JsonResponse
 
 import requests
 from collections import defaultdict
 from datetime import datetime, timezone as tz
+from urllib.parse import quote
+
+from main.circuit_breaker import CircuitOpen, openweather_breaker
+from main.http_client import http_client
+
+# Last good result per city, served (marked stale) while the OpenWeather breaker is open
+LAST_GOOD_TTL = 6 * 3600
 
 
 def _get_json(url, params, timeout=25):
     try:
-        r = requests.get(url, params=params, timeout=timeout)
+        openweather_breaker.before_call()
+    except CircuitOpen as e:
+        return 0, None, f"service unavailable ({e})"
+    try:
+        r = http_client.get(url, params=params, timeout=timeout, upstream="openweather")
+        openweather_breaker.record(r.status_code < 500, f"HTTP {r.status_code}")
         try:
             return r.status_code, r.json(), None
         except Exception:
             return r.status_code, {"message": r.text}, None
     except requests.exceptions.Timeout:
+        openweather_breaker.record(False, "timeout")
         return 0, None, "timeout"
     except requests.exceptions.RequestException as e:
+        openweather_breaker.record(False, f"network_error: {e}")
         return 0, None, f"network_error: {str(e)}"
 
 
+def _last_good_key(city: str) -> str:
+    # Quoted: memcached rejects spaces and non-ASCII in keys
+    return "weather:last:" + quote(city.strip().lower())
+
+
 def _fmt_local_hhmm(unix_ts: int, tz_offset_seconds: int):
     """
     OpenWeather sunrise/sunset -> UTC timestamp + timezone offset seconds.
@@ -196,8 +216,14 @@ def weather_api(request):
     if not city:
         return JsonResponse({"error": "city is required"}, status=400)
 
+    if openweather_breaker.is_open():
+        last_good = cache.get(_last_good_key(city))
+        if last_good is not None:
+            return JsonResponse({**last_good, "stale": True}, status=200)
+
     data, err = _fetch_weather(city)
     if err:
         return JsonResponse({"error": err}, status=503)
+    cache.set(_last_good_key(city), data, timeout=LAST_GOOD_TTL)
 
     return JsonResponse(data, status=200)
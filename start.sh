@@ -1,8 +1,25 @@
 #!/usr/bin/env bash
 # Production start script for Render.
 # Ensures PORT is set, binds to 0.0.0.0, uses stable gunicorn options.
+# SERVER=asgi runs core.asgi on uvicorn workers with the async flight search views
+# (CFF_ASYNC_VIEWS); the default is core.wsgi on gthread workers.
 set -e
 export PORT="${PORT:-10000}"
+if [ "${SERVER:-wsgi}" = "asgi" ]; then
+  export CFF_ASYNC_VIEWS="${CFF_ASYNC_VIEWS:-true}"
+  echo "[start.sh] Starting gunicorn (ASGI, uvicorn workers) on 0.0.0.0:${PORT}"
+  exec gunicorn core.asgi:application \
+    --bind "0.0.0.0:${PORT}" \
+    --workers 1 \
+    --worker-class uvicorn.workers.UvicornWorker \
+    --timeout 120 \
+    --graceful-timeout 30 \
+    --keep-alive 5 \
+    --access-logfile - \
+    --error-logfile - \
+    --capture-output \
+    --log-level info
+fi
 echo "[start.sh] Starting gunicorn on 0.0.0.0:${PORT}"
 exec gunicorn core.wsgi:application \
   --bind "0.0.0.0:${PORT}" \